@@ -1,5 +1,6 @@
 from __future__ import annotations
 from typing import Any, Callable
+import copy
 import random
 
 from gameData.rpg_enemy_data_common import *
@@ -129,10 +130,7 @@ ratMarkSkill = PassiveSkillData("Ravenous Rats", BasePlayerClassNames.WARRIOR, 0
 
 ## Fresh Field
 
-def ffSlime(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def ffSlimeRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if roomNumber > 0:
@@ -147,7 +145,10 @@ def ffSlime(params : dict, rng : random.Random | None = None) -> Enemy:
         }
         for stat in maxVars:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(ffSlimeRolls)
+def ffSlime(params : dict) -> Enemy:
     def decisionFn(controller : CombatController, enemy : CombatEntity, data : dict) -> EntityAIAction:
         target = controller.getAggroTarget(enemy)
         targetIdx = controller.getTargets(enemy).index(target)
@@ -161,7 +162,7 @@ def ffSlime(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 110, BaseStats.MP: 1,
         BaseStats.ATK: 25, BaseStats.DEF: 25, BaseStats.MAG: 1, BaseStats.RES: 25,
         BaseStats.ACC: 60, BaseStats.AVO: 60, BaseStats.SPD: 40
-    }, flatStatMods, {}, 0.5, None, None, [], [],
+    }, {}, {}, 0.5, None, None, [], [],
     "The slime lets out a 'blurble'.", "",
     EntityAI({}, decisionFn),
     lambda controller, entity:
@@ -169,10 +170,7 @@ def ffSlime(params : dict, rng : random.Random | None = None) -> Enemy:
                                        makeBasicCommonDrop(controller.rng, 0, 2, 0)))
         if not params.get('boss', False) else EnemyReward(1, 0, 0, None))
 
-def ffRat(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def ffRatRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if not params.get('storehouse', False):
@@ -205,7 +203,10 @@ def ffRat(params : dict, rng : random.Random | None = None) -> Enemy:
         for stat in maxVars:
             if maxVars[stat] > 0:
                 flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(ffRatRolls)
+def ffRat(params : dict) -> Enemy:
     impetuousRatSkill = PassiveSkillData("Mark of Impetuous Rat", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [SkillEffect("", [
         EFAfterNextAttack(lambda controller, _1, target, attackResult, _2: void((
             controller.logMessage(MessageType.EFFECT, f"{target.shortName} is marked for other rats!")
@@ -238,7 +239,7 @@ def ffRat(params : dict, rng : random.Random | None = None) -> Enemy:
     minRank, maxRank, wepChance = (0, 2, 0) if not params.get('storehouse', False) else (4, 7, 0.2)
     return Enemy("Roverat", "Roverat",
                  "A field rat. Despite its size, it seeks to defy the constraints of rules.", level,
-                 baseStats, flatStatMods, {}, 0.5, None, None, [ratMarkSkill, impetuousRatSkill], [],
+                 baseStats, {}, {}, 0.5, None, None, [ratMarkSkill, impetuousRatSkill], [],
     "\\*squeak squek\\*", "",
     EntityAI({}, decisionFn),
     lambda controller, entity:
@@ -246,10 +247,7 @@ def ffRat(params : dict, rng : random.Random | None = None) -> Enemy:
                                        makeBasicCommonDrop(controller.rng, minRank, maxRank, wepChance)))
         if not (params.get('boss', False) or params.get('summoned', False)) else EnemyReward(1, 0, 0, None))
 
-def ffPlant(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def ffPlantRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if roomNumber > 0:
@@ -266,7 +264,10 @@ def ffPlant(params : dict, rng : random.Random | None = None) -> Enemy:
         }
         for stat in maxVars:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(ffPlantRolls)
+def ffPlant(params : dict) -> Enemy:
     attackSkill = AttackSkillData("Petal Popper", BasePlayerClassNames.WARRIOR, 0, False, 10, "",
                                   False, AttackType.MAGIC, 1, DEFAULT_ATTACK_TIMER_USAGE, [
                                       SkillEffect("", [EFBeforeNextAttack({CombatStats.IGNORE_RANGE_CHECK: 1}, {}, None, None)], 0)
@@ -288,7 +289,7 @@ def ffPlant(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 130, BaseStats.MP: 50,
         BaseStats.ATK: 5, BaseStats.DEF: 30, BaseStats.MAG: 40, BaseStats.RES: 35,
         BaseStats.ACC: 85, BaseStats.AVO: 30, BaseStats.SPD: 20
-    }, flatStatMods, {}, 0.65, None, None, [
+    }, {}, {}, 0.65, None, None, [
         weaknessEffect(MagicalAttackAttribute.FIRE, 1),
         weaknessEffect(MagicalAttackAttribute.ICE, 1),
         weaknessEffect(MagicalAttackAttribute.WIND, 1)
@@ -540,10 +541,7 @@ def ffPlantBoss(params : dict) -> Enemy:
 
 ## Skylight Cave
 
-def scRat(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def scRatRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if not params.get('storehouse', False):
@@ -576,7 +574,10 @@ def scRat(params : dict, rng : random.Random | None = None) -> Enemy:
         for stat in maxVars:
             if maxVars[stat] > 0:
                 flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(scRatRolls)
+def scRat(params : dict) -> Enemy:
     resoluteRatSkill = PassiveSkillData("Mark of Resolute Rat", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [SkillEffect("", [
         EFAfterNextAttack(lambda controller, _1, target, attackResult, _2: void((
             controller.logMessage(MessageType.EFFECT, f"{target.shortName} is marked for other rats!")
@@ -608,7 +609,7 @@ def scRat(params : dict, rng : random.Random | None = None) -> Enemy:
     minRank, maxRank, wepChance = (2, 5, 0) if not params.get('storehouse', False) else (4, 7, 0.2)
     return Enemy("Spelunkerat", "Spelunkerat",
                  "A cave rat. It lives for treasure, both the friendship sort and the actual-monetary-value kind.", level,
-                 baseStats, flatStatMods, {}, 0.5,None, None, [ratMarkSkill, resoluteRatSkill], [],
+                 baseStats, {}, {}, 0.5,None, None, [ratMarkSkill, resoluteRatSkill], [],
     "\\*squeak squok\\*", "",
     EntityAI({}, decisionFn),
     lambda controller, entity:
@@ -616,10 +617,7 @@ def scRat(params : dict, rng : random.Random | None = None) -> Enemy:
                                        makeBasicCommonDrop(controller.rng, minRank, maxRank, wepChance)))
         if not (params.get('boss', False) or params.get('summoned', False)) else EnemyReward(1, 0, 0, None))
 
-def scRock(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def scRockRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if roomNumber > 0:
@@ -636,7 +634,10 @@ def scRock(params : dict, rng : random.Random | None = None) -> Enemy:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
     if params.get('boss', False):
         flatStatMods[BaseStats.HP] += 30
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(scRockRolls)
+def scRock(params : dict) -> Enemy:
     enrageAtStacks = 7
     enrageStackCost = 5
     rageSkill = PassiveSkillData("Rueful Rocks", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [
@@ -690,7 +691,7 @@ def scRock(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 180, BaseStats.MP: 30,
         BaseStats.ATK: 50, BaseStats.DEF: 65, BaseStats.MAG: 1, BaseStats.RES: 35,
         BaseStats.ACC: 85, BaseStats.AVO: 50, BaseStats.SPD: 40
-    }, flatStatMods, {}, 0.6, AttackType.MELEE, PhysicalAttackAttribute.CRUSHING, [
+    }, {}, {}, 0.6, AttackType.MELEE, PhysicalAttackAttribute.CRUSHING, [
         weaknessEffect(PhysicalAttackAttribute.CRUSHING, 1),
         resistanceEffect(PhysicalAttackAttribute.PIERCING, 1),
         rageSkill
@@ -703,10 +704,7 @@ def scRock(params : dict, rng : random.Random | None = None) -> Enemy:
                                        makeBasicCommonDrop(controller.rng, 3, 6, 0.25, getWeaponClasses(MELEE_WEAPON_TYPES))))
         if not params.get('boss', False) else EnemyReward(1, 0, 0, None))
 
-def scBat(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def scBatRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if roomNumber > 0:
@@ -723,7 +721,10 @@ def scBat(params : dict, rng : random.Random | None = None) -> Enemy:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
     if params.get('boss', False):
         flatStatMods[BaseStats.HP] += 75
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(scBatRolls)
+def scBat(params : dict) -> Enemy:
     dashSkill = AttackSkillData("Soaring Shadow", BasePlayerClassNames.WARRIOR, 0, False, 15, "",
                                   True, AttackType.MELEE, 2, DEFAULT_ATTACK_TIMER_USAGE, [
                                       SkillEffect("", [
@@ -774,7 +775,7 @@ def scBat(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 150, BaseStats.MP: 45,
         BaseStats.ATK: 40, BaseStats.DEF: 40, BaseStats.MAG: 1, BaseStats.RES: 40,
         BaseStats.ACC: 100, BaseStats.AVO: 100, BaseStats.SPD: 75
-    }, flatStatMods, {
+    }, {}, {
         CombatStats.BASIC_MP_GAIN_MULT: 10 / BASIC_ATTACK_MP_GAIN
     }, 0.4, AttackType.MELEE, PhysicalAttackAttribute.SLASHING, [
         weaknessEffect(PhysicalAttackAttribute.SLASHING, 1),
@@ -789,10 +790,7 @@ def scBat(params : dict, rng : random.Random | None = None) -> Enemy:
         if not params.get('boss', False) else EnemyReward(1, 0, 0, None))
 
 
-def scFairy(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def scFairyRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 2 }
     roomNumber = params.get('roomNumber', 0)
     if roomNumber > 0:
@@ -809,6 +807,10 @@ def scFairy(params : dict, rng : random.Random | None = None) -> Enemy:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
     if params.get('boss', False):
         flatStatMods[BaseStats.HP] += 75
+    return SpawnRolls(flatStatMods)
+
+@rolledSpawner(scFairyRolls)
+def scFairy(params : dict) -> Enemy:
     
     strafeSkill = AttackSkillData("Crystal Reflection", BasePlayerClassNames.WARRIOR, 0, False, 15, "",
         True, AttackType.RANGED, 0.8, DEFAULT_ATTACK_TIMER_USAGE * 1.2,
@@ -868,7 +870,7 @@ def scFairy(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 130, BaseStats.MP: 60,
         BaseStats.ATK: 60, BaseStats.DEF: 30, BaseStats.MAG: 1, BaseStats.RES: 60,
         BaseStats.ACC: 130, BaseStats.AVO: 50, BaseStats.SPD: 60
-    }, flatStatMods, {
+    }, {}, {
         CombatStats.BASIC_MP_GAIN_MULT: 8 / BASIC_ATTACK_MP_GAIN
     }, 0.4, AttackType.RANGED, PhysicalAttackAttribute.PIERCING, [
         weaknessEffect(PhysicalAttackAttribute.PIERCING, 1),
@@ -995,11 +997,11 @@ def scRpsBoss(params : dict, rng : random.Random | None = None) -> Enemy:
                 assert burstCost is not None
                 if currentMana >= burstCost:
                     attributeOrder = [attribute for attribute in PhysicalAttackAttribute]
-                    rng.shuffle(attributeOrder)
+                    controller.rng.shuffle(attributeOrder)
                     for attribute in attributeOrder:
                         if resistStacks[attribute] >= burstStackRequirement:
                             counterAttribute = rpsLosesMap[attribute]
-                            enemy.basicAttackAttribute = counterAttribute
+                            controller.combatStateMap[enemy].setBasicAttackAttribute(counterAttribute)
                             controller.logMessage(MessageType.EFFECT, rpsEffectStrings[counterAttribute])
                             return EntityAIAction(CombatActions.SKILL, 1, [targetIdx], None, attribute.name)
 
@@ -1183,7 +1185,7 @@ def scSpiritBoss(params : dict, rng : random.Random | None = None) -> Enemy:
             retreatTargets = [target for target in distMap if distMap[target] <= 1]
             if len(retreatTargets) > 0:
                 retreatAmount = 2 if len(retreatTargets) == 1 else 1
-                retreatTargetIdxs = [allTargets.index(target) for target in rng.sample(retreatTargets, min(2, len(retreatTargets)))]
+                retreatTargetIdxs = [allTargets.index(target) for target in controller.rng.sample(retreatTargets, min(2, len(retreatTargets)))]
                 data["retreatCd"] = 3
                 return EntityAIAction(CombatActions.RETREAT, None, retreatTargetIdxs, retreatAmount, None)
             
@@ -1229,10 +1231,7 @@ def scSpiritBoss(params : dict, rng : random.Random | None = None) -> Enemy:
 
 ## Saffron Forest
 
-def sfRat(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def sfRatRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if not params.get('storehouse', False):
@@ -1265,7 +1264,10 @@ def sfRat(params : dict, rng : random.Random | None = None) -> Enemy:
         for stat in maxVars:
             if maxVars[stat] > 0:
                 flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(sfRatRolls)
+def sfRat(params : dict) -> Enemy:
     intrepidRatSkill = PassiveSkillData("Mark of Intrepid Rat", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [SkillEffect("", [
         EFAfterNextAttack(lambda controller, _1, target, attackResult, _2: void((
             controller.logMessage(MessageType.EFFECT, f"{target.shortName} is marked for other rats!")
@@ -1297,7 +1299,7 @@ def sfRat(params : dict, rng : random.Random | None = None) -> Enemy:
     minRank, maxRank, wepChance = (2, 5, 0) if not params.get('storehouse', False) else (4, 7, 0.2)
     return Enemy("Gatherat", "Gatherat",
                  "A forest rat. Its hunger for battle is surpassed only by its hunger for food, but it's not particularly close.", level,
-                 baseStats, flatStatMods, {}, 0.5, None, None, [ratMarkSkill, intrepidRatSkill], [],
+                 baseStats, {}, {}, 0.5, None, None, [ratMarkSkill, intrepidRatSkill], [],
     "\\*squeak squak\\*", "",
     EntityAI({}, decisionFn),
     lambda controller, entity:
@@ -1306,10 +1308,7 @@ def sfRat(params : dict, rng : random.Random | None = None) -> Enemy:
         if not (params.get('boss', False) or params.get('summoned', False)) else EnemyReward(1, 0, 0, None))
 
 
-def sfReaper(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def sfReaperRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     if roomNumber > 0:
@@ -1323,7 +1322,10 @@ def sfReaper(params : dict, rng : random.Random | None = None) -> Enemy:
         }
         for stat in maxVars:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(sfReaperRolls)
+def sfReaper(params : dict) -> Enemy:
     proximitySkill = PassiveSkillData("Faceless Fear", BasePlayerClassNames.WARRIOR, 0, False, "",
                                     {}, {}, [SkillEffect("", [
                                         EFBeforeAttacked(
@@ -1366,7 +1368,7 @@ def sfReaper(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 200, BaseStats.MP: 30,
         BaseStats.ATK: 110, BaseStats.DEF: 100, BaseStats.MAG: 1, BaseStats.RES: 100,
         BaseStats.ACC: 100, BaseStats.AVO: 50, BaseStats.SPD: 30
-    }, flatStatMods, {
+    }, {}, {
         CombatStats.REPOSITION_ACTION_TIME_MULT: 1.65
     }, 0.85, AttackType.MELEE, PhysicalAttackAttribute.SLASHING,
     [
@@ -1384,10 +1386,7 @@ def sfReaper(params : dict, rng : random.Random | None = None) -> Enemy:
         if not params.get('boss', False) else EnemyReward(1, 0, 0, None))
 
 
-def sfNinja(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def sfNinjaRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 2 }
     roomNumber = params.get('roomNumber', 0)
     if roomNumber > 0:
@@ -1407,7 +1406,10 @@ def sfNinja(params : dict, rng : random.Random | None = None) -> Enemy:
     if params.get('boss', False):
         flatStatMods[BaseStats.HP] += 60
         flatStatMods[BaseStats.SPD] += 10
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(sfNinjaRolls)
+def sfNinja(params : dict) -> Enemy:
     bindSkill = AttackSkillData("Dragonfly Binding Art", BasePlayerClassNames.WARRIOR, 0, False, 30, "",
                                 False, AttackType.MAGIC, 1, DEFAULT_ATTACK_TIMER_USAGE, [SkillEffect("", [
                                     EFBeforeNextAttack({CombatStats.IGNORE_RANGE_CHECK: 1}, {}, None, None),
@@ -1467,7 +1469,7 @@ def sfNinja(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 120, BaseStats.MP: 60,
         BaseStats.ATK: 45, BaseStats.DEF: 40, BaseStats.MAG: 45, BaseStats.RES: 40,
         BaseStats.ACC: 110, BaseStats.AVO: 125, BaseStats.SPD: 70
-    }, flatStatMods, {
+    }, {}, {
         CombatStats.REPOSITION_ACTION_TIME_MULT: 0.7,
         CombatStats.BASIC_MP_GAIN_MULT: 8 / BASIC_ATTACK_MP_GAIN
     }, 0.5, AttackType.RANGED, PhysicalAttackAttribute.PIERCING,
@@ -1482,23 +1484,10 @@ def sfNinja(params : dict, rng : random.Random | None = None) -> Enemy:
         if not params.get('boss', False) else EnemyReward(1, 0, 0, None))
 
 
-def sfElemental(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
-    mainElement = params.get("element", None)
-    if mainElement is None:
-        mainElement = random.choice([MagicalAttackAttribute.FIRE, MagicalAttackAttribute.WIND, MagicalAttackAttribute.ICE])
-    weakElement = {
-        MagicalAttackAttribute.FIRE: MagicalAttackAttribute.WIND,
-        MagicalAttackAttribute.WIND: MagicalAttackAttribute.ICE,
-        MagicalAttackAttribute.ICE: MagicalAttackAttribute.FIRE
-    }[mainElement]
-    colorString = {
-        MagicalAttackAttribute.FIRE: "Red",
-        MagicalAttackAttribute.WIND: "Green",
-        MagicalAttackAttribute.ICE: "Blue"
-    }[mainElement]
+def sfElementalRolls(params : dict, rng : random.Random) -> SpawnRolls:
+    variantParams : dict = {}
+    if params.get("element", None) is None:
+        variantParams["element"] = rng.choice([MagicalAttackAttribute.FIRE, MagicalAttackAttribute.WIND, MagicalAttackAttribute.ICE])
 
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
@@ -1514,6 +1503,21 @@ def sfElemental(params : dict, rng : random.Random | None = None) -> Enemy:
         }
         for stat in maxVars:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods, variantParams=variantParams)
+
+@rolledSpawner(sfElementalRolls)
+def sfElemental(params : dict) -> Enemy:
+    mainElement = params["element"]
+    weakElement = {
+        MagicalAttackAttribute.FIRE: MagicalAttackAttribute.WIND,
+        MagicalAttackAttribute.WIND: MagicalAttackAttribute.ICE,
+        MagicalAttackAttribute.ICE: MagicalAttackAttribute.FIRE
+    }[mainElement]
+    colorString = {
+        MagicalAttackAttribute.FIRE: "Red",
+        MagicalAttackAttribute.WIND: "Green",
+        MagicalAttackAttribute.ICE: "Blue"
+    }[mainElement]
 
     attackSkill = AttackSkillData(f"Violet {enumName(mainElement)}", BasePlayerClassNames.WARRIOR, 0, False, 15, "",
                                   False, AttackType.MAGIC, 1, DEFAULT_ATTACK_TIMER_USAGE, [
@@ -1599,7 +1603,7 @@ def sfElemental(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.HP: 150, BaseStats.MP: 150,
         BaseStats.ATK: 10, BaseStats.DEF: 40, BaseStats.MAG: 60, BaseStats.RES: 85,
         BaseStats.ACC: 100, BaseStats.AVO: 75, BaseStats.SPD: 60
-    }, flatStatMods, {
+    }, {}, {
         CombatStats.BASIC_MP_GAIN_MULT: 5 / BASIC_ATTACK_MP_GAIN
     }, 0.5, AttackType.MAGIC, mainElement,
     [
@@ -1961,9 +1965,9 @@ def sfRuneBoss(params : dict, rng : random.Random | None = None) -> Enemy:
                 if currentMana >= summonCost:
                     data["summonActive"] = True
                     data["burstCd"] = 4
-                    selectedElement = random.choice(elementOptions)
+                    selectedElement = controller.rng.choice(elementOptions)
                     data["selectedElement"] = selectedElement
-                    enemy.basicAttackAttribute = selectedElement
+                    controller.combatStateMap[enemy].setBasicAttackAttribute(selectedElement)
                     controller.addResistanceStacks(enemy, selectedElement, 1)
                     return EntityAIAction(CombatActions.SKILL, 2, [], None, selectedElement.name)
             
@@ -1993,7 +1997,7 @@ def sfRuneBoss(params : dict, rng : random.Random | None = None) -> Enemy:
         if data["aiIdx"] == 1:
             selectedElement = data["selectedElement"]
             controller.removeResistanceStacks(enemy, selectedElement, 1)
-            enemy.basicAttackAttribute = PhysicalAttackAttribute.CRUSHING
+            controller.combatStateMap[enemy].setBasicAttackAttribute(PhysicalAttackAttribute.CRUSHING)
             data["summonActive"] = False
             data["summonCd"] = 3
             data["aiIdx"] = 0
@@ -2027,10 +2031,7 @@ def sfRuneBoss(params : dict, rng : random.Random | None = None) -> Enemy:
 
 ## Abandoned Storehouse
 
-def asSpawner(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def asSpawnerRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -2047,7 +2048,10 @@ def asSpawner(params : dict, rng : random.Random | None = None) -> Enemy:
     for stat in maxVars:
         if maxVars[stat] > 0:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
 
+@rolledSpawner(asSpawnerRolls)
+def asSpawner(params : dict) -> Enemy:
     summonParams = params.copy()
     summonParams['summoned'] = True
     ratOptions = [ffRat, scRat, sfRat, asMageRat, asStrongRat]
@@ -2110,7 +2114,7 @@ def asSpawner(params : dict, rng : random.Random | None = None) -> Enemy:
     }
     return Enemy("Rat's Cradle", "Cradle",
                  "A summoner's tool that's been modified to serve rat-related purposes. It's unclear if the patterns that look like crayon drawings are contributing to this.", 5,
-                 baseStats, flatStatMods, {}, 0.5, None, None, [], [summonSkill, buffSkill],
+                 baseStats, {}, {}, 0.5, None, None, [], [summonSkill, buffSkill],
     "Rats surge forth from the strange object!", "",
     EntityAI({}, decisionFn),
     lambda controller, entity:
@@ -2118,10 +2122,7 @@ def asSpawner(params : dict, rng : random.Random | None = None) -> Enemy:
                                        makeBasicCommonDrop(controller.rng, 4, 7, 0.2)))
         if not (params.get('boss', False) or params.get('summoned', False)) else EnemyReward(1, 0, 0, None))
 
-def asMageRat(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def asMageRatRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -2141,6 +2142,10 @@ def asMageRat(params : dict, rng : random.Random | None = None) -> Enemy:
     for stat in maxVars:
         if maxVars[stat] > 0:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
+
+@rolledSpawner(asMageRatRolls)
+def asMageRat(params : dict) -> Enemy:
     
     stackOptions = [EffectStacks.RAT_MARK_IMPETUOUS, EffectStacks.RAT_MARK_RESOLUTE, EffectStacks.RAT_MARK_INTREPID]
     stackBuffs = {
@@ -2155,8 +2160,8 @@ def asMageRat(params : dict, rng : random.Random | None = None) -> Enemy:
                                             EFAfterNextAttack(lambda controller, _1, target, attackResult, _2: void((
                                                 controller.logMessage(MessageType.EFFECT, f"{target.shortName} is marked for other rats!")
                                                     if all([controller.combatStateMap[target].getStack(stack) == 0 for stack in stackOptions]) else None,
-                                                controller.combatStateMap[target].addStack(rng.choice(stackOptions), 10),
-                                                controller.combatStateMap[target].addStack(rng.choice(stackOptions), 10),
+                                                controller.combatStateMap[target].addStack(controller.rng.choice(stackOptions), 10),
+                                                controller.combatStateMap[target].addStack(controller.rng.choice(stackOptions), 10),
                                             )) if attackResult.attackHit else None)
                                         ], None)
                                   ], False)
@@ -2213,7 +2218,7 @@ def asMageRat(params : dict, rng : random.Random | None = None) -> Enemy:
     }
     return Enemy("Tellerat", "Tellerat",
     "A rat often sought out for its arcane knowledge. Those who have uncovered the art of Cheese Location are held in particularly high regard.", 5,
-    baseStats, flatStatMods, {
+    baseStats, {}, {
         CombatStats.BASIC_MP_GAIN_MULT: 10 / BASIC_ATTACK_MP_GAIN
     }, 0.5, None, None, [ratMarkSkill], [attackSkill, buffSkill],
     "\\*squeak squyk\\*", "",
@@ -2223,10 +2228,7 @@ def asMageRat(params : dict, rng : random.Random | None = None) -> Enemy:
                                        makeBasicCommonDrop(controller.rng, 6, 9, 0.2)))
         if not (params.get('boss', False) or params.get('summoned', False)) else EnemyReward(1, 0, 0, None))
 
-def asStrongRat(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def asStrongRatRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 1 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -2246,6 +2248,10 @@ def asStrongRat(params : dict, rng : random.Random | None = None) -> Enemy:
     for stat in maxVars:
         if maxVars[stat] > 0:
             flatStatMods[stat] = rng.choice([0, rng.randint(1, maxVars[stat])])
+    return SpawnRolls(flatStatMods)
+
+@rolledSpawner(asStrongRatRolls)
+def asStrongRat(params : dict) -> Enemy:
     
     stackOptions = [EffectStacks.RAT_MARK_IMPETUOUS, EffectStacks.RAT_MARK_RESOLUTE, EffectStacks.RAT_MARK_INTREPID]
     boostSkill = PassiveSkillData("Wrath", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [
@@ -2289,7 +2295,7 @@ def asStrongRat(params : dict, rng : random.Random | None = None) -> Enemy:
     }
     return Enemy("Bouncerat", "Bouncerat",
     "An unusually large rat, even for the standards of giant rats. Doesn't act particularly rat-like, but it is readly accepted nonetheless.", 5,
-    baseStats, flatStatMods, {}, 0.5, None, None, [boostSkill], [],
+    baseStats, {}, {}, 0.5, None, None, [boostSkill], [],
     "\\*Squeak.\\*", "",
     EntityAI({}, decisionFn),
     lambda controller, entity:
@@ -2393,6 +2399,12 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
                                           )
                                       ], 0, None)
                                   ], False)
+
+    # The same attacks under their phase 2 names; the AI picks these once phased up, so no skill is renamed mid-fight
+    chargedThunderSkill = copy.copy(thunderSkill)
+    chargedThunderSkill.skillName = "Charge Sign 「Kite-Chasing Spear」"
+    chargedDashSkill = copy.copy(dashSkill)
+    chargedDashSkill.skillName = "Charge Sign 「Path of Least Resistance」"
     
     phaseThresholds = [1500]
     phaseSkill = PassiveSkillData(
@@ -2524,12 +2536,12 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
             if not data["overdriveActive"] and chargeStacks >= chargeStackThreshold:
                 data["overdriveActive"] = True
                 data["tauntCd"] += 2
-                enemy.aggroDecayFactor = overdriveAggroDecay
+                controller.combatStateMap[enemy].setAggroDecayFactor(overdriveAggroDecay)
                 return EntityAIAction(CombatActions.SKILL, 6, [], None, None)
             
             if data["overdriveActive"] and chargeStacks <= 0:
                 data["overdriveActive"] = False
-                enemy.aggroDecayFactor = baseAggroDecay
+                controller.combatStateMap[enemy].setAggroDecayFactor(baseAggroDecay)
                 return EntityAIAction(CombatActions.SKILL, 6, [], None, None)
 
         if data["aiIdx"] == 0:
@@ -2559,7 +2571,7 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
                     data["tauntTarget"] = target
                     data["aiIdx"] = 3
                     controller.logMessage(MessageType.TELEGRAPH, f"Salali taunts {target.shortName}!")
-                    controller.logMessage(MessageType.DIALOGUE, f"Salali: \"{rng.choice(warningTaunts)}\"")
+                    controller.logMessage(MessageType.DIALOGUE, f"Salali: \"{controller.rng.choice(warningTaunts)}\"")
                     controller.combatStateMap[target].setStack(EffectStacks.TELEGRAPH_ATTACK, 0)
                     return EntityAIAction(CombatActions.SKILL, 7, [], None, None)
             if data["dashCd"] <= 0:
@@ -2588,7 +2600,7 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
         if data["aiIdx"] == 1: # Thunder
             data["thunderCd"] = 7
             data["aiIdx"] = 0
-            return EntityAIAction(CombatActions.SKILL, 4, [targetIdx], None, None)
+            return EntityAIAction(CombatActions.SKILL, 4 if phaseIndex == 0 else 9, [targetIdx], None, None)
         
         if data["aiIdx"] == 2: # Dash
             dashCost = controller.getSkillManaCost(enemy, dashSkill)
@@ -2617,7 +2629,7 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
                     else:
                         controller.combatStateMap[enemy].setStack(EffectStacks.SALALI_CHARGE, chargeStacks - chargeStackPerTurn)
 
-                return EntityAIAction(CombatActions.SKILL, 5, [allTargets.index(target)], None, None)
+                return EntityAIAction(CombatActions.SKILL, 5 if phaseIndex == 0 else 10, [allTargets.index(target)], None, None)
             else:
                 # No more targets or mana
                 data["dashCd"] = 7
@@ -2637,11 +2649,11 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
             targetAttacked = controller.combatStateMap[target].getStack(EffectStacks.TELEGRAPH_ATTACK) == 1
             if targetAttacked:
                 controller.logMessage(MessageType.EFFECT, f"Salali's attack was disrupted!")
-                controller.logMessage(MessageType.DIALOGUE, f"Salali: \"{rng.choice(failureTaunts)}\"")
+                controller.logMessage(MessageType.DIALOGUE, f"Salali: \"{controller.rng.choice(failureTaunts)}\"")
                 controller.combatStateMap[enemy].setStack(EffectStacks.SALALI_CHARGE, max(chargeStacks - chargeStackPerTurn, 0))
                 return EntityAIAction(CombatActions.SKILL, 7, [], None, None)
             else:
-                controller.logMessage(MessageType.DIALOGUE, f"Salali: \"{rng.choice(successTaunts)}\"")
+                controller.logMessage(MessageType.DIALOGUE, f"Salali: \"{controller.rng.choice(successTaunts)}\"")
                 return EntityAIAction(CombatActions.SKILL, 8, [allTargets.index(target)], None, None)
         
         controller.logMessage(MessageType.DEBUG, "<salali ai error, should be unreachable>")
@@ -2654,13 +2666,11 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
             controller.combatStateMap[enemy].setStack(EffectStacks.ENEMY_PHASE_COUNTER, phaseIndex)
             controller.combatStateMap[enemy].phaseReset(controller, set([EffectStacks.ENEMY_PHASE_COUNTER]))
             if phaseIndex == 1:
-                thunderSkill.skillName = "Charge Sign 「Kite-Chasing Spear」"
-                dashSkill.skillName = "Charge Sign 「Path of Least Resistance」"
-                enemy.baseStats.update({
+                controller.combatStateMap[enemy].setBaseStats({
                     BaseStats.ATK: 125, BaseStats.DEF: 105, BaseStats.MAG: 125, BaseStats.RES: 105,
                     BaseStats.ACC: 200, BaseStats.AVO: 215, BaseStats.SPD: 145
                 })
-                enemy.name = "Salali, The Supercharged Sciuridae"
+                controller.renameEntity(enemy, "Salali, The Supercharged Sciuridae", enemy.shortName)
                 controller.logMessage(MessageType.DIALOGUE,
                                       "Salali: \"Hey, hey, you're kinda fun after all! You won't mind if I go a bit further, right, right?\"\n" +
                                       "__**Salali activates her *Charge Signature*!**__\n" +
@@ -2690,7 +2700,7 @@ def asSalali(params : dict, rng : random.Random | None = None) -> Enemy:
         voltageSkill,
         tauntAttackerCheck
     ], [waitSkill("", 0.3), waitSkill("", 0.5), summonSkill, aimSkill, thunderSkill, dashSkill,
-        overdriveSkill, waitSkill("", 1.5), tauntAttackSkill],
+        overdriveSkill, waitSkill("", 1.5), tauntAttackSkill, chargedThunderSkill, chargedDashSkill],
     lambda players:
         "Salali: \"Hey, hey! I don't see anyone else coming down here often! Aren't these guys cool? " +
         "Aren't these cradle thingies *cool* cool? They're super super fun, I found them around--\"\n" +
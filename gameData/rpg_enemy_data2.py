@@ -15,7 +15,7 @@ def damageTestDummy(params : dict, rng : random.Random | None = None) -> Enemy:
     dummySpd = params.get("spd", 25)
 
     def timeTrackerFn(controller : CombatController, user, time : float):
-        user.ai.data["time"] += time
+        controller.getAIData(user)["time"] += time
     initializerSkill = PassiveSkillData("Commence", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [
         SkillEffect("", [
             EFOnAdvanceTurn(
@@ -30,7 +30,7 @@ def damageTestDummy(params : dict, rng : random.Random | None = None) -> Enemy:
     ], False)
 
     def damageTrackerFn(controller : CombatController, attacker : CombatEntity, target, damage : int):
-        target.ai.data["damageMap"][attacker] = target.ai.data["damageMap"].get(attacker, 0) + damage
+        controller.getAIData(target)["damageMap"][attacker] = controller.getAIData(target)["damageMap"].get(attacker, 0) + damage
         controller.gainHealth(target, damage, silent=True)
     trackingSkill = PassiveSkillData("Analyze", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [
         SkillEffect("", [
@@ -42,7 +42,7 @@ def damageTestDummy(params : dict, rng : random.Random | None = None) -> Enemy:
     ], False)
 
     def dotTrackerFn(controller : CombatController, attacker : CombatEntity, target, damage : int):
-        target.ai.data["dotMap"][attacker] = target.ai.data["dotMap"].get(attacker, 0) + damage
+        controller.getAIData(target)["dotMap"][attacker] = controller.getAIData(target)["dotMap"].get(attacker, 0) + damage
         controller.gainHealth(target, damage, silent=True)
     dotTrackerEffect = SkillEffect("", [
         EFOnOpponentDotDamage(
@@ -111,10 +111,7 @@ def damageTestDummy(params : dict, rng : random.Random | None = None) -> Enemy:
 
 ## Arena I
 
-def arenaMercenary(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaMercenaryRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 1 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -141,7 +138,10 @@ def arenaMercenary(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaMercenaryRolls)
+def arenaMercenary(params : dict) -> Enemy:
     warriorSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.WARRIOR].rankSkills
     mercenarySkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.MERCENARY].rankSkills
 
@@ -192,21 +192,18 @@ def arenaMercenary(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 150, BaseStats.DEF: 30, BaseStats.MAG: 30, BaseStats.RES: 30,
         BaseStats.ACC: 160, BaseStats.AVO: 60, BaseStats.SPD: 100
     }
-    return Enemy(f"{adverb}{adjective} Mercenary", "Mercenary",
+    return Enemy("Mercenary", "Mercenary",
     "A sword-wielding fellow adventurer. They have one job, and they're fairly good at it.", 6,
-    baseStats, flatStatMods, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.SLASHING,
+    baseStats, {}, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.SLASHING,
     [ enduranceSkill, frenzySkill ],
     [ swingSkill, sweepSkill, berserkSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "attackCounts": {}, "berserkActive": False}, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
 
 
-def arenaKnight(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaKnightRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -233,7 +230,10 @@ def arenaKnight(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaKnightRolls)
+def arenaKnight(params : dict) -> Enemy:
     warriorSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.WARRIOR].rankSkills
     knightSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.KNIGHT].rankSkills
 
@@ -247,15 +247,15 @@ def arenaKnight(params : dict, rng : random.Random | None = None) -> Enemy:
         True, AttackType.MELEE, 2.5, DEFAULT_ATTACK_TIMER_USAGE, [SkillEffect("", [EFBeforeNextAttack({}, {CombatStats.AGGRO_MULT: 3}, None, None)], 0)], False)
     
     def challengeCheckFn(controller : CombatController, user, attacker : CombatEntity, attackResult : AttackResultInfo):
-        if user.ai.data["challengeTarget"] == attacker:
+        if controller.getAIData(user)["challengeTarget"] == attacker:
             controller.combatStateMap[user].setStack(EffectStacks.ENEMY_COUNTER_A, 0)
         if attackResult.attackHit:
-            hitType, hitCount = user.ai.data["takenHitHistory"]
+            hitType, hitCount = controller.getAIData(user)["takenHitHistory"]
             if hitType != attackResult.attackType :
                 hitType = attackResult.attackType
             else:
                 hitCount += 1
-            user.ai.data["takenHitHistory"] = (hitType, hitCount)
+            controller.getAIData(user)["takenHitHistory"] = (hitType, hitCount)
     challengeCheck = PassiveSkillData("Please Respond", AdvancedPlayerClassNames.KNIGHT, 2, False, "", {}, {}, [
         SkillEffect("", [
             EFImmediate(
@@ -331,21 +331,18 @@ def arenaKnight(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 90, BaseStats.DEF: 120, BaseStats.MAG: 30, BaseStats.RES: 50,
         BaseStats.ACC: 130, BaseStats.AVO: 60, BaseStats.SPD: 70
     }
-    return Enemy(f"{adverb}{adjective} Knight", "Knight",
+    return Enemy("Knight", "Knight",
     "A shield-bearing fellow adventurer. They've been trying to get better at asserting themselves.", 6,
-    baseStats, flatStatMods, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.SLASHING,
+    baseStats, {}, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.SLASHING,
     [ enduranceSkill, chivalrySkill, challengeCheck ],
     [ swingSkill, challengeSkill, parrySkill, exChallengeSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "challengeCd": 2, "challengeTarget": None, "takenHitHistory": (None, 0) }, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
 
 
-def arenaSniper(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaSniperRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 3 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -372,7 +369,10 @@ def arenaSniper(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaSniperRolls)
+def arenaSniper(params : dict) -> Enemy:
     rangerSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.RANGER].rankSkills
     sniperSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.SNIPER].rankSkills
 
@@ -424,21 +424,18 @@ def arenaSniper(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 110, BaseStats.DEF: 60, BaseStats.MAG: 30, BaseStats.RES: 60,
         BaseStats.ACC: 180, BaseStats.AVO: 90, BaseStats.SPD: 110
     }
-    return Enemy(f"{adverb}{adjective} Sniper", "Sniper",
+    return Enemy("Sniper", "Sniper",
     "A gun-wielding fellow adventurer. They act as if they'd prefer not to be noticed.", 6,
-    baseStats, flatStatMods, {}, 0.5, AttackType.RANGED, PhysicalAttackAttribute.PIERCING,
+    baseStats, {}, {}, 0.5, AttackType.RANGED, PhysicalAttackAttribute.PIERCING,
     [ eyeSkill, steadySkill, suppressiveSkill ],
     [ strafeSkill, perfectSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "perfectCd": 2, "didStrafe": False, "perfectTarget": None }, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
 
 
-def arenaHunter(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaHunterRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 3 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -465,7 +462,10 @@ def arenaHunter(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaHunterRolls)
+def arenaHunter(params : dict) -> Enemy:
     rangerSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.RANGER].rankSkills
     hunterSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.HUNTER].rankSkills
 
@@ -541,7 +541,7 @@ def arenaHunter(params : dict, rng : random.Random | None = None) -> Enemy:
             assert lacedCost is not None
             if currentMana >= lacedCost:
                 data["lacedCd"] = 4
-                return EntityAIAction(CombatActions.SKILL, 1, [targetIdx], None, rng.choice(["POISON", "BLIND", "STUN"]))
+                return EntityAIAction(CombatActions.SKILL, 1, [targetIdx], None, controller.rng.choice(["POISON", "BLIND", "STUN"]))
 
         minDistance = 2 if tracksSkill.skillEffects[0] in controller.combatStateMap[enemy].activeSkillEffects else 1
         if distanceToTarget < minDistance:
@@ -553,21 +553,18 @@ def arenaHunter(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 80, BaseStats.DEF: 70, BaseStats.MAG: 30, BaseStats.RES: 70,
         BaseStats.ACC: 170, BaseStats.AVO: 80, BaseStats.SPD: 80
     }
-    return Enemy(f"{adverb}{adjective} Hunter", "Hunter",
+    return Enemy("Hunter", "Hunter",
     "A crossbow-wielding fellow adventurer. Doesn't care about winning so much as making other people lose.", 6,
-    baseStats, flatStatMods, {}, 0.5, AttackType.RANGED, PhysicalAttackAttribute.PIERCING,
+    baseStats, {}, {}, 0.5, AttackType.RANGED, PhysicalAttackAttribute.PIERCING,
     [ eyeSkill, stunSkill ],
     [ strafeSkill, lacedSkill, tracksSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "lacedCd": 2, "tracksCd": 2, "didStrafe": False }, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
 
 
-def arenaAssassin(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaAssassinRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -594,7 +591,10 @@ def arenaAssassin(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaAssassinRolls)
+def arenaAssassin(params : dict) -> Enemy:
     rogueSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.ROGUE].rankSkills
     assassinSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.ASSASSIN].rankSkills
 
@@ -666,21 +666,18 @@ def arenaAssassin(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 100, BaseStats.DEF: 30, BaseStats.MAG: 30, BaseStats.RES: 30,
         BaseStats.ACC: 120, BaseStats.AVO: 150, BaseStats.SPD: 160
     }
-    return Enemy(f"{adverb}{adjective} Assassin", "Assassin",
+    return Enemy("Assassin", "Assassin",
     "A dagger-wielding fellow adventurer. The type to hold on to a grudge.", 6,
-    baseStats, flatStatMods, {}, 0.9, AttackType.MELEE, PhysicalAttackAttribute.SLASHING,
+    baseStats, {}, {}, 0.9, AttackType.MELEE, PhysicalAttackAttribute.SLASHING,
     [ illusionSkill, eyesSkill ],
     [ swiftSkill, shadowingSkill, ambushSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "shadowingCd": 0, "swiftCd": 2, "didCallout": False, "didInterrogate": False, "disabledSet": set() }, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
 
 
-def arenaAcrobat(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaAcrobatRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 1 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -707,7 +704,10 @@ def arenaAcrobat(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaAcrobatRolls)
+def arenaAcrobat(params : dict) -> Enemy:
     rogueSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.ROGUE].rankSkills
     acrobatSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.ACROBAT].rankSkills
 
@@ -719,12 +719,12 @@ def arenaAcrobat(params : dict, rng : random.Random | None = None) -> Enemy:
 
     def hitHistoryFn(controller : CombatController, user, attacker : CombatEntity, attackResult : AttackResultInfo):
         if attackResult.inRange:
-            hitType, hitCount = user.ai.data["takenHitHistory"]
+            hitType, hitCount = controller.getAIData(user)["takenHitHistory"]
             if hitType != attackResult.attackType:
                 hitType = attackResult.attackType
             else:
                 hitCount += 1
-            user.ai.data["takenHitHistory"] = (hitType, hitCount)
+            controller.getAIData(user)["takenHitHistory"] = (hitType, hitCount)
     aggroSkill = PassiveSkillData("I'll Help", AdvancedPlayerClassNames.ACROBAT, 2, False, "", {}, {}, [
         SkillEffect("", [
             EFImmediate(
@@ -801,18 +801,18 @@ def arenaAcrobat(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 95, BaseStats.DEF: 30, BaseStats.MAG: 30, BaseStats.RES: 30,
         BaseStats.ACC: 130, BaseStats.AVO: 200, BaseStats.SPD: 130
     }
-    return Enemy(f"{adverb}{adjective} Acrobat", "Acrobat",
+    return Enemy("Acrobat", "Acrobat",
     "A naginata-bearing fellow adventurer. Unclear if they're aware of the tournament, but they seem to be having fun.", 6,
-    baseStats, flatStatMods, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.PIERCING,
+    baseStats, {}, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.PIERCING,
     [ illusionSkill, aggroSkill, wakeSkill ],
     [ swiftSkill, bedazzleSkill, sidestepSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "swiftCd": 3, "bedazzleCd": 2, "takenHitHistory": (None, 0), "sidestepTurns": 0 }, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
 
 
-def _findBlessingTarget(controller : CombatController, enemy : CombatEntity, rng : random.Random, attackerPrio : bool):
+def _findBlessingTarget(controller : CombatController, enemy : CombatEntity, attackerPrio : bool):
     if len(controller.combatStateMap[enemy].activeEnchantments) == 0 and attackerPrio:
         return enemy
     
@@ -829,14 +829,11 @@ def _findBlessingTarget(controller : CombatController, enemy : CombatEntity, rng
     checkOrder = [attackers, defenders] if attackerPrio else [defenders, attackers]
     for allySet in checkOrder:
         if len(allySet) > 0:
-            return rng.choice(allySet)
+            return controller.rng.choice(allySet)
     
-    return rng.choice(availableAllies)
+    return controller.rng.choice(availableAllies)
     
-def arenaWizard(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaWizardRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 0 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -863,7 +860,10 @@ def arenaWizard(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaWizardRolls)
+def arenaWizard(params : dict) -> Enemy:
     mageSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.MAGE].rankSkills
     wizardSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.WIZARD].rankSkills
 
@@ -885,16 +885,16 @@ def arenaWizard(params : dict, rng : random.Random | None = None) -> Enemy:
         assert missileCost is not None
 
         if data["blessingCd"] <= 0:
-            blessingTarget = _findBlessingTarget(controller, enemy, rng, True)
+            blessingTarget = _findBlessingTarget(controller, enemy, True)
             blessingCost = controller.getSkillManaCost(enemy, blessingSkill)
             assert blessingCost is not None
             if blessingTarget is not None and currentMana >= blessingCost + (2 * missileCost):
                 if blessingTarget == enemy:
-                    data["blessingCd"] = rng.randint(1, 6)
+                    data["blessingCd"] = controller.rng.randint(1, 6)
                 else:
                     data["blessingCd"] = 6
                 return EntityAIAction(CombatActions.SKILL, 1, [controller.getTeammates(enemy).index(blessingTarget)],
-                                      None, rng.choice(["FIRE", "ICE", "WIND"]))
+                                      None, controller.rng.choice(["FIRE", "ICE", "WIND"]))
 
         if currentMana >= missileCost:
             return EntityAIAction(CombatActions.SKILL, 0, [targetIdx], None, None)
@@ -910,20 +910,17 @@ def arenaWizard(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 30, BaseStats.DEF: 50, BaseStats.MAG: 130, BaseStats.RES: 80,
         BaseStats.ACC: 160, BaseStats.AVO: 60, BaseStats.SPD: 80
     }
-    return Enemy(f"{adverb}{adjective} Wizard", "Wizard",
+    return Enemy("Wizard", "Wizard",
     "A wand-wielding fellow adventurer. Generally stoic, but panics badly under pressure.", 6,
-    baseStats, flatStatMods, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.CRUSHING,
+    baseStats, {}, {}, 0.5, AttackType.MELEE, PhysicalAttackAttribute.CRUSHING,
     [ manaSkill, serendipitySkill, flowSkill ],
     [ missileSkill, blessingSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "blessingCd": 1 }, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
     
-def arenaSaint(params : dict, rng : random.Random | None = None) -> Enemy:
-    if rng is None:
-        rng = random.Random()
-
+def arenaSaintRolls(params : dict, rng : random.Random) -> SpawnRolls:
     flatStatMods : dict[Stats, float] = { CombatStats.RANGE: 1 }
     roomNumber = params.get('roomNumber', 0)
     maxVarsRoomMap = {
@@ -950,7 +947,10 @@ def arenaSaint(params : dict, rng : random.Random | None = None) -> Enemy:
     if roomNumber >= 4:
         adverb = rng.choice(DESCRIPTIVE_ADVERBS) + " "
     teamCall = "" if roomNumber < 4 else f"A particularly {adjective.lower()} team approaches!"
+    return SpawnRolls(flatStatMods, f"{adverb}{adjective} ", teamCall)
 
+@rolledSpawner(arenaSaintRolls)
+def arenaSaint(params : dict) -> Enemy:
     mageSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[BasePlayerClassNames.MAGE].rankSkills
     saintSkills = PlayerClassData.PLAYER_CLASS_DATA_MAP[AdvancedPlayerClassNames.SAINT].rankSkills
 
@@ -982,16 +982,16 @@ def arenaSaint(params : dict, rng : random.Random | None = None) -> Enemy:
                 return EntityAIAction(CombatActions.SKILL, 1, [controller.getTeammates(enemy).index(ally)], None, None)
 
         if data["blessingCd"] <= 0:
-            blessingTarget = _findBlessingTarget(controller, enemy, rng, False)
+            blessingTarget = _findBlessingTarget(controller, enemy, False)
             blessingCost = controller.getSkillManaCost(enemy, blessingSkill)
             assert blessingCost is not None
             if blessingTarget is not None and currentMana >= blessingCost + (3 * healCost):
                 if blessingTarget == enemy:
-                    data["blessingCd"] = rng.randint(1, 6)
+                    data["blessingCd"] = controller.rng.randint(1, 6)
                 else:
                     data["blessingCd"] = 6
                 return EntityAIAction(CombatActions.SKILL, 2, [controller.getTeammates(enemy).index(blessingTarget)],
-                                      None, rng.choice(["LIGHT", "DARK"]))
+                                      None, controller.rng.choice(["LIGHT", "DARK"]))
 
         if controller.checkInRange(enemy, target):
             return EntityAIAction(CombatActions.ATTACK, None, [targetIdx], None, None)
@@ -1007,12 +1007,12 @@ def arenaSaint(params : dict, rng : random.Random | None = None) -> Enemy:
         BaseStats.ATK: 30, BaseStats.DEF: 50, BaseStats.MAG: 90, BaseStats.RES: 110,
         BaseStats.ACC: 130, BaseStats.AVO: 60, BaseStats.SPD: 75
     }
-    return Enemy(f"{adverb}{adjective} Saint", "Saint",
+    return Enemy("Saint", "Saint",
     "An amulet-wielding fellow adventurer. Their biggest weakness is that they try to be too helpful.", 6,
-    baseStats, flatStatMods, {}, 0.5, AttackType.MAGIC, MagicalAttackAttribute.NEUTRAL,
+    baseStats, {}, {}, 0.5, AttackType.MAGIC, MagicalAttackAttribute.NEUTRAL,
     [ manaSkill, auraSkill ],
     [ missileSkill, healSkill, blessingSkill ],
-    teamCall, "",
+    "", "",
     EntityAI({ "blessingCd": 1 }, decisionFn),
     lambda controller, entity:
         EnemyReward(6, 0, 0, None))
\ No newline at end of file
@@ -2506,7 +2506,7 @@ AttackSkillData("No Witnesses", SecretPlayerClassNames.SABOTEUR, 9, True, 45,
 
 def setSnapsTargetFn(controller : CombatController, user : CombatEntity, target : CombatEntity):
     if len(controller.getActiveSummons(user)) > 0:
-        controller.getActiveSummons(user)[0].ai.data["lastSummonerTarget"] = target
+        controller.getAIData(controller.getActiveSummons(user)[0])["lastSummonerTarget"] = target
 PassiveSkillData("Summoner's Pact", SecretPlayerClassNames.SUMMONER, 1, False,
     "At the beginning of combat, summon an ancient reptilian creature. " +
     "(Note that parties cannot contain more than 8 entities.)",
@@ -2658,7 +2658,7 @@ def talkToThemFn(controller : CombatController, user : CombatEntity):
     if len(controller.getActiveSummons(user)) > 0:
         summon = controller.getActiveSummons(user)[0]
         for cdKey in ["castigatorCd", "supererogatorCd"]:
-            summon.ai.data[cdKey] -= 2
+            controller.getAIData(summon)[cdKey] -= 2
         controller.combatStateMap[summon].setStack(EffectStacks.SNAPS_PREPARE_CASTIGATOR, 1)
 AttackSkillData("Talk To Them!", SecretPlayerClassNames.SUMMONER, 5, False, 25,
     "Attack with 1.2x MAG from any range. " +
@@ -2673,7 +2673,7 @@ AttackSkillData("Talk To Them!", SecretPlayerClassNames.SUMMONER, 5, False, 25,
     ])
 
 def supererogatorResetFn(controller : CombatController, summon):
-    summon.ai.data["supererogatorCd"] = 0
+    controller.getAIData(summon)["supererogatorCd"] = 0
     controller.logMessage(
         MessageType.EFFECT, f"{summon.shortName} roars with newfound energy!"
     )
@@ -2882,7 +2882,7 @@ PassiveSkillData("Subjugator", SecretPlayerClassNames.SNAPS, 6, False,
 
 def variegatorFn(controller : CombatController, summon):
     for cdKey in ["instigatorCd", "castigatorCd", "supererogatorCd"]:
-        summon.ai.data[cdKey] -= 1
+        controller.getAIData(summon)[cdKey] -= 1
 PassiveSkillData("Variegator", SecretPlayerClassNames.SNAPS, 7, False,
     "When landing a critical hit, gain 5 MP and reduce all cooldowns by 1 turn.",
     {}, {}, [
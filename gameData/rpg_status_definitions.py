@@ -1,6 +1,8 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
+import copy
 import math
+import types
 
 from rpg_consts import *
 from structures.rpg_classes_skills import SkillEffect, EffectFunction, EFImmediate, EFBeforeNextAttack, EFAfterNextAttack, EFWhenAttacked, EFOnStatsChange, \
@@ -35,6 +37,28 @@ class StatusEffect(SkillEffect):
     def onRemove(self, controller : CombatController, target : CombatEntity) -> None:
         pass
 
+    """
+        Returns an independent copy for a forked CombatController. Status state is all plain values, so a shallow
+        copy is enough, apart from effect functions that call this status's own methods; those get rebound to the copy.
+    """
+    def copyForFork(self) -> StatusEffect:
+        statusCopy = copy.copy(self)
+        functionCopies : dict[EffectFunction, EffectFunction] = {}
+        for effectFunction in self.effectFunctions:
+            for attribute, value in vars(effectFunction).items():
+                if isinstance(value, types.MethodType) and value.__self__ is self:
+                    functionCopy = functionCopies.get(effectFunction, None)
+                    if functionCopy is None:
+                        functionCopy = copy.copy(effectFunction)
+                        functionCopies[effectFunction] = functionCopy
+                    setattr(functionCopy, attribute, types.MethodType(value.__func__, statusCopy))
+        if len(functionCopies) > 0:
+            statusCopy.effectFunctions = [functionCopies.get(effectFunction, effectFunction) for effectFunction in self.effectFunctions]
+            for attribute, value in vars(self).items():
+                if isinstance(value, EffectFunction) and value in functionCopies:
+                    setattr(statusCopy, attribute, functionCopies[value])
+        return statusCopy
+
 class PoisonStatusEffect(StatusEffect):
     def __init__(self, inflicter : CombatEntity, target : CombatEntity, duration : int, poisonStrength : int):
         self.poisonStrength : int = poisonStrength
@@ -0,0 +1,243 @@
+from __future__ import annotations
+import lzma
+import os
+import sqlite3
+import struct
+import time
+
+from rpg_consts import *
+
+"""
+    On-disk account storage: one row per userId in a sqlite file (in WAL mode, so the save thread can
+    write while the event loop keeps reading). Rows hold the serialized AccountData along with the game
+    version it was saved under.
+"""
+class AccountStore(object):
+    def __init__(self, filename : str):
+        self.filename = filename
+        self.readConnection : sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def open(self):
+        folder = os.path.dirname(self.filename)
+        if folder != "" and not os.path.exists(folder):
+            os.mkdir(folder)
+
+        self.readConnection = self._connect()
+        with self.readConnection:
+            self.readConnection.execute("CREATE TABLE IF NOT EXISTS accounts (userId INTEGER PRIMARY KEY, " +
+                                        "gameVersion TEXT NOT NULL, data BLOB NOT NULL, savedAt INTEGER NOT NULL)")
+            self.readConnection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # Accounts written since the last archive point; see AccountArchive
+            self.readConnection.execute("CREATE TABLE IF NOT EXISTS archiveChanges (userId INTEGER PRIMARY KEY)")
+            # Dungeon runs that were in progress at the last save; see DungeonController.getCheckpointData
+            self.readConnection.execute("CREATE TABLE IF NOT EXISTS dungeonCheckpoints (runKey INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+
+    def close(self):
+        if self.readConnection is not None:
+            self.readConnection.close()
+            self.readConnection = None
+
+    """ Only valid on the thread that called open (the event loop). """
+    def hasAccount(self, userId : int) -> bool:
+        assert(self.readConnection is not None)
+        row = self.readConnection.execute("SELECT 1 FROM accounts WHERE userId = ?", (userId,)).fetchone()
+        return row is not None
+
+    """ Returns (data, gameVersion), or None if the account was never saved. Only valid on the event loop. """
+    def readAccount(self, userId : int) -> tuple[bytes, str] | None:
+        assert(self.readConnection is not None)
+        row = self.readConnection.execute("SELECT data, gameVersion FROM accounts WHERE userId = ?", (userId,)).fetchone()
+        if row is None:
+            return None
+        return bytes(row[0]), row[1]
+
+    def countAccounts(self) -> int:
+        assert(self.readConnection is not None)
+        return self.readConnection.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+    def getMeta(self, key : str) -> str | None:
+        assert(self.readConnection is not None)
+        row = self.readConnection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def setMeta(self, key : str, value : str):
+        assert(self.readConnection is not None)
+        with self.readConnection:
+            self.readConnection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    """
+        Writes the given (userId, data) records in a single transaction. Uses its own connection, so it can be
+        called from the save thread.
+        Dungeon checkpoints go in the same transaction, so a run's progress and the rewards it gave out are
+        always stored together.
+    """
+    def writeAccounts(self, records : list[tuple[int, bytes]], gameVersion : str,
+                      checkpointRecords : list[tuple[int, bytes]] | None = None, removedCheckpoints : list[int] | None = None):
+        savedAt = int(time.time())
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO accounts (userId, gameVersion, data, savedAt) VALUES (?, ?, ?, ?)",
+                                       [(userId, gameVersion, data, savedAt) for userId, data in records])
+                connection.executemany("INSERT OR IGNORE INTO archiveChanges (userId) VALUES (?)",
+                                       [(userId,) for userId, _ in records])
+                if removedCheckpoints is not None:
+                    connection.executemany("DELETE FROM dungeonCheckpoints WHERE runKey = ?", [(runKey,) for runKey in removedCheckpoints])
+                if checkpointRecords is not None:
+                    connection.executemany("INSERT OR REPLACE INTO dungeonCheckpoints (runKey, data) VALUES (?, ?)", checkpointRecords)
+        finally:
+            connection.close()
+
+    """ Returns (runKey, data) for every stored dungeon checkpoint. Only valid on the event loop. """
+    def readCheckpoints(self) -> list[tuple[int, bytes]]:
+        assert(self.readConnection is not None)
+        rows = self.readConnection.execute("SELECT runKey, data FROM dungeonCheckpoints ORDER BY runKey").fetchall()
+        return [(runKey, bytes(data)) for runKey, data in rows]
+
+    """ Iterates over (userId, data, gameVersion) for every stored account, using its own connection. """
+    def iterAccounts(self):
+        connection = self._connect()
+        try:
+            for userId, data, gameVersion in connection.execute("SELECT userId, data, gameVersion FROM accounts ORDER BY userId"):
+                yield userId, bytes(data), gameVersion
+        finally:
+            connection.close()
+
+    """ Returns (userId, data, gameVersion) for every account written since the last archive point. """
+    def readArchiveChanges(self) -> list[tuple[int, bytes, str]]:
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT accounts.userId, accounts.data, accounts.gameVersion FROM accounts " +
+                                      "JOIN archiveChanges ON accounts.userId = archiveChanges.userId ORDER BY accounts.userId").fetchall()
+            return [(userId, bytes(data), gameVersion) for userId, data, gameVersion in rows]
+        finally:
+            connection.close()
+
+    def clearArchiveChanges(self, userIds : list[int] | None):
+        connection = self._connect()
+        try:
+            with connection:
+                if userIds is None:
+                    connection.execute("DELETE FROM archiveChanges")
+                else:
+                    connection.executemany("DELETE FROM archiveChanges WHERE userId = ?", [(userId,) for userId in userIds])
+        finally:
+            connection.close()
+
+"""
+    Save history kept as chains of lzma-compressed files: a base holding every account, followed by deltas
+    holding only the accounts written since the previous point. Any point can be rebuilt from its chain's
+    base plus the deltas up to it. A new chain starts every ARCHIVE_SIZE points, and only the current and
+    previous chains are kept.
+"""
+class AccountArchive(object):
+    FILE_HEADER = struct.Struct("<4sBcqq")
+    RECORD_HEADER = struct.Struct("<qHI")
+    MAGIC = b"RPGA"
+    FORMAT_VERSION = 1
+
+    def __init__(self, folder : str, chainLength : int = ARCHIVE_SIZE):
+        self.folder = folder
+        self.chainLength = chainLength
+
+    """ Returns (timestamp, isBase, filename) for every archive point, oldest first. """
+    def listPoints(self) -> list[tuple[int, bool, str]]:
+        if not os.path.exists(self.folder):
+            return []
+        points = []
+        for filename in os.listdir(self.folder):
+            if not filename.endswith(ARCHIVE_FILE_SUFFIX):
+                continue
+            for prefix, isBase in [(ARCHIVE_BASE_NAME, True), (ARCHIVE_DELTA_NAME, False)]:
+                if filename.startswith(prefix):
+                    points.append((int(filename[len(prefix):-len(ARCHIVE_FILE_SUFFIX)]), isBase, filename))
+        points.sort()
+        return points
+
+    """
+        Adds a point for the store's current contents. Meant to be called from the save thread, right after the
+        save's own writes. Returns the number of accounts written to the archive.
+    """
+    def addPoint(self, store : AccountStore, timestamp : int) -> int:
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+
+        points = self.listPoints()
+        baseIndices = [i for i, (_, isBase, _) in enumerate(points) if isBase]
+        startNewChain = len(baseIndices) == 0 or len(points) - baseIndices[-1] >= self.chainLength
+
+        if startNewChain:
+            records = list(store.iterAccounts())
+            self._writeFile(ARCHIVE_BASE_NAME, b"B", timestamp, 0, records)
+            store.clearArchiveChanges(None)
+
+            # Drop everything older than the previous chain
+            if len(baseIndices) >= 2:
+                for _, _, filename in points[:baseIndices[-1]]:
+                    os.remove(self.folder + filename)
+        else:
+            records = store.readArchiveChanges()
+            self._writeFile(ARCHIVE_DELTA_NAME, b"D", timestamp, points[-1][0], records)
+            store.clearArchiveChanges([userId for userId, _, _ in records])
+        return len(records)
+
+    def _writeFile(self, prefix : str, kind : bytes, timestamp : int, parentTimestamp : int, records : list[tuple[int, bytes, str]]):
+        chunks = [AccountArchive.FILE_HEADER.pack(AccountArchive.MAGIC, AccountArchive.FORMAT_VERSION, kind, timestamp, parentTimestamp)]
+        for userId, data, gameVersion in records:
+            encodedVersion = gameVersion.encode()
+            chunks.append(AccountArchive.RECORD_HEADER.pack(userId, len(encodedVersion), len(data)))
+            chunks.append(encodedVersion)
+            chunks.append(data)
+
+        filename = self.folder + prefix + str(timestamp) + ARCHIVE_FILE_SUFFIX
+        tmpFilename = filename + ".tmp"
+        with open(tmpFilename, 'wb') as archiveFile:
+            archiveFile.write(lzma.compress(b"".join(chunks)))
+            archiveFile.flush()
+            os.fsync(archiveFile.fileno())
+        os.replace(tmpFilename, filename)
+
+    def _readFile(self, filename : str) -> tuple[bool, int, dict[int, tuple[bytes, str]]]:
+        with open(self.folder + filename, 'rb') as archiveFile:
+            raw = lzma.decompress(archiveFile.read())
+        magic, formatVersion, kind, _, parentTimestamp = AccountArchive.FILE_HEADER.unpack_from(raw, 0)
+        if magic != AccountArchive.MAGIC or formatVersion != AccountArchive.FORMAT_VERSION:
+            raise ValueError(f"{filename} is not a supported archive file")
+
+        records = {}
+        offset = AccountArchive.FILE_HEADER.size
+        while offset < len(raw):
+            userId, versionLength, dataLength = AccountArchive.RECORD_HEADER.unpack_from(raw, offset)
+            offset += AccountArchive.RECORD_HEADER.size
+            gameVersion = raw[offset:offset+versionLength].decode()
+            offset += versionLength
+            records[userId] = (raw[offset:offset+dataLength], gameVersion)
+            offset += dataLength
+        return kind == b"B", parentTimestamp, records
+
+    """
+        Rebuilds every account as of the latest point at or before the given timestamp.
+        Returns (the point's timestamp, {userId: (data, gameVersion)}).
+    """
+    def restorePoint(self, timestamp : int) -> tuple[int, dict[int, tuple[bytes, str]]]:
+        points = [point for point in self.listPoints() if point[0] <= timestamp]
+        baseIndices = [i for i, (_, isBase, _) in enumerate(points) if isBase]
+        if len(baseIndices) == 0:
+            raise KeyError(f"no archive point at or before {timestamp}")
+
+        accounts : dict[int, tuple[bytes, str]] = {}
+        previousTimestamp = None
+        for pointTimestamp, _, filename in points[baseIndices[-1]:]:
+            isBase, parentTimestamp, records = self._readFile(filename)
+            if not isBase and parentTimestamp != previousTimestamp:
+                raise ValueError(f"{filename} follows {parentTimestamp}, but the previous point is {previousTimestamp}")
+            accounts.update(records)
+            previousTimestamp = pointTimestamp
+        assert(previousTimestamp is not None)
+        return previousTimestamp, accounts
@@ -0,0 +1,81 @@
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from rpg_consts import *
+from rpg_account_store import AccountStore
+from rpg_global_state import decodeAccountData
+from structures.rpg_balance_analysis import EntityStatTable, MatchupMatrix, getDungeonEnemies, writeMatchupCsv
+from structures.rpg_classes_skills import PlayerClassData
+from structures.rpg_combat_entity import Player
+
+with contextlib.redirect_stdout(io.StringIO()):
+    # the loadout fixtures print their stat sheets on import
+    from rpg_loadout_testing import rerollOtherEquips, rerollWeapon
+
+"""
+    Writes the expected basic attack matchups between player builds and every dungeon enemy to a CSV
+    (see structures/rpg_balance_analysis.py). Builds are generated for every advanced class at each of the given
+    levels, with random stat points and gear, and/or read from an account store.
+"""
+
+def makeClassBuilds(levels : list[int], buildsPerClass : int, seed : int) -> list[Player]:
+    random.seed(seed)
+    rng = random.Random(seed)
+    builds = []
+    for advancedClass in AdvancedPlayerClassNames:
+        baseClass = PlayerClassData.getBaseClasses(advancedClass)[0]
+        for level in levels:
+            for i in range(buildsPerClass):
+                player = Player(f"{enumName(advancedClass)} L{level} #{i + 1}", baseClass)
+                player.level = level
+                player.freeStatPoints = STAT_POINTS_PER_LEVEL * level
+                while player.freeStatPoints > 0 and len(player.assignStatPoints(rng.sample(list(BaseStats), len(BaseStats)))) > 0:
+                    pass
+                player.classRanks[baseClass] = MAX_BASE_CLASS_RANK
+                player.changeClass(advancedClass)
+                [player._rankUp() for _ in range(MAX_ADVANCED_CLASS_RANK - 1)]
+                rarity = rng.randint(0, MAX_ITEM_RARITY)
+                rerollWeapon(player, rarity, min(level, MAX_ITEM_RANK))
+                rerollOtherEquips(player, rarity)
+                builds.append(player)
+    return builds
+
+def loadAccountBuilds(storeFilename : str) -> list[Player]:
+    store = AccountStore(storeFilename)
+    builds = []
+    for userId, data, gameVersion in store.iterAccounts():
+        saveData, _ = decodeAccountData(data, gameVersion)
+        for characterData in saveData["characters"]:
+            player = Player.fromSaveData(characterData)
+            player.name = f"{player.name} ({userId})"
+            builds.append(player)
+    return builds
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tabulate expected basic attack matchups between player builds and dungeon enemies.")
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("--levels", type=int, nargs="*", default=[1, 5, 10, 15, 20], help="levels to generate builds at (default: %(default)s)")
+    parser.add_argument("--builds", type=int, default=4, help="generated builds per class and level (default: %(default)s)")
+    parser.add_argument("--accounts", help="also include every character in this account store")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    builds = makeClassBuilds(args.levels, args.builds, args.seed)
+    if args.accounts is not None:
+        builds += loadAccountBuilds(args.accounts)
+    enemyLabels, enemies = zip(*getDungeonEnemies(random.Random(args.seed)))
+    buildTable = EntityStatTable.fromEntities(builds)
+    enemyTable = EntityStatTable.fromEntities(list(enemies), list(enemyLabels))
+    setupSeconds = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    buildMatchups = MatchupMatrix(buildTable, enemyTable)
+    enemyMatchups = MatchupMatrix(enemyTable, buildTable)
+    matrixSeconds = time.perf_counter() - startTime
+    writeMatchupCsv(args.output, buildMatchups, enemyMatchups)
+    print(f"{len(buildTable)} builds x {len(enemyTable)} enemies written to {args.output} " +
+          f"({setupSeconds:.1f}s building and reading stats, {matrixSeconds:.2f}s for the matchups)")
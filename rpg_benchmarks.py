@@ -0,0 +1,810 @@
+import contextlib
+import copy
+import io
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+
+from rpg_consts import *
+from rpg_global_state import AccountData, GlobalState
+from structures.rpg_classes_skills import EFOnAdvanceTurn, PlayerClassData, SkillEffect
+from structures.rpg_combat_interface import CombatInterface, NPCInputHandler, RandomEntityInputHandler
+from structures.rpg_combat_entity import ENEMY_PROTOTYPES, Enemy, EnemyPrototypeRegistry, Player
+from structures.rpg_combat_formulas import getDamageFactor, getDamageFactorArray, getHitChance, getHitChanceArray
+from structures.rpg_combat_state import CombatController, EntityCombatState
+from structures.rpg_dungeons import DungeonData, DungeonRoomData, SettingsDungeonRoomData
+from structures.rpg_items import generateHat, generateWeapon
+from structures.rpg_messages import LogMessage, MessageCollector, NullMessageCollector, SharedMessageLog
+from structures.rpg_npc_search import SearchEntityAI
+from structures.rpg_replay import CombatReplayRecord, CombatReplayViewer, finishRecordedCombat, replayCombat, saveCombatReplay, startRecordedCombat
+from structures.rpg_replay_archive import BinaryCombatReplay
+from structures.rpg_simulation import DEFAULT_SIMULATION_MAX_TURNS, CombatSimulator
+
+with contextlib.redirect_stdout(io.StringIO()):
+    # the loadout fixtures print their stat sheets on import
+    from rpg_loadout_testing import *
+from gameData.rpg_enemy_data import *
+from gameData.rpg_enemy_data2 import *
+from gameData.rpg_dungeon_data import *
+
+"""
+    Micro-benchmarks for the combat engine. Each returns its timings as well as printing them,
+    so they can be compared across changes.
+"""
+
+def _timeTurns(players : list[Player], enemyTeamFactory : Callable[[random.Random], list[Enemy]],
+               numFights : int, seed : int) -> tuple[float, int]:
+    simulator = CombatSimulator(players, enemyTeamFactory, seed=seed)
+    report = simulator.runFights(numFights)
+    return report.elapsedSeconds, sum(report.turnCounts)
+
+def _arenaTrio(rng : random.Random) -> list[Enemy]:
+    return [arenaWizard({'roomNumber': 4}, rng), arenaAcrobat({'roomNumber': 4}, rng), arenaHunter({'roomNumber': 4}, rng)]
+
+def _uncachedTotalStatValue(self : EntityCombatState, stat : Stats) -> int:
+    return round((self.entity.getStatValue(stat) + self.flatStatMod.get(stat, 0)) * self.multStatMod.get(stat, 1))
+
+def _uncachedTotalStatValueFloat(self : EntityCombatState, stat : Stats) -> float:
+    return (self.entity.getStatValueFloat(stat) + self.flatStatMod.get(stat, 0)) * self.multStatMod.get(stat, 1)
+
+"""
+    3v3 arena fight, timed per turn with the combat stat cache and with the old direct computation.
+"""
+def benchmarkStatCache(numFights : int = 200, seed : int = 0) -> dict[str, float]:
+    players = [tp_knight, tp_sniper, tp_saint]
+    cachedTime, cachedTurns = _timeTurns(players, _arenaTrio, numFights, seed)
+
+    cachedFns = (EntityCombatState.getTotalStatValue, EntityCombatState.getTotalStatValueFloat)
+    EntityCombatState.getTotalStatValue = _uncachedTotalStatValue
+    EntityCombatState.getTotalStatValueFloat = _uncachedTotalStatValueFloat
+    try:
+        uncachedTime, uncachedTurns = _timeTurns(players, _arenaTrio, numFights, seed)
+    finally:
+        EntityCombatState.getTotalStatValue, EntityCombatState.getTotalStatValueFloat = cachedFns
+
+    results = {
+        "cachedTurnMicros": cachedTime / max(cachedTurns, 1) * 1e6,
+        "uncachedTurnMicros": uncachedTime / max(uncachedTurns, 1) * 1e6
+    }
+    print(f"Stat cache, 3v3 arena ({numFights} fights): {results['cachedTurnMicros']:.1f}us/turn cached, " +
+          f"{results['uncachedTurnMicros']:.1f}us/turn uncached " +
+          f"({results['uncachedTurnMicros'] / results['cachedTurnMicros']:.2f}x)")
+    return results
+
+def _legacyGetEffectFunctions(self : EntityCombatState, effectTiming : EffectTimings):
+    checkedSkillEffects = set()
+    while len(checkedSkillEffects) < len(self.activeSkillEffects):
+        allSkillEffects = set(self.activeSkillEffects.keys())
+        uncheckedSkillEffects = allSkillEffects - checkedSkillEffects
+        skillEffect = list(uncheckedSkillEffects)[0]
+        for effectFunction in list(filter(lambda effectFunction : effectFunction.effectTiming == effectTiming, skillEffect.effectFunctions)):
+            yield effectFunction
+        checkedSkillEffects.add(skillEffect)
+
+"""
+    Max-rank player with passive free skills and max-rarity gear (so equipment trait skills are included).
+"""
+def makeHighRankPlayer(name : str, baseClass : BasePlayerClassNames, advancedClass : AdvancedPlayerClassNames) -> Player:
+    player = Player(name, baseClass)
+    player.level = MAX_PLAYER_LEVEL
+    for playerClass in BasePlayerClassNames:
+        player.classRanks[playerClass] = MAX_BASE_CLASS_RANK
+    for playerClass in AdvancedPlayerClassNames:
+        player.classRanks[playerClass] = MAX_ADVANCED_CLASS_RANK
+    player.changeClass(advancedClass)
+    for playerClass in AdvancedPlayerClassNames:
+        for rank in range(MAX_ADVANCED_CLASS_RANK, 0, -1):
+            freeSkill = PlayerClassData.getFreeSkillForRank(playerClass, rank)
+            if freeSkill is not None and not freeSkill.isActiveSkill:
+                player.addFreeSkill(playerClass, rank)
+    rerollWeapon(player, MAX_ITEM_RARITY, MAX_ITEM_RANK)
+    for equip in [generateHat(MAX_ITEM_RARITY, MAX_ITEM_RANK), generateOverall(MAX_ITEM_RARITY, MAX_ITEM_RANK),
+                  generateShoes(MAX_ITEM_RARITY, MAX_ITEM_RANK)]:
+        player.equipItem(equip)
+    return player
+
+"""
+    Effect lookups for an entity with 20+ passive effects active: the build's own passives and traits,
+    topped up with passive effects from every class. Also times full turns for a party of such builds.
+"""
+def benchmarkEffectIndex(minEffects : int = 24, lookups : int = 20000, numFights : int = 100, seed : int = 0) -> dict[str, float]:
+    player = makeHighRankPlayer("benchmark", BasePlayerClassNames.WARRIOR, AdvancedPlayerClassNames.MERCENARY)
+    controller = CombatController([player], [trainingBoss({})], {player : DEFAULT_STARTING_DISTANCE}, {}, lambda entity, enemyTeam: None)
+    state = controller.combatStateMap[player]
+
+    extraEffects : list[SkillEffect] = [skillEffect for classData in PlayerClassData.PLAYER_CLASS_DATA_MAP.values()
+                                        for skill in classData.rankSkills.values() if not skill.isActiveSkill
+                                        for skillEffect in skill.skillEffects]
+    for skillEffect in extraEffects:
+        if len(state.activeSkillEffects) >= minEffects:
+            break
+        state.addActiveSkillEffect(skillEffect)
+
+    timings = [timing for timing in EffectTimings]
+    def timeLookups(lookupFn) -> float:
+        startTime = time.perf_counter()
+        for i in range(lookups):
+            for _ in lookupFn(state, timings[i % len(timings)]):
+                pass
+        return (time.perf_counter() - startTime) / lookups * 1e6
+
+    results = {
+        "effectCount": len(state.activeSkillEffects),
+        "indexedLookupMicros": timeLookups(EntityCombatState.getEffectFunctions),
+        "scanLookupMicros": timeLookups(_legacyGetEffectFunctions)
+    }
+
+    players = [makeHighRankPlayer("hr knight", BasePlayerClassNames.WARRIOR, AdvancedPlayerClassNames.KNIGHT),
+               makeHighRankPlayer("hr sniper", BasePlayerClassNames.RANGER, AdvancedPlayerClassNames.SNIPER),
+               makeHighRankPlayer("hr saint", BasePlayerClassNames.MAGE, AdvancedPlayerClassNames.SAINT)]
+    indexedTime, indexedTurns = _timeTurns(players, _arenaTrio, numFights, seed)
+    indexedFn = EntityCombatState.getEffectFunctions
+    EntityCombatState.getEffectFunctions = _legacyGetEffectFunctions
+    try:
+        scanTime, scanTurns = _timeTurns(players, _arenaTrio, numFights, seed)
+    finally:
+        EntityCombatState.getEffectFunctions = indexedFn
+    results["indexedTurnMicros"] = indexedTime / max(indexedTurns, 1) * 1e6
+    results["scanTurnMicros"] = scanTime / max(scanTurns, 1) * 1e6
+
+    print(f"Effect index, {results['effectCount']} active effects: {results['indexedLookupMicros']:.2f}us/lookup indexed, " +
+          f"{results['scanLookupMicros']:.2f}us/lookup scanning ({results['scanLookupMicros'] / results['indexedLookupMicros']:.2f}x)")
+    print(f"Effect index, high-rank 3v3 arena ({numFights} fights): {results['indexedTurnMicros']:.1f}us/turn indexed, " +
+          f"{results['scanTurnMicros']:.1f}us/turn scanning ({results['scanTurnMicros'] / results['indexedTurnMicros']:.2f}x)")
+    return results
+
+def _legacyAdvanceToNextPlayer(self : CombatController) -> CombatEntity:
+    for removeEntity in self.removeQueue:
+        if removeEntity in self.playerTeam and len(self.playerTeam) > 1:
+            self.playerTeam.remove(removeEntity)
+        elif removeEntity in self.opponentTeam and len(self.opponentTeam) > 1:
+            self.opponentTeam.remove(removeEntity)
+    self.removeQueue = []
+
+    actionTimeMap : dict[CombatEntity, float] = {entity : self.combatStateMap[entity].getTimeToFullAction() for entity in self.combatStateMap}
+    livingEntities = list(filter(lambda entity: self.combatStateMap[entity].currentHP > 0, self.combatStateMap.keys()))
+    nextEntity : CombatEntity = min(livingEntities, key = lambda entity: actionTimeMap[entity])
+
+    if self.previousTurnEntity in livingEntities and actionTimeMap[self.previousTurnEntity] == 0:
+        nextEntity = self.previousTurnEntity
+
+    for entity in livingEntities:
+        self.combatStateMap[entity].increaseActionTimer(actionTimeMap[nextEntity])
+        for effectFunction in self.combatStateMap[entity].getEffectFunctions(EffectTimings.ADVANCE_TURN):
+            assert(isinstance(effectFunction, EFOnAdvanceTurn))
+            effectFunction.applyEffect(self, entity, self.previousTurnEntity, nextEntity, actionTimeMap[nextEntity])
+
+    return nextEntity
+
+def _spawnerRoom(rng : random.Random) -> list[Enemy]:
+    return [asSpawner({}, rng)]
+
+"""
+    Turn selection with the turn scheduler and with the old full scan. Times bare advances for a full 8v8 field
+    (with half of each side dead), then full turns for a summoner party against the spawner room, alternating modes
+    for several rounds and keeping each mode's fastest. The fight times also report how much of each turn is spent
+    choosing the next player, since that is all the scheduler changes.
+"""
+def benchmarkTurnScheduler(advances : int = 20000, numFights : int = 100, rounds : int = 3, seed : int = 0) -> dict[str, float]:
+    def timeAdvances(advanceFn) -> float:
+        players = [makeHighRankPlayer(f"p{i}", BasePlayerClassNames.RANGER, AdvancedPlayerClassNames.SNIPER) for i in range(8)]
+        dummies = [basicDummy({}) for _ in range(8)]
+        controller = CombatController(players, dummies, {}, {}, lambda entity, enemyTeam: None)
+        for entity in players[::2] + dummies[::2]:
+            controller.combatStateMap[entity].currentHP = 0
+        startTime = time.perf_counter()
+        for _ in range(advances):
+            nextEntity = advanceFn(controller)
+            controller.spendActionTimer(nextEntity, DEFAULT_ATTACK_TIMER_USAGE)
+            controller.previousTurnEntity = nextEntity
+        return (time.perf_counter() - startTime) / advances * 1e6
+
+    def timeFight(advanceFn) -> tuple[float, float]:
+        advanceSeconds = [0.0]
+        def timedAdvance(controller : CombatController) -> CombatEntity:
+            startTime = time.perf_counter()
+            try:
+                return advanceFn(controller)
+            finally:
+                advanceSeconds[0] += time.perf_counter() - startTime
+
+        scheduledFn = CombatController.advanceToNextPlayer
+        CombatController.advanceToNextPlayer = timedAdvance
+        try:
+            elapsedSeconds, turns = _timeTurns([tp_summoner, test_knight], _spawnerRoom, numFights, seed)
+        finally:
+            CombatController.advanceToNextPlayer = scheduledFn
+        return elapsedSeconds / max(turns, 1) * 1e6, advanceSeconds[0] / max(turns, 1) * 1e6
+
+    results = {
+        "scheduledAdvanceMicros": timeAdvances(CombatController.advanceToNextPlayer),
+        "scanAdvanceMicros": timeAdvances(_legacyAdvanceToNextPlayer)
+    }
+
+    scheduledRounds, scanRounds = [], []
+    for _ in range(rounds):
+        scheduledRounds.append(timeFight(CombatController.advanceToNextPlayer))
+        scanRounds.append(timeFight(_legacyAdvanceToNextPlayer))
+    results["scheduledTurnMicros"], results["scheduledTurnAdvanceMicros"] = min(scheduledRounds)
+    results["scanTurnMicros"], results["scanTurnAdvanceMicros"] = min(scanRounds)
+
+    print(f"Turn scheduler, 8v8 advances: {results['scheduledAdvanceMicros']:.1f}us/advance scheduled, " +
+          f"{results['scanAdvanceMicros']:.1f}us/advance scanning ({results['scanAdvanceMicros'] / results['scheduledAdvanceMicros']:.2f}x)")
+    print(f"Turn scheduler, summoner vs spawner ({numFights} fights, best of {rounds}): " +
+          f"{results['scheduledTurnMicros']:.1f}us/turn scheduled ({results['scheduledTurnAdvanceMicros']:.1f}us choosing), " +
+          f"{results['scanTurnMicros']:.1f}us/turn scanning ({results['scanTurnAdvanceMicros']:.1f}us choosing) " +
+          f"({results['scanTurnMicros'] / results['scheduledTurnMicros']:.2f}x)")
+    return results
+
+def _legacyLuckWeightedUniform(rng : random.Random, totalLuck : int) -> float:
+    rolls = [rng.random() for i in range(1 + abs(totalLuck))]
+    if totalLuck > 0:
+        return max(rolls)
+    else:
+        return min(rolls)
+
+def _ksStatistic(samplesA : np.ndarray, samplesB : np.ndarray) -> float:
+    samplesA, samplesB = np.sort(samplesA), np.sort(samplesB)
+    allSamples = np.concatenate([samplesA, samplesB])
+    cdfA = np.searchsorted(samplesA, allSamples, side='right') / len(samplesA)
+    cdfB = np.searchsorted(samplesB, allSamples, side='right') / len(samplesB)
+    return float(np.max(np.abs(cdfA - cdfB)))
+
+"""
+    Checks the closed-form luck roll against the old max/min-of-n-draws roll with a two-sample Kolmogorov-Smirnov
+    test at each luck value (alpha = 0.001), checks that equal seeds give equal rolls, and times both at each luck value.
+    Raises an AssertionError if either check fails.
+"""
+def benchmarkLuckRolls(lucks : list[int] = [-20, -5, -1, 0, 1, 5, 20], samples : int = 20000, seed : int = 0) -> dict[int, float]:
+    player = makeHighRankPlayer("benchmark", BasePlayerClassNames.RANGER, AdvancedPlayerClassNames.HUNTER)
+    controller = CombatController([player], [trainingBoss({})], {player : DEFAULT_STARTING_DISTANCE}, {}, lambda entity, enemyTeam: None)
+    legacyRng = random.Random(seed)
+    criticalValue = 1.95 * math.sqrt(2 / samples)
+
+    results = {}
+    for luck in lucks:
+        controller.rng.seed(seed + luck)
+        startTime = time.perf_counter()
+        closedForm = np.array([controller._luckWeightedUniform(luck) for _ in range(samples)])
+        closedFormMicros = (time.perf_counter() - startTime) / samples * 1e6
+
+        startTime = time.perf_counter()
+        legacy = np.array([_legacyLuckWeightedUniform(legacyRng, luck) for _ in range(samples)])
+        legacyMicros = (time.perf_counter() - startTime) / samples * 1e6
+
+        ksStatistic = _ksStatistic(closedForm, legacy)
+        assert ksStatistic < criticalValue, f"luck {luck}: KS statistic {ksStatistic:.4f} exceeds {criticalValue:.4f}"
+        assert np.all((closedForm >= 0) & (closedForm < 1)), f"luck {luck}: roll outside [0, 1)"
+
+        controller.rng.seed(seed + luck)
+        assert all(controller._luckWeightedUniform(luck) == roll for roll in closedForm[:100]), f"luck {luck}: seeded rolls differ"
+
+        results[luck] = ksStatistic
+        print(f"Luck rolls, luck {luck:+d}: {closedFormMicros:.2f}us/roll closed-form, {legacyMicros:.2f}us/roll " +
+              f"drawing {1 + abs(luck)} ({legacyMicros / closedFormMicros:.2f}x), KS statistic {ksStatistic:.4f} < {criticalValue:.4f}")
+    return results
+
+def _legacyLogMessage(viewerLogs : list[list[LogMessage]], renderEagerly : bool,
+                      messageType : MessageType, messageTemplate : str, *messageArgs) -> None:
+    for viewerLog in viewerLogs:
+        message = LogMessage(messageType, messageTemplate, messageArgs)
+        if renderEagerly:
+            message.messageText
+        viewerLog.append(message)
+
+"""
+    Cost of logging the hit chance message for parties of 1-8 players: appended once to a shared log, appended to
+    each player's own log (as before the shared log), appended to each player's own log rendered (as before lazy
+    rendering), and discarded by the simulators' null collector.
+    None of the logs are capped here, so nothing is spilled to disk (benchmarkLogRetention covers that). A solo
+    player pays a little more for the shared log than for a plain list (about 20%), since each message still goes
+    through the controller and the log; a party of 4 comes out well ahead (around 2.5x), and larger parties more so.
+"""
+def benchmarkLogging(messages : int = 20000, partySizes : list[int] = [1, 4, 8], repeats : int = 5) -> dict[int, dict[str, float]]:
+    opponent = trainingBoss({})
+    # Each run starts from empty logs; the best of the runs is kept, since the first runs also pay for warming up
+    def timeLogging(makeLogFn : Callable[[], Callable[..., None]]) -> float:
+        bestSeconds = math.inf
+        for _ in range(repeats):
+            logFn = makeLogFn()
+            startTime = time.perf_counter()
+            for i in range(messages):
+                logFn(MessageType.PROBABILITY, "{}'s chance to hit {}: {:.3f}%", "benchmark", opponent.shortName, i / messages * 100)
+            bestSeconds = min(bestSeconds, time.perf_counter() - startTime)
+        return bestSeconds / messages * 1e6
+
+    results = {}
+    for partySize in partySizes:
+        players = [makeHighRankPlayer(f"p{i}", BasePlayerClassNames.RANGER, AdvancedPlayerClassNames.SNIPER) for i in range(partySize)]
+        def makeSharedLogFn() -> Callable[..., None]:
+            sharedLog = SharedMessageLog(sys.maxsize)
+            sharedLoggers = {player : MessageCollector() for player in players}
+            [logger.attachToLog(sharedLog) for logger in sharedLoggers.values()]
+            return CombatController(players, [opponent], {}, sharedLoggers, lambda entity, enemyTeam: None).logMessage
+        def makePerViewerLogFn(renderEagerly : bool) -> Callable[..., None]:
+            viewerLogs : list[list[LogMessage]] = [[] for _ in players]
+            return lambda *args: _legacyLogMessage(viewerLogs, renderEagerly, *args)
+        def makeNullLogFn() -> Callable[..., None]:
+            return CombatController(players, [opponent], {}, {player : NullMessageCollector() for player in players},
+                                    lambda entity, enemyTeam: None).logMessage
+        results[partySize] = {
+            "sharedMicros": timeLogging(makeSharedLogFn),
+            "perViewerMicros": timeLogging(lambda: makePerViewerLogFn(False)),
+            "perViewerRenderedMicros": timeLogging(lambda: makePerViewerLogFn(True)),
+            "nullMicros": timeLogging(makeNullLogFn)
+        }
+        partyResults = results[partySize]
+        print(f"Logging, party of {partySize}: {partyResults['sharedMicros']:.2f}us/message shared, " +
+              f"{partyResults['perViewerMicros']:.2f}us/message per viewer " +
+              f"({partyResults['perViewerMicros'] / partyResults['sharedMicros']:.2f}x), " +
+              f"{partyResults['perViewerRenderedMicros']:.2f}us/message per viewer rendered, {partyResults['nullMicros']:.2f}us/message discarded")
+    return results
+
+"""
+    Memory held by a dungeon log after a long run that nobody has cleared (such as a stretch of retries), with the
+    in-memory cap and effectively without it. Also times appending to the log (which includes spilling when capped)
+    and reading the full log back, which crosses the spilled segments.
+"""
+def benchmarkLogRetention(messageCounts : list[int] = [5000, 50000], partySize : int = 4, repeats : int = 3) -> dict[int, dict[str, float]]:
+    def fillLog(memoryLimit : int, messageCount : int) -> tuple[SharedMessageLog, list[MessageCollector]]:
+        messageLog = SharedMessageLog(memoryLimit)
+        viewers = [MessageCollector() for _ in range(partySize)]
+        [viewer.attachToLog(messageLog) for viewer in viewers]
+        for i in range(messageCount):
+            messageLog.addMessage(MessageType.DAMAGE, "{} takes **{} damage{}**!", f"Roverat ({i % 3})", i, "")
+        return messageLog, viewers
+
+    # Times are the best of the repeats
+    def measure(memoryLimit : int, messageCount : int) -> tuple[int, float, float]:
+        appendMicros, readSeconds = math.inf, math.inf
+        for _ in range(repeats):
+            startTime = time.perf_counter()
+            messageLog, viewers = fillLog(memoryLimit, messageCount)
+            appendMicros = min(appendMicros, (time.perf_counter() - startTime) / messageCount * 1e6)
+            startTime = time.perf_counter()
+            fullLog = viewers[0].sendAllMessages(None, False).getMessagesString(None, False)
+            readSeconds = min(readSeconds, time.perf_counter() - startTime)
+            assert fullLog.count('\n') == messageCount - 1
+            [viewer.detachFromLog() for viewer in viewers]
+
+        tracemalloc.start()
+        messageLog, viewers = fillLog(memoryLimit, messageCount)
+        heldBytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        [viewer.detachFromLog() for viewer in viewers]
+        return heldBytes, appendMicros, readSeconds
+
+    results = {}
+    for messageCount in messageCounts:
+        cappedBytes, cappedAppend, cappedRead = measure(LOG_MEMORY_LIMIT, messageCount)
+        uncappedBytes, uncappedAppend, uncappedRead = measure(messageCount, messageCount)
+        results[messageCount] = {"cappedKB": cappedBytes / 1024, "uncappedKB": uncappedBytes / 1024,
+                                 "cappedAppendMicros": cappedAppend, "uncappedAppendMicros": uncappedAppend,
+                                 "cappedReadSeconds": cappedRead, "uncappedReadSeconds": uncappedRead}
+        print(f"Log retention, {messageCount} messages: {cappedBytes / 1024:.0f}KB held with a cap of {LOG_MEMORY_LIMIT} " +
+              f"({cappedAppend:.2f}us/append, {cappedRead:.3f}s full read), {uncappedBytes / 1024:.0f}KB held uncapped " +
+              f"({uncappedAppend:.2f}us/append, {uncappedRead:.3f}s full read)")
+    return results
+
+""" Holds the session fields an account saves, without needing discord. """
+class _BenchmarkSession(object):
+    def __init__(self, state : tuple):
+        self.userId, self.savedMention, self.defaultFormationDistance = state
+
+    def onLoadReset(self):
+        pass
+
+def _makeSyntheticPlayer(name : str, rng : random.Random) -> Player:
+    player = Player(name, rng.choice(list(BasePlayerClassNames)))
+    while len(player.inventory) < MAX_INVENTORY:
+        rarity = rng.randint(0, 4)
+        player.storeEquipItem(generateWeapon(rarity, 10) if rng.random() < 0.5 else generateHat(rarity, 10))
+    player.equipItem(next(item for item in player.inventory if item.equipSlot == EquipmentSlot.HAT))
+    return player
+
+"""
+    Saves a store of synthetic accounts (full inventories of generated items, several characters each)
+    and loads it back, to track how save/load cost grows with the player base.
+"""
+def benchmarkSaveLoad(accountCounts : list[int] = [100, 1000], charactersPerAccount : int = 2,
+                      seed : int = 0) -> dict[int, dict[str, float]]:
+    results = {}
+    for accountCount in accountCounts:
+        random.seed(seed)  # item generation uses the global rng
+        rng = random.Random(seed)
+        saveFolder = tempfile.mkdtemp() + "/"
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                state = GlobalState(saveFolder)
+                state.sessionFactory = _BenchmarkSession
+                state.loadState()
+                for userId in range(accountCount):
+                    accountData = AccountData(userId, _makeSyntheticPlayer(f"p{userId}", rng), _BenchmarkSession((userId, "", 1)))
+                    for i in range(1, charactersPerAccount):
+                        accountData.allCharacters.append(_makeSyntheticPlayer(f"p{userId}_{i}", rng))
+                    state.accountDataMap[userId] = accountData
+
+                profiles = state.profileSaves()
+                startTime = time.perf_counter()
+                state.saveState()
+                saveSeconds = time.perf_counter() - startTime
+                saveStats = state.lastSaveStats
+                state.accountStore.close()
+
+                startTime = time.perf_counter()
+                loadedState = GlobalState(saveFolder)
+                loadedState.sessionFactory = _BenchmarkSession
+                loadedState.loadState()
+                startupSeconds = time.perf_counter() - startTime
+                for userId in range(accountCount):
+                    loadedState.accountDataMap[userId]
+                loadSeconds = time.perf_counter() - startTime
+                loadedState.accountStore.close()
+        finally:
+            shutil.rmtree(saveFolder, ignore_errors=True)
+
+        characterBytes = [characterProfile[3] for profile in profiles for characterProfile in profile.characterProfiles]
+        results[accountCount] = {
+            "saveSeconds": saveSeconds,
+            "loopBlockedSeconds": saveStats["loopBlockedSeconds"],
+            "startupSeconds": startupSeconds,
+            "loadSeconds": loadSeconds,
+            "meanAccountBytes": sum(profile.saveBytes for profile in profiles) / len(profiles),
+            "maxAccountBytes": profiles[0].saveBytes,
+            "meanCharacterBytes": sum(characterBytes) / len(characterBytes),
+            "meanAccountSaveMicros": sum(profile.saveSeconds for profile in profiles) / len(profiles) * 1e6,
+            "meanAccountLoadMicros": sum(profile.loadSeconds for profile in profiles) / len(profiles) * 1e6
+        }
+        print(f"Save/load, {accountCount} accounts x {charactersPerAccount} characters: {saveSeconds:.3f}s save " +
+              f"({saveStats['loopBlockedSeconds']:.3f}s serializing), {startupSeconds * 1000:.1f}ms startup, {loadSeconds:.3f}s to load all")
+        print(f"Save/load, {accountCount} accounts: {results[accountCount]['meanAccountBytes'] / 1024:.1f}KB/account " +
+              f"(max {results[accountCount]['maxAccountBytes'] / 1024:.1f}KB, {results[accountCount]['meanCharacterBytes'] / 1024:.1f}KB/character), " +
+              f"{results[accountCount]['meanAccountSaveMicros']:.0f}us save, {results[accountCount]['meanAccountLoadMicros']:.0f}us load per account")
+    return results
+
+def _getDungeonSpawns() -> list[tuple[Callable[[dict], Enemy], dict]]:
+    spawns = {}
+    for dungeon in DungeonData.registeredDungeons:
+        for room in dungeon.dungeonRooms:
+            params = room.params
+            if isinstance(room, SettingsDungeonRoomData):
+                params = {setting.settingKey: setting.settingDefault for setting in room.roomSettings}
+            for enemyGroup in room.enemyGroups:
+                for spawner in enemyGroup:
+                    spawns[(spawner, tuple(sorted(params.items())))] = (spawner, params)
+    return list(spawns.values())
+
+def _legacyRollEnemyGroup(room : DungeonRoomData, rng : random.Random) -> list[Callable[[dict], Enemy]]:
+    roll = rng.randrange(sum(room.weights))
+    groupIndex = 0
+    while roll >= room.weights[groupIndex] and groupIndex <= len(room.enemyGroups) - 1:
+        roll -= room.weights[groupIndex]
+        groupIndex += 1
+    return room.enemyGroups[groupIndex]
+
+"""
+    Enemy group rolls for the registered dungeon room with the most groups: the old sum-and-walk,
+    the cumulative-weight bisect, and the batch sampler. The first two consume the rng identically,
+    so they're also checked to pick the same groups.
+"""
+def benchmarkRoomSampling(rolls : int = 50000, seed : int = 0) -> dict[str, float]:
+    room = max((room for dungeon in DungeonData.registeredDungeons for room in dungeon.dungeonRooms),
+               key=lambda room: len(room.enemyGroups))
+
+    legacyRng, rng = random.Random(seed), random.Random(seed)
+    for _ in range(1000):
+        assert _legacyRollEnemyGroup(room, legacyRng) is room.rollEnemyGroup(rng)
+
+    results : dict[str, float] = {"groups": len(room.enemyGroups)}
+    rng = random.Random(seed)
+    startTime = time.perf_counter()
+    for _ in range(rolls):
+        _legacyRollEnemyGroup(room, rng)
+    results["legacyMicros"] = (time.perf_counter() - startTime) / rolls * 1e6
+
+    rng = random.Random(seed)
+    startTime = time.perf_counter()
+    for _ in range(rolls):
+        room.rollEnemyGroup(rng)
+    results["bisectMicros"] = (time.perf_counter() - startTime) / rolls * 1e6
+
+    rng = random.Random(seed)
+    startTime = time.perf_counter()
+    room.sampleEnemyGroups(rng, rolls)
+    results["batchMicros"] = (time.perf_counter() - startTime) / rolls * 1e6
+
+    print(f"Room sampling, {results['groups']} enemy groups: {results['legacyMicros']:.2f}us/roll walking, " +
+          f"{results['bisectMicros']:.2f}us/roll bisecting, {results['batchMicros']:.2f}us/roll batched")
+    return results
+
+"""
+    Spawn cost of every enemy/params pair used by the registered dungeons, calling the spawner directly
+    vs going through an EnemyPrototypeRegistry. Spawners that roll stats or names (see rolledSpawner) still
+    make their rolls on a newly seeded Random every spawn, so copying saves less for those.
+"""
+def benchmarkEnemySpawns(spawnsPerEnemy : int = 200) -> dict[str, dict[str, float]]:
+    results = {}
+    for spawner, params in _getDungeonSpawns():
+        startTime = time.perf_counter()
+        for _ in range(spawnsPerEnemy):
+            spawner(params)
+        directMicros = (time.perf_counter() - startTime) / spawnsPerEnemy * 1e6
+
+        registry = EnemyPrototypeRegistry()
+        registry.spawn(spawner, params)
+        startTime = time.perf_counter()
+        for _ in range(spawnsPerEnemy):
+            registry.spawn(spawner, params)
+        registryMicros = (time.perf_counter() - startTime) / spawnsPerEnemy * 1e6
+
+        cached = next(iter(registry.prototypes.values())) is not None
+        results[f"{spawner.__name__}{params}"] = {"directMicros": directMicros, "registryMicros": registryMicros, "cached": cached}
+
+    cachedResults = [result for result in results.values() if result["cached"]]
+    print(f"Enemy spawns, {len(results)} enemy/params pairs: {len(cachedResults)} cacheable, " +
+          f"{sum(result['directMicros'] for result in cachedResults) / max(len(cachedResults), 1):.1f}us/spawn built vs " +
+          f"{sum(result['registryMicros'] for result in cachedResults) / max(len(cachedResults), 1):.1f}us/spawn copied for those")
+    for name, result in results.items():
+        print(f"    {name}: {result['directMicros']:.1f}us built, {result['registryMicros']:.1f}us via registry" +
+              ("" if result["cached"] else " (not cacheable)"))
+    return results
+
+def _legacyForkController(controller : CombatController) -> CombatController:
+    return copy.deepcopy(controller)
+
+"""
+    Cost of snapshotting a 3v3 arena fight partway through, with CombatController.fork and with a deepcopy
+    of the whole controller (which also copies every entity, skill, and logger). Also plays forks of the arena
+    and of Salali's fight (whose phase change alters her stats and name) to the end, and checks that the live
+    entities and the live fight's result come out unchanged.
+"""
+def benchmarkCombatFork(forks : int = 1000, openingTurns : int = 20, seed : int = 0) -> dict[str, float]:
+    players = [tp_knight, tp_sniper, tp_saint]
+    enemies = _arenaTrio(random.Random(seed))
+    playerHandlers = {player: RandomEntityInputHandler(player, 0, random.Random(seed)) for player in players}
+    interface = CombatInterface(playerHandlers, {enemy: NPCInputHandler(enemy) for enemy in enemies}, {}, {}, {}, {})
+    interface.cc.rng.seed(seed)
+    interface.runCombatHeadless(openingTurns)
+
+    startTime = time.perf_counter()
+    for _ in range(forks):
+        interface.cc.fork()
+    forkMicros = (time.perf_counter() - startTime) / forks * 1e6
+
+    legacyForks = max(forks // 20, 1)
+    startTime = time.perf_counter()
+    for _ in range(legacyForks):
+        _legacyForkController(interface.cc)
+    deepcopyMicros = (time.perf_counter() - startTime) / legacyForks * 1e6
+
+    isolationFights = [_arenaTrio, lambda rng: [ENEMY_PROTOTYPES.spawn(asSalali, {}, rng)]]
+    forksIsolated = all(CombatSimulator(players, enemyTeamFactory).checkForkIsolation(seed) for enemyTeamFactory in isolationFights)
+    assert forksIsolated, "playing a fork changed the live fight"
+
+    results = {"forkMicros": forkMicros, "deepcopyMicros": deepcopyMicros, "forksIsolated": forksIsolated}
+    print(f"Combat fork, 3v3 arena after {openingTurns} turns: {forkMicros:.1f}us/fork, " +
+          f"{deepcopyMicros:.1f}us/deepcopy ({deepcopyMicros / forkMicros:.1f}x); forks played out left the live fights unchanged")
+    return results
+
+"""
+    3v3 arena fights against random players, with the enemies' scripted AI and with SearchEntityAI (falling back
+    to the same scripts). Reports how long each search took against its budget, and how much of the enemy
+    team's health was left at the end.
+"""
+def benchmarkNPCSearch(numFights : int = 10, timeBudget : float = 0.03, seed : int = 0) -> dict[str, float]:
+    def runFights(useSearch : bool) -> tuple[float, list[float], list[int], list[bool]]:
+        enemyHealth = 0.0
+        searchSeconds : list[float] = []
+        searchRollouts : list[int] = []
+        searchOverrides : list[bool] = []
+        for fight in range(numFights):
+            enemies = _arenaTrio(random.Random(seed + fight))
+            if useSearch:
+                for enemy in enemies:
+                    enemy.ai = SearchEntityAI(enemy.ai.data, enemy.ai.decisionFn, timeBudget, seed=seed + fight)
+            players = [tp_knight, tp_sniper, tp_saint]
+            playerHandlers = {player: RandomEntityInputHandler(player, 0, random.Random(seed + fight)) for player in players}
+            interface = CombatInterface(playerHandlers, {enemy: NPCInputHandler(enemy) for enemy in enemies}, {}, {}, {}, {})
+            interface.cc.rng.seed(seed + fight)
+
+            originalChooseAction = SearchEntityAI.chooseAction
+            def timedChooseAction(ai, combatController, enemy):
+                action = originalChooseAction(ai, combatController, enemy)
+                if not combatController.isFork:
+                    searchSeconds.append(ai.lastSearchStats["seconds"])
+                    searchRollouts.append(int(ai.lastSearchStats["rollouts"]))
+                    searchOverrides.append(bool(ai.lastSearchStats["overridden"]))
+                return action
+            SearchEntityAI.chooseAction = timedChooseAction
+            try:
+                interface.runCombatHeadless(DEFAULT_SIMULATION_MAX_TURNS)
+            finally:
+                SearchEntityAI.chooseAction = originalChooseAction
+            enemyHealth += sum(interface.cc.getCurrentHealth(enemy) for enemy in enemies) / \
+                sum(interface.cc.getMaxHealth(enemy) for enemy in enemies)
+        return enemyHealth / numFights, searchSeconds, searchRollouts, searchOverrides
+
+    scriptedHealth, _, _, _ = runFights(False)
+    searchHealth, searchSeconds, searchRollouts, searchOverrides = runFights(True)
+    results = {
+        "scriptedEnemyHealth": scriptedHealth,
+        "searchEnemyHealth": searchHealth,
+        "meanSearchMillis": sum(searchSeconds) / max(len(searchSeconds), 1) * 1000,
+        "maxSearchMillis": max(searchSeconds, default=0) * 1000,
+        "meanRollouts": sum(searchRollouts) / max(len(searchRollouts), 1),
+        "overrideRate": sum(searchOverrides) / max(len(searchOverrides), 1)
+    }
+    print(f"NPC search, 3v3 arena ({numFights} fights, {timeBudget * 1000:.0f}ms budget): " +
+          f"{results['meanSearchMillis']:.1f}ms/decision (max {results['maxSearchMillis']:.1f}ms), " +
+          f"{results['meanRollouts']:.1f} rollouts/decision, script overridden {results['overrideRate'] * 100:.0f}% of the time; " +
+          f"enemy health left {results['scriptedEnemyHealth'] * 100:.1f}% scripted, {results['searchEnemyHealth'] * 100:.1f}% searching")
+    return results
+
+"""
+    Records 3v3 arena fights and archives them as binary replays. Compares their size with the JSON record plus
+    the fight's text log, times scanning the archive through memory maps, and times jumping to random turns with
+    a CombatReplayViewer against replaying each fight from the start. Also records a fight against Salali before
+    and after all of that, checking that the same seed records the same fight whatever ran in between, and that
+    seeking back through it and the first arena fight gives the same fight as replaying from the start.
+"""
+def benchmarkReplayArchive(numFights : int = 20, numSeeks : int = 40, seed : int = 0) -> dict[str, float]:
+    arenaSpawns = [(arenaWizard, {'roomNumber': 4}), (arenaAcrobat, {'roomNumber': 4}), (arenaHunter, {'roomNumber': 4})]
+    def recordSalali() -> CombatReplayRecord:
+        interface, record = startRecordedCombat(seed + 5, [tp_knight, tp_sniper, tp_saint], [(asSalali, {})])
+        interface.runCombatHeadless(DEFAULT_SIMULATION_MAX_TURNS)
+        finishRecordedCombat(interface, record)
+        return record
+    firstSalaliRecord = recordSalali()
+
+    folder = tempfile.mkdtemp()
+    try:
+        binarySize, jsonSize, logSize = 0, 0, 0
+        filenames = []
+        for fight in range(numFights):
+            players = [tp_knight, tp_sniper, tp_saint]
+            logger = MessageCollector()
+            interface, record = startRecordedCombat(seed + fight, players, arenaSpawns, loggers={players[0]: logger})
+            interface.runCombatHeadless(DEFAULT_SIMULATION_MAX_TURNS)
+            finishRecordedCombat(interface, record)
+
+            filename = f"{folder}/fight{fight}.rpgc"
+            BinaryCombatReplay.writeFile(record, filename)
+            saveCombatReplay(record, f"{folder}/fight{fight}.json")
+            filenames.append(filename)
+            binarySize += os.path.getsize(filename)
+            jsonSize += os.path.getsize(f"{folder}/fight{fight}.json")
+            logSize += len(logger.sendAllMessages(None, True).getMessagesString(None, True).encode())
+
+        startTime = time.perf_counter()
+        scannedTurns = 0
+        for filename in filenames:
+            binaryReplay = BinaryCombatReplay.openFile(filename)
+            scannedTurns += binaryReplay.turnCount
+            binaryReplay.getTurnActions((binaryReplay.turnCount + 1) // 2)
+            binaryReplay.close()
+        scanMicros = (time.perf_counter() - startTime) / numFights * 1e6
+
+        binaryReplay = BinaryCombatReplay.openFile(filenames[0])
+        record = binaryReplay.toRecord()
+        binaryReplay.close()
+        viewer = CombatReplayViewer(record)
+        seekRng = random.Random(seed)
+        seekTurns = [seekRng.randint(0, record.turnCount) for _ in range(numSeeks)]
+        viewer.seekTurn(record.turnCount)
+        startTime = time.perf_counter()
+        for turn in seekTurns:
+            viewer.seekTurn(turn)
+        seekMillis = (time.perf_counter() - startTime) / numSeeks * 1000
+        startTime = time.perf_counter()
+        for turn in seekTurns:
+            replayCombat(record, maxTurns=turn)
+        replayMillis = (time.perf_counter() - startTime) / numSeeks * 1000
+        seeksMatch = all(viewer.matchesFreshReplay(turn) for turn in seekTurns)
+    finally:
+        shutil.rmtree(folder)
+    seedsRepeat = recordSalali().getSaveData() == firstSalaliRecord.getSaveData()
+    assert seedsRepeat, "the same seed recorded a different fight"
+    salaliViewer = CombatReplayViewer(firstSalaliRecord)
+    salaliViewer.seekTurn(firstSalaliRecord.turnCount)
+    seeksMatch = seeksMatch and all(salaliViewer.matchesFreshReplay(turn) for turn in range(firstSalaliRecord.turnCount, -1, -3))
+    assert seeksMatch, "seeking back through a replay gave a different fight than replaying it from the start"
+
+    results = {
+        "binaryBytes": binarySize / numFights,
+        "jsonBytes": jsonSize / numFights,
+        "logBytes": logSize / numFights,
+        "scanMicros": scanMicros,
+        "seekMillis": seekMillis,
+        "replayMillis": replayMillis,
+        "seedsRepeat": seedsRepeat,
+        "seeksMatch": seeksMatch
+    }
+    print(f"Replay archive, 3v3 arena ({numFights} fights, {scannedTurns / numFights:.1f} turns avg): " +
+          f"{results['binaryBytes'] / 1024:.1f}KB binary, {results['jsonBytes'] / 1024:.1f}KB JSON, {results['logBytes'] / 1024:.1f}KB text log; " +
+          f"{scanMicros:.1f}us/file scanned; {seekMillis:.2f}ms/seek with checkpoints, {replayMillis:.2f}ms replaying from the start " +
+          f"({replayMillis / seekMillis:.1f}x); the same seed recorded the same fight, and seeks matched fresh replays")
+    return results
+
+"""
+    Attack resolution in a 3v3 arena fight (rollForHit and rollForDamage for every attacker/defender pair), with the
+    memoized formula kernels and with the formulas evaluated every time, checking that both roll the same results.
+    Also times the array kernels over every pairing of some random attacker and defender stat lines (at each
+    distance for hit chance) against a loop over the uncached formulas, checking that every value is identical.
+"""
+def benchmarkFormulaKernels(rounds : int = 500, statLines : int = 300, seed : int = 0) -> dict[str, float]:
+    players = [tp_knight, tp_sniper, tp_saint]
+    enemies = _arenaTrio(random.Random(seed))
+    playerHandlers = {player: RandomEntityInputHandler(player, 0, random.Random(seed)) for player in players}
+    interface = CombatInterface(playerHandlers, {enemy: NPCInputHandler(enemy) for enemy in enemies}, {}, {}, {}, {})
+    interface.cc.rng.seed(seed)
+    interface.runCombatHeadless(10)
+    controller = interface.cc
+    pairs = [(attacker, defender) for attackerTeam, defenderTeam in [(controller.playerTeam, controller.opponentTeam),
+                                                                     (controller.opponentTeam, controller.playerTeam)]
+             for attacker in attackerTeam for defender in defenderTeam]
+
+    def resolveAttacks() -> tuple[float, list]:
+        controller.rng.seed(seed)
+        rolls = []
+        startTime = time.perf_counter()
+        for _ in range(rounds):
+            for attacker, defender in pairs:
+                rolls.append((controller.rollForHit(attacker, defender), controller.rollForDamage(attacker, defender, True)))
+        return (time.perf_counter() - startTime) / (rounds * len(pairs)) * 1e6, rolls
+
+    combatStateModule = sys.modules[CombatController.__module__]
+    cachedMicros, cachedRolls = resolveAttacks()
+    combatStateModule.getHitChance = getHitChance.__wrapped__
+    combatStateModule.getDamageFactor = getDamageFactor.__wrapped__
+    try:
+        uncachedMicros, uncachedRolls = resolveAttacks()
+    finally:
+        combatStateModule.getHitChance = getHitChance
+        combatStateModule.getDamageFactor = getDamageFactor
+    assert cachedRolls == uncachedRolls, "memoized kernels rolled different results"
+
+    rng = np.random.default_rng(seed)
+    accs, avos = rng.integers(20, 400, statLines), rng.integers(20, 400, statLines)
+    offenses, defenses = rng.integers(10, 500, statLines), rng.integers(10, 500, statLines)
+    distances = np.arange(MAX_DISTANCE + 1)
+    startTime = time.perf_counter()
+    hitChances = getHitChanceArray(accs[:, None, None], avos[None, :, None], distances[None, None, :], 2.0)
+    damageFactors = getDamageFactorArray(offenses[:, None], defenses[None, :])
+    arrayMillis = (time.perf_counter() - startTime) * 1000
+
+    legacyHitChance, legacyDamageFactor = getHitChance.__wrapped__, getDamageFactor.__wrapped__
+    startTime = time.perf_counter()
+    loopHitChances = [[[legacyHitChance(acc, avo, distance, 2.0) for distance in distances.tolist()] for avo in avos.tolist()]
+                      for acc in accs.tolist()]
+    loopDamageFactors = [[legacyDamageFactor(offense, defense) for defense in defenses.tolist()] for offense in offenses.tolist()]
+    loopMillis = (time.perf_counter() - startTime) * 1000
+    assert hitChances.tolist() == loopHitChances and damageFactors.tolist() == loopDamageFactors, "array kernels differ from the formulas"
+
+    results = {"cachedMicros": cachedMicros, "uncachedMicros": uncachedMicros, "arrayMillis": arrayMillis, "loopMillis": loopMillis}
+    print(f"Formula kernels, 3v3 arena: {cachedMicros:.2f}us/attack resolved memoized, {uncachedMicros:.2f}us/attack " +
+          f"uncached ({uncachedMicros / cachedMicros:.2f}x); {statLines}x{statLines} stat lines: {arrayMillis:.1f}ms array kernels, " +
+          f"{loopMillis:.1f}ms looping over the formulas ({loopMillis / arrayMillis:.1f}x), all values identical")
+    return results
+
+if __name__ == '__main__':
+    benchmarkStatCache()
+    benchmarkEffectIndex()
+    benchmarkTurnScheduler()
+    benchmarkLuckRolls()
+    benchmarkLogging()
+    benchmarkLogRetention()
+    benchmarkSaveLoad()
+    benchmarkEnemySpawns()
+    benchmarkRoomSampling()
+    benchmarkCombatFork()
+    benchmarkNPCSearch()
+    benchmarkReplayArchive()
+    benchmarkFormulaKernels()
@@ -962,6 +962,14 @@ class DungeonCategory(Enum):
     NORMAL = auto()
     SPECIAL = auto()
 
+# Where a checkpointed dungeon run picks back up
+class DungeonCheckpointStage(Enum):
+    ROOM_START = auto()
+    BETWEEN_ROOMS = auto()
+    CLEARED = auto()
+
+DUNGEON_CHECKPOINT_FORMAT_VERSION = 1
+
 """ Logging """
 
 class MessageType(Enum):
@@ -1002,10 +1010,35 @@ with open(HINTS_FILE) as file:
 """ Data and Persistence """
 
 TMP_FOLDER = "./tmp/"
-COMBAT_LOG_FILE_PREFIX = TMP_FOLDER + "combat_log_"
+COMBAT_LOG_FILE_NAME = "combat_log_"
+COMBAT_LOG_FILE_PREFIX = TMP_FOLDER + COMBAT_LOG_FILE_NAME
+# Exported combat logs larger than this (in bytes) are gzip-compressed
+COMBAT_LOG_COMPRESS_THRESHOLD = 1024 * 1024
+LOG_SPILL_FILE_NAME = "log_spill_"
+# Messages kept in memory per shared combat/dungeon log; older ones are written out to TMP_FOLDER
+LOG_MEMORY_LIMIT = 2000
+# Whether the bot records its dungeon boss fights as binary replays (see structures/rpg_replay.py), for reproducing bug reports
+RECORD_DUNGEON_FIGHTS = False
+COMBAT_REPLAY_FOLDER = TMP_FOLDER + "replays/"
+# Replays kept in COMBAT_REPLAY_FOLDER; the oldest are deleted past this
+COMBAT_REPLAY_KEEP_COUNT = 200
+COMBAT_REPLAY_FILE_NAME = "combat_replay_"
+COMBAT_REPLAY_FILE_SUFFIX = ".rpgc"
 STATE_FILE_FOLDER = "./saves/"
 STATE_FILE_NAME = "saveState_"
 STATE_FILE_PREFIX = STATE_FILE_FOLDER + STATE_FILE_NAME
 BACKUP_INTERVAL_SECONDS = 600
-STATE_ARCHIVE_FOLDER = STATE_FILE_FOLDER + "recent/"
-ARCHIVE_SIZE = 60
\ No newline at end of file
+STATE_ARCHIVE_NAME = "archive/"
+STATE_ARCHIVE_FOLDER = STATE_FILE_FOLDER + STATE_ARCHIVE_NAME
+# Archive points per chain (one full base followed by deltas); the previous chain is kept as well
+ARCHIVE_SIZE = 60
+ARCHIVE_BASE_NAME = "base_"
+ARCHIVE_DELTA_NAME = "delta_"
+ARCHIVE_FILE_SUFFIX = ".xz"
+STATE_JOURNAL_NAME = STATE_FILE_NAME + "journal"
+STATE_JOURNAL_FILENAME = STATE_FILE_FOLDER + STATE_JOURNAL_NAME
+STATE_DB_NAME = "accounts.db"
+STATE_DB_FILENAME = STATE_FILE_FOLDER + STATE_DB_NAME
+# Saves between archive points. Each point is an lzma delta of the accounts written since the previous one (or a
+# full base at the start of a chain), so every save (BACKUP_INTERVAL_SECONDS apart) can afford to be one
+ARCHIVE_INTERVAL_SAVES = 1
\ No newline at end of file
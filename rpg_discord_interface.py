@@ -45,6 +45,13 @@ class GameSession(object):
         self.userId, self.savedMention, self.defaultFormationDistance = state
         GameSession.restoreUnpickledState(self)
         
+    """ Builds a session from the same values that get pickled; used when loading saved accounts. """
+    @staticmethod
+    def fromSavedState(state) -> GameSession:
+        session = GameSession.__new__(GameSession)
+        session.__setstate__(state)
+        return session
+
     @staticmethod
     def restoreUnpickledState(session : GameSession):
         session.__class__ = GameSession
@@ -64,13 +71,7 @@ class GameSession(object):
         session.cleanEmbed()
         
     def onLoadReset(self):
-        # Originally had support for re-loading dungeons here, but too hard to figure out pickling at the moment
-        
-        # if self.currentDungeon is not None:
-        #     # TODO: only the first person in a party this is called for needs to do this
-        #     asyncio.create_task(self.currentDungeon.runDungeon(True))
-        #     if not self.currentDungeon.loadCheckWaiting():
-        #         asyncio.create_task(self.waitForCombatStart())
+        # Dungeons in progress are resumed from their checkpoints instead; see resumeDungeonCheckpoint
         pass
 
     async def messageTimeout(self, view):
@@ -126,12 +127,9 @@ class GameSession(object):
         assert(player is not None)
         sessionPlayerMap : dict[GameSession, Player] = {self: player} if self.currentParty is None else self.currentParty.getSessionPlayerMap()
 
-        inputHandlerMap : dict[Player, DungeonInputHandler] = {
-            sessionPlayerMap[session]: DiscordDungeonInputHandler(sessionPlayerMap[session], session) for session in sessionPlayerMap}
+        inputHandlerMap, loggerMap = makeDungeonHandlerMaps(sessionPlayerMap)
         startingDistanceMap : dict[CombatEntity, int] = {
             sessionPlayerMap[session]: session.defaultFormationDistance for session in sessionPlayerMap}
-        loggerMap : dict[Player, MessageCollector] = {
-            sessionPlayerMap[session]: DiscordMessageCollector(session) for session in sessionPlayerMap}
 
         partyOrder = []
         if self.currentParty is not None:
@@ -147,17 +145,21 @@ class GameSession(object):
             self.currentDungeon = newDungeon
 
         assert(self.currentDungeon is not None)
-        asyncio.create_task(self.currentDungeon.runDungeon(False))
+        if not dungeonData.pvpMode:
+            channelId = self.currentMessage.channel.id if self.currentMessage is not None else None
+            GLOBAL_STATE.trackDungeon(newDungeon, {sessionPlayerMap[session]: session.userId for session in sessionPlayerMap},
+                                      {"channelId": channelId})
+        asyncio.create_task(runCheckpointedDungeon(newDungeon, False))
         [await session.waitForCombatStart() for session in sessionPlayerMap]
 
-    async def waitForCombatStart(self):
+    async def waitForCombatStart(self, channel : Channel | None = None):
         assert(self.currentDungeon is not None)
 
         self.unseenCombatLog = ""
         self.dungeonLoaded.clear()
         await self.currentDungeon.combatReadyFlag.wait()
         # TODO: also load other party sessions, including loading flags (is this needed?)
-        await self.loadNewMenu(COMBAT_MENU)
+        await self.loadNewMenu(COMBAT_MENU, channel)
         self.dungeonFailed = False
         self.dungeonLoaded.set()
 
@@ -188,6 +190,77 @@ class GameSession(object):
         else:
             return self.currentParty.allSessions
 
+def makeDungeonHandlerMaps(sessionPlayerMap : dict[GameSession, Player]) -> tuple[dict[Player, DungeonInputHandler], dict[Player, MessageCollector]]:
+    inputHandlerMap : dict[Player, DungeonInputHandler] = {
+        sessionPlayerMap[session]: DiscordDungeonInputHandler(sessionPlayerMap[session], session) for session in sessionPlayerMap}
+    loggerMap : dict[Player, MessageCollector] = {
+        sessionPlayerMap[session]: DiscordMessageCollector(session) for session in sessionPlayerMap}
+    return inputHandlerMap, loggerMap
+
+"""
+    Runs a dungeon that GLOBAL_STATE is checkpointing, and stops checkpointing it once it's over.
+    Its boss fights are saved as replays in COMBAT_REPLAY_FOLDER if RECORD_DUNGEON_FIGHTS is set.
+"""
+async def runCheckpointedDungeon(dungeon : DungeonController, reload : bool):
+    if RECORD_DUNGEON_FIGHTS:
+        dungeon.replayFolder = COMBAT_REPLAY_FOLDER
+    try:
+        await dungeon.runDungeon(reload)
+    finally:
+        GLOBAL_STATE.untrackDungeon(dungeon)
+
+"""
+    Puts a party back into the dungeon they were in when the bot last stopped, using the checkpoint from
+    the last save. Members whose accounts can't be found are left out.
+"""
+async def resumeDungeonCheckpoint(runKey : int, checkpointData : dict):
+    sessionPlayerMap : dict[GameSession, Player] = {}
+    players : dict[int, Player] = {}
+    for member in checkpointData["members"]:
+        accountData = GLOBAL_STATE.accountDataMap.get(member["userId"], None)
+        if accountData is None:
+            continue
+        sessionPlayerMap[accountData.session] = accountData.currentCharacter
+        players[member["userId"]] = accountData.currentCharacter
+    if len(sessionPlayerMap) == 0:
+        return
+
+    channelId = checkpointData["extraData"]["channelId"]
+    channel = None if channelId is None else bot.get_channel(channelId)
+    if channel is None and channelId is not None:
+        try:
+            channel = await bot.fetch_channel(channelId)
+        except discord.DiscordException:
+            channel = None
+    if channel is None:
+        print(f"unable to find the channel to resume dungeon run {runKey}")
+        return
+
+    inputHandlerMap, loggerMap = makeDungeonHandlerMaps(sessionPlayerMap)
+    try:
+        dungeon = DungeonController.fromCheckpointData(checkpointData, players, inputHandlerMap, loggerMap)
+    except KeyError:
+        print(f"unable to resume dungeon run {runKey}: {checkpointData['dungeonName']} no longer exists")
+        return
+
+    sessions = list(sessionPlayerMap.keys())
+    if len(sessions) > 1:
+        party = PartyInfo(sessions[0], dungeon.dungeonData)
+        [party.joinParty(session) for session in sessions[1:]]
+        sessions[0].currentParty = party
+    for session in sessions:
+        session.currentDungeon = dungeon
+
+    GLOBAL_STATE.trackDungeon(dungeon, {sessionPlayerMap[session]: session.userId for session in sessions}, checkpointData["extraData"])
+    print(f"resuming dungeon run {runKey} ({checkpointData['dungeonName']}, {checkpointData['stage']})")
+    if DungeonCheckpointStage[checkpointData["stage"]] == DungeonCheckpointStage.ROOM_START:
+        asyncio.create_task(runCheckpointedDungeon(dungeon, True))
+        [await session.waitForCombatStart(channel) for session in sessions]
+    else:
+        # Gives each session a message to update before any rewards or menus go out
+        [await session.loadNewMenu(BETWEEN_ROOM_MENU, channel) for session in sessions]
+        asyncio.create_task(runCheckpointedDungeon(dungeon, True))
+
 class InterfaceView(discord.ui.View):
     def __init__(self, session : GameSession, availablePages : list[InterfacePage],
                  currentPageStack : list[int], pageData : dict):
@@ -385,6 +458,8 @@ class CharacterDeletionPrompt(object):
 
 
 
+GLOBAL_STATE.sessionFactory = GameSession.fromSavedState
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
@@ -396,28 +471,41 @@ async def on_ready():
         os.mkdir(TMP_FOLDER)
 
     print(f'Logged in as {bot.user}.')
-    GLOBAL_STATE.loadState()
+    # on_ready fires again after every reconnect; the state is only loaded and the dungeons only resumed the first time
+    if not GLOBAL_STATE.loaded:
+        GLOBAL_STATE.loadState()
     await bot.change_presence(status=discord.Status.online,
                               activity=discord.Game("Chatanquest using /play (or ch.play)"))
-    saveLoop.start()
+    if not GLOBAL_STATE.resumedCheckpoints:
+        GLOBAL_STATE.resumedCheckpoints = True
+        for runKey, checkpointData in GLOBAL_STATE.getStoredCheckpoints():
+            asyncio.create_task(resumeDungeonCheckpoint(runKey, checkpointData))
+        saveLoop.start()
 
 @tasks.loop(seconds = BACKUP_INTERVAL_SECONDS)
 async def saveLoop():
     if GLOBAL_STATE.loaded:
         if GLOBAL_STATE.firstSave:
-            _doSave()
+            await _doSave()
         else:
             GLOBAL_STATE.firstSave = True
 
-def _doSave():
+async def _doSave() -> dict[str, float] | None:
     try:
-        GLOBAL_STATE.saveState()
+        return await GLOBAL_STATE.saveStateInBackground()
     except TypeError:
         print(traceback.format_exc())
         print("failed to save")
     except pickle.PicklingError:
         print(traceback.format_exc())
         print("failed to save")
+    except KeyError:
+        print(traceback.format_exc())
+        print("failed to save")
+    except OSError:
+        print(traceback.format_exc())
+        print("failed to save")
+    return None
 
 async def respondNotLoaded(ctx : commands.Context):
     await ctx.send(f"Sorry, still setting up; please wait a moment and try again.")
@@ -483,6 +571,7 @@ async def select_character(ctx : commands.Context, target_character : str):
                 raise KeyError
             elif chosenCharacter != accountData.currentCharacter:
                 accountData.currentCharacter = chosenCharacter
+                accountData.markSaveDirty()
                 await ctx.send(f"Selected {chosenCharacter.name} as your current character.")
             else:
                 await ctx.send(f"{chosenCharacter.name} is already your current character!", ephemeral=True)
@@ -508,7 +597,9 @@ async def play(ctx : commands.Context):
         if GLOBAL_STATE.idRegistered(userId):
             gameSession = GLOBAL_STATE.accountDataMap[userId].session
             await ctx.send(f"Opening session for {ctx.author.display_name}...")
-            gameSession.savedMention = ctx.author.mention
+            if gameSession.savedMention != ctx.author.mention:
+                gameSession.savedMention = ctx.author.mention
+                GLOBAL_STATE.accountDataMap[userId].markSaveDirty()
             await gameSession.recreateEmbed(ctx.channel)
         else:
             await ctx.send("You don't have a character yet! Use the 'new_character [name]' command first.", ephemeral=True)
@@ -669,6 +760,7 @@ async def name_summon(ctx : commands.Context, summonName : str | None = None):
                     currentPlayer = GLOBAL_STATE.accountDataMap[userId].session.getPlayer()
                     assert(currentPlayer is not None)
                     currentPlayer.summonName = summonName
+                    currentPlayer.markSaveDirty()
                     await ctx.send(f"Gator name for {currentPlayer.name} set to {summonName}! Just curious.", ephemeral=True)
                 else:
                     await ctx.send("You don't have a character yet! Use the 'new_character [name]' command first.", ephemeral=True)
@@ -684,11 +776,34 @@ async def name_summon(ctx : commands.Context, summonName : str | None = None):
                     description=f"[BOT OWNER ONLY] Force-saves the bot state. This should automatically happen periodically without calling this command.")
 async def save(ctx : commands.Context):
     if ctx.author.id == MY_ID:
-        _doSave()
-        await ctx.send("saved state")
+        saveStats = await _doSave()
+        if saveStats is None:
+            await ctx.send("nothing saved")
+        else:
+            await ctx.send(f"saved state ({saveStats['accountsWritten']}/{saveStats['totalAccounts']} accounts, " +
+                           f"{saveStats['bytesWritten']} bytes; {saveStats['loopBlockedSeconds'] * 1000:.1f}ms on loop, " +
+                           f"{saveStats['latencySeconds'] * 1000:.1f}ms total)")
     else:
         await ctx.send("This is a dev-only command; progress should be periodically saved automatically.")
 
+@bot.command(brief="[OWNER] Profile saves",
+                    description=f"[BOT OWNER ONLY] Reports how long each loaded account takes to save and load, and how large it is.")
+async def save_profile(ctx : commands.Context, count : int = 5):
+    if ctx.author.id == MY_ID:
+        if not GLOBAL_STATE.loaded:
+            await respondNotLoaded(ctx)
+            return
+        profiles = GLOBAL_STATE.profileSaves()
+        totalBytes = sum(profile.saveBytes for profile in profiles)
+        totalSaveSeconds = sum(profile.saveSeconds for profile in profiles)
+        totalLoadSeconds = sum(profile.loadSeconds for profile in profiles)
+        profileString = (f"{len(profiles)} loaded accounts: {totalBytes} bytes, {totalSaveSeconds * 1000:.1f}ms save, " +
+                         f"{totalLoadSeconds * 1000:.1f}ms load\n" +
+                         "\n".join(profile.getSummaryString() for profile in profiles[:count]))
+        await ctx.send(profileString[:2000])
+    else:
+        await ctx.send("This is a dev-only command.")
+
 @bot.command(brief="[OWNER] Toggle secrets",
                     description=f"[BOT OWNER ONLY] This command should be commented out")
 async def toggle_secrets(ctx : commands.Context):
@@ -706,9 +821,11 @@ async def toggle_secrets(ctx : commands.Context):
             ])
             if Milestones.CLASS_STRIKER_UNLOCKED not in currentPlayer.milestones:
                 currentPlayer.milestones = currentPlayer.milestones.union(secretMilestones)
+                currentPlayer.markSaveDirty()
                 await ctx.send(f"secrets enabled", ephemeral=True)
             else:
                 currentPlayer.milestones = currentPlayer.milestones.difference(secretMilestones)
+                currentPlayer.markSaveDirty()
                 await ctx.send(f"secrets disabled", ephemeral=True)
         else:
             await ctx.send("wher character", ephemeral=True)
@@ -16,7 +16,7 @@ from structures.rpg_combat_state import CombatController
 from structures.rpg_dungeons import DungeonController, DungeonData, DungeonInputHandler, IntRoomSetting, PlayerTeamRoomSetting, RoomSetting, SettingsDungeonRoomData
 from structures.rpg_items import Equipment, EquipmentTrait, Weapon, getAdaptOptionsForEquip
 import gameData.rpg_dungeon_data
-from structures.rpg_messages import LogMessageCollection, MessageCollector
+from structures.rpg_messages import LogMessageCollection, MessageCollector, exportMessages
 
 if TYPE_CHECKING:
     from rpg_discord_interface import GameSession, InterfaceView
@@ -633,6 +633,7 @@ def equipMainContentFn(session : GameSession, view : InterfaceView):
             salePrice = focusItem.getSalePrice()
             player.wup += salePrice[0]
             player.swup += salePrice[1]
+            player.markSaveDirty()
             view.pageData.pop('dropItem')
         else:
             view.pageData.pop('tradeItem')
@@ -1289,6 +1290,7 @@ async def updateFormationFn(interaction : discord.Interaction, session : GameSes
     if interaction.user.id != session.userId:
         return await asyncio.sleep(0)
     session.defaultFormationDistance = newDist
+    GLOBAL_STATE.accountDataMap[session.userId].markSaveDirty()
     if session.currentDungeon is not None:
         session.currentDungeon.startingPlayerTeamDistances[player] = newDist
     await view.refresh()
@@ -1299,6 +1301,7 @@ async def enterDungeonFn(interaction : discord.Interaction, session : GameSessio
     if len(dungeon.dungeonRooms) > 0 and isinstance(dungeon.dungeonRooms[0], SettingsDungeonRoomData):
         if dungeon.dungeonRooms[0].roomSettingsKey is not None:
             GLOBAL_STATE.accountDataMap[session.userId].roomSettingMemory[dungeon.dungeonRooms[0].roomSettingsKey] = roomSettings
+            GLOBAL_STATE.accountDataMap[session.userId].markSaveDirty()
     await session.enterDungeon(dungeon, roomSettings)
 async def makePartyFn(interaction : discord.Interaction, session : GameSession, view : InterfaceView, dungeon : DungeonData):
     await interaction.response.defer()
@@ -1884,20 +1887,20 @@ async def sendCombatLogFn(interaction : discord.Interaction, session : GameSessi
     if interaction.user.id != session.userId:
         return await asyncio.sleep(0)
     filterSettings = list(GLOBAL_STATE.accountDataMap[session.userId].enabledLogFilters)
-    messages = logger.sendAllMessages(filterSettings, False)
-    messageString = messages.getMessagesString(filterSettings, False)
+    messageStream = logger.streamAllMessages()
+    # Reading spilled segments and rendering can take a while for long dungeons, so it happens off the event loop
+    logBuffer, compressed = await asyncio.to_thread(exportMessages, messageStream, filterSettings, False)
 
     assert(session.currentMessage is not None)
 
-    combatLogFile = f"{COMBAT_LOG_FILE_PREFIX}{session.userId}_{int(datetime.now().timestamp())}.txt"
-    with open(combatLogFile, "w", encoding="utf-8") as tmp:
-        tmp.write(messageString)
+    combatLogFile = f"{COMBAT_LOG_FILE_NAME}{session.userId}_{int(datetime.now().timestamp())}.txt"
+    if compressed:
+        combatLogFile += ".gz"
 
     channel = session.currentMessage.channel
     mentionString = session.savedMention
-    await channel.send(mentionString, file=discord.File(combatLogFile))
+    await channel.send(mentionString, file=discord.File(logBuffer, filename=combatLogFile))
 
-    os.remove(combatLogFile)
     view.pageData['sentLog'] = True
     await view.refresh()
 DUNGEON_COMPLETE_PAGE = InterfacePage("Exit", discord.ButtonStyle.green, [],
@@ -1948,6 +1951,7 @@ async def toggleFilterFn(interaction : discord.Interaction, session : GameSessio
         enabledFilterSet.remove(newFilter)
     else:
         enabledFilterSet.add(newFilter)
+    GLOBAL_STATE.accountDataMap[session.userId].markSaveDirty()
     await session.currentView.refresh()
 OPTIONS_LOG_PAGE = InterfacePage("Combat Log Filters", discord.ButtonStyle.secondary, [],
                                   optionsLogContent, lambda session: True, changePageCallback)
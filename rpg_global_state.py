@@ -1,28 +1,55 @@
 from __future__ import annotations
-import os
+import asyncio
+import json
 import random
-import shutil
+import time
 import dill as pickle
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 from datetime import datetime
 
 from rpg_consts import *
+from rpg_account_store import AccountStore, AccountArchive
 from structures.rpg_combat_entity import Player
-from structures.rpg_dungeons import DungeonData
+from structures.rpg_dungeons import DungeonData, DungeonController
 
 CURRENT_VERSION = "0.1.4c"
+# Game version of the last saves written by pickling AccountData objects directly
+PICKLED_SAVE_VERSION = "0.1.4c"
+# Version of the data produced by AccountData.getSaveData
+SAVE_FORMAT_VERSION = 1
 
 if TYPE_CHECKING:
     from rpg_discord_interface import GameSession
 
 class GlobalState(object):
-    TS_FILENAME = STATE_FILE_PREFIX + "ts"
-
-    def __init__(self):
-        self.accountDataMap : dict[int, AccountData] = {}
+    def __init__(self, saveFolder : str = STATE_FILE_FOLDER):
+        self.saveFolder = saveFolder
+        self.accountStore = AccountStore(saveFolder + STATE_DB_NAME)
+        self.accountArchive = AccountArchive(saveFolder + STATE_ARCHIVE_NAME)
+        self.accountDataMap = LazyAccountMap()
         self.loaded = False
         self.firstSave = False
 
+        # Save fingerprint of each loaded account as of its last save; accounts whose fingerprint differs get written
+        self.savedFingerprints : dict[int, tuple] = {}
+        self.savesSinceArchive = ARCHIVE_INTERVAL_SAVES
+        self.lastArchiveTimestamp = 0
+
+        # Serialized bytes of each account along with the fingerprint they were taken at
+        self.accountBlobs : dict[int, tuple[tuple, bytes]] = {}
+        self.saveInProgress = False
+        self.lastSaveStats : dict[str, float] = {}
+
+        # Rebuilds a GameSession from (userId, savedMention, defaultFormationDistance); set by the discord interface
+        self.sessionFactory : Callable[[tuple], GameSession] | None = None
+
+        # Running dungeons to checkpoint on each save, with (runKey, memberIds, extraData); see trackDungeon
+        self.activeDungeons : dict[DungeonController, tuple[int, dict[Player, int], dict]] = {}
+        # Checkpoint bytes as of the last save (or load), by runKey
+        self.savedCheckpoints : dict[int, bytes] = {}
+        # Set once the stored checkpoints have been resumed, so they aren't resumed again in this run
+        self.resumedCheckpoints = False
+
     def idRegistered(self, id : int) -> bool:
         return id in self.accountDataMap and len(self.accountDataMap[id].allCharacters) > 0
 
@@ -32,29 +59,81 @@ class GlobalState(object):
         if userId in self.accountDataMap:
             self.accountDataMap[userId].allCharacters.append(player)
             self.accountDataMap[userId].currentCharacter = player
+            self.accountDataMap[userId].markSaveDirty()
         else:
             self.accountDataMap[userId] = AccountData(userId, player, session)
 
+    """
+        Has each save checkpoint the dungeon until untrackDungeon is called. memberIds gives the userId of each
+        player in the run; extraData is stored alongside the checkpoint for whatever resumes it.
+    """
+    def trackDungeon(self, dungeon : DungeonController, memberIds : dict[Player, int], extraData : dict):
+        runKey = min(memberIds.values())
+        self.activeDungeons[dungeon] = (runKey, memberIds, extraData)
+
+    def untrackDungeon(self, dungeon : DungeonController):
+        self.activeDungeons.pop(dungeon, None)
+
+    """ Returns (runKey, checkpoint) for each dungeon that was running as of the last save before this run. """
+    def getStoredCheckpoints(self) -> list[tuple[int, dict]]:
+        return [(runKey, json.loads(data)) for runKey, data in self.accountStore.readCheckpoints()]
+
+    """
+        Writes every loaded account that changed since its last save to the account store. Every
+        ARCHIVE_INTERVAL_SAVES saves, the accounts written since the last archive point are also added to the archive.
+        Blocks until the files are written; the bot uses saveStateInBackground instead. Skipped if a background
+        save is still writing, since it can't be waited on from here without blocking the event loop it finishes on.
+    """
     def saveState(self):
-        if len(self.accountDataMap) == 0:
+        if self.saveInProgress:
+            print("previous save still in progress; skipping")
             return
-        
-        if not os.path.exists(STATE_FILE_FOLDER):
-            os.mkdir(STATE_FILE_FOLDER)
-
-        # Archive old files
-        saveFiles = [f for f in os.listdir(STATE_FILE_FOLDER) if f.startswith(STATE_FILE_NAME) and f != STATE_FILE_NAME + "ts"]
-        saveFiles.sort()
-        print(saveFiles)
-        if len(saveFiles) > ARCHIVE_SIZE + 1:
-            if os.path.exists(STATE_ARCHIVE_FOLDER):
-                shutil.rmtree(STATE_ARCHIVE_FOLDER)
-            os.mkdir(STATE_ARCHIVE_FOLDER)
-            for file in saveFiles[:-1]:
-                os.rename(STATE_FILE_FOLDER + file, STATE_ARCHIVE_FOLDER + file)
-
-        # Save new file, update timestamp tracker
+
+        self.saveInProgress = True
+        try:
+            snapshot = self.prepareSave()
+            if snapshot is None:
+                return
+            self.writeSnapshot(snapshot)
+            self.finishSave(snapshot)
+        finally:
+            self.saveInProgress = False
+
+    """
+        Same as saveState, but only the snapshot is taken on the event loop; file writes happen in a
+        worker thread. Returns the stats for this save, or None if there was nothing to do.
+    """
+    async def saveStateInBackground(self) -> dict[str, float] | None:
+        if self.saveInProgress:
+            print("previous save still in progress; skipping")
+            return None
+
+        self.saveInProgress = True
+        try:
+            snapshot = self.prepareSave()
+            if snapshot is None:
+                return None
+            await asyncio.to_thread(self.writeSnapshot, snapshot)
+            self.finishSave(snapshot)
+            return self.lastSaveStats
+        finally:
+            self.saveInProgress = False
+
+    """
+        Takes the point-in-time copy of everything a save writes. Changed accounts are serialized here,
+        since live objects can't safely be pickled from another thread while the game keeps running.
+        Accounts that were never loaded this run can't have changed, so they're skipped entirely.
+    """
+    def prepareSave(self) -> SaveSnapshot | None:
+        loadedAccounts = self.accountDataMap.loadedAccounts
+        if len(loadedAccounts) == 0 and len(self.activeDungeons) == 0 and len(self.savedCheckpoints) == 0:
+            return None
+        startTime = time.perf_counter()
+
+        isArchive = self.savesSinceArchive >= ARCHIVE_INTERVAL_SAVES
         timestamp = int(datetime.now().timestamp())
+        if timestamp <= self.lastArchiveTimestamp:
+            timestamp = self.lastArchiveTimestamp + 1
 
         # if len(self.accountDataMap) > 0:
         #     print(pickle.detect.baditems(list(self.accountDataMap.values())[0]))
@@ -63,63 +142,332 @@ class GlobalState(object):
         # if isinstance(errors, BaseException):
         #     raise errors
 
-        filename = STATE_FILE_PREFIX + str(timestamp)
-        with open(filename, 'wb') as saveFile:
-            pickle.dump(self.accountDataMap, saveFile, protocol=pickle.HIGHEST_PROTOCOL)
+        records : list[tuple[int, bytes]] = []
+        fingerprints : dict[int, tuple] = {}
+        for userId, accountData in loadedAccounts.items():
+            fingerprint = accountData.getSaveFingerprint()
+            if self.savedFingerprints.get(userId, None) != fingerprint:
+                cachedBlob = self.accountBlobs.get(userId, None)
+                if cachedBlob is None or cachedBlob[0] != fingerprint:
+                    cachedBlob = (fingerprint, encodeAccountData(accountData.getSaveData()))
+                    self.accountBlobs[userId] = cachedBlob
+                records.append((userId, cachedBlob[1]))
+                fingerprints[userId] = fingerprint
 
-        with open(GlobalState.TS_FILENAME, 'w') as timestampFile:
-            timestampFile.write(str(timestamp) + "\n" + CURRENT_VERSION)
+        # Taken along with the accounts, so rewards a run has given out are never saved without its progress (or vice versa)
+        checkpoints : dict[int, bytes] = {}
+        for dungeon, (runKey, memberIds, extraData) in self.activeDungeons.items():
+            checkpointData = dungeon.getCheckpointData(memberIds)
+            if checkpointData is not None:
+                checkpointData["extraData"] = extraData
+                checkpoints[runKey] = json.dumps(checkpointData, separators=(",", ":")).encode()
+        checkpointRecords = [(runKey, data) for runKey, data in checkpoints.items() if self.savedCheckpoints.get(runKey, None) != data]
+        removedCheckpoints = [runKey for runKey in self.savedCheckpoints if runKey not in checkpoints]
 
-        print(f"state saved at {timestamp}")
+        return SaveSnapshot(isArchive, timestamp, records, fingerprints, len(loadedAccounts),
+                            time.perf_counter() - startTime, checkpointRecords, removedCheckpoints)
 
+    """
+        Writes a prepared snapshot out to disk. Only touches the snapshot, so it's safe to run off the event loop.
+    """
+    def writeSnapshot(self, snapshot : SaveSnapshot):
+        startTime = time.perf_counter()
+        if len(snapshot.records) > 0 or len(snapshot.checkpointRecords) > 0 or len(snapshot.removedCheckpoints) > 0:
+            self.accountStore.writeAccounts(snapshot.records, CURRENT_VERSION, snapshot.checkpointRecords, snapshot.removedCheckpoints)
+
+        if snapshot.isArchive:
+            snapshot.archivedAccounts = self.accountArchive.addPoint(self.accountStore, snapshot.timestamp)
+
+        snapshot.writeSeconds = time.perf_counter() - startTime
+
+    def finishSave(self, snapshot : SaveSnapshot):
+        self.savedFingerprints.update(snapshot.fingerprints)
+        for runKey in snapshot.removedCheckpoints:
+            self.savedCheckpoints.pop(runKey, None)
+        self.savedCheckpoints.update(snapshot.checkpointRecords)
+        if snapshot.isArchive:
+            self.savesSinceArchive = 1
+            self.lastArchiveTimestamp = snapshot.timestamp
+        else:
+            self.savesSinceArchive += 1
+
+        self.lastSaveStats = {
+            "archived": snapshot.isArchive,
+            "archivedAccounts": snapshot.archivedAccounts,
+            "accountsWritten": len(snapshot.records),
+            "checkpointsWritten": len(snapshot.checkpointRecords),
+            "totalAccounts": snapshot.totalAccounts,
+            "bytesWritten": sum(len(blob) for _, blob in snapshot.records),
+            "loopBlockedSeconds": snapshot.prepareSeconds,
+            "writeSeconds": snapshot.writeSeconds,
+            "latencySeconds": time.perf_counter() - snapshot.createdAt
+        }
+        print(f"saved {len(snapshot.records)}/{snapshot.totalAccounts} loaded accounts at {snapshot.timestamp}" +
+              (f" (archived {snapshot.archivedAccounts})" if snapshot.isArchive else "") +
+              f" ({self.lastSaveStats['bytesWritten']} bytes; {snapshot.prepareSeconds * 1000:.1f}ms on loop, " +
+              f"{self.lastSaveStats['latencySeconds'] * 1000:.1f}ms total)")
+
+    """
+        Serializes and reloads every loaded account to see where save time and size go, without writing anything.
+        Returns the profiles largest first.
+    """
+    def profileSaves(self) -> list[AccountSaveProfile]:
+        assert(self.sessionFactory is not None)
+        profiles = [profileAccountSave(accountData, self.sessionFactory) for accountData in self.accountDataMap.values()]
+        profiles.sort(key=lambda profile: profile.saveBytes, reverse=True)
+        return profiles
+
+    """
+        Opens the account store; accounts themselves are only read the first time they're looked up.
+        Saves from before the store existed are imported into it once.
+    """
     def loadState(self):
+        self.accountStore.open()
+        if self.accountStore.getMeta("legacyImported") is None:
+            self._importLegacyState()
+            self.accountStore.setMeta("legacyImported", CURRENT_VERSION)
+
+        self.savedCheckpoints = dict(self.accountStore.readCheckpoints())
+
+        archivePoints = self.accountArchive.listPoints()
+        if len(archivePoints) > 0:
+            self.lastArchiveTimestamp = max(self.lastArchiveTimestamp, archivePoints[-1][0])
+
+        self.accountDataMap.loadFn = self._loadAccount
+        self.loaded = True
+
+    def _loadAccount(self, userId : int) -> AccountData | None:
+        storedAccount = self.accountStore.readAccount(userId)
+        if storedAccount is None:
+            return None
+        data, gameVersion = storedAccount
+
+        saveData, upToDate = decodeAccountData(data, gameVersion)
+        assert(self.sessionFactory is not None)
+        accountData = AccountData.fromSaveData(saveData, self.sessionFactory)
+        accountData.session.onLoadReset()
+        if upToDate:
+            # Still an exact copy of what's stored, so this doesn't need to be written or serialized again yet
+            fingerprint = accountData.getSaveFingerprint()
+            self.savedFingerprints[userId] = fingerprint
+            self.accountBlobs[userId] = (fingerprint, data)
+        return accountData
+
+    """
+        Copies the last snapshot (plus anything journaled after it) from the file-based saves into the account
+        store as-is. Accounts keep the version they were saved under and are converted when they're loaded.
+    """
+    def _importLegacyState(self):
         try:
             lastSaveTimestamp = None
-            lastSaveVersion = None
-            with open(GlobalState.TS_FILENAME, 'r') as tsFile:
+            lastSaveVersion = ""
+            with open(self.saveFolder + STATE_FILE_NAME + "ts", 'r') as tsFile:
                 tsFileData = tsFile.read().split("\n")
                 lastSaveTimestamp = int(tsFileData[0])
                 if len(tsFileData) > 1:
                     lastSaveVersion = tsFileData[1]
 
-            if lastSaveTimestamp is not None:
-                filename = STATE_FILE_PREFIX + str(lastSaveTimestamp)
-                with open(filename, 'rb') as saveFile:
-                    self.accountDataMap = pickle.load(saveFile)
-                
-                for accountData in self.accountDataMap.values():
-                    for character in accountData.allCharacters:
-                        character._updateAvailableSkills()
-                    accountData.session.onLoadReset()
-
-                    # Upgrades
-                    if lastSaveVersion != CURRENT_VERSION:
-                        accountData.roomSettingMemory = {}
-                        for character in accountData.allCharacters:
-                            character.summonName = random.choice(DEFAULT_SUMMON_NAMES)
-                            for secretClassName in SecretPlayerClassNames:
-                                if secretClassName not in character.classRanks:
-                                    character.classRanks[secretClassName] = 1
-                                if secretClassName not in character.classExp:
-                                    character.classExp[secretClassName] = 0
-                                
-
-                print(f"loaded state from {lastSaveTimestamp}")
+            with open(self.saveFolder + STATE_FILE_NAME + str(lastSaveTimestamp), 'rb') as saveFile:
+                savedAccounts = pickle.load(saveFile)
+            accountRecords : dict[int, bytes] = {}
+            for userId, accountData in savedAccounts.items():
+                # Older snapshots pickled the whole map at once rather than one account at a time
+                if not isinstance(accountData, bytes):
+                    accountData = pickle.dumps(accountData, protocol=pickle.HIGHEST_PROTOCOL)
+                accountRecords[userId] = accountData
+            replayedCount = self._replayLegacyJournal(lastSaveTimestamp, accountRecords)
+
+            self.accountStore.writeAccounts(list(accountRecords.items()), lastSaveVersion)
+            self.lastArchiveTimestamp = lastSaveTimestamp
+            print(f"imported state from {lastSaveTimestamp} (+{replayedCount} journaled)")
         except FileNotFoundError:
             print("unable to load previous state")
 
-        self.loaded = True
+    """
+        Applies journaled accounts on top of a legacy snapshot. Records from a journal started against a
+        different snapshot are skipped, and a record cut off partway through (e.g. by a crash) ends the replay.
+    """
+    def _replayLegacyJournal(self, snapshotTimestamp : int, accountRecords : dict[int, bytes]) -> int:
+        replayed = 0
+        try:
+            with open(self.saveFolder + STATE_JOURNAL_NAME, 'rb') as journalFile:
+                header = pickle.load(journalFile)
+                if header != ("base", snapshotTimestamp):
+                    return 0
+                while True:
+                    try:
+                        userId, accountData = pickle.load(journalFile)
+                    except EOFError:
+                        break
+                    except pickle.UnpicklingError:
+                        print("journal ended with an incomplete record")
+                        break
+                    if not isinstance(accountData, bytes):
+                        accountData = pickle.dumps(accountData, protocol=pickle.HIGHEST_PROTOCOL)
+                    accountRecords[userId] = accountData
+                    replayed += 1
+        except (FileNotFoundError, EOFError):
+            return 0
+        return replayed
 
     def deleteCharacter(self, userId, character):
         if userId not in self.accountDataMap:
             return
         accountData = self.accountDataMap[userId]
         accountData.allCharacters.remove(character)
+        accountData.markSaveDirty()
         if accountData.currentCharacter == character:
             if len(accountData.allCharacters) > 0:
                 accountData.currentCharacter = accountData.allCharacters[0]
 
+"""
+    Dict-like map from userId to AccountData that only reads an account from the store the first time
+    it's looked up. Iterating only covers accounts loaded (or created) so far this run.
+"""
+class LazyAccountMap(object):
+    def __init__(self):
+        self.loadedAccounts : dict[int, AccountData] = {}
+        self.missingIds : set[int] = set()
+        self.loadFn : Callable[[int], AccountData | None] | None = None
+
+    def _tryLoad(self, userId : int) -> AccountData | None:
+        accountData = self.loadedAccounts.get(userId, None)
+        if accountData is None and self.loadFn is not None and userId not in self.missingIds:
+            accountData = self.loadFn(userId)
+            if accountData is None:
+                self.missingIds.add(userId)
+            else:
+                self.loadedAccounts[userId] = accountData
+        return accountData
+
+    def __contains__(self, userId : int) -> bool:
+        return self._tryLoad(userId) is not None
+
+    def __getitem__(self, userId : int) -> AccountData:
+        accountData = self._tryLoad(userId)
+        if accountData is None:
+            raise KeyError(userId)
+        return accountData
+
+    def __setitem__(self, userId : int, accountData : AccountData):
+        self.loadedAccounts[userId] = accountData
+        self.missingIds.discard(userId)
+
+    def __len__(self) -> int:
+        return len(self.loadedAccounts)
+
+    def get(self, userId : int, default : AccountData | None = None) -> AccountData | None:
+        accountData = self._tryLoad(userId)
+        return default if accountData is None else accountData
+
+    def items(self):
+        return self.loadedAccounts.items()
+
+    def values(self):
+        return self.loadedAccounts.values()
+
+"""
+    A consistent copy of everything one save writes, taken on the event loop by GlobalState.prepareSave.
+"""
+class SaveSnapshot(object):
+    def __init__(self, isArchive : bool, timestamp : int, records : list[tuple[int, bytes]],
+                 fingerprints : dict[int, tuple], totalAccounts : int, prepareSeconds : float,
+                 checkpointRecords : list[tuple[int, bytes]] | None = None, removedCheckpoints : list[int] | None = None):
+        self.isArchive = isArchive
+        self.timestamp = timestamp
+        self.records = records
+        self.checkpointRecords = checkpointRecords if checkpointRecords is not None else []
+        self.removedCheckpoints = removedCheckpoints if removedCheckpoints is not None else []
+        self.fingerprints = fingerprints
+        self.totalAccounts = totalAccounts
+        self.prepareSeconds = prepareSeconds
+        self.writeSeconds = 0.0
+        self.archivedAccounts = 0
+        self.createdAt = time.perf_counter() - prepareSeconds
+
+def encodeAccountData(saveData : dict) -> bytes:
+    return json.dumps(saveData, separators=(",", ":")).encode()
+
+"""
+    Reads stored account data, migrating it to SAVE_FORMAT_VERSION if needed. Also handles accounts stored
+    as pickled AccountData objects before the save format existed.
+    Returns the data along with whether it was already current (i.e. doesn't need to be rewritten).
+"""
+def decodeAccountData(data : bytes, gameVersion : str) -> tuple[dict, bool]:
+    if data[:1] == b"{":
+        saveData = json.loads(data)
+    else:
+        pickledAccount : AccountData = pickle.loads(data)
+        if gameVersion != PICKLED_SAVE_VERSION:
+            # May predate these fields entirely; the migration fills them in properly
+            pickledAccount.roomSettingMemory = {}
+            for character in pickledAccount.allCharacters:
+                character.summonName = ""
+        saveData = pickledAccount.getSaveData()
+        if gameVersion != PICKLED_SAVE_VERSION:
+            saveData["formatVersion"] = 0
+
+    upToDate = data[:1] == b"{" and saveData["formatVersion"] == SAVE_FORMAT_VERSION
+    while saveData["formatVersion"] < SAVE_FORMAT_VERSION:
+        saveData = SAVE_FORMAT_MIGRATIONS[saveData["formatVersion"]](saveData)
+        saveData["formatVersion"] += 1
+    return saveData, upToDate
+
+""" Pickled saves from before 0.1.4c: secret classes, summon names, and room setting memory were added. """
+def _migrateFromPrePickledVersion(saveData : dict) -> dict:
+    saveData["roomSettingMemory"] = {}
+    for characterData in saveData["characters"]:
+        characterData["summonName"] = random.choice(DEFAULT_SUMMON_NAMES)
+        for secretClassName in SecretPlayerClassNames:
+            characterData["classRanks"].setdefault(secretClassName.name, 1)
+            characterData["classExp"].setdefault(secretClassName.name, 0)
+    return saveData
+
+# Upgrades saved data from the keyed format version to the next one
+SAVE_FORMAT_MIGRATIONS : dict[int, Callable[[dict], dict]] = {
+    0: _migrateFromPrePickledVersion
+}
+
+"""
+    Time and bytes spent serializing one account, and how much of that each of its characters accounts for.
+    Load time covers decoding the bytes and rebuilding the AccountData from them.
+"""
+class AccountSaveProfile(object):
+    def __init__(self, userId : int, saveSeconds : float, loadSeconds : float, saveBytes : int,
+                 characterProfiles : list[tuple[str, int, float, int]]):
+        self.userId = userId
+        self.saveSeconds = saveSeconds
+        self.loadSeconds = loadSeconds
+        self.saveBytes = saveBytes
+        # (name, inventory size, serialization seconds, bytes) for each character
+        self.characterProfiles = characterProfiles
+
+    def getSummaryString(self) -> str:
+        characterStrings = [f"{name} ({inventorySize} items, {characterBytes} bytes, {characterSeconds * 1000:.2f}ms)"
+                            for name, inventorySize, characterSeconds, characterBytes in self.characterProfiles]
+        return (f"{self.userId}: {self.saveBytes} bytes, {self.saveSeconds * 1000:.2f}ms save, {self.loadSeconds * 1000:.2f}ms load; " +
+                ", ".join(characterStrings))
+
+def profileAccountSave(accountData : AccountData, sessionFactory : Callable[[tuple], GameSession]) -> AccountSaveProfile:
+    startTime = time.perf_counter()
+    data = encodeAccountData(accountData.getSaveData())
+    saveSeconds = time.perf_counter() - startTime
+
+    characterProfiles = []
+    for character in accountData.allCharacters:
+        startTime = time.perf_counter()
+        characterBytes = len(encodeAccountData(character.getSaveData()))
+        characterProfiles.append((character.name, len(character.inventory), time.perf_counter() - startTime, characterBytes))
+
+    startTime = time.perf_counter()
+    AccountData.fromSaveData(decodeAccountData(data, CURRENT_VERSION)[0], sessionFactory)
+    loadSeconds = time.perf_counter() - startTime
+    return AccountSaveProfile(accountData.userId, saveSeconds, loadSeconds, len(data), characterProfiles)
+
 class AccountData(object):
+    # class-level default for accounts loaded from saves predating the counter
+    saveVersion : int = 0
+
     def __init__(self, userId : int, character : Player, session : GameSession):
         self.userId = userId
         self.currentCharacter = character
@@ -135,5 +483,41 @@ class AccountData(object):
 
         self.allCharacters = [self.currentCharacter]
         self.roomSettingMemory : dict[str, dict] = {}
+        self.saveVersion : int = 0
+
+    """
+        Should be called whenever account-level settings change (current character, filters, room settings,
+        session preferences). Character changes are tracked on each Player.
+    """
+    def markSaveDirty(self) -> None:
+        self.saveVersion += 1
+
+    """ Returns the account as plain data for saving; see encodeAccountData and fromSaveData. """
+    def getSaveData(self) -> dict:
+        return {
+            "formatVersion": SAVE_FORMAT_VERSION,
+            "userId": self.userId,
+            "savedMention": self.session.savedMention,
+            "defaultFormationDistance": self.session.defaultFormationDistance,
+            "characters": [character.getSaveData() for character in self.allCharacters],
+            "currentCharacter": self.allCharacters.index(self.currentCharacter),
+            "enabledLogFilters": sorted(logFilter.name for logFilter in self.enabledLogFilters),
+            "roomSettingMemory": self.roomSettingMemory
+        }
+
+    @staticmethod
+    def fromSaveData(saveData : dict, sessionFactory : Callable[[tuple], GameSession]) -> AccountData:
+        accountData = AccountData.__new__(AccountData)
+        accountData.userId = saveData["userId"]
+        accountData.session = sessionFactory((saveData["userId"], saveData["savedMention"], saveData["defaultFormationDistance"]))
+        accountData.allCharacters = [Player.fromSaveData(characterData) for characterData in saveData["characters"]]
+        accountData.currentCharacter = accountData.allCharacters[saveData["currentCharacter"]]
+        accountData.enabledLogFilters = set(MessageType[logFilter] for logFilter in saveData["enabledLogFilters"])
+        accountData.roomSettingMemory = saveData["roomSettingMemory"]
+        accountData.saveVersion = 0
+        return accountData
+
+    def getSaveFingerprint(self) -> tuple:
+        return (self.saveVersion, tuple((id(character), character.saveVersion) for character in self.allCharacters))
 
 GLOBAL_STATE = GlobalState()
\ No newline at end of file
@@ -14,6 +14,7 @@ from structures.rpg_dungeons import *
 from gameData.rpg_dungeon_data import *
 from structures.rpg_items import *
 from structures.rpg_messages import LocalMessageCollector, MessageCollector
+from structures.rpg_simulation import CombatSimulator, DungeonSimulator
 from rpg_loadout_testing import *
 from gameData.rpg_enemy_data import *
 from gameData.rpg_enemy_data2 import *
@@ -38,6 +39,18 @@ async def betterCombatSimulation(players : list[Player], enemies : list[Enemy])
 
     await ci.runCombat()
 
+def headlessCombatSimulation(players : list[Player], enemyTeamFactory : Callable[[random.Random], list[Enemy]],
+                             numFights : int, seed : int | None = None) -> None:
+    simulator = CombatSimulator(players, enemyTeamFactory, seed=seed)
+    report = simulator.runFights(numFights)
+    print(report.getReportString())
+
+def monteCarloDungeonSimulation(dungeon : DungeonData, players : list[Player], numRuns : int,
+                                workers : int | None = None, seed : int | None = None) -> None:
+    simulator = DungeonSimulator(dungeon, players, seed=seed)
+    report = simulator.runDungeons(numRuns, workers)
+    print(report.getReportString())
+
 def rerollWeapon(player : Player, testRarity : int = 0):
     weaponClass = random.choice(list(filter(
         lambda wc: any([baseClass in weaponTypeAttributeMap[weaponClassAttributeMap[wc].weaponType].permittedClasses
@@ -62,6 +75,8 @@ if __name__ == '__main__':
     asyncio.run(dungeonController.runDungeon(False))
 
     # asyncio.run(betterCombatSimulation([test_knight], [arenaSaint({'roomNumber': 4})]))
+    # monteCarloDungeonSimulation(caveDungeon, [test_knight, test_sniper, test_saint], 1000, seed=0)
+    # headlessCombatSimulation([tp_knight, tp_sniper, tp_saint], lambda rng: [arenaSaint({'roomNumber': 4}, rng)], 1000, seed=0)
 
     # print(tp_mercenary.getTotalStatString())
     # print("--")
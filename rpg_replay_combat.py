@@ -0,0 +1,51 @@
+import argparse
+
+from rpg_consts import *
+from structures.rpg_messages import MessageCollector
+from structures.rpg_replay import CombatReplayRecord, loadCombatReplay, replayCombat
+from structures.rpg_replay_archive import BinaryCombatReplay
+
+"""
+    Replays a recorded fight (see structures/rpg_replay.py) headlessly, printing the fight log as one of the players
+    saw it and whether the replay matched the record. Takes JSON records or binary archived ones.
+"""
+
+def loadReplayFile(filename : str) -> CombatReplayRecord:
+    with open(filename, 'rb') as replayFile:
+        isBinary = replayFile.read(len(BinaryCombatReplay.MAGIC)) == BinaryCombatReplay.MAGIC
+    if not isBinary:
+        return loadCombatReplay(filename)
+    binaryReplay = BinaryCombatReplay.openFile(filename)
+    try:
+        return binaryReplay.toRecord()
+    finally:
+        binaryReplay.close()
+
+def replayCombatFile(filename : str, playerIndex : int, quiet : bool):
+    record = loadReplayFile(filename)
+    logger = MessageCollector()
+    result = replayCombat(record, {playerIndex: logger})
+    if not quiet:
+        print(logger.sendAllMessages(None, False).getMessagesString(None, True))
+
+    outcome = {True: "victory", False: "defeat", None: "unfinished"}
+    print(f"seed {record.seed}: {result.turnCount} turns, {outcome[result.playerVictory]} " +
+          f"(recorded: {record.turnCount} turns, {outcome[record.playerVictory]})")
+    divergence = result.findDivergence()
+    if result.matchesRecord():
+        print("replay matches the record")
+    elif result.error is not None:
+        print(f"replay diverged: {result.error}")
+    elif divergence is not None:
+        print(f"replay diverged at action {divergence}: recorded {record.actions[divergence] if divergence < len(record.actions) else None}, " +
+              f"replayed {result.actions[divergence] if divergence < len(result.actions) else None}")
+    else:
+        print(f"replay diverged: final health {result.finalHealth}, recorded {record.finalHealth}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a recorded fight and check it against the record.")
+    parser.add_argument("replay", help="combat replay file")
+    parser.add_argument("--player", type=int, default=0, help="index of the player whose view of the log is printed (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="only print the outcome")
+    args = parser.parse_args()
+    replayCombatFile(args.replay, args.player, args.quiet)
@@ -0,0 +1,60 @@
+import argparse
+import os
+from datetime import datetime
+
+from rpg_consts import *
+from rpg_account_store import AccountStore, AccountArchive
+
+"""
+    Lists the points in the save archive, or rebuilds the account store as of one of them.
+    The restored store is written to a new file; stop the bot and move it over saves/accounts.db to use it.
+"""
+
+def listArchivePoints(archive : AccountArchive):
+    points = archive.listPoints()
+    if len(points) == 0:
+        print(f"no archive points in {archive.folder}")
+        return
+    totalSize = 0
+    for timestamp, isBase, filename in points:
+        fileSize = os.path.getsize(archive.folder + filename)
+        totalSize += fileSize
+        print(f"{timestamp}  {datetime.fromtimestamp(timestamp).isoformat(' ')}  {'base ' if isBase else 'delta'}  {fileSize / 1024:.1f}KB")
+    print(f"{len(points)} points, {totalSize / 1024:.1f}KB total")
+
+def restoreArchivePoint(archive : AccountArchive, timestamp : int, outputFilename : str):
+    if os.path.exists(outputFilename):
+        raise FileExistsError(f"{outputFilename} already exists")
+    pointTimestamp, accounts = archive.restorePoint(timestamp)
+
+    # Versions can differ between accounts, so each group is written separately
+    recordsByVersion : dict[str, list[tuple[int, bytes]]] = {}
+    for userId, (data, gameVersion) in accounts.items():
+        recordsByVersion.setdefault(gameVersion, []).append((userId, data))
+
+    store = AccountStore(outputFilename)
+    store.open()
+    try:
+        for gameVersion, records in recordsByVersion.items():
+            store.writeAccounts(records, gameVersion)
+        store.setMeta("legacyImported", "restored")
+    finally:
+        store.close()
+    print(f"restored {len(accounts)} accounts as of {pointTimestamp} " +
+          f"({datetime.fromtimestamp(pointTimestamp).isoformat(' ')}) into {outputFilename}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or restore from the save archive.")
+    parser.add_argument("--archive", default=STATE_ARCHIVE_FOLDER, help="archive folder (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="show every archive point")
+    restoreParser = subparsers.add_parser("restore", help="rebuild the account store as of a point")
+    restoreParser.add_argument("timestamp", type=int, help="uses the latest point at or before this timestamp")
+    restoreParser.add_argument("output", help="new account store file to create")
+    args = parser.parse_args()
+
+    archive = AccountArchive(args.archive if args.archive.endswith("/") else args.archive + "/")
+    if args.command == "list":
+        listArchivePoints(archive)
+    else:
+        restoreArchivePoint(archive, args.timestamp, args.output)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+from typing import Callable
+import csv
+import inspect
+import random
+
+import numpy as np
+
+from rpg_consts import *
+from structures.rpg_combat_entity import CombatEntity, Enemy, Player
+from structures.rpg_combat_formulas import getDamageFactorArray, getHitChanceArray
+from structures.rpg_combat_state import CombatController
+from structures.rpg_dungeons import DungeonData, SettingsDungeonRoomData
+from gameData.rpg_enemy_data import basicDummy
+# Registers the dungeons that getDungeonEnemies reads from
+import gameData.rpg_dungeon_data
+
+"""
+    Expected basic attack outcomes for every pairing of two groups of entities (e.g. player builds against every
+    dungeon enemy), evaluated as array operations over the whole cross product. Follows rollForHit and
+    rollForDamage, including luck, crits, attributes, and range, but not skills, buffs gained during the fight,
+    defending, or damage being rounded up.
+"""
+
+ATTACK_ATTRIBUTES : list[AttackAttribute] = list(PhysicalAttackAttribute) + list(MagicalAttackAttribute)
+ANALYSIS_INT_STATS : list[Stats] = list(BaseStats) + [CombatStats.LUCK, CombatStats.RANGE, CombatStats.IGNORE_RANGE_CHECK,
+                                                      CombatStats.ACC_EFFECTIVE_DISTANCE_MOD, CombatStats.OPPORTUNISM,
+                                                      CombatStats.FIXED_ATTACK_POWER]
+ANALYSIS_FLOAT_STATS : list[Stats] = [CombatStats.CRIT_RATE, CombatStats.CRIT_DAMAGE, CombatStats.ACCURACY_DISTANCE_MOD,
+                                      CombatStats.DAMAGE_REDUCTION, CombatStats.WEAKNESS_MODIFIER, CombatStats.RESISTANCE_MODIFIER,
+                                      CombatStats.BONUS_WEAKNESS_DAMAGE_MULT, CombatStats.IGNORE_RESISTANCE_MULT]
+DISTANCES = np.arange(MAX_DISTANCE + 1)
+
+"""
+    Each entity's total stats as they'd be at the start of a fight (passives and equipment traits applied), one
+    array entry per entity. Also holds each one's basic attack type and attribute, and how many times it's weak
+    or resistant to each of ATTACK_ATTRIBUTES.
+"""
+class EntityStatTable(object):
+    def __init__(self, names : list[str], stats : dict[Stats, np.ndarray], isPhysical : np.ndarray, attackAttributes : np.ndarray,
+                 weaknesses : np.ndarray, resistances : np.ndarray):
+        self.names = names
+        self.stats = stats
+        self.isPhysical = isPhysical
+        self.attackAttributes = attackAttributes
+        self.weaknesses = weaknesses
+        self.resistances = resistances
+
+    """
+        Reads each entity's stats from its own fight against a training dummy, so passives that only apply in
+        combat are included without the entities affecting each other.
+    """
+    @staticmethod
+    def fromEntities(entities : list[CombatEntity], names : list[str] | None = None) -> EntityStatTable:
+        statRows : dict[Stats, list[float]] = {stat: [] for stat in ANALYSIS_INT_STATS + ANALYSIS_FLOAT_STATS}
+        isPhysical, attackAttributes = [], []
+        weaknesses, resistances = [], []
+        for entity in entities:
+            if isinstance(entity, Player):
+                controller = CombatController([entity], [basicDummy({})], {}, {}, lambda entity, enemyTeam: None)
+            else:
+                controller = CombatController([Player("dummy", BasePlayerClassNames.WARRIOR)], [entity], {}, {},
+                                              lambda entity, enemyTeam: None)
+            state = controller.combatStateMap[entity]
+            for stat in ANALYSIS_INT_STATS:
+                statRows[stat].append(state.getTotalStatValue(stat))
+            for stat in ANALYSIS_FLOAT_STATS:
+                statRows[stat].append(state.getTotalStatValueFloat(stat))
+
+            entityIsPhysical = entity.basicAttackType != AttackType.MAGIC
+            isPhysical.append(entityIsPhysical)
+            attackAttributes.append(ATTACK_ATTRIBUTES.index(state.getCurrentAttackAttribute(entityIsPhysical)))
+            weaknesses.append([state.weaknesses.count(attribute) for attribute in ATTACK_ATTRIBUTES])
+            resistances.append([state.resistances.count(attribute) for attribute in ATTACK_ATTRIBUTES])
+
+        stats = {stat: np.array(values, dtype=np.int64 if stat in ANALYSIS_INT_STATS else np.float64) for stat, values in statRows.items()}
+        return EntityStatTable([entity.name for entity in entities] if names is None else names, stats, np.array(isPhysical, dtype=bool),
+                               np.array(attackAttributes, dtype=np.int64), np.array(weaknesses).reshape(-1, len(ATTACK_ATTRIBUTES)),
+                               np.array(resistances).reshape(-1, len(ATTACK_ATTRIBUTES)))
+
+    def __len__(self):
+        return len(self.names)
+
+"""
+    Expected results of each attacker's basic attack against each defender. Arrays are indexed
+    [attacker, defender] or [attacker, defender, distance], with distances 0..MAX_DISTANCE.
+        hitChance: chance to hit, after luck (regardless of range)
+        inRange: whether the attacker can attack from that distance
+        damagePerHit: expected damage when it hits, after variation, crits, attributes, and damage reduction
+        expectedDamage: expected damage per attack (0 when out of range)
+        turnsToKill: attacks it takes on average to defeat the defender from full HP: the hits needed at
+            damagePerHit, over hitChance (inf when out of range)
+"""
+class MatchupMatrix(object):
+    def __init__(self, attackers : EntityStatTable, defenders : EntityStatTable):
+        self.attackers = attackers
+        self.defenders = defenders
+        attackerStats, defenderStats = attackers.stats, defenders.stats
+
+        # Positive luck favors the defender for hits and crits, as in rollForHit and rollForDamage
+        totalLuck = defenderStats[CombatStats.LUCK][None, :] - attackerStats[CombatStats.LUCK][:, None]
+
+        effectiveDistance = np.clip(DISTANCES[None, :] + attackerStats[CombatStats.ACC_EFFECTIVE_DISTANCE_MOD][:, None], 0, MAX_DISTANCE)
+        rawHitChance = getHitChanceArray(attackerStats[BaseStats.ACC][:, None, None], defenderStats[BaseStats.AVO][None, :, None],
+                                         effectiveDistance[:, None, :], attackerStats[CombatStats.ACCURACY_DISTANCE_MOD][:, None, None])
+        self.hitChance : np.ndarray = _getLuckyChance(rawHitChance, totalLuck[:, :, None])
+        self.inRange : np.ndarray = (DISTANCES[None, :] <= attackerStats[CombatStats.RANGE][:, None]) | \
+            (attackerStats[CombatStats.IGNORE_RANGE_CHECK][:, None] != 0)
+
+        isPhysical = attackers.isPhysical[:, None]
+        offenseStat = np.where(attackers.isPhysical, attackerStats[BaseStats.ATK], attackerStats[BaseStats.MAG])
+        offenseStat = np.where(attackerStats[CombatStats.FIXED_ATTACK_POWER] > 0, attackerStats[CombatStats.FIXED_ATTACK_POWER], offenseStat)
+        defenseStat = np.where(isPhysical, defenderStats[BaseStats.DEF][None, :], defenderStats[BaseStats.RES][None, :])
+        defenseStat = np.where(attackerStats[CombatStats.OPPORTUNISM][:, None] == 1,
+                               np.minimum(defenderStats[BaseStats.DEF], defenderStats[BaseStats.RES])[None, :], defenseStat)
+        damageFactor = getDamageFactorArray(offenseStat[:, None], defenseStat)
+
+        critChance = _getLuckyChance(attackerStats[CombatStats.CRIT_RATE][:, None], totalLuck)
+        critMultiplier = 1 + critChance * (attackerStats[CombatStats.CRIT_DAMAGE][:, None] - 1)
+        variationMultiplier = 0.9 + 0.2 * _getLuckyMeanRoll(-totalLuck)
+
+        weaknessInstances = defenders.weaknesses[:, attackers.attackAttributes].T
+        resistanceInstances = defenders.resistances[:, attackers.attackAttributes].T
+        weaknessModifier = defenderStats[CombatStats.WEAKNESS_MODIFIER][None, :] * attackerStats[CombatStats.BONUS_WEAKNESS_DAMAGE_MULT][:, None]
+        resistanceModifier = np.maximum(defenderStats[CombatStats.RESISTANCE_MODIFIER][None, :] *
+                                        attackerStats[CombatStats.IGNORE_RESISTANCE_MULT][:, None], 0)
+        attributeMultiplier = (1 + weaknessModifier) ** weaknessInstances * (1 + resistanceModifier) ** -resistanceInstances.astype(np.float64)
+
+        self.damagePerHit : np.ndarray = (offenseStat[:, None] * damageFactor * variationMultiplier * critMultiplier * attributeMultiplier
+                                          * (1 - defenderStats[CombatStats.DAMAGE_REDUCTION][None, :]))
+        self.expectedDamage : np.ndarray = self.hitChance * self.damagePerHit[:, :, None] * self.inRange[:, None, :]
+        with np.errstate(divide="ignore", over="ignore", invalid="ignore"):
+            hitsToKill = np.ceil(defenderStats[BaseStats.HP][None, :] / self.damagePerHit)
+            self.turnsToKill : np.ndarray = np.where(self.expectedDamage > 0, hitsToKill[:, :, None] / self.hitChance, np.inf)
+
+""" Chance of a luck-weighted roll (see CombatController._luckWeightedUniform) landing at or under chance. """
+def _getLuckyChance(chance : np.ndarray, totalLuck : np.ndarray) -> np.ndarray:
+    chance = np.clip(chance, 0, 1)
+    rollCount = 1 + np.abs(totalLuck)
+    return np.where(totalLuck > 0, chance ** rollCount, np.where(totalLuck < 0, 1 - (1 - chance) ** rollCount, chance))
+
+""" Mean of a luck-weighted roll: the max (or min, for negative luck) of 1 + |luck| uniform draws. """
+def _getLuckyMeanRoll(totalLuck : np.ndarray) -> np.ndarray:
+    rollCount = 1 + np.abs(totalLuck)
+    return np.where(totalLuck > 0, rollCount / (rollCount + 1), np.where(totalLuck < 0, 1 / (rollCount + 1), 0.5))
+
+"""
+    Spawns every enemy that can appear in a (non-PvP) dungeon, once per room it appears in, with that room's
+    params (or its settings' defaults). Enemies with random variants are spawned from rng.
+    Returns (label, enemy) pairs.
+"""
+def getDungeonEnemies(rng : random.Random | None = None) -> list[tuple[str, Enemy]]:
+    if rng is None:
+        rng = random.Random(0)
+    enemies : list[tuple[str, Enemy]] = []
+    for dungeon in DungeonData.registeredDungeons:
+        if dungeon.pvpMode:
+            continue
+        for roomIndex, room in enumerate(dungeon.dungeonRooms):
+            params = room.params
+            if isinstance(room, SettingsDungeonRoomData):
+                params = {roomSetting.settingKey: roomSetting.settingDefault for roomSetting in room.roomSettings}
+            spawners : list[Callable[[dict], Enemy]] = []
+            for enemyGroup in room.enemyGroups:
+                spawners += [spawner for spawner in enemyGroup if spawner not in spawners]
+            for spawner in spawners:
+                if "rng" in inspect.signature(spawner).parameters:
+                    enemy = spawner(dict(params), random.Random(rng.getrandbits(64))) # type: ignore
+                else:
+                    enemy = spawner(dict(params))
+                enemies.append((f"{dungeon.shortDungeonName} {roomIndex + 1}: {enemy.name}", enemy))
+    return enemies
+
+"""
+    Writes one row per build/enemy pair: each side's hit chance, expected damage, and turns to kill at every
+    distance, plus damage per hit. buildMatchups has builds attacking enemies, and enemyMatchups the reverse.
+"""
+def writeMatchupCsv(filename : str, buildMatchups : MatchupMatrix, enemyMatchups : MatchupMatrix):
+    distanceColumns = lambda prefix: [f"{prefix}{distance}" for distance in DISTANCES]
+    header = ["build", "enemy", "buildDamagePerHit"] + distanceColumns("buildHitChance") + distanceColumns("buildExpectedDamage") + \
+        distanceColumns("buildTurnsToKill") + ["enemyDamagePerHit"] + distanceColumns("enemyHitChance") + \
+        distanceColumns("enemyExpectedDamage") + distanceColumns("enemyTurnsToKill")
+
+    builds, enemies = buildMatchups.attackers.names, buildMatchups.defenders.names
+    buildHitChance = buildMatchups.hitChance.round(4).tolist()
+    buildExpectedDamage = buildMatchups.expectedDamage.round(2).tolist()
+    buildTurnsToKill = buildMatchups.turnsToKill.round(2).tolist()
+    buildDamagePerHit = buildMatchups.damagePerHit.round(2).tolist()
+    enemyHitChance = enemyMatchups.hitChance.round(4).tolist()
+    enemyExpectedDamage = enemyMatchups.expectedDamage.round(2).tolist()
+    enemyTurnsToKill = enemyMatchups.turnsToKill.round(2).tolist()
+    enemyDamagePerHit = enemyMatchups.damagePerHit.round(2).tolist()
+    with open(filename, "w", newline="") as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(header)
+        for b, build in enumerate(builds):
+            for e, enemy in enumerate(enemies):
+                writer.writerow([build, enemy, buildDamagePerHit[b][e]] + buildHitChance[b][e] + buildExpectedDamage[b][e] +
+                                buildTurnsToKill[b][e] + [enemyDamagePerHit[e][b]] + enemyHitChance[e][b] +
+                                enemyExpectedDamage[e][b] + enemyTurnsToKill[e][b])
@@ -190,6 +190,7 @@ class PassiveSkillData(SkillData):
             entity.flatStatMod[stat] = entity.flatStatMod.get(stat, 0) + self.flatStatBonuses[stat]
         for stat in self.multStatBonuses:
             entity.multStatMod[stat] = entity.multStatMod.get(stat, 1) * self.multStatBonuses[stat]
+        entity.markStatsChanged()
 
         entity.passiveBonusSkills.append(self)
 
@@ -201,6 +202,7 @@ class PassiveSkillData(SkillData):
             entity.flatStatMod[stat] -= self.flatStatBonuses[stat]
         for stat in self.multStatBonuses:
             entity.multStatMod[stat] /= self.multStatBonuses[stat]
+        entity.markStatsChanged()
 
         entity.passiveBonusSkills.remove(self)
 
@@ -1,4 +1,6 @@
 from __future__ import annotations
+import copy
+import inspect
 import random
 from typing import TYPE_CHECKING, Callable
 
@@ -12,6 +14,9 @@ if TYPE_CHECKING:
     from structures.rpg_combat_state import CombatController
 
 class CombatEntity(object):
+    # class-level default so that entities loaded from saves predating the counter still have one
+    statVersion : int = 0
+
     def __init__(self, name : str, level : int, aggroDecayFactor : float,
                  passiveSkills : list[SkillData], activeSkills : list[SkillData],
                  shortName : str = "", description = "",
@@ -24,6 +29,7 @@ class CombatEntity(object):
         self.baseStats : dict[BaseStats, int] = {}
         self.flatStatMod : dict[Stats, float] = {}
         self.multStatMod : dict[Stats, float] = {}
+        self.statVersion : int = 0
         self.description = description
         self.encounterMessage = encounterMessage
         self.defeatMessage = defeatMessage
@@ -64,6 +70,13 @@ ACC: {self.baseStats[BaseStats.ACC]}, AVO: {self.baseStats[BaseStats.AVO]}, SPD:
 
     def getStatValue(self, stat : Stats) -> int:
         return round(self.getStatValueFloat(stat))
+
+    """
+        Should be called whenever baseStats, flatStatMod, or multStatMod change, so that cached
+        combat stats (see EntityCombatState) are recomputed.
+    """
+    def markStatsChanged(self) -> None:
+        self.statVersion += 1
     
     def makeSummon(self, name : str, shortName : str, description : str,
                    summoner : CombatEntity, summonClass : PlayerClassNames, baseStatBonuses : dict[BaseStats, int],
@@ -74,10 +87,18 @@ ACC: {self.baseStats[BaseStats.ACC]}, AVO: {self.baseStats[BaseStats.AVO]}, SPD:
         else:
             assert(False) # not supported yet
 
+PLAYER_CLASS_NAME_MAP : dict[str, PlayerClassNames] = {className.name : className
+                                                        for classNameSet in [BasePlayerClassNames, AdvancedPlayerClassNames, SecretPlayerClassNames]
+                                                        for className in classNameSet}
+
 class Player(CombatEntity):
+    # class-level default for players loaded from saves predating the counter
+    saveVersion : int = 0
+
     """Initializes the Player at level 1"""
     def __init__(self, name : str, playerClass : PlayerClassNames) -> None:
         super().__init__(name, 1, 0, [], [])
+        self.saveVersion : int = 0
 
         self.playerExp : int = 0
 
@@ -112,12 +133,24 @@ class Player(CombatEntity):
             if baseClass == self.currentPlayerClass:
                 self.equipItem(newWeapon)
 
+    """
+        Should be called whenever anything that gets saved changes, so that the next save includes this
+        player's account (see GlobalState.saveState). Stat changes count automatically.
+    """
+    def markSaveDirty(self) -> None:
+        self.saveVersion += 1
+
+    def markStatsChanged(self) -> None:
+        super().markStatsChanged()
+        self.markSaveDirty()
+
     def _updateBaseStats(self) -> None:
         for baseStat in BaseStats:
             base : int = baseStatValues_base[baseStat]
             level : int = self.statLevels[baseStat]
             increment : int = baseStatValues_perLevel[baseStat]
             self.baseStats[baseStat] = base + (level * increment)
+        self.markStatsChanged()
 
     def _updateAvailableSkills(self) -> None:
         for passiveSkill in self.availablePassiveSkills:
@@ -210,6 +243,7 @@ class Player(CombatEntity):
         newStatMap = newEquip.getStatMap()
         for stat in newStatMap:
             self.flatStatMod[stat] = self.flatStatMod.get(stat, 0) + newStatMap[stat]
+        self.markStatsChanged()
         
         if equipSlot == EquipmentSlot.WEAPON:
             assert(isinstance(newEquip, Weapon))
@@ -229,6 +263,7 @@ class Player(CombatEntity):
             oldStatMap = oldEquip.getStatMap()
             for stat in oldStatMap:
                 self.flatStatMod[stat] -= oldStatMap[stat]
+            self.markStatsChanged()
         
         if equipSlot == EquipmentSlot.WEAPON:
             self.basicAttackType = DEFAULT_ATTACK_TYPE
@@ -244,6 +279,7 @@ class Player(CombatEntity):
         if self.equipment.get(equip.equipSlot, None) == equip:
             self.unequipItem(equip.equipSlot)
         self.inventory.remove(equip)
+        self.markSaveDirty()
     
     """
         Adds a class's free skill, as specified by the skill's class and rank.
@@ -265,6 +301,7 @@ class Player(CombatEntity):
         
         self.freeSkills.append((freeSkillClass, freeSkillRank))
         self._updateAvailableSkills()
+        self.markSaveDirty()
         return True
     
     """
@@ -274,6 +311,7 @@ class Player(CombatEntity):
         if (freeSkillClass, freeSkillRank) in self.freeSkills:
             self.freeSkills.remove((freeSkillClass, freeSkillRank))
             self._updateAvailableSkills()
+            self.markSaveDirty()
             return True
         return False
     
@@ -301,6 +339,7 @@ class Player(CombatEntity):
             return False
             
         self.currentPlayerClass = newClass
+        self.markSaveDirty()
         removedFreeSkills = []
         for skillClass, skillRank in self.freeSkills:
             if skillClass in PlayerClassData.getAllClassDependencies(self.currentPlayerClass):
@@ -377,6 +416,7 @@ class Player(CombatEntity):
     def gainExp(self, expAmount : int) -> tuple[bool, bool]:
         levelUp = False
         rankUp = False
+        self.markSaveDirty()
 
         if self.level < MAX_PLAYER_LEVEL:
             self.playerExp += expAmount
@@ -403,6 +443,7 @@ class Player(CombatEntity):
     def storeEquipItem(self, equip : Equipment) -> bool:
         if len(self.inventory) < MAX_INVENTORY:
             self.inventory.append(equip)
+            self.markSaveDirty()
             return True
         return False
     
@@ -420,6 +461,7 @@ class Player(CombatEntity):
             return False
         self.wup -= wupCost
         self.swup -= swupCost
+        self.markSaveDirty()
 
         currentlyEquipped = self.equipment.get(equip.equipSlot, None) == equip
         if currentlyEquipped:
@@ -443,6 +485,7 @@ class Player(CombatEntity):
             return False
         self.wup -= wupCost
         self.swup -= swupCost
+        self.markSaveDirty()
 
         currentlyEquipped = self.equipment.get(equip.equipSlot, None) == equip
         if currentlyEquipped:
@@ -464,6 +507,7 @@ class Player(CombatEntity):
         if self.swup < adaptCost:
             return False
         self.swup -= adaptCost
+        self.markSaveDirty()
 
         currentlyEquipped = self.equipment.get(equip.equipSlot, None) == equip
         if currentlyEquipped:
@@ -473,6 +517,69 @@ class Player(CombatEntity):
             self.equipItem(equip)
         return True
 
+    """
+        Returns the player as plain data for saving; see fromSaveData. Anything derived (stats, skills, trait
+        effects) is left out and recomputed on load. Equipped and cached weapons refer to inventory positions.
+    """
+    def getSaveData(self) -> dict:
+        inventoryIndices = {id(equip): i for i, equip in enumerate(self.inventory)}
+        def getItemRef(equip : Equipment) -> int | dict:
+            return inventoryIndices[id(equip)] if id(equip) in inventoryIndices else equip.getSaveData()
+
+        return {
+            "name": self.name,
+            "summonName": self.summonName,
+            "level": self.level,
+            "playerExp": self.playerExp,
+            "freeStatPoints": self.freeStatPoints,
+            "statLevels": {stat.name: level for stat, level in self.statLevels.items()},
+            "classRanks": {className.name: rank for className, rank in self.classRanks.items()},
+            "classExp": {className.name: exp for className, exp in self.classExp.items()},
+            "currentPlayerClass": self.currentPlayerClass.name,
+            "freeSkills": [[skillClass.name, skillRank] for skillClass, skillRank in self.freeSkills],
+            "inventory": [equip.getSaveData() for equip in self.inventory],
+            "equipment": {slot.name: getItemRef(equip) for slot, equip in self.equipment.items()},
+            "weaponCache": {className.name: getItemRef(weapon) for className, weapon in self.weaponCache.items()},
+            "wup": self.wup,
+            "swup": self.swup,
+            "milestones": sorted(milestone.name for milestone in self.milestones)
+        }
+
+    @staticmethod
+    def fromSaveData(data : dict) -> Player:
+        player = Player.__new__(Player)
+        CombatEntity.__init__(player, data["name"], data["level"], 0, [], [])
+        player.saveVersion = 0
+        player.summonName = data["summonName"]
+
+        player.playerExp = data["playerExp"]
+        player.freeStatPoints = data["freeStatPoints"]
+        player.statLevels = {stat : data["statLevels"].get(stat.name, 0) for stat in BaseStats}
+
+        player.classRanks = {}
+        player.classExp = {}
+        for className in PLAYER_CLASS_NAME_MAP.values():
+            player.classRanks[className] = data["classRanks"].get(className.name, 1)
+            player.classExp[className] = data["classExp"].get(className.name, 0)
+        player.currentPlayerClass = PLAYER_CLASS_NAME_MAP[data["currentPlayerClass"]]
+        player.freeSkills = [(PLAYER_CLASS_NAME_MAP[skillClass], skillRank) for skillClass, skillRank in data["freeSkills"]]
+
+        player.inventory = [Equipment.fromSaveData(equipData) for equipData in data["inventory"]]
+        def getItem(itemRef : int | dict) -> Equipment:
+            return player.inventory[itemRef] if isinstance(itemRef, int) else Equipment.fromSaveData(itemRef)
+
+        player.equipment = {}
+        player.weaponCache = {}
+        player.wup = data["wup"]
+        player.swup = data["swup"]
+        player.milestones = set(Milestones[milestone] for milestone in data["milestones"])
+
+        player._updateBaseStats()
+        for itemRef in data["equipment"].values():
+            player.equipItem(getItem(itemRef))
+        player.weaponCache = {PLAYER_CLASS_NAME_MAP[className]: getItem(itemRef) for className, itemRef in data["weaponCache"].items()}
+        return player
+
 class NPCEntity(CombatEntity):
     def __init__(self, name : str, level : int, aggroDecayFactor : float,
                  passiveSkills : list[SkillData], activeSkills : list[SkillData], ai : EntityAI,
@@ -496,6 +603,8 @@ class Enemy(NPCEntity):
         self.flatStatMod = bonusFlatStats
         self.multStatMod = bonusMultStats
         self.rewardFn = rewardFn
+        # The spawner, params and rng seed this came from, if it was spawned through ENEMY_PROTOTYPES (for replays)
+        self.spawnSource : tuple[Callable, dict, int | None] | None = None
         
         if basicAttackType is not None:
             self.basicAttackType = basicAttackType
@@ -505,6 +614,180 @@ class Enemy(NPCEntity):
     def getReward(self, combatController : CombatController, player : CombatEntity) -> EnemyReward:
         return self.rewardFn(combatController, player)
 
+    """
+        Makes a new enemy sharing this one's skills, closures, and reward function, with its own copy of
+        everything that changes during a fight (stats, AI data, names). Skills are shared as-is, so AIs
+        shouldn't change them; see asSalali for swapping in a variant instead.
+    """
+    def copyForSpawn(self) -> Enemy:
+        enemy = copy.copy(self)
+        enemy.baseStats = self.baseStats.copy()
+        enemy.flatStatMod = self.flatStatMod.copy()
+        enemy.multStatMod = self.multStatMod.copy()
+        enemy.statVersion = 0
+        enemy.passiveBonusSkills = self.passiveBonusSkills.copy()
+        enemy.availablePassiveSkills = self.availablePassiveSkills.copy()
+        enemy.availableActiveSkills = self.availableActiveSkills.copy()
+        enemy.ai = self.ai.copyForSpawn()
+        enemy.summonName = random.choice(DEFAULT_SUMMON_NAMES)
+        return enemy
+
+"""
+    What a spawner rolls for each enemy it spawns, kept apart from the rest of its build (see rolledSpawner).
+    flatStatMods replaces the enemy's flat stat bonuses outright, namePrefix goes in front of its name, and
+    encounterMessage replaces its own if given. variantParams are added to the params the enemy is built from,
+    for rolls that change more than that (an elemental's element), so each variant is built separately.
+"""
+class SpawnRolls(object):
+    def __init__(self, flatStatMods : dict[Stats, float], namePrefix : str = "", encounterMessage : str | None = None,
+                 variantParams : dict | None = None):
+        self.flatStatMods = flatStatMods
+        self.namePrefix = namePrefix
+        self.encounterMessage = encounterMessage
+        self.variantParams = {} if variantParams is None else variantParams
+
+    def getBuildParams(self, params : dict) -> dict:
+        if len(self.variantParams) == 0:
+            return params
+        return {**params, **self.variantParams}
+
+    def applyTo(self, enemy : Enemy):
+        enemy.flatStatMod = self.flatStatMods.copy()
+        enemy.name = self.namePrefix + enemy.name
+        if self.encounterMessage is not None:
+            enemy.encounterMessage = self.encounterMessage
+        enemy.markStatsChanged()
+
+"""
+    Builds each enemy spawner's result once per set of params, then hands out copies (see Enemy.copyForSpawn).
+    Spawners that roll stat variance or names are split with rolledSpawner: their builds are cached, and each
+    spawn rolls its own SpawnRolls onto a copy. Any other spawner that draws from its rng while building gives a
+    different enemy every time, so those params are remembered as uncacheable and always go through the spawner,
+    as does every spawner marked with uncachedSpawner.
+
+    Given an rng, every spawn from a spawner that takes one draws exactly one seed from it, whether or not the
+    enemy ends up cached, so a seeded caller (e.g. a dungeon run) rolls the same enemies every time. Each enemy
+    handed out notes that seed in its spawnSource; calling the spawner with a Random seeded from it gives the
+    same enemy again, cached or not.
+"""
+class EnemyPrototypeRegistry(object):
+    def __init__(self):
+        # None marks params that can't be cached for that spawner
+        self.prototypes : dict[tuple[Callable, tuple], Enemy | None] = {}
+        self.acceptsRng : dict[Callable, bool] = {}
+
+    def spawn(self, spawner : Callable[[dict], Enemy], params : dict, rng : random.Random | None = None) -> Enemy:
+        spawnSeed = None
+        if self._acceptsRng(spawner):
+            spawnSeed = (rng if rng is not None else random).getrandbits(64)
+
+        enemy = self._spawn(spawner, params, spawnSeed)
+        enemy.spawnSource = (spawner, dict(params), spawnSeed)
+        return enemy
+
+    def _spawn(self, spawner : Callable[[dict], Enemy], params : dict, spawnSeed : int | None) -> Enemy:
+        if spawner in UNCACHED_SPAWNERS:
+            return self._spawnDirect(spawner, params, spawnSeed)
+        if spawner in ROLLED_SPAWNERS:
+            assert(spawnSeed is not None)
+            rollFn, buildFn = ROLLED_SPAWNERS[spawner]
+            rolls = rollFn(params, random.Random(spawnSeed))
+            enemy = self._spawnCached(buildFn, rolls.getBuildParams(params), None)
+            rolls.applyTo(enemy)
+            return enemy
+        return self._spawnCached(spawner, params, spawnSeed)
+
+    def _spawnCached(self, spawner : Callable[[dict], Enemy], params : dict, spawnSeed : int | None) -> Enemy:
+        try:
+            key = (spawner, tuple(sorted(params.items())))
+            hash(key)
+        except TypeError:
+            return self._spawnDirect(spawner, params, spawnSeed)
+
+        if key not in self.prototypes:
+            globalRngState = random.getstate()
+            # Built from a copy, so later changes to the caller's params don't leak into the prototype's closures
+            enemy, drewFromRng = self._build(spawner, dict(params), spawnSeed)
+            if drewFromRng:
+                self.prototypes[key] = None
+                return enemy
+            self.prototypes[key] = enemy
+            # Building the prototype drew its summon name; the copy below draws its own, as every later spawn will
+            random.setstate(globalRngState)
+
+        prototype = self.prototypes[key]
+        if prototype is None:
+            return self._spawnDirect(spawner, params, spawnSeed)
+        return prototype.copyForSpawn()
+
+    def _acceptsRng(self, spawner : Callable[[dict], Enemy]) -> bool:
+        if spawner not in self.acceptsRng:
+            self.acceptsRng[spawner] = "rng" in inspect.signature(spawner).parameters
+        return self.acceptsRng[spawner]
+
+    def _spawnDirect(self, spawner : Callable[[dict], Enemy], params : dict, spawnSeed : int | None) -> Enemy:
+        if spawnSeed is None:
+            return spawner(params)
+        return spawner(params, random.Random(spawnSeed)) # type: ignore
+
+    def _build(self, spawner : Callable[[dict], Enemy], params : dict, spawnSeed : int | None) -> tuple[Enemy, bool]:
+        if spawnSeed is None:
+            return spawner(params), False
+
+        rng = _DrawTrackingRandom(spawnSeed)
+        enemy = spawner(params, rng) # type: ignore
+        return enemy, rng.drawn
+
+""" Notes whether anything was drawn from it; otherwise an ordinary Random. """
+class _DrawTrackingRandom(random.Random):
+    def __init__(self, seed : int):
+        self.drawn = False
+        super().__init__(seed)
+
+    def random(self) -> float:
+        self.drawn = True
+        return super().random()
+
+    def getrandbits(self, k : int) -> int:
+        self.drawn = True
+        return super().getrandbits(k)
+
+ENEMY_PROTOTYPES = EnemyPrototypeRegistry()
+
+# Each spawner made by rolledSpawner, with the roll and build functions it was made from
+ROLLED_SPAWNERS : dict[Callable, tuple[Callable[[dict, random.Random], SpawnRolls], Callable[[dict], Enemy]]] = {}
+# Spawners ENEMY_PROTOTYPES never caches; see uncachedSpawner
+UNCACHED_SPAWNERS : set[Callable] = set()
+
+"""
+    Makes a spawner, called as spawner(params, rng), from rollFn, which rolls an enemy's SpawnRolls, and the
+    decorated function, which builds everything else from the params alone. Since nothing in the build depends
+    on the rng, ENEMY_PROTOTYPES caches it, and only the rolls are made per spawn.
+"""
+def rolledSpawner(rollFn : Callable[[dict, random.Random], SpawnRolls]) -> Callable[[Callable[[dict], Enemy]], Callable[..., Enemy]]:
+    def makeSpawner(buildFn : Callable[[dict], Enemy]) -> Callable[..., Enemy]:
+        def spawner(params : dict, rng : random.Random | None = None) -> Enemy:
+            rolls = rollFn(params, rng if rng is not None else random.Random())
+            enemy = buildFn(rolls.getBuildParams(params))
+            rolls.applyTo(enemy)
+            return enemy
+        spawner.__name__ = buildFn.__name__
+        spawner.__qualname__ = buildFn.__qualname__
+        spawner.__module__ = buildFn.__module__
+        spawner.__doc__ = buildFn.__doc__
+        ROLLED_SPAWNERS[spawner] = (rollFn, buildFn)
+        return spawner
+    return makeSpawner
+
+"""
+    Marks a spawner whose skills or AI keep the rng it was given to draw from during fights. Copies of a cached
+    enemy would all share that rng, so ENEMY_PROTOTYPES always calls these spawners directly; randomness during a
+    fight should come from controller.rng instead.
+"""
+def uncachedSpawner(spawner : Callable[..., Enemy]) -> Callable[..., Enemy]:
+    UNCACHED_SPAWNERS.add(spawner)
+    return spawner
+
 class EnemyReward(object):
     def __init__(self, exp : int, wup : int, swup : int, equip : Equipment | None, milestones : set[Milestones] = set()):
         self.exp = exp
@@ -539,10 +822,12 @@ class PlayerSummon(NPCEntity):
             level : int = self.statLevels[baseStat]
             increment : int = baseStatValues_perLevel[baseStat]
             self.baseStats[baseStat] = base + (level * increment)
+        self.markStatsChanged()
 
     def _updateAvailableSkills(self) -> None:
         for stat in self.baseStatBonuses:
             self.flatStatMod[stat] = self.flatStatMod.get(stat, 0) + self.baseStatBonuses[stat]
+        self.markStatsChanged()
 
         allSkills = PlayerClassData.getSkillsForRank(self.summonClass, self.classRank)
         for equip in self.summoner.equipment.values():
@@ -0,0 +1,87 @@
+from __future__ import annotations
+import functools
+import math
+
+import numpy as np
+
+from rpg_consts import *
+
+"""
+    The hit chance and damage curves used by CombatController.rollForHit and rollForDamage. Their inputs are
+    mostly small integer stats, so each result is memoized on its exact inputs.
+
+    The array versions give results identical to the scalar ones. NumPy's own tan/exp/power can differ from the
+    math module's in the last bit, so only plain arithmetic (which rounds the same everywhere) is done with
+    arrays: each distinct ACC/AVO or offense/defense ratio, and each distinct distance, goes through the scalar
+    math once, and the results are combined and broadcast back out with NumPy.
+"""
+
+# Entries kept by the formula caches; inputs are small integer stats, so a busy server touches a few thousand at most
+FORMULA_CACHE_SIZE = 8192
+
+"""
+    Chance for an attacker with the given ACC to hit a defender with the given AVO (can be over 1). distance
+    should already include the attacker's effective distance modifier and be clamped to 0..MAX_DISTANCE; None
+    means there's no distance between them (e.g. teammates), which counts as no distance penalty.
+"""
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def getHitChance(attackerAcc : float, defenderAvo : float, distance : int | None, distanceExponent : float) -> float:
+    return _getDistanceMultiplier(distance, distanceExponent) / _getHitDenominator(attackerAcc/defenderAvo)
+
+""" Fraction of the attacking stat dealt as damage, before variation, crits, and other multipliers. """
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def getDamageFactor(attackerOS : float, defenderDS : float) -> float:
+    return _getDamageFactorForRatio(attackerOS/defenderDS)
+
+def _getDistanceMultiplier(distance : int | None, distanceExponent : float) -> float:
+    distanceMod : float = 1
+    if distance is not None:
+        distanceMod = 1.1 - (0.1 * (distance ** distanceExponent))
+    return 2 * (distanceMod ** 0.5)
+
+def _getHitDenominator(accAvoRatio : float) -> float:
+    domainScaleTerm : float = math.tan(math.pi * (1 - (2 ** (1 - accAvoRatio))) / 2)
+    return 1 + math.exp(-ACCURACY_FORMULA_C * domainScaleTerm)
+
+""" As above, but a ratio so low that no hit is possible (e.g. an ACC of 0) gives inf rather than raising. """
+def _getHitDenominatorOrInf(accAvoRatio : float) -> float:
+    try:
+        return _getHitDenominator(accAvoRatio)
+    except OverflowError:
+        return math.inf
+
+def _getDamageFactorForRatio(statRatio : float) -> float:
+    return 1 - math.exp((statRatio ** DAMAGE_FORMULA_C) * math.log(1 - DAMAGE_FORMULA_K))
+
+""" getHitChance over broadcast arrays of inputs. Every distance is used as given (there's no None here). """
+def getHitChanceArray(attackerAcc : np.ndarray, defenderAvo : np.ndarray, distance : np.ndarray,
+                      distanceExponent : np.ndarray | float) -> np.ndarray:
+    accAvoRatio = np.asarray(attackerAcc, dtype=np.float64) / np.asarray(defenderAvo, dtype=np.float64)
+    distanceMultiplier = _mapDistinct(lambda distance, exponent: _getDistanceMultiplier(int(distance), exponent),
+                                      np.asarray(distance, dtype=np.float64), np.asarray(distanceExponent, dtype=np.float64))
+    return distanceMultiplier / _mapDistinct(_getHitDenominatorOrInf, accAvoRatio)
+
+def getDamageFactorArray(attackerOS : np.ndarray, defenderDS : np.ndarray) -> np.ndarray:
+    return _mapDistinct(_getDamageFactorForRatio, np.asarray(attackerOS, dtype=np.float64) / np.asarray(defenderDS, dtype=np.float64))
+
+""" Applies a scalar function elementwise over broadcast arrays, calling it once per distinct combination of inputs. """
+def _mapDistinct(function, *inputs : np.ndarray) -> np.ndarray:
+    broadcastInputs = np.broadcast_arrays(*inputs)
+    resultShape = broadcastInputs[0].shape
+    # Each combination is numbered from the indices of its values among each input's distinct values
+    columnValues : list[list[float]] = []
+    combinationKeys = np.zeros(broadcastInputs[0].size, dtype=np.int64)
+    for inputArray in broadcastInputs:
+        distinctValues, valueIndices = np.unique(inputArray.ravel(), return_inverse=True)
+        columnValues.append(distinctValues.tolist())
+        combinationKeys = combinationKeys * len(distinctValues) + valueIndices.ravel()
+    distinctKeys, inverse = np.unique(combinationKeys, return_inverse=True)
+
+    distinctResults = np.empty(len(distinctKeys), dtype=np.float64)
+    for i, key in enumerate(distinctKeys.tolist()):
+        row = []
+        for values in reversed(columnValues):
+            key, valueIndex = divmod(key, len(values))
+            row.append(values[valueIndex])
+        distinctResults[i] = function(*reversed(row))
+    return distinctResults[inverse.ravel()].reshape(resultShape)
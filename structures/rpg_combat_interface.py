@@ -7,6 +7,7 @@ from structures.rpg_combat_entity import CombatEntity, Enemy, NPCEntity, Player,
 from structures.rpg_combat_state import ActionResultInfo, CombatController
 from rpg_consts import *
 from structures.rpg_messages import MessageCollector
+from structures.rpg_npc_ai import EntityAIAction
 
 class CombatInputHandler(object):
     def __init__(self, entity : CombatEntity):
@@ -18,6 +19,8 @@ class CombatInputHandler(object):
         if isBasic:
             isPhysical = self.entity.basicAttackType != AttackType.MAGIC
         assert(isPhysical is not None)
+        if isBasic and combatController.replayRecorder is not None:
+            combatController.replayRecorder.recordAttack(self.entity, target)
         combatController.performAttack(self.entity, target, isPhysical, attackType, isBasic, bonusAttackData)
 
     def _doReactionAttack(self, combatController : CombatController, user : CombatEntity, target : CombatEntity,
@@ -25,6 +28,8 @@ class CombatInputHandler(object):
         combatController.performReactionAttack(self.entity, user, target, attackData, additionalAttacks)
 
     def doSkill(self, combatController : CombatController, targets : list[CombatEntity], skillData : SkillData) -> ActionResultInfo:
+        if combatController.replayRecorder is not None:
+            combatController.replayRecorder.recordSkill(self.entity, targets, skillData)
         actionResult : ActionResultInfo = combatController.performActiveSkill(self.entity, targets, skillData)
         if actionResult.success == ActionSuccessState.SUCCESS:
             if actionResult.startAttack:
@@ -39,6 +44,8 @@ class CombatInputHandler(object):
         return actionResult
     
     def doReposition(self, combatController : CombatController, targets : list[CombatEntity], distanceChange : int) -> bool:
+        if combatController.replayRecorder is not None:
+            combatController.replayRecorder.recordReposition(self.entity, targets, distanceChange)
         repositionResult = combatController.performReposition(self.entity, targets, distanceChange)
         if not repositionResult.success:
             return False
@@ -52,6 +59,8 @@ class CombatInputHandler(object):
         return True
     
     def doDefend(self, combatController : CombatController) -> None:
+        if combatController.replayRecorder is not None:
+            combatController.replayRecorder.recordDefend(self.entity)
         combatController.performDefend(self.entity)
 
     def onPlayerLeaveDungeon(self) -> None:
@@ -59,13 +68,25 @@ class CombatInputHandler(object):
 
     async def takeTurn(self, combatController : CombatController) -> None:
         raise NotImplementedError()
+
+    """
+        Synchronous version of takeTurn, for handlers that never need to wait on input.
+        Used by headless simulations, which drive combat without an event loop.
+    """
+    def performTurn(self, combatController : CombatController) -> None:
+        raise NotImplementedError()
     
 class RandomEntityInputHandler(CombatInputHandler):
-    def __init__(self, entity : CombatEntity, sleepTime : float):
+    def __init__(self, entity : CombatEntity, sleepTime : float, rng : random.Random | None = None):
         super().__init__(entity)
         self.sleepTime = sleepTime
+        self.rng : random.Random = random.Random() if rng is None else rng
 
     async def takeTurn(self, combatController : CombatController) -> None:
+        self.performTurn(combatController)
+        await asyncio.sleep(self.sleepTime)
+
+    def performTurn(self, combatController : CombatController) -> None:
         targetList = combatController.getTargets(self.entity)
         teammateList = combatController.getTeammates(self.entity)
 
@@ -103,39 +124,37 @@ class RandomEntityInputHandler(CombatInputHandler):
                 availableCommands.append("approach")
             if len(retreatTargets) > 0:
                 availableCommands.append("retreat")
-            command = random.choice(availableCommands)
+            command = self.rng.choice(availableCommands)
 
             if command == "attack":
-                target = random.choice(attackTargets)
+                target = self.rng.choice(attackTargets)
                 self.doAttack(combatController, target, None, None, True, [])
-                await asyncio.sleep(self.sleepTime)
                 return
             elif command == "skill":
-                chosenSkill = random.choice(availableSkills)
+                chosenSkill = self.rng.choice(availableSkills)
                 originalChosenSkill = chosenSkill
 
                 if isinstance(chosenSkill, ActiveSkillDataSelector):
                     availableOptions = [option for option in chosenSkill.options
                                             if chosenSkill.checkOptionAvailable(option, combatController, self.entity)]
-                    chosenSkill = chosenSkill.selectSkill(random.choice(availableOptions))
+                    chosenSkill = chosenSkill.selectSkill(self.rng.choice(availableOptions))
 
                 targets = []
                 targetCount = 1 if chosenSkill.expectedTargets is None else chosenSkill.expectedTargets
                 if chosenSkill.targetOpponents:
                     if chosenSkill.causesAttack:
                         if len(attackTargets) >= targetCount:
-                            targets = random.sample(attackTargets, targetCount)
+                            targets = self.rng.sample(attackTargets, targetCount)
                         else:
                             availableSkills.remove(originalChosenSkill)
                             continue
                     else:
-                        targets = random.sample(targetList, targetCount)
+                        targets = self.rng.sample(targetList, targetCount)
                 else:
-                    targets = random.sample(teammateList, targetCount)
+                    targets = self.rng.sample(teammateList, targetCount)
 
                 skillResult = self.doSkill(combatController, targets, chosenSkill)
                 if skillResult.success == ActionSuccessState.SUCCESS:
-                    await asyncio.sleep(self.sleepTime)
                     return
                 # elif skillResult.success == ActionSuccessState.FAILURE_MANA:
                 #     print("You do not have enough MP to use this skill.")
@@ -143,30 +162,27 @@ class RandomEntityInputHandler(CombatInputHandler):
                     #     print("Invalid target(s) for this skill.")
 
             elif command == "approach":
-                targets = random.sample(approachTargets, random.choice([1, 2])) if len(approachTargets) > 1 else approachTargets
+                targets = self.rng.sample(approachTargets, self.rng.choice([1, 2])) if len(approachTargets) > 1 else approachTargets
 
-                amount = random.choice([1, MAX_SINGLE_REPOSITION])
+                amount = self.rng.choice([1, MAX_SINGLE_REPOSITION])
                 if amount < 0 or amount > MAX_SINGLE_REPOSITION:
                     print("You may change your distance by at most 2 on your turn.")
                     
                 if self.doReposition(combatController, targets, -amount):
-                    await asyncio.sleep(self.sleepTime)
                     return
 
             elif command == "retreat":
-                targets = random.sample(retreatTargets, random.choice([1, 2])) if len(retreatTargets) > 1 else retreatTargets
+                targets = self.rng.sample(retreatTargets, self.rng.choice([1, 2])) if len(retreatTargets) > 1 else retreatTargets
 
-                amount = random.choice([1, MAX_SINGLE_REPOSITION])
+                amount = self.rng.choice([1, MAX_SINGLE_REPOSITION])
                 if amount < 0 or amount > MAX_SINGLE_REPOSITION:
                     print("You may change your distance by at most 2 on your turn.")
                     
                 if self.doReposition(combatController, targets, amount):
-                    await asyncio.sleep(self.sleepTime)
                     return
                 
             elif command == "defend":
                 self.doDefend(combatController)
-                await asyncio.sleep(self.sleepTime)
                 return
             
             else:
@@ -356,11 +372,15 @@ class NPCInputHandler(CombatInputHandler):
         self.enemy : NPCEntity = entity
 
     async def takeTurn(self, combatController : CombatController) -> None:
+        self.performDecision(combatController, await self.enemy.ai.chooseActionAsync(combatController, self.enemy))
+
+    def performTurn(self, combatController : CombatController) -> None:
+        self.performDecision(combatController, self.enemy.ai.chooseAction(combatController, self.enemy))
+
+    def performDecision(self, combatController : CombatController, aiDecision : EntityAIAction) -> None:
         targetList = combatController.getTargets(self.entity)
         teammateList = combatController.getTeammates(self.entity)
 
-        aiDecision = self.enemy.ai.chooseAction(combatController, self.enemy)
-
         if aiDecision.action == CombatActions.ATTACK:
             target = targetList[aiDecision.targetIndices[0]]
             self.doAttack(combatController, target, None, None, True, [])
@@ -433,6 +453,10 @@ class CombatInterface(object):
             if manaDelta > 0:
                 self.cc.spendMana(player, manaDelta, True)
 
+    def attachLoggers(self, loggers : dict[CombatEntity, MessageCollector]):
+        self.loggers = loggers
+        self.cc.attachLoggers(loggers)
+
     def spawnEntity(self, entity : CombatEntity, enemyTeam : bool):
         assert isinstance(entity, NPCEntity)
         teamList = self.opponents if enemyTeam else self.players
@@ -482,6 +506,24 @@ class CombatInterface(object):
             self.cc.logMessage(MessageType.BASIC, defeatMessage)
         self.sendAllLatestMessages()
 
+    """
+        Runs combat to completion without an event loop, using each handler's performTurn. Messages are left
+        in the loggers rather than sent. Returns the victory state (None if maxTurns ran out first) and the number of turns taken.
+    """
+    def runCombatHeadless(self, maxTurns : int | None = None) -> tuple[bool | None, int]:
+        turnCount = 0
+        while (self.cc.checkPlayerVictory() is None):
+            if maxTurns is not None and turnCount >= maxTurns:
+                return None, turnCount
+            self.activePlayer = self.cc.advanceToNextPlayer()
+            if self.cc.isStunned(self.activePlayer):
+                self.cc.stunSkipTurn(self.activePlayer)
+            else:
+                self.cc.beginPlayerTurn(self.activePlayer)
+                self.handlerMap[self.activePlayer].performTurn(self.cc)
+            turnCount += 1
+        return self.cc.checkPlayerVictory(), turnCount
+
     def removePlayer(self, player : Player):
         self.cc.applyDamage(player, player, self.cc.getCurrentHealth(player), False, silent=True, queueRemove=True)
         if self.activePlayer is not None and self.activePlayer == player:
@@ -1,35 +1,64 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Callable, Generator
+from typing import TYPE_CHECKING, Callable, Generator, Iterable
+import copy
 import random
 import math
+import heapq
 
 from rpg_consts import *
-from structures.rpg_classes_skills import EFBeforeAttacked, EFBeforeAttacked_Revert, EFOnAdvanceTurn, EFOnAttackSkill, EFOnDefend, EFOnOpponentDotDamage, EFOnHealSkill, EFOnStatusApplied, EFOnToggle, EFStartTurn, EnchantmentSkillEffect, SkillData, AttackSkillData, ActiveToggleSkillData, SkillEffect, \
+from structures.rpg_classes_skills import EFBeforeAttacked, EFBeforeAttacked_Revert, EFOnAdvanceTurn, EFOnAttackSkill, EFOnDefend, EFOnOpponentDotDamage, EFOnHealSkill, EFOnStatusApplied, EFOnToggle, EFStartTurn, EnchantmentSkillEffect, EffectFunction, SkillData, AttackSkillData, ActiveToggleSkillData, SkillEffect, \
     EFImmediate, EFBeforeNextAttack, EFBeforeNextAttack_Revert, EFAfterNextAttack, EFWhenAttacked, \
     EFOnDistanceChange, EFOnStatsChange, EFOnParry, EFBeforeAllyAttacked, EFEndTurn
 from structures.rpg_combat_entity import Player, PlayerSummon
-from structures.rpg_messages import MessageCollector, makeTeamString
+from structures.rpg_combat_formulas import getDamageFactor, getHitChance
+from structures.rpg_messages import MessageCollector, SharedMessageLog, makeTeamString
 from gameData.rpg_status_definitions import StatusEffect
 
 if TYPE_CHECKING:
     from structures.rpg_combat_entity import CombatEntity
 
+# Largest float below 1; see CombatController._luckWeightedUniform
+LUCK_ROLL_MAX = math.nextafter(1, 0)
+
 class EntityCombatState(object):
     def __init__(self, entity : CombatEntity) -> None:
         self.entity : CombatEntity = entity
 
-        self.currentHP : int = entity.getStatValue(BaseStats.HP)
+        self._currentHP : int = entity.getStatValue(BaseStats.HP)
         self.currentMP : int = entity.getStatValue(BaseStats.MP)
 
         self.flatStatMod : dict[Stats, float] = {}
         self.multStatMod : dict[Stats, float] = {}
 
+        # Totals are cached until the mods above change, or until the entity's own stats do (tracked by statVersion)
+        self.totalStatCache : dict[Stats, int] = {}
+        self.totalStatFloatCache : dict[Stats, float] = {}
+        self.cachedStatVersion : int = entity.statVersion
+
+        # Changes to the entity's own attributes over the fight (such as a boss changing phase). They're kept here
+        # instead of on the entity, since forks of the fight share the live entities; see CombatController.fork
+        self.baseStatOverrides : dict[BaseStats, int] = {}
+        self.basicAttackAttributeOverride : AttackAttribute | None = None
+        self.aggroDecayFactorOverride : float | None = None
+
         self.weaknesses : list[AttackAttribute] = []
         self.resistances : list[AttackAttribute] = []
 
-        self.actionTimer : float = 0
+        # The action timer advances lazily against the controller's TurnScheduler clock; see the actionTimer property
+        self.turnScheduler : TurnScheduler | None = None
+        self.turnOrder : int = 0
+        self.scheduleVersion : int = -1
+        self.timerRunning : bool = False
+        self.timerRateDirty : bool = True
+        self._actionTimer : float = 0
+        self._timerClock : float = 0
+        self._timerRate : float = 0
 
         self.activeSkillEffects: dict[SkillEffect, int] = {}
+        # Mirrors the keys of activeSkillEffects; only change them through add/removeActiveSkillEffect
+        self.effectFunctionIndex : dict[EffectTimings, dict[SkillEffect, list[EffectFunction]]] = {}
+        # Set when a forked state still shares the index above; see copyForFork
+        self.effectIndexShared : bool = False
         self.activeToggleSkills: set[ActiveToggleSkillData] = set()
         self.effectStacks : dict[EffectStacks, int] = {}
         self.activeEnchantments : list[EnchantmentSkillEffect] = []
@@ -49,6 +78,61 @@ class EntityCombatState(object):
         self.alchefyPrepared : list[AlchefyElements] = []
         self.alchefyRepeatQueue : list[AlchefyElements] = []
 
+    """
+        Returns an independent copy of this state for a forked controller, attached to its scheduler.
+        Status effects are swapped for the copies in statusCopies; other skill effects are shared definitions.
+    """
+    def copyForFork(self, turnScheduler : TurnScheduler | None, statusCopies : dict[SkillEffect, SkillEffect]) -> EntityCombatState:
+        forkedState = EntityCombatState.__new__(EntityCombatState)
+        forkedState.__dict__.update(self.__dict__)
+        forkedState.turnScheduler = turnScheduler
+
+        forkedState.flatStatMod = self.flatStatMod.copy()
+        forkedState.multStatMod = self.multStatMod.copy()
+        forkedState.totalStatCache = self.totalStatCache.copy()
+        forkedState.totalStatFloatCache = self.totalStatFloatCache.copy()
+        forkedState.baseStatOverrides = self.baseStatOverrides.copy()
+        forkedState.weaknesses = self.weaknesses[:]
+        forkedState.resistances = self.resistances[:]
+
+        forkedState.activeSkillEffects = {statusCopies.get(effect, effect): duration for effect, duration in self.activeSkillEffects.items()}
+        if any(effect in statusCopies for effect in self.activeSkillEffects):
+            forkedState.effectFunctionIndex = self._copyEffectIndex(statusCopies)
+            forkedState.effectIndexShared = False
+        else:
+            # Copied on write instead; it only changes when effects are added or removed
+            self.effectIndexShared = True
+            forkedState.effectIndexShared = True
+        forkedState.activeToggleSkills = self.activeToggleSkills.copy()
+        forkedState.effectStacks = self.effectStacks.copy()
+        forkedState.activeEnchantments = self.activeEnchantments[:]
+        forkedState.inactiveEnchantmentDurations = self.inactiveEnchantmentDurations.copy()
+        if self.activeParrySkillEffect is not None:
+            forkedState.activeParrySkillEffect = statusCopies.get(self.activeParrySkillEffect, self.activeParrySkillEffect)
+
+        forkedState.maxStatusTolerance = self.maxStatusTolerance.copy()
+        forkedState.currentStatusTolerance = self.currentStatusTolerance.copy()
+        forkedState.currentStatusEffects = {statusName: statusCopies.get(status, status) # type: ignore
+                                            for statusName, status in self.currentStatusEffects.items()}
+        forkedState.aggroMap = self.aggroMap.copy()
+        forkedState.alchefyPrepared = self.alchefyPrepared[:]
+        forkedState.alchefyRepeatQueue = self.alchefyRepeatQueue[:]
+        return forkedState
+
+    def _copyEffectIndex(self, statusCopies : dict[SkillEffect, SkillEffect]) -> dict[EffectTimings, dict[SkillEffect, list[EffectFunction]]]:
+        effectIndex = {}
+        for timing, timingIndex in self.effectFunctionIndex.items():
+            indexCopy = {}
+            for effect, effectFunctions in timingIndex.items():
+                effectCopy = statusCopies.get(effect, None)
+                if effectCopy is None:
+                    indexCopy[effect] = effectFunctions[:]
+                else:
+                    indexCopy[effectCopy] = [effectFunction for effectFunction in effectCopy.effectFunctions
+                                             if effectFunction.effectTiming == timing]
+            effectIndex[timing] = indexCopy
+        return effectIndex
+
     def phaseReset(self, controller : CombatController, keepStacks : set[EffectStacks]):
         keepStacks.add(EffectStacks.ENEMY_PHASE_COUNTER)
         for stack in self.effectStacks:
@@ -71,12 +155,13 @@ class EntityCombatState(object):
         for effect in removeEffects:
             controller.removeSkillEffect(self.entity, effect)
             if effect.expirationMessage is not None:
-                controller.logMessage(MessageType.EFFECT, f"{effect.shortName}'s {effect.expirationMessage}")
+                controller.logMessage(MessageType.EFFECT, "{}'s {}", effect.shortName, effect.expirationMessage)
             for expirationEffect in effect.expirationEffects:
                 expirationEffect.applyEffect(controller, self.entity, [])
         
         self.flatStatMod = {}
         self.multStatMod = {}
+        self.invalidateStatCache(None)
         self.defendActive = False
         self.parryType = None
         self.activeParrySkillEffect = None
@@ -106,17 +191,62 @@ class EntityCombatState(object):
         if self.currentMP > self.getTotalStatValue(BaseStats.MP):
             self.currentMP = self.getTotalStatValue(BaseStats.MP)
 
+    """ Drops cached totals for the given stats, or for all stats if None. """
+    def invalidateStatCache(self, stats : Iterable[Stats] | None) -> None:
+        if stats is None:
+            self.totalStatCache.clear()
+            self.totalStatFloatCache.clear()
+            self.markTimerDirty()
+        else:
+            for stat in stats:
+                self.totalStatCache.pop(stat, None)
+                self.totalStatFloatCache.pop(stat, None)
+                if stat == BaseStats.SPD:
+                    self.markTimerDirty()
+
+    def _checkStatVersion(self) -> None:
+        if self.cachedStatVersion != self.entity.statVersion:
+            self.invalidateStatCache(None)
+            self.cachedStatVersion = self.entity.statVersion
+
+    """ The entity's own value for a stat, using any base stats set over this fight (see setBaseStats). """
+    def getEntityStatValueFloat(self, stat : Stats) -> float:
+        base = self.baseStatOverrides.get(stat, None) # type: ignore
+        if base is None:
+            return self.entity.getStatValueFloat(stat)
+        return (base + self.entity.flatStatMod.get(stat, 0)) * self.entity.multStatMod.get(stat, 1)
+
+    def getEntityStatValue(self, stat : Stats) -> int:
+        return round(self.getEntityStatValueFloat(stat))
+
+    """ Replaces some of the entity's base stats for the rest of this fight. """
+    def setBaseStats(self, baseStats : dict[BaseStats, int]) -> None:
+        self.baseStatOverrides.update(baseStats)
+        self.invalidateStatCache(None)
+
     def getTotalStatValue(self, stat : Stats) -> int:
-        base : int = self.entity.getStatValue(stat)
+        self._checkStatVersion()
+        cached = self.totalStatCache.get(stat)
+        if cached is not None:
+            return cached
+        base : int = self.getEntityStatValue(stat)
         flatMod : float = self.flatStatMod.get(stat, 0)
         multMod : float = self.multStatMod.get(stat, 1)
-        return round((base + flatMod) * multMod)
+        result = round((base + flatMod) * multMod)
+        self.totalStatCache[stat] = result
+        return result
 
     def getTotalStatValueFloat(self, stat : Stats) -> float:
-        base : float = self.entity.getStatValueFloat(stat)
+        self._checkStatVersion()
+        cached = self.totalStatFloatCache.get(stat)
+        if cached is not None:
+            return cached
+        base : float = self.getEntityStatValueFloat(stat)
         flatMod : float = self.flatStatMod.get(stat, 0)
         multMod : float = self.multStatMod.get(stat, 1)
-        return (base + flatMod) * multMod
+        result = (base + flatMod) * multMod
+        self.totalStatFloatCache[stat] = result
+        return result
 
     def getStateOverviewString(self) -> str:
         baseStatusString = f"**{self.entity.name}**: {self.currentHP}/{self.getTotalStatValue(BaseStats.HP)} HP, {self.currentMP}/{self.getTotalStatValue(BaseStats.MP)} MP"
@@ -189,7 +319,7 @@ class EntityCombatState(object):
             return ALCHEFY_PRODUCT_MAP[nextIngredients]
 
     def getFullStatusStatString(self, stat : Stats) -> str:
-        baseStatValue = self.entity.getStatValue(stat)
+        baseStatValue = self.getEntityStatValue(stat)
         totalStatValue = self.getTotalStatValue(stat)
         if baseStatValue == totalStatValue:
             return str(totalStatValue)
@@ -197,13 +327,64 @@ class EntityCombatState(object):
             return f"*{totalStatValue}* ({baseStatValue})"
         
     def getFullStatusPercentStatString(self, stat : CombatStats) -> str:
-        baseStatValue = self.entity.getStatValueFloat(stat)
+        baseStatValue = self.getEntityStatValueFloat(stat)
         totalStatValue = self.getTotalStatValueFloat(stat)
         if baseStatValue == totalStatValue:
             return f"{totalStatValue*100:.1f}%"
         else:
             return f"*{totalStatValue*100:.1f}%* ({baseStatValue*100:.1f}%)"
 
+    """
+        While running, the timer is stored as its value at an earlier point on the scheduler's clock, and has since
+        been filling at the rate given by the entity's SPD at that time.
+    """
+    @property
+    def actionTimer(self) -> float:
+        if self.timerRunning:
+            return self._actionTimer + (self.turnScheduler.clock - self._timerClock) * self._timerRate # type: ignore
+        return self._actionTimer
+
+    @actionTimer.setter
+    def actionTimer(self, value : float) -> None:
+        self._actionTimer = value
+        if self.turnScheduler is not None:
+            self._timerClock = self.turnScheduler.clock
+            self.turnScheduler.schedule(self)
+
+    """ Only living entities' timers run, so the scheduler is told whenever this crosses 0. """
+    @property
+    def currentHP(self) -> int:
+        return self._currentHP
+
+    @currentHP.setter
+    def currentHP(self, value : int) -> None:
+        if (value > 0) != (self._currentHP > 0) and self.turnScheduler is not None:
+            self.turnScheduler.pendingSyncs[self] = None
+        self._currentHP = value
+
+    """ Flags the timer's rate as out of date, so it's synced before the next turn is picked. """
+    def markTimerDirty(self) -> None:
+        self.timerRateDirty = True
+        if self.turnScheduler is not None:
+            self.turnScheduler.pendingSyncs[self] = None
+
+    """
+        Stores the timer's value at the current clock time, then picks up any change in SPD or in whether the entity
+        is alive (only living entities' timers run).
+    """
+    def syncActionTimer(self) -> None:
+        assert(self.turnScheduler is not None)
+        self._actionTimer = self.actionTimer
+        self._timerClock = self.turnScheduler.clock
+        self.timerRunning = self.currentHP > 0
+        self._timerRate = self.getTotalStatValue(BaseStats.SPD) ** 0.5
+        self.timerRateDirty = False
+        self.turnScheduler.schedule(self)
+
+    def needsTimerSync(self) -> bool:
+        self._checkStatVersion()
+        return self.timerRateDirty or self.timerRunning != (self.currentHP > 0)
+
     """ Given that action timer fills at a rate speed ** 0.5, gets time until it reaches the maximum. """
     def getTimeToFullAction(self) -> float:
         return (MAX_ACTION_TIMER - self.actionTimer) / (self.getTotalStatValue(BaseStats.SPD) ** 0.5)
@@ -218,11 +399,13 @@ class EntityCombatState(object):
     def applyFlatStatBonuses(self, flatStatMap : dict[Stats, float]) -> None:
         for stat in flatStatMap:
             self.flatStatMod[stat] = self.flatStatMod.get(stat, 0) + flatStatMap[stat]
+        self.invalidateStatCache(flatStatMap)
         self._adjustCurrentValues()
 
     def applyMultStatBonuses(self, multStatMap : dict[Stats, float]) -> None:
         for stat in multStatMap:
             self.multStatMod[stat] = self.multStatMod.get(stat, 1) * multStatMap[stat]
+        self.invalidateStatCache(multStatMap)
         self._adjustCurrentValues()
 
     def revertFlatStatBonuses(self, flatStatMap : dict[Stats, float]) -> None:
@@ -231,6 +414,7 @@ class EntityCombatState(object):
                 assert(flatStatMap[stat] == 0)
                 self.flatStatMod[stat] = 0
             self.flatStatMod[stat] -= flatStatMap[stat]
+        self.invalidateStatCache(flatStatMap)
         self._adjustCurrentValues()
 
     def revertMultStatBonuses(self, multStatMap : dict[Stats, float]) -> None:
@@ -239,25 +423,27 @@ class EntityCombatState(object):
                 assert(multStatMap[stat] == 1)
                 self.multStatMod[stat] = 1
             self.multStatMod[stat] /= multStatMap[stat]
+        self.invalidateStatCache(multStatMap)
         self._adjustCurrentValues()
 
     """
-        Removes effects with no duration. Returns the set of expiring effects.
+        Removes effects with no duration. Returns the expiring effects, in the order they were activated
+        (so expiration effects resolve in the same order in forked controllers).
     """
-    def durationCheck(self) -> set[SkillEffect]:
-        result = set()
+    def durationCheck(self) -> list[SkillEffect]:
+        result = []
         for effect in self.activeSkillEffects:
             if effect.effectDuration is None:
                 continue
             if self.activeSkillEffects[effect] >= effect.effectDuration:
-                result.add(effect)
+                result.append(effect)
         return result
 
     """
-        Increments the amount of time skills have been active. Returns the set of expiring effects.
+        Increments the amount of time skills have been active. Returns the expiring effects.
         Also automatically removes inactive enchatments.
     """
-    def durationTick(self, controller : CombatController) -> set[SkillEffect]:
+    def durationTick(self, controller : CombatController) -> list[SkillEffect]:
         for effect in self.activeSkillEffects:
             self.activeSkillEffects[effect] += 1
         
@@ -269,25 +455,77 @@ class EntityCombatState(object):
         [self.removeEnchantmentEffect(enchantment, controller) for enchantment in removeEnchantments]
         return self.durationCheck()
 
+    """
+        Starts tracking a skill effect with the given elapsed duration, indexing its effect functions by timing.
+    """
+    def addActiveSkillEffect(self, skillEffect : SkillEffect, duration : int = 0) -> None:
+        if skillEffect not in self.activeSkillEffects:
+            if self.effectIndexShared:
+                self.effectFunctionIndex = self._copyEffectIndex({})
+                self.effectIndexShared = False
+            for effectFunction in skillEffect.effectFunctions:
+                timingIndex = self.effectFunctionIndex.setdefault(effectFunction.effectTiming, {})
+                timingIndex.setdefault(skillEffect, []).append(effectFunction)
+            self._updateAdvanceTurnTracking()
+        self.activeSkillEffects[skillEffect] = duration
+
+    """
+        Stops tracking a skill effect, returning its elapsed duration.
+    """
+    def removeActiveSkillEffect(self, skillEffect : SkillEffect) -> int:
+        duration = self.activeSkillEffects.pop(skillEffect)
+        if self.effectIndexShared:
+            self.effectFunctionIndex = self._copyEffectIndex({})
+            self.effectIndexShared = False
+        for effectFunction in skillEffect.effectFunctions:
+            self.effectFunctionIndex[effectFunction.effectTiming].pop(skillEffect, None)
+        self._updateAdvanceTurnTracking()
+        return duration
+
+    """ Keeps the scheduler's set of states with ADVANCE_TURN effects up to date. """
+    def _updateAdvanceTurnTracking(self) -> None:
+        if self.turnScheduler is None:
+            return
+        if self.effectFunctionIndex.get(EffectTimings.ADVANCE_TURN):
+            self.turnScheduler.advanceTurnStates[self] = None
+        else:
+            self.turnScheduler.advanceTurnStates.pop(self, None)
+
+    """
+        Yields the functions of the given timing from all active skill effects. Effects added while iterating
+        are picked up afterwards; effects removed before being reached are skipped.
+    """
     def getEffectFunctions(self, effectTiming : EffectTimings) -> Generator:
+        timingIndex = self.effectFunctionIndex.get(effectTiming)
+        if timingIndex is None:
+            return
         checkedSkillEffects = set()
-        while len(checkedSkillEffects) < len(self.activeSkillEffects):
-            allSkillEffects = set(self.activeSkillEffects.keys())
-            uncheckedSkillEffects = allSkillEffects - checkedSkillEffects
-            skillEffect = list(uncheckedSkillEffects)[0]
-            for effectFunction in list(filter(lambda effectFunction : effectFunction.effectTiming == effectTiming, skillEffect.effectFunctions)):
-                yield effectFunction
-            checkedSkillEffects.add(skillEffect)
+        pendingSkillEffects = list(timingIndex)
+        while len(pendingSkillEffects) > 0:
+            for skillEffect in pendingSkillEffects:
+                checkedSkillEffects.add(skillEffect)
+                # Looked up again each time, since a shared index is replaced by a copy when it changes
+                effectFunctions = self.effectFunctionIndex.get(effectTiming, {}).get(skillEffect)
+                if effectFunctions is None:
+                    continue
+                for effectFunction in effectFunctions:
+                    yield effectFunction
+            pendingSkillEffects = [skillEffect for skillEffect in self.effectFunctionIndex.get(effectTiming, {})
+                                   if skillEffect not in checkedSkillEffects]
     
     """
         Updates the current weapon attribute (previous enchantments are remembered, but not expressed.)
         Assumes that the enchantment skill effect has been added normally already.
     """
     def addEnchantmentEffect(self, enchantmentEffect : EnchantmentSkillEffect) -> None:
+        if enchantmentEffect in self.activeEnchantments:
+            # Re-applying an enchantment that was disabled moves it back to the top, rather than stacking it twice
+            self.activeEnchantments.remove(enchantmentEffect)
+            self.inactiveEnchantmentDurations.pop(enchantmentEffect, None)
         if len(self.activeEnchantments) > 0:
             # Disable previously active enchantment
             previousEnchantment = self.activeEnchantments[-1]
-            self.inactiveEnchantmentDurations[previousEnchantment] = self.activeSkillEffects.pop(previousEnchantment)
+            self.inactiveEnchantmentDurations[previousEnchantment] = self.removeActiveSkillEffect(previousEnchantment)
             self.revertFlatStatBonuses(previousEnchantment.flatStatBonuses)
             self.revertMultStatBonuses(previousEnchantment.multStatBonuses)
             
@@ -311,23 +549,41 @@ class EntityCombatState(object):
             if len(self.activeEnchantments) > 0:
                 # Reactivate next enchantment on stack
                 newEnchantment = self.activeEnchantments[-1]
-                self.activeSkillEffects[newEnchantment] = self.inactiveEnchantmentDurations.pop(newEnchantment)
+                self.addActiveSkillEffect(newEnchantment, self.inactiveEnchantmentDurations.pop(newEnchantment))
                 self.applyFlatStatBonuses(newEnchantment.flatStatBonuses)
                 self.applyMultStatBonuses(newEnchantment.multStatBonuses)
                 newEnchantmentStr = f" (The {newEnchantment.enchantmentAttribute.name} enchantment is now active.)"
         if enchantmentEffect.effectDuration is not None and enchantmentEffect.effectDuration > 0:
             controller.logMessage(MessageType.EXPIRATION,
-                                f"{self.entity.shortName}'s {enchantmentEffect.enchantmentAttribute.name} enchantment wore off.{newEnchantmentStr}")
+                                "{}'s {} enchantment wore off.{}", self.entity.shortName, enchantmentEffect.enchantmentAttribute.name, newEnchantmentStr)
             
     def getCurrentAttackAttribute(self, isPhysical : bool) -> AttackAttribute:
         if len(self.activeEnchantments) > 0:
             return self.activeEnchantments[-1].enchantmentAttribute
-        weaponAttribute = self.entity.basicAttackAttribute
+        weaponAttribute = self.getBasicAttackAttribute()
         # Use neutral magic if weapon has a physical attribute
         if isinstance(weaponAttribute, PhysicalAttackAttribute) and not isPhysical:
             weaponAttribute = MagicalAttackAttribute.NEUTRAL
         return weaponAttribute
     
+    def getBasicAttackAttribute(self) -> AttackAttribute:
+        if self.basicAttackAttributeOverride is not None:
+            return self.basicAttackAttributeOverride
+        return self.entity.basicAttackAttribute
+
+    """ Changes the attribute of the entity's basic attacks for the rest of this fight. """
+    def setBasicAttackAttribute(self, attribute : AttackAttribute) -> None:
+        self.basicAttackAttributeOverride = attribute
+
+    def getAggroDecayFactor(self) -> float:
+        if self.aggroDecayFactorOverride is not None:
+            return self.aggroDecayFactorOverride
+        return self.entity.aggroDecayFactor
+
+    """ Changes how quickly the entity's aggro decays for the rest of this fight. """
+    def setAggroDecayFactor(self, aggroDecayFactor : float) -> None:
+        self.aggroDecayFactorOverride = aggroDecayFactor
+
     def getDefaultAttackType(self) -> AttackType:
         if len(self.activeEnchantments) > 0:
             if self.activeEnchantments[-1].forceMagicAttack:
@@ -345,7 +601,7 @@ class EntityCombatState(object):
 
     def clearParryType(self):
         if self.activeParrySkillEffect is not None:
-            self.activeSkillEffects.pop(self.activeParrySkillEffect)
+            self.removeActiveSkillEffect(self.activeParrySkillEffect)
         self.activeParrySkillEffect = None
         self.parryType = None
     
@@ -380,27 +636,27 @@ class EntityCombatState(object):
             
             durationStr = " Its duration was extended!" if durationExtension > 0 else ""
             controller.logMessage(MessageType.EFFECT,
-                                  f"{self.entity.shortName}'s {statusName.name} was amplified!{durationStr}")
+                                  "{}'s {} was amplified!{}", self.entity.shortName, statusName.name, durationStr)
             return True
         else:
             statusResistance = self.getStatusResistChance(statusName)
             statusResistance *= controller.combatStateMap[statusCondition.inflicter].getTotalStatValueFloat(CombatStats.STATUS_APPLICATION_TOLERANCE_MULTIPLIER)
             controller.logMessage(MessageType.PROBABILITY,
-                                  f"{self.entity.shortName}'s {statusName.name} resistance chance: {statusResistance * 100:.1f}%")
+                                  "{}'s {} resistance chance: {:.1f}%", self.entity.shortName, statusName.name, statusResistance * 100)
             if randomRoll >= statusResistance:
                 controller.logMessage(MessageType.EFFECT,
-                                      f"{self.entity.shortName} was inflicted with {statusName.name}!")
+                                      "{} was inflicted with {}!", self.entity.shortName, statusName.name)
                 self.currentStatusEffects[statusName] = statusCondition
 
                 immediateEffects = filter(lambda effectFunction : effectFunction.effectTiming == EffectTimings.IMMEDIATE, statusCondition.effectFunctions)
                 for effectFunction in immediateEffects:
                     if isinstance(effectFunction, EFImmediate):
                         effectFunction.applyEffect(controller, self.entity, [])
-                self.activeSkillEffects[statusCondition] = 0
+                self.addActiveSkillEffect(statusCondition)
                 return True
             else:
                 controller.logMessage(MessageType.EFFECT,
-                                      f"{self.entity.shortName} resisted the {statusName.name}!")
+                                      "{} resisted the {}!", self.entity.shortName, statusName.name)
                 self.reduceTolerance(statusName, STATUS_TOLERANCE_RESIST_DECREASE)
                 return False
             
@@ -414,7 +670,7 @@ class EntityCombatState(object):
             return
         
         controller.logMessage(MessageType.EFFECT,
-                              f"{self.entity.shortName}'s {statusName.name} wore off.")
+                              "{}'s {} wore off.", self.entity.shortName, statusName.name)
         self.currentStatusEffects.pop(statusName)
         self.maxStatusTolerance[statusName] *= STATUS_TOLERANCE_RECOVERY_INCREASE_FACTOR
         self.currentStatusTolerance[statusName] = self.maxStatusTolerance[statusName]
@@ -426,15 +682,137 @@ class EntityCombatState(object):
         return None
 
 
+"""
+    Orders combat states by the clock time at which their action timers will fill. A state is pushed again whenever
+    its timer is set or its rate changes; the entries it leaves behind are skipped once they reach the top.
+"""
+class TurnScheduler(object):
+    TIE_TOLERANCE : float = 1e-9
+
+    def __init__(self) -> None:
+        self.clock : float = 0
+        self.heap : list[tuple[float, int, int, EntityCombatState]] = []
+        self.pushCount : int = 0
+        self.nextTurnOrder : int = 0
+        self.attachedCount : int = 0
+        # States whose timers need a sync before the next turn is picked, and states with ADVANCE_TURN effects
+        # (both used as ordered sets), so advancing doesn't have to check every state
+        self.pendingSyncs : dict[EntityCombatState, None] = {}
+        self.advanceTurnStates : dict[EntityCombatState, None] = {}
+
+    """
+        Starts scheduling a state. Ties in ready time go to the lowest turn order; by default, that is whichever
+        state was attached first.
+    """
+    def attach(self, state : EntityCombatState, turnOrder : int | None = None) -> None:
+        if turnOrder is None:
+            turnOrder = self.nextTurnOrder
+            self.nextTurnOrder += 1
+        state.turnScheduler = self
+        state.turnOrder = turnOrder
+        state._timerClock = self.clock
+        state.markTimerDirty()
+        state._updateAdvanceTurnTracking()
+        self.attachedCount += 1
+
+    def detach(self, state : EntityCombatState) -> None:
+        state._actionTimer = state.actionTimer
+        state.timerRunning = False
+        state.scheduleVersion = -1
+        state.turnScheduler = None
+        self.pendingSyncs.pop(state, None)
+        self.advanceTurnStates.pop(state, None)
+        self.attachedCount -= 1
+
+    def schedule(self, state : EntityCombatState) -> None:
+        state.scheduleVersion = -1
+        if not state.timerRunning:
+            return
+        readyTime = state._timerClock + (MAX_ACTION_TIMER - state._actionTimer) / state._timerRate
+        state.scheduleVersion = self.pushCount
+        heapq.heappush(self.heap, (readyTime, state.turnOrder, self.pushCount, state))
+        self.pushCount += 1
+
+        if len(self.heap) > 4 * self.attachedCount + 32:
+            self.heap = [entry for entry in self.heap if entry[3].scheduleVersion == entry[2]]
+            heapq.heapify(self.heap)
+
+    """ Returns a copy of the schedule for a forked controller, given each state's copy. """
+    def copyForFork(self, stateCopies : dict[EntityCombatState, EntityCombatState]) -> TurnScheduler:
+        forkedScheduler = TurnScheduler()
+        forkedScheduler.clock = self.clock
+        forkedScheduler.pushCount = self.pushCount
+        forkedScheduler.nextTurnOrder = self.nextTurnOrder
+        forkedScheduler.attachedCount = self.attachedCount
+        # Only live entries carry over, so the copy starts out compacted
+        forkedScheduler.heap = [(readyTime, turnOrder, version, stateCopies[state]) for readyTime, turnOrder, version, state in self.heap
+                                if state.scheduleVersion == version and state in stateCopies]
+        heapq.heapify(forkedScheduler.heap)
+        forkedScheduler.pendingSyncs = {stateCopies[state]: None for state in self.pendingSyncs if state in stateCopies}
+        forkedScheduler.advanceTurnStates = {stateCopies[state]: None for state in self.advanceTurnStates if state in stateCopies}
+        return forkedScheduler
+
+    """
+        Syncs every state that asked for it, then returns the running states with ADVANCE_TURN effects, in turn order.
+        An entity's own stats changing (see CombatEntity.markStatsChanged) is noticed the next time its state
+        reads a stat.
+    """
+    def syncPendingStates(self) -> list[EntityCombatState]:
+        while len(self.pendingSyncs) > 0:
+            pendingStates = list(self.pendingSyncs)
+            self.pendingSyncs.clear()
+            for state in pendingStates:
+                if state.needsTimerSync():
+                    state.syncActionTimer()
+        advanceStates = [state for state in self.advanceTurnStates if state.timerRunning]
+        if len(advanceStates) > 1:
+            advanceStates.sort(key=lambda state: state.turnOrder)
+        return advanceStates
+
+    def _discardStaleEntries(self) -> None:
+        while len(self.heap) > 0 and self.heap[0][3].scheduleVersion != self.heap[0][2]:
+            heapq.heappop(self.heap)
+
+    """
+        Returns the running state whose timer fills first, or None if no timers are running.
+        Ready times within TIE_TOLERANCE of each other are treated as tied, since they can differ by rounding alone.
+    """
+    def peekNext(self) -> EntityCombatState | None:
+        self._discardStaleEntries()
+        if len(self.heap) == 0:
+            return None
+        # Everything below the first entry's children is at least as late as them, so if both children are clear
+        # of the tolerance nothing can tie, and the heap doesn't have to be touched
+        firstReadyTime = self.heap[0][0]
+        if all(entry[0] - firstReadyTime > TurnScheduler.TIE_TOLERANCE for entry in self.heap[1:3]):
+            return self.heap[0][3]
+        tiedEntries = [heapq.heappop(self.heap)]
+        self._discardStaleEntries()
+        while len(self.heap) > 0 and self.heap[0][0] - tiedEntries[0][0] <= TurnScheduler.TIE_TOLERANCE:
+            tiedEntries.append(heapq.heappop(self.heap))
+            self._discardStaleEntries()
+        nextEntry = min(tiedEntries, key=lambda entry: entry[1])
+        for entry in tiedEntries:
+            heapq.heappush(self.heap, entry)
+        return nextEntry[3]
+
+
 class CombatController(object):
+    # Set to a CombatReplayRecorder (see rpg_replay) to log every action taken; forks never record
+    replayRecorder = None
+
     def __init__(self, playerTeam : list[CombatEntity], opponentTeam : list[CombatEntity],
                 startingPlayerTeamDistances : dict[CombatEntity, int], loggers : dict[CombatEntity, MessageCollector],
                 spawnerCallback : Callable[[CombatEntity, bool], None]) -> None:
         self.playerTeam : list[CombatEntity] = playerTeam[:]
         self.opponentTeam : list[CombatEntity] = opponentTeam[:]
-        self.loggers : dict[CombatEntity, MessageCollector] = loggers
+        self.attachLoggers(loggers)
         self.spawnerCallback : Callable[[CombatEntity, bool], None] = spawnerCallback
 
+        self.isFork = False
+        # Entities this controller spawned itself (as opposed to ones it shares with the fight it was forked from)
+        self.spawnedEntities : set[CombatEntity] = set()
+
         self.removeQueue = []
         self.opponentNameCount = {}
         self.namedOpponentMemory = {}
@@ -448,10 +826,11 @@ class CombatController(object):
                 startingDistance = startingPlayerTeamDistances.get(player, DEFAULT_STARTING_DISTANCE)
                 self.distanceMap[player][opponent] = startingDistance
 
+        self.turnScheduler : TurnScheduler = TurnScheduler()
         self.combatStateMap : dict[CombatEntity, EntityCombatState] = {}
         for team in [self.playerTeam, self.opponentTeam]:
             for entity in team:
-                self.combatStateMap[entity] = EntityCombatState(entity)
+                self._addCombatState(entity)
 
         for team in [self.playerTeam, self.opponentTeam]:
             for entity in team:
@@ -464,10 +843,12 @@ class CombatController(object):
 
         self.previousTurnEntity : CombatEntity | None = None
         self.rng : random.Random = random.Random()
+        # Per-controller AI data for enemies; only forks fill this in, so live fights use the EntityAI's own
+        self.aiDataMap : dict[CombatEntity, dict] = {}
 
         plural = "" if len(playerTeam) > 1 else "es"
         self.logMessage(MessageType.BASIC,
-                        f"*{makeTeamString(playerTeam)} approach{plural} {makeTeamString(opponentTeam)}.*")
+                        "*{} approach{} {}.*", makeTeamString(playerTeam), plural, makeTeamString(opponentTeam))
         for opponent in self.opponentTeam:
             encounterMessage = opponent.encounterMessage if isinstance(opponent.encounterMessage, str) \
                 else opponent.encounterMessage(self.playerTeam) # type: ignore
@@ -476,23 +857,103 @@ class CombatController(object):
                 break
         self.logMessage(MessageType.BASIC, "**COMBAT START!**")
 
+    """
+        Sets where this combat's messages go. Loggers view one shared log, unless they were already given one
+        (such as the log for a whole dungeon).
+    """
+    def attachLoggers(self, loggers : dict[CombatEntity, MessageCollector]):
+        self.loggers : dict[CombatEntity, MessageCollector] = loggers
+        combatLog = SharedMessageLog()
+        [logger.attachToLog(combatLog) for logger in self.loggers.values()]
+        self.messageLogs : list[SharedMessageLog] = list(dict.fromkeys(
+            logger.messageLog for logger in self.loggers.values() if logger.messageLog is not None))
+
+    """
+        Returns an independent copy of the fight as it stands, for simulating turns without touching this one.
+        Entities, skills, and skill effect definitions are shared, so nothing may change them over a fight; changes
+        belong in the combat states (see EntityCombatState.setBaseStats and the like) or the controller's AI data.
+        Everything that does change (combat states, distances, the turn schedule, status effects, enemy AI data, and
+        the rng) is copied. The fork logs nothing, and entities spawned in it go to spawnerCallback instead of this
+        controller's.
+        A fork can itself be forked, so keeping one untouched gives a snapshot that can be restored repeatedly.
+    """
+    def fork(self, spawnerCallback : Callable[[CombatEntity, bool], None] | None = None) -> CombatController:
+        forked = CombatController.__new__(CombatController)
+        forked.playerTeam = self.playerTeam[:]
+        forked.opponentTeam = self.opponentTeam[:]
+        forked.attachLoggers({})
+        forked.spawnerCallback = spawnerCallback if spawnerCallback is not None else _ignoreSpawn
+
+        forked.removeQueue = self.removeQueue[:]
+        forked.opponentNameCount = self.opponentNameCount.copy()
+        forked.namedOpponentMemory = self.namedOpponentMemory.copy()
+        forked.distanceMap = {player: distances.copy() for player, distances in self.distanceMap.items()}
+
+        # Status effects hold their own mutable state (e.g. poison strength)
+        statusCopies : dict[SkillEffect, SkillEffect] = {}
+        for state in self.combatStateMap.values():
+            for effect in state.activeSkillEffects:
+                if isinstance(effect, StatusEffect) and effect not in statusCopies:
+                    statusCopies[effect] = effect.copyForFork()
+
+        stateCopies = {state: state.copyForFork(None, statusCopies) for state in self.combatStateMap.values()}
+        forked.turnScheduler = self.turnScheduler.copyForFork(stateCopies)
+        for state, stateCopy in stateCopies.items():
+            if state.turnScheduler is not None:
+                stateCopy.turnScheduler = forked.turnScheduler
+        forked.combatStateMap = {entity: stateCopies[state] for entity, state in self.combatStateMap.items()}
+
+        forked.previousTurnEntity = self.previousTurnEntity
+        # Skips seeding a new Random from the OS, since its state is replaced right away
+        forked.rng = random.Random.__new__(random.Random)
+        forked.rng.setstate(self.rng.getstate())
+        forked.aiDataMap = {}
+        forked.isFork = True
+        forked.spawnedEntities = set()
+        for entity in self.combatStateMap:
+            if getattr(entity, "ai", None) is not None:
+                forked.aiDataMap[entity] = {key: copy.copy(value) for key, value in self.getAIData(entity).items()}
+        return forked
+
+    """ Returns the AI data an NPC should read and update in this controller; see fork. """
+    def getAIData(self, entity : CombatEntity) -> dict:
+        aiData = self.aiDataMap.get(entity, None)
+        if aiData is None:
+            return entity.ai.data # type: ignore
+        return aiData
+
+    """
+        Changes an entity's display name. Forks display nothing and share their entities with the fight they came
+        from, so they only rename entities they spawned themselves.
+    """
+    def renameEntity(self, entity : CombatEntity, name : str, shortName : str) -> None:
+        if self.isFork and entity not in self.spawnedEntities:
+            return
+        entity.name = name
+        entity.shortName = shortName
+
     def _removeDuplicateOpponentNames(self, newOpponent : CombatEntity):
         opponentName = newOpponent.name
         nameCount = self.opponentNameCount.get(opponentName, 0)
         if nameCount > 0:
-            newOpponent.name += f" ({nameCount+1})"
-            newOpponent.shortName += f" ({nameCount+1})"
+            self.renameEntity(newOpponent, newOpponent.name + f" ({nameCount+1})", newOpponent.shortName + f" ({nameCount+1})")
             if nameCount == 1:
-                self.namedOpponentMemory[opponentName].name += " (1)"
-                self.namedOpponentMemory[opponentName].shortName += " (1)"
+                firstOpponent = self.namedOpponentMemory[opponentName]
+                self.renameEntity(firstOpponent, firstOpponent.name + " (1)", firstOpponent.shortName + " (1)")
         self.opponentNameCount[opponentName] = nameCount + 1
         self.namedOpponentMemory[opponentName] = newOpponent
 
-    def logMessage(self, messageType : MessageType, messageText : str):
-        [log.addMessage(messageType, messageText) for log in self.loggers.values()]
+    """
+        Logs a message for every logger. Extra arguments are formatted into the text with str.format, but only if
+        a logger actually displays it.
+    """
+    def logMessage(self, messageType : MessageType, messageTemplate : str, *messageArgs):
+        for messageLog in self.messageLogs:
+            messageLog.addMessage(messageType, messageTemplate, *messageArgs)
     
     def spawnNewEntity(self, spawner : CombatEntity, entity : CombatEntity, spawnFromEnemy : bool):
         enemyTeam = spawner in self.opponentTeam
+        self.spawnedEntities.add(entity)
 
         self.spawnerCallback(entity, enemyTeam)
         if enemyTeam:
@@ -507,15 +968,27 @@ class CombatController(object):
             for opponent in self.opponentTeam:
                 self.distanceMap[entity][opponent] = DEFAULT_STARTING_DISTANCE
 
-        self.combatStateMap[entity] = EntityCombatState(entity)
+        self._addCombatState(entity)
         for skill in entity.availablePassiveSkills:
             self._activateImmediateEffects(entity, [], skill)
             [self.addSkillEffect(entity, skillEffect) for skillEffect in skill.skillEffects]
-        self.logMessage(MessageType.BASIC, f"*{entity.shortName} joins the battle!*")
+        self.logMessage(MessageType.BASIC, "*{} joins the battle!*", entity.shortName)
 
         if spawnFromEnemy:
             self._cleanupEnemies()
 
+    def _addCombatState(self, entity : CombatEntity) -> EntityCombatState:
+        turnOrder = None
+        previousState = self.combatStateMap.get(entity)
+        if previousState is not None:
+            # Re-summoned entities keep their place in the turn order, as they do in combatStateMap
+            turnOrder = previousState.turnOrder
+            self.turnScheduler.detach(previousState)
+        newState = EntityCombatState(entity)
+        self.turnScheduler.attach(newState, turnOrder)
+        self.combatStateMap[entity] = newState
+        return newState
+
     def _cleanupEnemies(self):
         defeatedEnemies = [entity for entity in self.opponentTeam if self.getCurrentHealth(entity) <= 0]
         for entity in defeatedEnemies:
@@ -562,9 +1035,12 @@ class CombatController(object):
     """
         Updates all action timers according to current entity speeds, returning the player who gets to move next.
         Entities with 0 HP are ignored.
-        In the case of a tie, a random selection is made.
+        In the case of a tie, the entity that entered combat first is chosen.
+        Timers are advanced by moving the turn scheduler's clock, rather than by updating each one.
     """
     def advanceToNextPlayer(self) -> CombatEntity:
+        if self.replayRecorder is not None:
+            self.replayRecorder.onBeginTurn()
         for removeEntity in self.removeQueue:
             if removeEntity in self.playerTeam and len(self.playerTeam) > 1:
                 self.playerTeam.remove(removeEntity)
@@ -572,19 +1048,29 @@ class CombatController(object):
                 self.opponentTeam.remove(removeEntity)
         self.removeQueue = []
 
-        actionTimeMap : dict[CombatEntity, float] = {entity : self.combatStateMap[entity].getTimeToFullAction() for entity in self.combatStateMap}
-        livingEntities = list(filter(lambda entity: self.combatStateMap[entity].currentHP > 0, self.combatStateMap.keys()))
-        nextEntity : CombatEntity = min(livingEntities, key = lambda entity: actionTimeMap[entity])
+        advanceEffectEntities : list[CombatEntity] = [state.entity for state in self.turnScheduler.syncPendingStates()]
 
-        # Time-stop consistency
-        if self.previousTurnEntity in livingEntities and actionTimeMap[self.previousTurnEntity] == 0:
-            nextEntity = self.previousTurnEntity
+        nextState = self.turnScheduler.peekNext()
+        if nextState is None:
+            raise ValueError("advanceToNextPlayer called with no living entities")
 
-        for entity in livingEntities:
-            self.combatStateMap[entity].increaseActionTimer(actionTimeMap[nextEntity])
+        # Time-stop consistency
+        timePassed : float | None = None
+        previousState = self.combatStateMap.get(self.previousTurnEntity) # type: ignore
+        if previousState is not None and previousState.timerRunning and previousState.getTimeToFullAction() == 0:
+            nextState = previousState
+            timePassed = 0
+        nextEntity : CombatEntity = nextState.entity
+
+        if timePassed is None:
+            timePassed = nextState.getTimeToFullAction()
+        self.turnScheduler.clock += timePassed
+        nextState.actionTimer = MAX_ACTION_TIMER
+
+        for entity in advanceEffectEntities:
             for effectFunction in self.combatStateMap[entity].getEffectFunctions(EffectTimings.ADVANCE_TURN):
                 assert(isinstance(effectFunction, EFOnAdvanceTurn))
-                effectFunction.applyEffect(self, entity, self.previousTurnEntity, nextEntity, actionTimeMap[nextEntity])
+                effectFunction.applyEffect(self, entity, self.previousTurnEntity, nextEntity, timePassed)
 
         return nextEntity
 
@@ -629,7 +1115,7 @@ class CombatController(object):
 
         if oldDistance != newDistance:
             self.logMessage(MessageType.POSITIONING,
-                            f"{entity1.shortName} repositions to distance {newDistance} from {entity2.shortName}!")
+                            "{} repositions to distance {} from {}!", entity1.shortName, newDistance, entity2.shortName)
 
         reactionAttackData : list[tuple[CombatEntity, CombatEntity, AttackSkillData]] = []
         for effectFunction in self.combatStateMap[entity1].getEffectFunctions(EffectTimings.ON_REPOSITION):
@@ -645,60 +1131,60 @@ class CombatController(object):
 
         return reactionAttackData
 
-    """
-        Gets a random float from 0 to 1, accounting for luck values.
-        The Positive player's luck favors higher rolls, and the Negative player's favors low rolls.
-    """
-    def _randomRoll(self, positiveEntity : CombatEntity | None, negativeEntity : CombatEntity | None) -> float:
+    def _getTotalLuck(self, positiveEntity : CombatEntity | None, negativeEntity : CombatEntity | None) -> int:
         totalLuck = 0
         if positiveEntity is not None:
             totalLuck += self.combatStateMap[positiveEntity].getTotalStatValue(CombatStats.LUCK)
         if negativeEntity is not None:
             totalLuck -= self.combatStateMap[negativeEntity].getTotalStatValue(CombatStats.LUCK)
+        return totalLuck
 
-        rolls = [self.rng.random() for i in range(1 + abs(totalLuck))]
+    """
+        Samples the max (for positive luck) or min (for negative luck) of 1 + |luck| uniform draws from [0, 1),
+        using one draw from self.rng. The max of n uniforms has CDF x^n, so it's sampled as u^(1/n);
+        the min is its mirror image. u^(1/n) can round up to exactly 1, so it's capped just below, keeping
+        the result in [0, 1) like the draws it stands in for.
+    """
+    def _luckWeightedUniform(self, totalLuck : int) -> float:
+        roll = self.rng.random()
+        if totalLuck == 0:
+            return roll
+        exponent = 1 / (1 + abs(totalLuck))
         if totalLuck > 0:
-            return max(rolls)
+            return min(roll ** exponent, LUCK_ROLL_MAX)
         else:
-            return min(rolls)
+            return 1 - (1 - roll) ** exponent
+
+    """
+        Gets a random float from 0 to 1, accounting for luck values.
+        The Positive player's luck favors higher rolls, and the Negative player's favors low rolls.
+    """
+    def _randomRoll(self, positiveEntity : CombatEntity | None, negativeEntity : CombatEntity | None) -> float:
+        return self._luckWeightedUniform(self._getTotalLuck(positiveEntity, negativeEntity))
     
     """
         The above, but for a uniform distribution.
     """
     def _randomRollUniform(self, a : float, b : float, positiveEntity : CombatEntity | None, negativeEntity : CombatEntity | None) -> float:
-        totalLuck = 0
-        if positiveEntity is not None:
-            totalLuck += self.combatStateMap[positiveEntity].getTotalStatValue(CombatStats.LUCK)
-        if negativeEntity is not None:
-            totalLuck -= self.combatStateMap[negativeEntity].getTotalStatValue(CombatStats.LUCK)
-
-        rolls = [self.rng.uniform(a, b) for i in range(1 + abs(totalLuck))]
-        if totalLuck > 0:
-            return max(rolls)
-        else:
-            return min(rolls)
+        return a + (b - a) * self._luckWeightedUniform(self._getTotalLuck(positiveEntity, negativeEntity))
 
     """
         Checks if an attacker hits a defender. Distance modifier treated as 1x if they're on the same team (for debugging).
     """
     def rollForHit(self, attacker : CombatEntity, defender : CombatEntity) -> bool:
         distance : int | None = self.checkDistance(attacker, defender)
-        distanceMod : float = 1
+        distanceExponent : float = 0
         if distance is not None:
             distance += self.combatStateMap[attacker].getTotalStatValue(CombatStats.ACC_EFFECTIVE_DISTANCE_MOD)
             if (distance < 0): distance = 0
             if (distance > MAX_DISTANCE): distance = MAX_DISTANCE
-            distanceMod = 1.1 - (0.1 * (distance ** self.combatStateMap[attacker].getTotalStatValueFloat(CombatStats.ACCURACY_DISTANCE_MOD)))
+            distanceExponent = self.combatStateMap[attacker].getTotalStatValueFloat(CombatStats.ACCURACY_DISTANCE_MOD)
 
         attackerAcc : float = self.combatStateMap[attacker].getTotalStatValue(BaseStats.ACC)
         defenderAvo : float = self.combatStateMap[defender].getTotalStatValue(BaseStats.AVO)
-       
-        accAvoRatio : float = attackerAcc/defenderAvo
-        distanceMultiplier : float = 2 * (distanceMod ** 0.5)
-        domainScaleTerm : float = math.tan(math.pi * (1 - (2 ** (1 - accAvoRatio))) / 2)
-        hitChance : float = distanceMultiplier / (1 + math.exp(-ACCURACY_FORMULA_C * domainScaleTerm))
+        hitChance : float = getHitChance(attackerAcc, defenderAvo, distance, distanceExponent)
         self.logMessage(MessageType.PROBABILITY,
-                        f"{attacker.shortName}'s chance to hit {defender.shortName}: {hitChance*100:.3f}%")
+                        "{}'s chance to hit {}: {:.3f}%", attacker.shortName, defender.shortName, hitChance*100)
 
         return self._randomRoll(defender, attacker) <= hitChance
 
@@ -734,10 +1220,10 @@ class CombatController(object):
         
         if attributeMultiplier > 1:
             self.logMessage(MessageType.DAMAGE,
-                        f"{defender.shortName} is weak to the {enumName(attackAttribute)} attack!")
+                        "{} is weak to the {} attack!", defender.shortName, enumName(attackAttribute))
         elif attributeMultiplier < 1:
             self.logMessage(MessageType.DAMAGE,
-                        f"{defender.shortName} resists the {enumName(attackAttribute)} attack!")
+                        "{} resists the {} attack!", defender.shortName, enumName(attackAttribute))
 
         damageReduction : float = self.combatStateMap[defender].getTotalStatValueFloat(CombatStats.DAMAGE_REDUCTION)
         defenseReduction : float = 1
@@ -746,8 +1232,7 @@ class CombatController(object):
             defenseReduction *= self.combatStateMap[defender].getTotalStatValueFloat(CombatStats.DEFEND_ACTION_DAMAGE_MULT)
             self.gainMana(defender, DEFEND_HIT_MP_GAIN)
 
-        statRatio : float = attackerOS/defenderDS
-        damageFactor : float = 1 - math.exp((statRatio ** DAMAGE_FORMULA_C) * math.log(1 - DAMAGE_FORMULA_K))
+        damageFactor : float = getDamageFactor(attackerOS, defenderDS)
         variationFactor : float = self._randomRollUniform(0.9, 1.1, attacker, defender)
         return (math.ceil(attackerOS * damageFactor * variationFactor * critFactor * attributeMultiplier
                           * (1 - damageReduction) * defenseReduction), isCrit)
@@ -766,7 +1251,7 @@ class CombatController(object):
             if not silent:
                 critString = " (Critical)" if isCritical else ""
                 self.logMessage(MessageType.DAMAGE,
-                            f"{defender.shortName} takes **{damageTaken} damage{critString}**!")
+                            "{} takes **{} damage{}**!", defender.shortName, damageTaken, critString)
                 
             self._applyAggro(attacker, defender, damageTaken)
             
@@ -783,12 +1268,12 @@ class CombatController(object):
         if newHP == 0:
             if not silent:
                 self.logMessage(MessageType.BASIC,
-                                f"**{defender.name} is defeated!**")
+                                "**{} is defeated!**", defender.name)
             
             for summon in self.getActiveSummons(defender):
                 if not silent:
                     self.logMessage(MessageType.BASIC,
-                                    f"**The connection to {summon.name} is disrupted!**")
+                                    "**The connection to {} is disrupted!**", summon.name)
                 self.combatStateMap[summon].currentHP = 0
             
             if queueRemove:
@@ -829,7 +1314,7 @@ class CombatController(object):
             if not silent:
                 critString = " (Critical Heal)" if isCritical else ""
                 self.logMessage(MessageType.DAMAGE,
-                                f"{entity.shortName} **restores {healthGained} health{critString}**!")
+                                "{} **restores {} health{}**!", entity.shortName, healthGained, critString)
 
             # TODO: may need to do something with result
             for effectFunction in self.combatStateMap[entity].getEffectFunctions(EffectTimings.ON_STAT_CHANGE):
@@ -849,7 +1334,7 @@ class CombatController(object):
         if originalMP != newMP:
             if not silent:
                 self.logMessage(MessageType.MANA,
-                                f"{entity.shortName} spends {originalMP - newMP} mana!")
+                                "{} spends {} mana!", entity.shortName, originalMP - newMP)
             
             # TODO: may need to do something with result
             for effectFunction in self.combatStateMap[entity].getEffectFunctions(EffectTimings.ON_STAT_CHANGE):
@@ -874,7 +1359,7 @@ class CombatController(object):
         if manaGained > 0:
             if not silent:
                 self.logMessage(MessageType.MANA,
-                                f"{entity.shortName} restores {manaGained} mana!")
+                                "{} restores {} mana!", entity.shortName, manaGained)
             
             # TODO: may need to do something with result
             for effectFunction in self.combatStateMap[entity].getEffectFunctions(EffectTimings.ON_STAT_CHANGE):
@@ -952,7 +1437,7 @@ class CombatController(object):
     """
     def addSkillEffect(self, entity : CombatEntity, skillEffect : SkillEffect) -> None:
         if skillEffect not in self.combatStateMap[entity].activeSkillEffects:
-            self.combatStateMap[entity].activeSkillEffects[skillEffect] = 0
+            self.combatStateMap[entity].addActiveSkillEffect(skillEffect)
             if isinstance(skillEffect, EnchantmentSkillEffect):
                 self.combatStateMap[entity].addEnchantmentEffect(skillEffect)
 
@@ -960,7 +1445,7 @@ class CombatController(object):
         Removes a skill effect from an entity.
     """
     def removeSkillEffect(self, entity : CombatEntity, skillEffect : SkillEffect) -> None:
-        self.combatStateMap[entity].activeSkillEffects.pop(skillEffect)
+        self.combatStateMap[entity].removeActiveSkillEffect(skillEffect)
         if isinstance(skillEffect, StatusEffect):
             skillEffect.onRemove(self, entity)
             self.combatStateMap[entity].removeStatusCondition(skillEffect.statusName, self)
@@ -998,7 +1483,7 @@ class CombatController(object):
     """
     def _applyAggroDecay(self, entity : CombatEntity) -> None:
         aggroMap = self.combatStateMap[entity].aggroMap
-        aggroFactor = entity.aggroDecayFactor
+        aggroFactor = self.combatStateMap[entity].getAggroDecayFactor()
         for target in aggroMap:
             aggroMap[target] *= aggroFactor
             
@@ -1161,7 +1646,7 @@ class CombatController(object):
     def performDefend(self, user : CombatEntity) -> None:
         self.combatStateMap[user].defendActive = True
         self.logMessage(MessageType.ACTION,
-                        f"{user.shortName} defends themselves against the next attack!")
+                        "{} defends themselves against the next attack!", user.shortName)
 
         self.gainMana(user, DEFEND_MP_GAIN, canUnwaveringTrust=True)
         defendTime = MAX_ACTION_TIMER * self.combatStateMap[user].getTotalStatValueFloat(CombatStats.DEFEND_ACTION_TIME_MULT)
@@ -1206,7 +1691,7 @@ class CombatController(object):
                 if len(targets) == 1 and targets[0] == user:
                     targetString = " on themselves"
                 self.logMessage(MessageType.ACTION,
-                                f"{user.shortName} uses {skill.skillName}{targetString}!")
+                                "{} uses {}{}!", user.shortName, skill.skillName, targetString)
             reactionAttackData = self._activateImmediateEffects(user, targets, skill)
             # add skill effects to active
             for effect in skill.skillEffects:
@@ -1214,7 +1699,7 @@ class CombatController(object):
         else:
             if not toggleEnabled:
                 self.logMessage(MessageType.ACTION,
-                                f"{user.shortName} activates {skill.skillName}!")
+                                "{} activates {}!", user.shortName, skill.skillName)
                 self.combatStateMap[user].activeToggleSkills.add(skill)
                 self.applyFlatStatBonuses(user, skill.flatStatBonuses)
                 self.applyMultStatBonuses(user, skill.multStatBonuses)
@@ -1223,7 +1708,7 @@ class CombatController(object):
                     self.addSkillEffect(user, effect)
             else:
                 self.logMessage(MessageType.ACTION,
-                                f"{user.shortName} deactivates {skill.skillName}.")
+                                "{} deactivates {}.", user.shortName, skill.skillName)
                 self.combatStateMap[user].activeToggleSkills.remove(skill)
                 self.revertFlatStatBonuses(user, skill.flatStatBonuses)
                 self.revertMultStatBonuses(user, skill.multStatBonuses)
@@ -1268,7 +1753,7 @@ class CombatController(object):
                       bonusAttackData : list[tuple[CombatEntity, CombatEntity, AttackSkillData]]) -> AttackResultInfo:
         if isBasic:
             self.logMessage(MessageType.ACTION,
-                            f"{attacker.shortName} attacks {defender.shortName}!")
+                            "{} attacks {}!", attacker.shortName, defender.shortName)
 
         # initial attack
         attackResultInfo : AttackResultInfo = self._doSingleAttack(attacker, defender, isPhysical, attackType, isBasic, False)
@@ -1289,7 +1774,7 @@ class CombatController(object):
     def performReactionAttack(self, turnPlayer : CombatEntity, attacker : CombatEntity, defender : CombatEntity, attackSkillData : AttackSkillData,
                               additionalAttacks : list[tuple[CombatEntity, CombatEntity, AttackSkillData]]):
         self.logMessage(MessageType.ACTION,
-                        f"{attacker.shortName} performs a bonus attack against {defender.shortName}!")
+                        "{} performs a bonus attack against {}!", attacker.shortName, defender.shortName)
         
         self.performActiveSkill(attacker, [defender], attackSkillData)
         attackResultInfo = self._doSingleAttack(attacker, defender, attackSkillData.isPhysical, attackSkillData.attackType, False, True)
@@ -1307,7 +1792,7 @@ class CombatController(object):
             if self.getCurrentHealth(bonusAttacker) > 0:
                 self.performActiveSkill(bonusAttacker, [bonusTarget], bonusAttackData)
                 self.logMessage(MessageType.ACTION,
-                                f"{bonusAttacker.shortName} performs a bonus attack against {bonusTarget.shortName}!")
+                                "{} performs a bonus attack against {}!", bonusAttacker.shortName, bonusTarget.shortName)
                 bonusAttackResultInfo : AttackResultInfo = self._doSingleAttack(bonusAttacker, bonusTarget, bonusAttackData.isPhysical,
                                                                                 bonusAttackData.attackType, False, True)
                 attackResultInfo.addBonusResultInfo(bonusAttackResultInfo)
@@ -1356,13 +1841,13 @@ class CombatController(object):
         inRange = self.checkInRange(attacker, defender)
         if not inRange:
             self.logMessage(MessageType.DAMAGE,
-                            f"{attacker.shortName} is out of range of {defender.shortName}!")
+                            "{} is out of range of {}!", attacker.shortName, defender.shortName)
 
         parryDamageMultiplier = 1
         if inRange and self.combatStateMap[defender].parryType is not None:
             if attackType == self.combatStateMap[defender].parryType:
                 self.logMessage(MessageType.EFFECT,
-                                f"{defender.shortName} reacts to the {attackType.name.lower()} attack!")
+                                "{} reacts to the {} attack!", defender.shortName, attackType.name.lower())
                 for effectFunction in self.combatStateMap[defender].getEffectFunctions(EffectTimings.PARRY):
                     assert(isinstance(effectFunction, EFOnParry))
                     effectResult = effectFunction.applyEffect(self, defender, attacker, isPhysical)
@@ -1374,20 +1859,20 @@ class CombatController(object):
                         guaranteeDodge = guaranteeDodge or effectResult.guaranteeDodge
             else:
                 self.logMessage(MessageType.EFFECT,
-                                f"{defender.shortName} fails to react to the {attackType.name.lower()} attack!")
+                                "{} fails to react to the {} attack!", defender.shortName, attackType.name.lower())
             self.combatStateMap[defender].clearParryType()
 
         checkHit : bool = False
         if inRange and not guaranteeDodge:
             if self.combatStateMap[defender].getTotalStatValue(CombatStats.GUARANTEE_SELF_HIT) == 1:
                 self.logMessage(MessageType.PROBABILITY,
-                                f"{attacker.shortName} is guaranteed to hit {defender.shortName}!")
+                                "{} is guaranteed to hit {}!", attacker.shortName, defender.shortName)
                 checkHit = True
             else:
                 checkHit = self.rollForHit(attacker, defender)
         elif guaranteeDodge:
             self.logMessage(MessageType.PROBABILITY,
-                            f"{attacker.shortName} is guaranteed to miss {defender.shortName}!")
+                            "{} is guaranteed to miss {}!", attacker.shortName, defender.shortName)
 
         damageDealt : int = 0
         isCritical : bool = False
@@ -1398,7 +1883,7 @@ class CombatController(object):
                 damageDealt = self.applyDamage(attacker, defender, damage, isCritical)
             else:
                 self.logMessage(MessageType.DAMAGE,
-                                f"{attacker.shortName}'s attack misses {defender.shortName}!")
+                                "{}'s attack misses {}!", attacker.shortName, defender.shortName)
 
         attackAttribute : AttackAttribute = self.combatStateMap[attacker].getCurrentAttackAttribute(isPhysical)
         attackResultInfo = AttackResultInfo(attacker, defender, inRange, checkHit, damageDealt,
@@ -1481,7 +1966,7 @@ class CombatController(object):
                     continue
             self.removeSkillEffect(player, expiredEffect)
             if expiredEffect.expirationMessage is not None:
-                self.logMessage(MessageType.EFFECT, f"{player.shortName}'s {expiredEffect.expirationMessage}")
+                self.logMessage(MessageType.EFFECT, "{}'s {}", player.shortName, expiredEffect.expirationMessage)
             for expirationEffect in expiredEffect.expirationEffects:
                 expirationEffect.applyEffect(self, player, [])
 
@@ -1490,7 +1975,7 @@ class CombatController(object):
         Should be called when it's a player's turn, unless they are stunned.
     """
     def beginPlayerTurn(self, player) -> None:
-        self.logMessage(MessageType.BASIC, f"--__{player.name} turn!__--")
+        self.logMessage(MessageType.BASIC, "--__{} turn!__--", player.name)
         self.combatStateMap[player].defendActive = False
         for effectFunction in self.combatStateMap[player].getEffectFunctions(EffectTimings.START_TURN):
             if isinstance(effectFunction, EFStartTurn):
@@ -1509,7 +1994,7 @@ class CombatController(object):
             return False
 
         self.beginPlayerTurn(player)
-        self.logMessage(MessageType.BASIC, f"{player.shortName} is stunned!")
+        self.logMessage(MessageType.BASIC, "{} is stunned!", player.shortName)
         self.spendActionTimer(player, MAX_ACTION_TIMER)
         self._endPlayerTurn(player)
         return True
@@ -1526,13 +2011,16 @@ class CombatController(object):
             for expiredEffect in self.combatStateMap[player].durationTick(self):
                 self.removeSkillEffect(player, expiredEffect)
                 if expiredEffect.expirationMessage is not None:
-                    self.logMessage(MessageType.EFFECT, f"{player.shortName}'s {expiredEffect.expirationMessage}")
+                    self.logMessage(MessageType.EFFECT, "{}'s {}", player.shortName, expiredEffect.expirationMessage)
                 for expirationEffect in expiredEffect.expirationEffects:
                     expirationEffect.applyEffect(self, player, [])
 
         self._applyAggroDecay(player)
         self.previousTurnEntity = player
 
+def _ignoreSpawn(entity : CombatEntity, enemyTeam : bool) -> None:
+    pass
+
 class ActionResultInfo(object):
     def __init__(self, success : ActionSuccessState, startAttack : bool, attackTarget : CombatEntity | None,
                  toggleChanged : bool, newToggle : bool,
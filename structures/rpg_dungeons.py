@@ -1,13 +1,18 @@
 from __future__ import annotations
 import asyncio
+import bisect
+import itertools
 import math
+import os
 from random import Random
 from typing import Callable
 
 from structures.rpg_combat_interface import CombatInputHandler, CombatInterface, NPCInputHandler, LocalPlayerInputHandler
 from rpg_consts import *
 from structures.rpg_combat_entity import *
-from structures.rpg_messages import MessageCollector, makeTeamString
+from structures.rpg_messages import MessageCollector, SharedMessageLog, makeTeamString
+from structures.rpg_replay import CombatReplayRecord, finishRecordedCombat, recordLiveCombat
+from structures.rpg_replay_archive import BinaryCombatReplay
 
 class DungeonData(object):
     registeredDungeons : list[DungeonData] = []
@@ -36,6 +41,13 @@ class DungeonData(object):
 
     def getReward(self, controller : DungeonController, player : Player):
         return self.rewardFn(controller, player)
+
+    @staticmethod
+    def findDungeon(dungeonName : str) -> DungeonData | None:
+        for dungeon in DungeonData.registeredDungeons:
+            if dungeon.dungeonName == dungeonName:
+                return dungeon
+        return None
     
     def meetsRequirements(self, player : Player) -> bool:
         return len(self.milestoneRequirements.intersection(player.milestones)) == len(self.milestoneRequirements)
@@ -44,20 +56,24 @@ class DungeonRoomData(object):
     def __init__(self, enemyGroupWeights : list[tuple[list[Callable[[dict], Enemy]], int]], params : dict):
         self.enemyGroups = [egw[0] for egw in enemyGroupWeights]
         self.weights = [egw[1] for egw in enemyGroupWeights]
+        self.cumulativeWeights = list(itertools.accumulate(self.weights))
         self.previousSpawners : list[Callable[[dict], Enemy]] = []
         self.params = params
 
+    """ Picks an enemy group with probability proportional to its weight. """
+    def rollEnemyGroup(self, rng : Random) -> list[Callable[[dict], Enemy]]:
+        roll = rng.randrange(self.cumulativeWeights[-1])
+        return self.enemyGroups[bisect.bisect_right(self.cumulativeWeights, roll)]
+
+    """ Picks count enemy groups at once (with replacement), e.g. for simulating the room's composition. """
+    def sampleEnemyGroups(self, rng : Random, count : int) -> list[list[Callable[[dict], Enemy]]]:
+        return rng.choices(self.enemyGroups, cum_weights=self.cumulativeWeights, k=count)
+
     def spawnEnemies(self, controller : DungeonController, retry : bool) -> list[Enemy]:
         if not retry:
-            roll = controller.rng.randrange(sum(self.weights))
-            groupIndex = 0
-            while roll >= self.weights[groupIndex] and groupIndex <= len(self.enemyGroups) - 1:
-                roll -= self.weights[groupIndex]
-                groupIndex += 1
-            
-            self.previousSpawners = self.enemyGroups[groupIndex]
+            self.previousSpawners = self.rollEnemyGroup(controller.rng)
 
-        return [spawner(self.params) for spawner in self.previousSpawners]
+        return [ENEMY_PROTOTYPES.spawn(spawner, self.params, controller.rng) for spawner in self.previousSpawners]
     
 class SettingsDungeonRoomData(DungeonRoomData):
     def __init__(self, enemyGroupWeights : list[tuple[list[Callable[[dict], Enemy]], int]], roomSettings : list[RoomSetting], roomSettingsKey : str | None):
@@ -67,15 +83,9 @@ class SettingsDungeonRoomData(DungeonRoomData):
 
     def spawnEnemies(self, controller : DungeonController, retry : bool, chosenSettings : dict) -> list[Enemy]:
         if not retry:
-            roll = controller.rng.randrange(sum(self.weights))
-            groupIndex = 0
-            while roll >= self.weights[groupIndex] and groupIndex <= len(self.enemyGroups) - 1:
-                roll -= self.weights[groupIndex]
-                groupIndex += 1
-            
-            self.previousSpawners = self.enemyGroups[groupIndex]
+            self.previousSpawners = self.rollEnemyGroup(controller.rng)
 
-        return [spawner(chosenSettings) for spawner in self.previousSpawners]
+        return [ENEMY_PROTOTYPES.spawn(spawner, chosenSettings, controller.rng) for spawner in self.previousSpawners]
     
 class RoomSetting(object):
     def __init__(self, settingName : str, settingKey : str, settingDescription : str, settingDefault):
@@ -107,6 +117,8 @@ class DungeonController(object):
         self.playerTeamHandlers = playerTeamHandlers
         self.startingPlayerTeamDistances = startingPlayerTeamDistances
         self.loggers = loggers
+        self.messageLog = SharedMessageLog()
+        [logger.attachToLog(self.messageLog) for logger in self.loggers.values()]
         self.roomSettings = roomSettings
         self.partyOrder = partyOrder
 
@@ -122,14 +134,33 @@ class DungeonController(object):
         self.totalRooms = len(self.dungeonData.dungeonRooms)
         self.currentEnemyTeam : list[Enemy] = []
         self.currentCombatInterface : CombatInterface | None = None
+        self.preparedRoom : PreparedDungeonRoom | None = None
         self.currentHealth : dict[CombatEntity, int] = {player : player.getStatValue(BaseStats.HP) for player in self.playerTeamHandlers}
         self.currentMana : dict[CombatEntity, int] = {player : player.getStatValue(BaseStats.MP) for player in self.playerTeamHandlers}
+
+        # Where the run would pick back up after a restart; see getCheckpointData
+        self.checkpointStage : DungeonCheckpointStage | None = None
+        # rng state from just before the current room's enemies were rolled
+        self.roomRngState : tuple | None = None
+        # Rewards rolled but not yet given out
+        self.pendingRewards : dict[Player, DungeonReward] = {}
+        # Where each fight is saved as a binary replay (see recordLiveCombat), if anywhere
+        self.replayFolder : str | None = None
         
     def sendAllLatestMessages(self):
         [logger.sendNewestMessages(None, False) for logger in self.loggers.values()]
 
-    def logMessage(self, messageType : MessageType, messageText : str):
-        [log.addMessage(messageType, messageText) for log in self.loggers.values()]
+    """
+        Logs a message for every logger. Extra arguments are formatted into the text with str.format, but only if
+        a logger actually displays it.
+    """
+    def logMessage(self, messageType : MessageType, messageTemplate : str, *messageArgs):
+        self.messageLog.addMessage(messageType, messageTemplate, *messageArgs)
+
+    """ Logs a message that only the given player's logger will show. """
+    def logPrivateMessage(self, player : Player, messageType : MessageType, messageTemplate : str, *messageArgs):
+        if player in self.loggers:
+            self.loggers[player].addMessage(messageType, messageTemplate, *messageArgs)
 
     def combatActive(self) -> bool:
         return self.combatIsActive
@@ -139,17 +170,27 @@ class DungeonController(object):
             nextRoom = self.dungeonData.dungeonRooms[self.currentRoom]
 
             if not self.dungeonData.pvpMode:
-                playerHandlerMap : dict[CombatEntity, CombatInputHandler] = {player: self.playerTeamHandlers[player].makeCombatInputController()
-                                                                            for player in self.playerTeamHandlers}
-                isRetry = len(self.currentEnemyTeam) > 0
-                if isinstance(nextRoom, SettingsDungeonRoomData):
-                    self.currentEnemyTeam = nextRoom.spawnEnemies(self, isRetry, self.roomSettings)
-                else:
-                    self.currentEnemyTeam = nextRoom.spawnEnemies(self, isRetry)
+                loggers : dict[CombatEntity, MessageCollector] = {player : self.loggers[player] for player in self.loggers}
+                preparedRoom = self.preparedRoom
+                self.preparedRoom = None
+                self.checkpointStage = DungeonCheckpointStage.ROOM_START
+                if preparedRoom is not None and preparedRoom.roomIndex == self.currentRoom:
+                    self.roomRngState = preparedRoom.rngState
+                    if preparedRoom.inputKey == self._getRoomInputKey():
+                        assert(preparedRoom.combatInterface is not None)
+                        self.currentEnemyTeam = preparedRoom.combatInterface.opponents[:]
+                        self.currentCombatInterface = preparedRoom.commitCombat(loggers)
+                    else:
+                        # Same enemies as prepared, but the combat has to be rebuilt for the party's new setup
+                        self.currentEnemyTeam = [enemy.copyForSpawn() for enemy in preparedRoom.enemyTeam]
+                        self.currentCombatInterface = self._buildCombatInterface(self.currentEnemyTeam, loggers)
+                    return self.currentCombatInterface
 
-                enemyHandlerMap : dict[CombatEntity, CombatInputHandler] = {enemy: NPCInputHandler(enemy) for enemy in self.currentEnemyTeam}
-                self.currentCombatInterface = CombatInterface(playerHandlerMap, enemyHandlerMap, {player : self.loggers[player] for player in self.loggers},
-                                                            self.currentHealth, self.currentMana, self.startingPlayerTeamDistances)
+                isRetry = len(self.currentEnemyTeam) > 0
+                if not isRetry or self.roomRngState is None:
+                    self.roomRngState = self.rng.getstate()
+                self.currentEnemyTeam = self._spawnEnemies(nextRoom, isRetry)
+                self.currentCombatInterface = self._buildCombatInterface(self.currentEnemyTeam, loggers)
                 return self.currentCombatInterface
             
             else:
@@ -171,6 +212,112 @@ class DungeonController(object):
                                                               {}, {}, {}, True)
                 return self.currentCombatInterface
     
+    def _spawnEnemies(self, room : DungeonRoomData, isRetry : bool) -> list[Enemy]:
+        if isinstance(room, SettingsDungeonRoomData):
+            return room.spawnEnemies(self, isRetry, self.roomSettings)
+        return room.spawnEnemies(self, isRetry)
+
+    def _buildCombatInterface(self, enemyTeam : list[Enemy], loggers : dict[CombatEntity, MessageCollector]) -> CombatInterface:
+        playerHandlerMap : dict[CombatEntity, CombatInputHandler] = {player: self.playerTeamHandlers[player].makeCombatInputController()
+                                                                    for player in self.playerTeamHandlers}
+        enemyHandlerMap : dict[CombatEntity, CombatInputHandler] = {enemy: NPCInputHandler(enemy) for enemy in enemyTeam}
+        return CombatInterface(playerHandlerMap, enemyHandlerMap, loggers,
+                               self.currentHealth, self.currentMana, self.startingPlayerTeamDistances)
+
+    """ Everything the next room's combat is built from, besides its enemies. """
+    def _getRoomInputKey(self) -> tuple:
+        return (self.currentRoom,
+                tuple((player, player.statVersion, player.saveVersion) for player in self.playerTeamHandlers),
+                tuple(self.loggers),
+                tuple(self.startingPlayerTeamDistances.items()),
+                tuple(self.currentHealth.items()),
+                tuple(self.currentMana.items()))
+
+    """
+        Spawns the next room's enemies and builds its combat ahead of time, so beginRoom doesn't have to when
+        the party is ready. If the party, formation, or anyone's equipment/stats change in the meantime,
+        beginRoom rebuilds the combat against the same enemies.
+    """
+    def prepareNextRoom(self):
+        if self.dungeonData.pvpMode or self.currentRoom >= self.totalRooms or self.currentCombatInterface is not None:
+            return
+        if self.preparedRoom is not None and self.preparedRoom.roomIndex == self.currentRoom:
+            return
+
+        rngState = self.rng.getstate()
+        preparedRoom = PreparedDungeonRoom(self.currentRoom, self._spawnEnemies(self.dungeonData.dungeonRooms[self.currentRoom], False))
+        preparedRoom.rngState = rngState
+        stagingCollector = MessageCollector()
+        stagingCollector.attachToLog(preparedRoom.stagingLog)
+        preparedRoom.inputKey = self._getRoomInputKey()
+        preparedRoom.combatInterface = self._buildCombatInterface([enemy.copyForSpawn() for enemy in preparedRoom.enemyTeam],
+                                                                  {player : stagingCollector for player in self.loggers})
+        self.preparedRoom = preparedRoom
+
+    """
+        Returns everything needed to pick the run back up with fromCheckpointData, as plain data, or None if
+        there's nothing to resume (PvP runs aren't checkpointed). memberIds gives the id each player is saved under.
+        Meant to be called between any two steps of the run: it only reads state that's updated at room boundaries
+        (or, for rewards, at the moment each one is given out).
+    """
+    def getCheckpointData(self, memberIds : dict[Player, int]) -> dict | None:
+        if self.dungeonData.pvpMode or self.checkpointStage is None:
+            return None
+        members = [player for player in self.partyOrder
+                   if player in self.playerTeamHandlers and player not in self.playersToRemove and player in memberIds]
+        if len(members) == 0:
+            return None
+
+        # A room that hasn't been cleared (or was already prepared) is rolled again from the same state, so it comes back with the same enemies
+        rngState = self.roomRngState if self.checkpointStage == DungeonCheckpointStage.ROOM_START else None
+        if self.checkpointStage == DungeonCheckpointStage.BETWEEN_ROOMS and self.preparedRoom is not None and self.preparedRoom.roomIndex == self.currentRoom:
+            rngState = self.preparedRoom.rngState
+        if rngState is None:
+            rngState = self.rng.getstate()
+        return {
+            "formatVersion": DUNGEON_CHECKPOINT_FORMAT_VERSION,
+            "dungeonName": self.dungeonData.dungeonName,
+            "stage": self.checkpointStage.name,
+            "room": self.currentRoom,
+            "roomSettings": self.roomSettings,
+            "rngState": [rngState[0], list(rngState[1]), rngState[2]],
+            "members": [{
+                "userId": memberIds[player],
+                "health": self.currentHealth[player],
+                "mana": self.currentMana[player],
+                "distance": self.startingPlayerTeamDistances.get(player, DEFAULT_STARTING_DISTANCE),
+                "pendingReward": self.pendingRewards[player].getSaveData() if player in self.pendingRewards else None
+            } for player in members]
+        }
+
+    """
+        Rebuilds a run from getCheckpointData's output, for runDungeon(True) to resume. players maps each saved id to
+        the player it belongs to; members missing from it are left out of the run.
+    """
+    @staticmethod
+    def fromCheckpointData(checkpointData : dict, players : dict[int, Player], playerTeamHandlers : dict[Player, DungeonInputHandler],
+                           loggers : dict[Player, MessageCollector]) -> DungeonController:
+        dungeonData = DungeonData.findDungeon(checkpointData["dungeonName"])
+        if dungeonData is None:
+            raise KeyError(f"no dungeon named {checkpointData['dungeonName']}")
+        memberData = [member for member in checkpointData["members"] if member["userId"] in players]
+        partyOrder = [players[member["userId"]] for member in memberData]
+        startingDistances : dict[CombatEntity, int] = {players[member["userId"]]: member["distance"] for member in memberData}
+
+        controller = DungeonController(dungeonData, playerTeamHandlers, startingDistances, loggers,
+                                       checkpointData["roomSettings"], partyOrder)
+        controller.currentRoom = checkpointData["room"]
+        controller.checkpointStage = DungeonCheckpointStage[checkpointData["stage"]]
+        version, internalState, gaussNext = checkpointData["rngState"]
+        controller.rng.setstate((version, tuple(internalState), gaussNext))
+        for member in memberData:
+            player = players[member["userId"]]
+            controller.currentHealth[player] = member["health"]
+            controller.currentMana[player] = member["mana"]
+            if member["pendingReward"] is not None:
+                controller.pendingRewards[player] = DungeonReward.fromSaveData(member["pendingReward"])
+        return controller
+
     def completeRoom(self) -> dict[Player, DungeonReward] | None:
         if self.dungeonData.pvpMode:
             self.currentRoom += 1
@@ -220,7 +367,9 @@ class DungeonController(object):
             if handler is not None:
                 handler.onPlayerLeaveDungeon()
 
-        self.loggers.pop(player, None)
+        removedLogger = self.loggers.pop(player, None)
+        if removedLogger is not None:
+            removedLogger.detachFromLog()
         self.logMessage(MessageType.BASIC, f"{player.name} escaped from the dungeon.")
         self.sendAllLatestMessages()
 
@@ -236,44 +385,42 @@ class DungeonController(object):
     async def handleRewardsForPlayer(self, player : Player, reward : DungeonReward):
         scaledExp = self._scaleDungeonExp(player, reward.exp)
         levelUp, rankUp = player.gainExp(scaledExp)
-        if player in self.loggers:
-            self.loggers[player].addMessage(
-                MessageType.BASIC, f"*Gained **{scaledExp} EXP!***{' *(Scaled down because you outlevel this dungeon.)*' if scaledExp != reward.exp else ''}"
-            )
+        if reward.exp > 0:
+            self.logPrivateMessage(player, MessageType.BASIC,
+                f"*Gained **{scaledExp} EXP!***{' *(Scaled down because you outlevel this dungeon.)*' if scaledExp != reward.exp else ''}")
         if levelUp:
-            if player in self.loggers:
-                self.loggers[player].addMessage(
-                    MessageType.BASIC, f"**Your level increased to {player.level}! Gained {STAT_POINTS_PER_LEVEL} stat points.**"
-                )
+            self.logPrivateMessage(player, MessageType.BASIC,
+                f"**Your level increased to {player.level}! Gained {STAT_POINTS_PER_LEVEL} stat points.**")
         if rankUp:
             classData =  PlayerClassData.PLAYER_CLASS_DATA_MAP[player.currentPlayerClass]
             newSkillData = classData.getSingleSkillForRank(player.currentPlayerClass, player.classRanks[player.currentPlayerClass])
             newSkillString = f" Gained new skill: {newSkillData.skillName}!" if newSkillData is not None else "" 
-            if player in self.loggers:
-                self.loggers[player].addMessage(
-                    MessageType.BASIC, f"**Your {classData.className.name[0] + classData.className.name[1:].lower()}" +
-                        f" rank increased to {player.classRanks[player.currentPlayerClass]}!{newSkillString}**"
-                )
+            self.logPrivateMessage(player, MessageType.BASIC,
+                f"**Your {classData.className.name[0] + classData.className.name[1:].lower()}" +
+                    f" rank increased to {player.classRanks[player.currentPlayerClass]}!{newSkillString}**")
         
         player.wup += reward.wup
         player.swup += reward.swup
         player.milestones = player.milestones.union(reward.milestones)
+        player.markSaveDirty()
         wupString = f"**{reward.wup} WUP**" if reward.wup > 0 else ""
         swupString = f"**{reward.swup} SWUP**" if reward.swup > 0 else ""
         andString = " and " if reward.wup > 0 and reward.swup > 0 else ""
         if reward.wup > 0 or reward.swup > 0:
-            if player in self.loggers:
-                self.loggers[player].addMessage(
-                    MessageType.BASIC, f"*Picked up {wupString}{andString}{swupString}!*"
-                )
+            self.logPrivateMessage(player, MessageType.BASIC, f"*Picked up {wupString}{andString}{swupString}!*")
+
+        # Everything above was given out at once, so from here a checkpoint only needs the equips not yet picked up
+        remainingReward = DungeonReward()
+        remainingReward.equips = reward.equips[:]
+        if player in self.pendingRewards:
+            self.pendingRewards[player] = remainingReward
 
         for equip in reward.equips:
-            if player in self.loggers:
-                self.loggers[player].addMessage(
-                    MessageType.BASIC, f"*Picked up {equip.name}!*"
-                )
+            self.logPrivateMessage(player, MessageType.BASIC, f"*Picked up {equip.name}!*")
             self.sendAllLatestMessages()
             await self.playerTeamHandlers[player].getEquip(self, equip)
+            remainingReward.equips.remove(equip)
+        self.pendingRewards.pop(player, None)
 
         # self.loggers[player].addMessage(
         #     MessageType.BASIC, f"*Waiting for teammates...*"
@@ -308,71 +455,157 @@ class DungeonController(object):
 
     def loadCheckWaiting(self):
         return self.waitingForReady or self.waitingForRetry
+
+    """ Gives out rewards, keeping track of them as pending until each player has received theirs. """
+    async def _grantRewards(self, rewardMap : dict[Player, DungeonReward]):
+        self.pendingRewards.update({player: rewardMap[player] for player in self.playerTeamHandlers})
+        await asyncio.gather(*[self.handleRewardsForPlayer(player, rewardMap[player]) for player in self.playerTeamHandlers])
+
+    """
+        Picks up a run rebuilt by fromCheckpointData. Rooms that were in progress start over; otherwise, any
+        rewards that hadn't been given out yet are, and the party gets to ready up again.
+        Returns False if the party is gone by then.
+    """
+    async def _resumeFromCheckpoint(self) -> bool:
+        self.logMessage(MessageType.BASIC,
+                        f"*{makeTeamString([player for player in self.playerTeamHandlers])} return to {self.dungeonData.dungeonName}...*\n")
+        if self.checkpointStage == DungeonCheckpointStage.ROOM_START:
+            return True
+
+        pendingRewards = {player: reward for player, reward in self.pendingRewards.items() if player in self.playerTeamHandlers}
+        self.pendingRewards = {}
+        if len(pendingRewards) > 0:
+            self.pendingRewards.update(pendingRewards)
+            await asyncio.gather(*[self.handleRewardsForPlayer(player, pendingRewards[player]) for player in pendingRewards])
+        if self.checkpointStage == DungeonCheckpointStage.BETWEEN_ROOMS and self.currentRoom < self.totalRooms:
+            await self._processReady()
+        return len(self.playerTeamHandlers) > 0
         
+    """
+        Starts recording the room's fight, if this run keeps replays and it's the boss room (every dungeon's last).
+        A fight that can't be recorded just isn't.
+    """
+    def _startReplay(self) -> CombatReplayRecord | None:
+        if self.replayFolder is None or self.dungeonData.pvpMode or self.currentRoom != self.totalRooms - 1:
+            return None
+        assert(self.currentCombatInterface is not None)
+        try:
+            return recordLiveCombat(self.currentCombatInterface, self.startingPlayerTeamDistances, self.currentHealth, self.currentMana)
+        except ValueError as e:
+            print(f"not recording a fight in {self.dungeonData.dungeonName}: {e}")
+            return None
+
+    async def _saveReplay(self, record : CombatReplayRecord):
+        assert(self.currentCombatInterface is not None)
+        assert(self.replayFolder is not None)
+        finishRecordedCombat(self.currentCombatInterface, record)
+        filename = f"{self.replayFolder}{COMBAT_REPLAY_FILE_NAME}{record.seed}{COMBAT_REPLAY_FILE_SUFFIX}"
+        try:
+            await asyncio.to_thread(self._writeReplay, record, filename)
+        except OSError as e:
+            print(f"unable to save the replay of a fight in {self.dungeonData.dungeonName}: {e}")
+
+    def _writeReplay(self, record : CombatReplayRecord, filename : str):
+        assert(self.replayFolder is not None)
+        os.makedirs(self.replayFolder, exist_ok=True)
+        BinaryCombatReplay.writeFile(record, filename)
+
+        replayFiles = [entry for entry in os.scandir(self.replayFolder)
+                       if entry.is_file() and entry.name.startswith(COMBAT_REPLAY_FILE_NAME)]
+        if len(replayFiles) > COMBAT_REPLAY_KEEP_COUNT:
+            replayFiles.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in replayFiles[:len(replayFiles) - COMBAT_REPLAY_KEEP_COUNT]:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
     """
         Returns true if the run is successful.
+        With reload, resumes a run rebuilt from a checkpoint by fromCheckpointData.
     """
     async def runDungeon(self, reload : bool) -> bool:
         if not reload:
             plural = "s" if len(self.playerTeamHandlers) == 1 else ""
             self.logMessage(MessageType.BASIC,
                             f"*{makeTeamString([player for player in self.playerTeamHandlers])} enter{plural} {self.dungeonData.dungeonName}...*\n")
+        elif not (await self._resumeFromCheckpoint()):
+            return False
 
         while self.currentRoom < self.totalRooms:
-            if not self.loadCheckWaiting():
-                if len(self.playerTeamHandlers) == 0:
-                    return False
-                
-                if reload:
-                    self.currentCombatInterface = None
-
-                self.beginRoom()
-                assert (self.currentCombatInterface is not None)
-
-                self.combatIsActive = True
-                await self.currentCombatInterface.runCombat(self.combatReadyFlag)
-                self.combatIsActive = False
-
-                self.combatReadyFlag.clear()
-                for player in self.playersToRemove:
-                    self.playerTeamHandlers.pop(player, None)
-                self.playersToRemove = []
-
-                if not self.dungeonData.pvpMode:
-                    if not self.currentCombatInterface.cc.checkPlayerVictory():
-                        if not (await self._processRetry()):
-                            return False
-                    else:
-                        rewardMap = self.completeRoom()
-                        assert rewardMap is not None
-                        await asyncio.gather(*[self.handleRewardsForPlayer(player, rewardMap[player]) for player in self.playerTeamHandlers])
-                        if self.currentRoom < self.totalRooms:
-                            await self._processReady()
-                            if len(self.playerTeamHandlers) == 0:
-                                return False
-                else:
-                    self.completeRoom()
-            else:
-                # Attempt to handle interruptions between rooms
-                assert(reload)
-                if self.waitingForRetry:
+            if len(self.playerTeamHandlers) == 0:
+                return False
+
+            self.beginRoom()
+            assert (self.currentCombatInterface is not None)
+            replayRecord = self._startReplay()
+
+            self.combatIsActive = True
+            await self.currentCombatInterface.runCombat(self.combatReadyFlag)
+            self.combatIsActive = False
+            if replayRecord is not None:
+                await self._saveReplay(replayRecord)
+
+            self.combatReadyFlag.clear()
+            for player in self.playersToRemove:
+                self.playerTeamHandlers.pop(player, None)
+            self.playersToRemove = []
+
+            if not self.dungeonData.pvpMode:
+                if not self.currentCombatInterface.cc.checkPlayerVictory():
                     if not (await self._processRetry()):
                         return False
                 else:
-                    await self._processReady()
+                    rewardMap = self.completeRoom()
+                    assert rewardMap is not None
+                    self.checkpointStage = DungeonCheckpointStage.BETWEEN_ROOMS
+                    await self._grantRewards(rewardMap)
+                    if self.currentRoom < self.totalRooms:
+                        readyTask = asyncio.create_task(self._processReady())
+                        # Let the between-rooms menus go out first, then build the next room while the party looks them over
+                        await asyncio.sleep(0)
+                        self.prepareNextRoom()
+                        await readyTask
+                        if len(self.playerTeamHandlers) == 0:
+                            return False
+            else:
+                self.completeRoom()
 
-        if not self.dungeonData.pvpMode:
+        # Resumed runs that had already been cleared got their clear rewards in _resumeFromCheckpoint
+        if not self.dungeonData.pvpMode and self.checkpointStage != DungeonCheckpointStage.CLEARED:
             self.logMessage(MessageType.BASIC,
                             f"**{makeTeamString([player for player in self.playerTeamHandlers])} cleared {self.dungeonData.dungeonName}!**\n")
             rewardMap = self.completeDungeon()
             assert(rewardMap is not None)
-            await asyncio.gather(*[self.handleRewardsForPlayer(player, rewardMap[player]) for player in self.playerTeamHandlers])
+            self.checkpointStage = DungeonCheckpointStage.CLEARED
+            await self._grantRewards(rewardMap)
         self.sendAllLatestMessages()
         [self.playerTeamHandlers[player].onDungeonComplete() for player in self.playerTeamHandlers]
 
         return True
 
 
+"""
+    A room's enemies and combat built ahead of time by DungeonController.prepareNextRoom. The combat's
+    opening messages are held in a log of its own until the room actually begins.
+"""
+class PreparedDungeonRoom(object):
+    def __init__(self, roomIndex : int, enemyTeam : list[Enemy]):
+        self.roomIndex = roomIndex
+        # Never put into a combat themselves; each combat built for the room gets copies
+        self.enemyTeam = enemyTeam
+        self.rngState : tuple | None = None
+        self.inputKey : tuple | None = None
+        self.combatInterface : CombatInterface | None = None
+        self.stagingLog = SharedMessageLog()
+
+    def commitCombat(self, loggers : dict[CombatEntity, MessageCollector]) -> CombatInterface:
+        assert(self.combatInterface is not None)
+        self.combatInterface.attachLoggers(loggers)
+        for message in self.stagingLog.messages:
+            self.combatInterface.cc.logMessage(message.messageType, message.messageTemplate, *message.messageArgs)
+        return self.combatInterface
+
 class DungeonReward(object):
     def __init__(self):
         self.exp = 0
@@ -389,6 +622,25 @@ class DungeonReward(object):
         if enemyReward.equip is not None:
             self.equips.append(enemyReward.equip)
 
+    def getSaveData(self) -> dict:
+        return {
+            "exp": self.exp,
+            "wup": self.wup,
+            "swup": self.swup,
+            "equips": [equip.getSaveData() for equip in self.equips],
+            "milestones": sorted(milestone.name for milestone in self.milestones)
+        }
+
+    @staticmethod
+    def fromSaveData(data : dict) -> DungeonReward:
+        reward = DungeonReward()
+        reward.exp = data["exp"]
+        reward.wup = data["wup"]
+        reward.swup = data["swup"]
+        reward.equips = [Equipment.fromSaveData(equipData) for equipData in data["equips"]]
+        reward.milestones = set(Milestones[milestone] for milestone in data["milestones"])
+        return reward
+
 
 class DungeonInputHandler(object):
     def __init__(self, player : Player, combatInputControllerClass : type[CombatInputHandler]):
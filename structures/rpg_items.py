@@ -1,3 +1,4 @@
+from __future__ import annotations
 import math
 import random
 import numpy as np
@@ -16,18 +17,35 @@ class Item(object):
         self.name : str = name
 
 class EquipmentTrait(object):
-    def __init__(self, summary : str,
+    # Every trait and curse by its traitId, which is what saves refer to them by
+    registry : dict[str, EquipmentTrait] = {}
+    # class-level default for traits pickled before ids existed; see getTraitId
+    traitId : str = ""
+
+    def __init__(self, traitId : str, summary : str,
                  descriptionGenerator: Callable[[int, bool], str], effectSkillGenerator : Callable[[int, bool], PassiveSkillData]) -> None:
+        self.traitId = traitId
         self.summary = summary
         self.descriptionGenerator : Callable[[int, bool], str] = descriptionGenerator
         self.effectSkillGenerator : Callable[[int, bool], PassiveSkillData] = effectSkillGenerator
 
+        EquipmentTrait.registry[traitId] = self
+
     def getDescription(self, rarity : int, curseBoost : bool) -> str:
         return self.descriptionGenerator(rarity, curseBoost)
 
     def getEffectSkill(self, rarity : int, curseBoost : bool) -> PassiveSkillData:
         return self.effectSkillGenerator(rarity, curseBoost)
 
+    """ Gets the registered id for this trait; traits from old pickles are matched up by their summary. """
+    def getTraitId(self) -> str:
+        if self.traitId != "":
+            return self.traitId
+        for trait in EquipmentTrait.registry.values():
+            if trait.summary == self.summary:
+                return trait.traitId
+        raise KeyError(self.summary)
+
 class Equipment(Item):
     def __init__(self, name : str, equipSlot : EquipmentSlot, baseStats : dict[BaseStats, int],
                 curse : EquipmentTrait | None, traits : list[EquipmentTrait], rarity : int, rank : int,
@@ -192,6 +210,43 @@ class Equipment(Item):
     """ An item is Adaptable if its rarity has been increased or maximized. """
     def isAdaptable(self):
         return self.rarityIncreased or self.rarity == MAX_ITEM_RARITY
+
+    """
+        Returns the item as plain data for saving. Traits and curses are stored by id, so their effects
+        always come from the current definitions when the item is rebuilt by fromSaveData.
+    """
+    def getSaveData(self) -> dict:
+        return {
+            "name": self.name,
+            "slot": self.equipSlot.name,
+            "stats": {stat.name: value for stat, value in self.baseStats.items()},
+            "rarity": self.rarity,
+            "rank": self.rank,
+            "specialName": self.specialName,
+            "curse": None if self.curse is None else self.curse.getTraitId(),
+            "traits": [trait.getTraitId() for trait in self.traits],
+            "rarityIncreased": self.rarityIncreased,
+            "timesTraitsAdapted": self.timesTraitsAdapted,
+            "priceOverride": None if self.priceOverride is None else list(self.priceOverride)
+        }
+
+    @staticmethod
+    def fromSaveData(data : dict) -> Equipment:
+        baseStats = {BaseStats[statName]: value for statName, value in data["stats"].items()}
+        curse = None if data["curse"] is None else EquipmentTrait.registry[data["curse"]]
+        traits = [EquipmentTrait.registry[traitId] for traitId in data["traits"]]
+        priceOverride = None if data["priceOverride"] is None else tuple(data["priceOverride"])
+
+        equip : Equipment
+        if "weaponType" in data:
+            equip = Weapon(data["name"], WeaponType[data["weaponType"]], baseStats, curse, traits,
+                           data["rarity"], data["rank"], data["specialName"], priceOverride)
+        else:
+            equip = Equipment(data["name"], EquipmentSlot[data["slot"]], baseStats, curse, traits,
+                              data["rarity"], data["rank"], data["specialName"], priceOverride)
+        equip.rarityIncreased = data["rarityIncreased"]
+        equip.timesTraitsAdapted = data["timesTraitsAdapted"]
+        return equip
     
 class Weapon(Equipment):
     def __init__(self, name : str, weaponType : WeaponType, baseStats : dict[BaseStats, int],
@@ -221,28 +276,33 @@ class Weapon(Equipment):
         super().reloadTraitSkills()
         self.currentTraitSkills.append(self.rangeSkill)
 
+    def getSaveData(self) -> dict:
+        saveData = super().getSaveData()
+        saveData["weaponType"] = self.weaponType.name
+        return saveData
+
 # Weapon/trait definition; move later?
 
 def makeStatUpTrait(stat: Stats, scaling : int):
-    return EquipmentTrait(f"{stat.name} Increase", lambda r, c: f"Increase {stat.name} by {scaling*(r+1)*(1.5 if c else 1)}%.",
+    return EquipmentTrait(f"{stat.name}_UP", f"{stat.name} Increase", lambda r, c: f"Increase {stat.name} by {scaling*(r+1)*(1.5 if c else 1)}%.",
                    lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {},
                                                  {stat: 1 + (scaling*(r+1)*(0.015 if c else 0.01))}, [], False))
     
 def makeStatDownTrait(stat: Stats, scaling : int):
-    return EquipmentTrait(f"{stat.name} Decrease", lambda r, c: f"Decrease {stat.name} by {scaling*(r+1)}%.",
+    return EquipmentTrait(f"{stat.name}_DOWN", f"{stat.name} Decrease", lambda r, c: f"Decrease {stat.name} by {scaling*(r+1)}%.",
                    lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {},
                                                  {stat: 1 - (scaling*(r+1)*0.01)}, [], False))
 
 # TODO: probably needs more specific revert
 def makeWeaknessTrait(attribute : AttackAttribute):
     attributeString = attribute.name[0] + attribute.name[1:].lower()
-    return EquipmentTrait(f"{attributeString} Weakness", lambda r, c: f"Gain {r+1} stack(s) of {attributeString}-attribute weakness.",
+    return EquipmentTrait(f"{attribute.name}_WEAKNESS", f"{attributeString} Weakness", lambda r, c: f"Gain {r+1} stack(s) of {attributeString}-attribute weakness.",
                     lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [SkillEffect("",
                         [EFImmediate(lambda controller, user, _1, _2: controller.addWeaknessStacks(user, attribute, r+1))], None)], False))
 
 def makeResistanceTrait(attribute : AttackAttribute):
     attributeString = attribute.name[0] + attribute.name[1:].lower()
-    return EquipmentTrait(f"{attributeString} Resistance", lambda r, c: f"Gain {r+1+(1 if c else 0)} stack(s) of {attributeString}-attribute resistance.",
+    return EquipmentTrait(f"{attribute.name}_RESISTANCE", f"{attributeString} Resistance", lambda r, c: f"Gain {r+1+(1 if c else 0)} stack(s) of {attributeString}-attribute resistance.",
                     lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {}, [SkillEffect("",
                         [EFImmediate(lambda controller, user, _1, _2: controller.addResistanceStacks(user, attribute, r+1+(1 if c else 0)))],
                         None)], False))
@@ -267,36 +327,37 @@ resistLightTrait = makeResistanceTrait(MagicalAttackAttribute.LIGHT)
 resistDarkTrait = makeResistanceTrait(MagicalAttackAttribute.DARK)
 
 """ Use a formatting field in description to indicate the part to replace with the amount. """
-def makeFlatStatBonusTrait(stat: Stats, scaling : int, summary : str, description : str):
-    return EquipmentTrait(summary, lambda r, c: description.format(abs(scaling*(r+1)*(1.5 if c else 1))),
+def makeFlatStatBonusTrait(traitId : str, stat: Stats, scaling : int, summary : str, description : str):
+    return EquipmentTrait(traitId, summary, lambda r, c: description.format(abs(scaling*(r+1)*(1.5 if c else 1))),
                           lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "",
                                                         {stat: scaling*(r+1)*(0.015 if c else 0.01)}, {}, [], False))
-def makeMultStatBonusTrait(stat: Stats, scaling : int, summary : str, description : str):
-    return EquipmentTrait(summary, lambda r, c: description.format(abs(scaling*(r+1)*(1.5 if c else 1))),
+def makeMultStatBonusTrait(traitId : str, stat: Stats, scaling : int, summary : str, description : str):
+    return EquipmentTrait(traitId, summary, lambda r, c: description.format(abs(scaling*(r+1)*(1.5 if c else 1))),
                           lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {},
                                                         {stat: 1 + (scaling*(r+1)*(0.015 if c else 0.01))}, [], False))
 
-bonusWeaknessTrait = makeMultStatBonusTrait(CombatStats.BONUS_WEAKNESS_DAMAGE_MULT, 4, "Increase Damage Against Weaknesses",
+bonusWeaknessTrait = makeMultStatBonusTrait("BONUS_WEAKNESS_DAMAGE", CombatStats.BONUS_WEAKNESS_DAMAGE_MULT, 4, "Increase Damage Against Weaknesses",
                                             "Increase damage by {}% when targeting a weakness.")
-ignoreResistanceTrait = makeMultStatBonusTrait(CombatStats.IGNORE_RESISTANCE_MULT, 5, "Ignore Resistances",
+ignoreResistanceTrait = makeMultStatBonusTrait("IGNORE_RESISTANCE", CombatStats.IGNORE_RESISTANCE_MULT, 5, "Ignore Resistances",
                                                "Ignore {}% of opponent resistances.")
-critRateTrait = makeFlatStatBonusTrait(CombatStats.CRIT_RATE, 2, "Critical Hit Rate Increase",
+critRateTrait = makeFlatStatBonusTrait("CRIT_RATE", CombatStats.CRIT_RATE, 2, "Critical Hit Rate Increase",
                                        "Increase critical hit rate by {}%.")
-critDamageTrait = makeFlatStatBonusTrait(CombatStats.CRIT_RATE, 3, "Critical Damage Increase",
+critDamageTrait = makeFlatStatBonusTrait("CRIT_DAMAGE", CombatStats.CRIT_RATE, 3, "Critical Damage Increase",
                                          "Increase critical hit damage by {}%.")
-aggroIncreaseTrait = makeFlatStatBonusTrait(CombatStats.AGGRO_MULT, 5, "Aggro Increase",
+aggroIncreaseTrait = makeFlatStatBonusTrait("AGGRO_UP", CombatStats.AGGRO_MULT, 5, "Aggro Increase",
                                             "Increase aggro generated by {}%.")
-aggroDecreaseTrait = makeFlatStatBonusTrait(CombatStats.AGGRO_MULT, -4, "Aggro Decrease",
+aggroDecreaseTrait = makeFlatStatBonusTrait("AGGRO_DOWN", CombatStats.AGGRO_MULT, -4, "Aggro Decrease",
                                             "Decrease aggro generated by {}%.")
-statusResistanceTrait = makeMultStatBonusTrait(CombatStats.STATUS_RESISTANCE_MULTIPLIER, 4, "Increase Status Condition Resistance",
+statusResistanceTrait = makeMultStatBonusTrait("STATUS_RESISTANCE", CombatStats.STATUS_RESISTANCE_MULTIPLIER, 4, "Increase Status Condition Resistance",
                                                "Increase status condition resistance by {}%.")
-statusApplicationTrait = makeMultStatBonusTrait(CombatStats.STATUS_APPLICATION_TOLERANCE_MULTIPLIER, -5, "Improve Status Condition Application",
+statusApplicationTrait = makeMultStatBonusTrait("STATUS_APPLICATION", CombatStats.STATUS_APPLICATION_TOLERANCE_MULTIPLIER, -5, "Improve Status Condition Application",
                                                "Increase the chance of applying status conditions by {}%.")
 
 def makeStatusEffectTrait(statusName : StatusConditionNames, procScaling : int, duration : int, valMethod : Callable | None, description : str):
     statusClass = STATUS_CLASS_MAP[statusName]
     statusSummary = f"Chance to Apply {statusName.name}"
-    return EquipmentTrait(statusSummary, lambda r, c: description.format(abs(procScaling*(r+1)*(1.5 if c else 1)), duration + (1 if c else 0)),
+    return EquipmentTrait(f"{statusName.name}_ON_HIT", statusSummary,
+                          lambda r, c: description.format(abs(procScaling*(r+1)*(1.5 if c else 1)), duration + (1 if c else 0)),
                             lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {},
             [SkillEffect("", [EFAfterNextAttack(
                 lambda controller, user, target, attackInfo, _: void(
@@ -333,29 +394,29 @@ fearEffectTrait = makeStatusEffectTrait(StatusConditionNames.FEAR, 2, 5,
                                           lambda controller, user, target: 0.9,
                                           "{}% chance to attempt to apply FEAR (10% strength) on hit for {} turns.")
 
-healthDrainTrait = EquipmentTrait("Attacks Restore HP", lambda r, c: f"Restore {r+1}% of the damage you deal as HP.",
+healthDrainTrait = EquipmentTrait("HEALTH_DRAIN", "Attacks Restore HP", lambda r, c: f"Restore {r+1}% of the damage you deal as HP.",
                                   lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {},
     [SkillEffect("", [EFAfterNextAttack(
         lambda controller, user, _1, attackInfo, _2: void(controller.gainHealth(user, math.ceil(attackInfo.damageDealt * ((r+1) * 0.01))))
     )], None)], False))
-manaGainTrait = EquipmentTrait("Attacks Restore MP", lambda r, c: f"When you hit the opponent, restore {(2*r)-3}% of your MP.",
+manaGainTrait = EquipmentTrait("MANA_GAIN", "Attacks Restore MP", lambda r, c: f"When you hit the opponent, restore {(2*r)-3}% of your MP.",
                                   lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {},
     [SkillEffect("", [EFAfterNextAttack(
         lambda controller, user, _1, attackInfo, _2:
             void(controller.gainMana(user, math.ceil(controller.getMaxMana(user) * (((2*r)-3) * 0.01)))) if attackInfo.attackHit else None
     )], None)], False))
 
-luckTrait = EquipmentTrait("Lucky", lambda r, c: f"Become{','.join([' much' for i in range(math.floor(r*(1.5 if c else 1) / 2)-1)])} luckier!",
+luckTrait = EquipmentTrait("LUCK", "Lucky", lambda r, c: f"Become{','.join([' much' for i in range(math.floor(r*(1.5 if c else 1) / 2)-1)])} luckier!",
                           lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "",
                                                         {CombatStats.LUCK: math.floor(r*(1.5 if c else 1) / 2)}, {}, [], False))
 
 
-healthCostCurse = EquipmentTrait("Attacks Cost HP", lambda r, c: f"When attacking, spend {r+1}% of your total HP. (Cannot kill you.)",
+healthCostCurse = EquipmentTrait("HEALTH_COST", "Attacks Cost HP", lambda r, c: f"When attacking, spend {r+1}% of your total HP. (Cannot kill you.)",
                                   lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {},
     [SkillEffect("", [EFBeforeNextAttack({}, {},
         lambda controller, user, _1, _2: void(controller.applyDamage(user, user,
             min(math.ceil(controller.getMaxHealth(user) * ((r+1)*0.01)), controller.getCurrentHealth(user)-1))), None)], None)], False))
-manaCostCurse = EquipmentTrait("Attacks Cost MP", lambda r, c: f"When attacking, spend {r+1}% of your total MP.",
+manaCostCurse = EquipmentTrait("MANA_COST", "Attacks Cost MP", lambda r, c: f"When attacking, spend {r+1}% of your total MP.",
                                   lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {},
     [SkillEffect("", [EFBeforeNextAttack({}, {},
         lambda controller, user, _1, _2:
@@ -364,7 +425,7 @@ manaCostCurse = EquipmentTrait("Attacks Cost MP", lambda r, c: f"When attacking,
 def makeStatusEffectCurse(statusName : StatusConditionNames, procScaling : float, duration : int, valMethod : Callable | None, description : str):
     statusClass = STATUS_CLASS_MAP[statusName]
     statusSummary = f"Attacks May Self-Inflict {statusName}"
-    return EquipmentTrait(statusSummary, lambda r, c: description.format(abs(procScaling*(r+1)), duration),
+    return EquipmentTrait(f"{statusName.name}_SELF_INFLICT", statusSummary, lambda r, c: description.format(abs(procScaling*(r+1)), duration),
                             lambda r, c: PassiveSkillData("", BasePlayerClassNames.WARRIOR, 0, False, "", {}, {},
             [SkillEffect("", [EFAfterNextAttack(
                 lambda controller, user, _1, attackInfo, _2: void(
@@ -390,36 +451,40 @@ perplexityEffectCurse = makeStatusEffectCurse(StatusConditionNames.PERPLEXITY, 2
                                               lambda controller, user: 1.5,
                                           "After attacking, {:.1f}% chance to attempt to self-inflict PERPLEXITY (50% strength) for {} turns.")
 
+# Built once so that each curse has a single registered instance
+_commonCurseTraits = [
+    makeStatDownTrait(BaseStats.HP, 4),
+    makeStatDownTrait(BaseStats.MP, 4),
+    makeStatDownTrait(BaseStats.DEF, 5),
+    makeStatDownTrait(BaseStats.RES, 5),
+    makeStatDownTrait(BaseStats.ACC, 3),
+    makeStatDownTrait(BaseStats.AVO, 3),
+    makeStatDownTrait(BaseStats.SPD, 4),
+    makeWeaknessTrait(PhysicalAttackAttribute.SLASHING),
+    makeWeaknessTrait(PhysicalAttackAttribute.PIERCING),
+    makeWeaknessTrait(PhysicalAttackAttribute.CRUSHING),
+    makeWeaknessTrait(MagicalAttackAttribute.FIRE),
+    makeWeaknessTrait(MagicalAttackAttribute.ICE),
+    makeWeaknessTrait(MagicalAttackAttribute.WIND),
+    makeWeaknessTrait(MagicalAttackAttribute.LIGHT),
+    makeWeaknessTrait(MagicalAttackAttribute.DARK),
+    healthCostCurse,
+    manaCostCurse,
+    targetEffectCurse,
+    blindEffectCurse,
+    stunEffectCurse,
+    exhaustionEffectCurse,
+    misfortuneEffectCurse,
+    restrictEffectCurse,
+    perplexityEffectCurse
+]
+healingEffectivenessCurse = makeFlatStatBonusTrait("HEALING_EFFECTIVENESS_DOWN", CombatStats.HEALING_EFFECTIVENESS, -6,
+                                                   "Reduce Healing Effectiveness", "Decrease healing effectiveness by {}%.")
+
 def getCurseTraits(equipType : EquipmentSlot) -> list[EquipmentTrait]:
-    curseTraits = [
-        makeStatDownTrait(BaseStats.HP, 4),
-        makeStatDownTrait(BaseStats.MP, 4),
-        makeStatDownTrait(BaseStats.DEF, 5),
-        makeStatDownTrait(BaseStats.RES, 5),
-        makeStatDownTrait(BaseStats.ACC, 3),
-        makeStatDownTrait(BaseStats.AVO, 3),
-        makeStatDownTrait(BaseStats.SPD, 4),
-        makeWeaknessTrait(PhysicalAttackAttribute.SLASHING),
-        makeWeaknessTrait(PhysicalAttackAttribute.PIERCING),
-        makeWeaknessTrait(PhysicalAttackAttribute.CRUSHING),
-        makeWeaknessTrait(MagicalAttackAttribute.FIRE),
-        makeWeaknessTrait(MagicalAttackAttribute.ICE),
-        makeWeaknessTrait(MagicalAttackAttribute.WIND),
-        makeWeaknessTrait(MagicalAttackAttribute.LIGHT),
-        makeWeaknessTrait(MagicalAttackAttribute.DARK),
-        healthCostCurse,
-        manaCostCurse,
-        targetEffectCurse,
-        blindEffectCurse,
-        stunEffectCurse,
-        exhaustionEffectCurse,
-        misfortuneEffectCurse,
-        restrictEffectCurse,
-        perplexityEffectCurse
-    ]
+    curseTraits = _commonCurseTraits[:]
     if equipType in [EquipmentSlot.HAT, EquipmentSlot.OVERALL, EquipmentSlot.SHOES]:
-        curseTraits.append(makeFlatStatBonusTrait(CombatStats.HEALING_EFFECTIVENESS, -6,
-                                                  "Reduce Healing Effectiveness", "Decrease healing effectiveness by {}%."))
+        curseTraits.append(healingEffectivenessCurse)
     return curseTraits
 
 def getEquipTraitWeights(equipType : EquipmentSlot, rarity : int, hasCurse : bool) -> dict[EquipmentTrait, int]: #TODO: put on correct piece of equipment
@@ -1,15 +1,39 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import IO, TYPE_CHECKING, Iterable, Iterator
+from collections import deque
+from itertools import islice
+import gzip
+import io
+import os
+import pickle
+import tempfile
+import threading
 
 from rpg_consts import *
 if TYPE_CHECKING:
     from structures.rpg_combat_entity import CombatEntity
 
 
+"""
+    A log entry stored as a str.format template and its arguments. The text is only built the first time
+    it's needed, so messages that are never displayed cost little more than a tuple.
+    Templates without arguments are used as-is, so preformatted text can be passed in directly.
+"""
 class LogMessage(object):
-    def __init__(self, messageType : MessageType, messageText : str):
+    def __init__(self, messageType : MessageType, messageTemplate : str, messageArgs : tuple = (),
+                 recipient : MessageCollector | None = None):
         self.messageType : MessageType = messageType
-        self.messageText : str = messageText
+        self.messageTemplate : str = messageTemplate
+        self.messageArgs : tuple = messageArgs
+        # Private messages are only shown to their recipient
+        self.recipient : MessageCollector | None = recipient
+        self._renderedText : str | None = None
+
+    @property
+    def messageText(self) -> str:
+        if self._renderedText is None:
+            self._renderedText = self.messageTemplate.format(*self.messageArgs) if len(self.messageArgs) > 0 else self.messageTemplate
+        return self._renderedText
 
     def getMessageString(self, includeType : bool):
         typeString = f"[{self.messageType.name}] " if includeType else ""
@@ -20,30 +44,226 @@ class LogMessageCollection(object):
         self.messages : list[LogMessage] = messages
 
     def getMessagesString(self, filters : list[MessageType] | None, includeTypes : bool):
-        if filters is None:
-            filters = [messageType for messageType in MessageType]
-        return '\n'.join(map(lambda msg: msg.getMessageString(includeTypes), filter(lambda msg: msg.messageType in filters, self.messages)))
+        return '\n'.join(iterMessageStrings(self.messages, filters, includeTypes))
+
+def iterMessageStrings(messages : Iterable[LogMessage], filters : list[MessageType] | None, includeTypes : bool) -> Iterator[str]:
+    if filters is None:
+        filters = [messageType for messageType in MessageType]
+    return map(lambda msg: msg.getMessageString(includeTypes), filter(lambda msg: msg.messageType in filters, messages))
+
+"""
+    Writes the filtered messages into an in-memory file, one line at a time. Once the output passes compressThreshold
+    bytes, what's been written so far is moved into a gzip stream and the rest is written through it.
+    Returns the buffer (rewound to the start) and whether it was compressed.
+"""
+def exportMessages(messages : Iterable[LogMessage], filters : list[MessageType] | None, includeTypes : bool,
+                   compressThreshold : int = COMBAT_LOG_COMPRESS_THRESHOLD) -> tuple[io.BytesIO, bool]:
+    buffer = io.BytesIO()
+    output : io.BytesIO | gzip.GzipFile = buffer
+    compressed = False
+    separator = b""
+    for messageString in iterMessageStrings(messages, filters, includeTypes):
+        output.write(separator + messageString.encode("utf-8"))
+        separator = b"\n"
+        if not compressed and buffer.tell() > compressThreshold:
+            plainBuffer = buffer
+            buffer = io.BytesIO()
+            output = gzip.GzipFile(fileobj=buffer, mode="wb")
+            output.write(plainBuffer.getvalue())
+            compressed = True
+    if compressed:
+        output.close()
+    buffer.seek(0)
+    return buffer, compressed
+
+"""
+    Pickles spilled log records. Message arguments that aren't plain values are stored as their str(), so that
+    spilling never drags in live objects such as entities.
+"""
+class _SpillPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        if isinstance(obj, (MessageType, type)):
+            return NotImplemented
+        return str, (str(obj),)
+
+"""
+    An append-only log shared by every viewer of a combat or dungeon, so that each message is only stored once.
+    Messages are addressed by absolute index. At most memoryLimit of the newest messages are kept in memory;
+    once there are more, the oldest half is pickled as one segment and appended to a spill file in TMP_FOLDER,
+    to be read back when a viewer asks for it. Messages that every viewer has cleared are dropped, and the spill
+    file is emptied once none of its segments are needed.
+"""
+class SharedMessageLog(object):
+    def __init__(self, memoryLimit : int = LOG_MEMORY_LIMIT):
+        self.memoryLimit : int = memoryLimit
+        self.messages : deque[LogMessage] = deque()
+        self.memoryStartIndex : int = 0
+        self.baseIndex : int = 0
+        # (start index, end index, file offset, byte length) for each spilled segment, oldest first
+        self.segments : list[tuple[int, int, int, int]] = []
+        self.spillFile : IO[bytes] | None = None
+        self.spillSize : int = 0
+        # Bumped whenever the spill file is emptied, so that readers holding old offsets skip them
+        self.spillGeneration : int = 0
+        self.spillLock : threading.Lock = threading.Lock()
+        self.viewers : list[MessageCollector] = []
+        self.nextViewerId : int = 0
+
+    def getEndIndex(self) -> int:
+        return self.memoryStartIndex + len(self.messages)
+
+    def registerViewer(self, viewer : MessageCollector) -> None:
+        viewer.viewerId = self.nextViewerId
+        self.nextViewerId += 1
+        self.viewers.append(viewer)
+
+    def addMessage(self, messageType : MessageType, messageTemplate : str, *messageArgs) -> None:
+        self.messages.append(LogMessage(messageType, messageTemplate, messageArgs))
+        if len(self.messages) > self.memoryLimit:
+            self._spillMessages(max(self.memoryLimit // 2, 1))
+
+    def addPrivateMessage(self, recipient : MessageCollector, messageType : MessageType, messageTemplate : str, *messageArgs) -> None:
+        self.messages.append(LogMessage(messageType, messageTemplate, messageArgs, recipient))
+        if len(self.messages) > self.memoryLimit:
+            self._spillMessages(max(self.memoryLimit // 2, 1))
+
+    def _spillMessages(self, count : int) -> None:
+        spilled = [self.messages.popleft() for _ in range(count)]
+        records = [(message.messageType, message.recipient.viewerId if message.recipient is not None else -1,
+                    message.messageTemplate, message.messageArgs) for message in spilled]
+        with self.spillLock:
+            if self.spillFile is None:
+                os.makedirs(TMP_FOLDER, exist_ok=True)
+                self.spillFile = tempfile.TemporaryFile(prefix=LOG_SPILL_FILE_NAME, dir=TMP_FOLDER)
+            self.spillFile.seek(self.spillSize)
+            _SpillPickler(self.spillFile, pickle.HIGHEST_PROTOCOL).dump(records)
+            segmentLength = self.spillFile.tell() - self.spillSize
+        self.segments.append((self.memoryStartIndex, self.memoryStartIndex + count, self.spillSize, segmentLength))
+        self.spillSize += segmentLength
+        self.memoryStartIndex += count
+
+    def _readSegment(self, generation : int, offset : int, length : int, skipCount : int, viewer : MessageCollector) -> list[LogMessage]:
+        with self.spillLock:
+            if generation != self.spillGeneration or self.spillFile is None:
+                return []
+            self.spillFile.seek(offset)
+            segmentData = self.spillFile.read(length)
+        result = []
+        for messageType, recipientId, messageTemplate, messageArgs in islice(pickle.loads(segmentData), skipCount, None):
+            if recipientId == -1:
+                result.append(LogMessage(messageType, messageTemplate, messageArgs))
+            elif recipientId == viewer.viewerId:
+                result.append(LogMessage(messageType, messageTemplate, messageArgs, viewer))
+        return result
+
+    """ Gets the messages from the given absolute index onwards that the viewer can see. """
+    def getMessagesFor(self, viewer : MessageCollector, startIndex : int) -> list[LogMessage]:
+        return list(self.streamMessagesFor(viewer, startIndex))
 
+    """
+        As above, but only the in-memory part of the log is copied up front; spilled segments are read as the
+        result is iterated. Later changes to the log don't affect the result, so it can be consumed in another
+        thread. (Segments of messages that every viewer clears in the meantime are skipped.)
+    """
+    def streamMessagesFor(self, viewer : MessageCollector, startIndex : int) -> Iterator[LogMessage]:
+        startIndex = max(startIndex, self.baseIndex)
+        segments = [(offset, length, max(startIndex - segmentStart, 0)) for segmentStart, segmentEnd, offset, length in self.segments
+                    if segmentEnd > startIndex]
+        memoryMessages = [message for message in islice(self.messages, max(startIndex - self.memoryStartIndex, 0), None)
+                          if message.recipient is None or message.recipient is viewer]
+        return self._iterSnapshot(viewer, self.spillGeneration, segments, memoryMessages)
+
+    def _iterSnapshot(self, viewer : MessageCollector, generation : int, segments : list[tuple[int, int, int]],
+                      memoryMessages : list[LogMessage]) -> Iterator[LogMessage]:
+        for offset, length, skipCount in segments:
+            yield from self._readSegment(generation, offset, length, skipCount, viewer)
+        yield from memoryMessages
+
+    def trimClearedMessages(self) -> None:
+        if len(self.viewers) == 0:
+            return
+        trimIndex = min(viewer.clearIndex for viewer in self.viewers)
+        if trimIndex <= self.baseIndex:
+            return
+        self.baseIndex = trimIndex
+        while len(self.segments) > 0 and self.segments[0][1] <= trimIndex:
+            self.segments.pop(0)
+        if len(self.segments) == 0 and self.spillSize > 0:
+            with self.spillLock:
+                assert(self.spillFile is not None)
+                self.spillFile.truncate(0)
+                self.spillSize = 0
+                self.spillGeneration += 1
+        while self.memoryStartIndex < trimIndex and len(self.messages) > 0:
+            self.messages.popleft()
+            self.memoryStartIndex += 1
+
+"""
+    A viewer of a SharedMessageLog, holding its own read cursors into it. A collector that isn't attached to a
+    log when it first receives a message gets a log of its own.
+"""
 class MessageCollector(object):
     def __init__(self):
-        self.allMessages : list[LogMessage] = []
+        self.messageLog : SharedMessageLog | None = None
+        self.viewerId : int = -1
+        self.clearIndex : int = 0
         self.lastSendLength : int = 0
 
-    def addMessage(self, messageType : MessageType, messageText : str) -> None:
-        self.allMessages.append(LogMessage(messageType, messageText))
+    """ Starts viewing the given log from its current end, unless this collector is already attached to one. """
+    def attachToLog(self, messageLog : SharedMessageLog) -> None:
+        if self.messageLog is not None:
+            return
+        self.messageLog = messageLog
+        self.clearIndex = messageLog.getEndIndex()
+        self.lastSendLength = self.clearIndex
+        messageLog.registerViewer(self)
+
+    def detachFromLog(self) -> None:
+        if self.messageLog is None:
+            return
+        self.messageLog.viewers.remove(self)
+        self.messageLog.trimClearedMessages()
+        self.messageLog = None
+
+    def _getMessageLog(self) -> SharedMessageLog:
+        if self.messageLog is None:
+            self.attachToLog(SharedMessageLog())
+        assert(self.messageLog is not None)
+        return self.messageLog
+
+    @property
+    def allMessages(self) -> list[LogMessage]:
+        if self.messageLog is None:
+            return []
+        return self.messageLog.getMessagesFor(self, self.clearIndex)
+
+    """ Adds a message that only this collector will see. """
+    def addMessage(self, messageType : MessageType, messageTemplate : str, *messageArgs) -> None:
+        self._getMessageLog().addPrivateMessage(self, messageType, messageTemplate, *messageArgs)
 
     def sendAllMessages(self, filters : list[MessageType] | None, includeTypes : bool) -> LogMessageCollection:
         result = LogMessageCollection(self.allMessages)
         return result
+
+    """ Snapshots every message since the last clear, for iterating later (possibly in another thread). """
+    def streamAllMessages(self) -> Iterator[LogMessage]:
+        if self.messageLog is None:
+            return iter([])
+        return self.messageLog.streamMessagesFor(self, self.clearIndex)
     
     def sendNewestMessages(self, filters : list[MessageType] | None, includeTypes : bool) -> LogMessageCollection:
-        result = LogMessageCollection(self.allMessages[self.lastSendLength:])
-        self.lastSendLength = len(self.allMessages)
+        if self.messageLog is None:
+            return LogMessageCollection([])
+        result = LogMessageCollection(self.messageLog.getMessagesFor(self, self.lastSendLength))
+        self.lastSendLength = self.messageLog.getEndIndex()
         return result
     
     def clearMessages(self):
-        self.allMessages = []
-        self.lastSendLength = 0
+        if self.messageLog is None:
+            return
+        self.clearIndex = self.messageLog.getEndIndex()
+        self.lastSendLength = self.clearIndex
+        self.messageLog.trimClearedMessages()
     
 class LocalMessageCollector(MessageCollector):
     def __init__(self):
@@ -59,6 +279,17 @@ class LocalMessageCollector(MessageCollector):
         print(result.getMessagesString(filters, includeTypes))
         return result
 
+class NullMessageCollector(MessageCollector):
+    """ Discards everything it receives; used for headless simulations where nobody reads the log. """
+    def __init__(self):
+        super().__init__()
+
+    def attachToLog(self, messageLog : SharedMessageLog) -> None:
+        pass
+
+    def addMessage(self, messageType : MessageType, messageTemplate : str, *messageArgs) -> None:
+        pass
+
 # eventually have a child class that does whatever networking instead of just printing
     
 def makeTeamString(entities : list[CombatEntity]):
@@ -1,20 +1,34 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, Callable
+import copy
 
 from rpg_consts import *
 
 if TYPE_CHECKING:
     from structures.rpg_combat_state import CombatController
     from structures.rpg_combat_entity import CombatEntity
-        
+
 class EntityAI(object):
     def __init__(self, data : dict, decisionFn : Callable[[CombatController, CombatEntity, dict], EntityAIAction]):
         self.data = data
         self.decisionFn = decisionFn
-    
+
+    """
+        Forked controllers keep their own copy of the data, so simulated turns don't change the live AI's state.
+        Decision functions draw any randomness from the controller's rng, which forks copy as well.
+    """
     def chooseAction(self, combatController : CombatController, enemy : CombatEntity) -> EntityAIAction:
-        return self.decisionFn(combatController, enemy, self.data)
+        return self.decisionFn(combatController, enemy, combatController.getAIData(enemy))
+
+    """ Same as chooseAction; AIs that take a while to decide override this to do so off the event loop. """
+    async def chooseActionAsync(self, combatController : CombatController, enemy : CombatEntity) -> EntityAIAction:
+        return self.chooseAction(combatController, enemy)
+
+    """ Returns a fresh AI for a copy of the enemy, with its own copy of the data. """
+    def copyForSpawn(self) -> EntityAI:
+        return EntityAI(copy.deepcopy(self.data), self.decisionFn)
+
         
 class EntityAIAction(object):
     def __init__(self, action : CombatActions, skillIndex : int | None, targetIndices : list[int],
@@ -0,0 +1,270 @@
+from __future__ import annotations
+from typing import Callable
+import asyncio
+import concurrent.futures
+import copy
+import gc
+import itertools
+import os
+import random
+import time
+
+from rpg_consts import *
+from structures.rpg_classes_skills import ActiveSkillDataSelector
+from structures.rpg_combat_entity import CombatEntity, NPCEntity
+from structures.rpg_combat_interface import CombatInputHandler, NPCInputHandler, RandomEntityInputHandler
+from structures.rpg_combat_state import CombatController
+from structures.rpg_npc_ai import EntityAI, EntityAIAction
+
+DEFAULT_SEARCH_TIME_BUDGET = 0.25
+DEFAULT_SEARCH_ROLLOUT_TURNS = 4
+# How much better (on the 0-1 rollout score) another action has to do before the search overrides the script
+SEARCH_SWITCH_MARGIN = 0.05
+# Rounds every candidate must get through before any can be overridden or pruned; short rollouts make one
+# round cheap, and pruning after it is what frees the budget for more rounds on the actions still in it
+SEARCH_MIN_ROUNDS = 1
+# Caps how many target combinations get tried for a single multi-target skill
+MAX_SEARCH_TARGET_COMBINATIONS = 6
+# Most of the time budget that can be set aside for a full garbage collection landing near the deadline
+MAX_SEARCH_GC_RESERVE = 0.5
+
+# Searches started from the event loop run here; see SearchEntityAI.chooseActionAsync
+NPC_SEARCH_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="npcSearch")
+
+"""
+    Times the cyclic garbage collector's full collections, which pause every thread, so searches can stop early
+    enough for one to fit before their deadlines. Leans towards the slowest seen, like the search's turn estimates.
+"""
+class _FullCollectionTimer(object):
+    def __init__(self):
+        self.startTime : float = 0
+        self.pauseSeconds : float = 0
+
+    def onCollection(self, phase : str, info : dict):
+        if info["generation"] != 2:
+            return
+        if phase == "start":
+            self.startTime = time.perf_counter()
+        else:
+            self.pauseSeconds = max(time.perf_counter() - self.startTime, self.pauseSeconds * 0.9)
+
+FULL_COLLECTION_TIMER = _FullCollectionTimer()
+gc.callbacks.append(FULL_COLLECTION_TIMER.onCollection)
+
+"""
+    An EntityAI that checks its decision function's choice against the other actions available, by playing each
+    out on forks of the fight (see CombatController.fork): the action, then a few more turns with NPCs following
+    their decision functions and players acting randomly, scored by how the NPC's team is doing afterwards.
+    Candidates are played in rounds that share one rng seed, so each round compares them under the same rolls;
+    after every round, the ones trailing the leader by more than SEARCH_SWITCH_MARGIN are dropped. The scripted
+    action is kept unless another beats it by that margin, so a short budget falls back to the script.
+
+    The time budget covers the whole decision, including forking the fight and running the decision function.
+    Rollouts stop before a turn that wouldn't finish in time (judging by how long turns have taken so far), and
+    any rollout cut short is thrown away so every candidate is scored over the same rounds. Room is left before
+    the deadline for a full garbage collection as long as the recent ones (up to MAX_SEARCH_GC_RESERVE of the
+    budget), since one can land at any point.
+"""
+class SearchEntityAI(EntityAI):
+    def __init__(self, data : dict, decisionFn : Callable[[CombatController, CombatEntity, dict], EntityAIAction],
+                 timeBudget : float = DEFAULT_SEARCH_TIME_BUDGET, rolloutTurns : int = DEFAULT_SEARCH_ROLLOUT_TURNS,
+                 seed : int | None = None):
+        super().__init__(data, decisionFn)
+        self.timeBudget = timeBudget
+        self.rolloutTurns = rolloutTurns
+        self.rng = random.Random(seed)
+        # Running estimates of how long a fork and a single rollout turn take, for stopping before the deadline
+        self.forkSeconds : float = 0
+        self.turnSeconds : float = 0
+        # rollouts, rounds, candidates, whether the script was overridden, and seconds taken by the last decision
+        self.lastSearchStats : dict[str, float] = {}
+
+    def chooseAction(self, combatController : CombatController, enemy : CombatEntity) -> EntityAIAction:
+        if combatController.isFork:
+            return super().chooseAction(combatController, enemy)
+        startTime = time.perf_counter()
+        root, fallbackAction = self._prepareSearch(combatController, enemy)
+        chosenAction = self.search(root, enemy, fallbackAction, self._getDeadline(startTime))
+        return self._finishSearch(combatController, enemy, chosenAction, fallbackAction, startTime)
+
+    """ Forks the fight here on the event loop, then searches on NPC_SEARCH_POOL. """
+    async def chooseActionAsync(self, combatController : CombatController, enemy : CombatEntity) -> EntityAIAction:
+        if combatController.isFork:
+            return super().chooseAction(combatController, enemy)
+        startTime = time.perf_counter()
+        root, fallbackAction = self._prepareSearch(combatController, enemy)
+        chosenAction = await asyncio.get_running_loop().run_in_executor(NPC_SEARCH_POOL, self.search, root, enemy, fallbackAction,
+                                                                        self._getDeadline(startTime))
+        return self._finishSearch(combatController, enemy, chosenAction, fallbackAction, startTime)
+
+    def _getDeadline(self, startTime : float) -> float:
+        gcReserve = min(FULL_COLLECTION_TIMER.pauseSeconds, self.timeBudget * MAX_SEARCH_GC_RESERVE)
+        return startTime + self.timeBudget - gcReserve
+
+    """ Forks the fight and runs the decision function on the fork, so the live AI data isn't touched yet. """
+    def _prepareSearch(self, combatController : CombatController, enemy : CombatEntity) -> tuple[CombatController, EntityAIAction]:
+        root = combatController.fork()
+        return root, super().chooseAction(root, enemy)
+
+    """
+        If the search kept the scripted action, runs the decision function again on the live fight so that its
+        AI data and messages are applied there; it rolls the same way it did on the fork.
+    """
+    def _finishSearch(self, combatController : CombatController, enemy : CombatEntity, chosenAction : EntityAIAction,
+                      fallbackAction : EntityAIAction, startTime : float) -> EntityAIAction:
+        self.lastSearchStats["overridden"] = chosenAction is not fallbackAction
+        if chosenAction is fallbackAction:
+            chosenAction = super().chooseAction(combatController, enemy)
+        self.lastSearchStats["seconds"] = time.perf_counter() - startTime
+        return chosenAction
+
+    def copyForSpawn(self) -> SearchEntityAI:
+        return SearchEntityAI(copy.deepcopy(self.data), self.decisionFn, self.timeBudget, self.rolloutTurns,
+                              self.rng.getrandbits(64))
+
+    """
+        Runs the search from root, a fork taken partway through the enemy's turn, until the deadline (a
+        time.perf_counter time). fallbackAction is what the decision function chose on root.
+    """
+    def search(self, root : CombatController, enemy : CombatEntity, fallbackAction : EntityAIAction, deadline : float) -> EntityAIAction:
+        candidates = [fallbackAction] + [candidate for candidate in getCandidateActions(root, enemy)
+                                         if not _sameAction(candidate, fallbackAction)]
+        onPlayerTeam = enemy in root.playerTeam
+        roundRng = random.Random(self.rng.getrandbits(64))
+
+        activeIndices = list(range(len(candidates)))
+        totalScores = [0.0 for _ in candidates]
+        rounds = 0
+        rollouts = 0
+        while len(activeIndices) > 1:
+            roundSeed = roundRng.getrandbits(64)
+            roundScores = []
+            for candidateIndex in activeIndices:
+                score = self._rollout(root, enemy, candidates[candidateIndex], onPlayerTeam, roundSeed, deadline)
+                if score is None:
+                    break
+                roundScores.append(score)
+                rollouts += 1
+            if len(roundScores) < len(activeIndices):
+                break
+            for candidateIndex, score in zip(activeIndices, roundScores):
+                totalScores[candidateIndex] += score
+            rounds += 1
+
+            if rounds >= SEARCH_MIN_ROUNDS:
+                bestScore = max(totalScores[i] for i in activeIndices)
+                activeIndices = [i for i in activeIndices if i == 0 or totalScores[i] >= bestScore - SEARCH_SWITCH_MARGIN * rounds]
+
+        bestIndex = 0
+        if rounds >= SEARCH_MIN_ROUNDS:
+            bestIndex = max(activeIndices, key=lambda i: totalScores[i])
+            if totalScores[bestIndex] - totalScores[0] <= SEARCH_SWITCH_MARGIN * rounds:
+                bestIndex = 0
+        self.lastSearchStats = {
+            "rollouts": rollouts,
+            "rounds": rounds,
+            "candidates": len(candidates)
+        }
+        return candidates[bestIndex]
+
+    """
+        Plays out one candidate on a new fork of root, with the fight's rolls seeded from roundSeed.
+        Returns a score from 0 (loss) to 1 (win) for the enemy's team, or None if the deadline came first.
+    """
+    def _rollout(self, root : CombatController, enemy : CombatEntity, candidate : EntityAIAction, onPlayerTeam : bool,
+                 roundSeed : int, deadline : float) -> float | None:
+        if time.perf_counter() + self.forkSeconds + self.turnSeconds >= deadline:
+            return None
+        forkStart = time.perf_counter()
+        fork = root.fork()
+        self.forkSeconds = max(time.perf_counter() - forkStart, self.forkSeconds * 0.95)
+        fork.rng.seed(roundSeed)
+        playerRng = random.Random(roundSeed)
+        assert(isinstance(enemy, NPCEntity))
+        NPCInputHandler(enemy).performDecision(fork, candidate)
+
+        handlerMap : dict[CombatEntity, CombatInputHandler] = {}
+        for _ in range(self.rolloutTurns):
+            if fork.checkPlayerVictory() is not None:
+                break
+            turnStart = time.perf_counter()
+            if turnStart + self.turnSeconds >= deadline:
+                return None
+            activeEntity = fork.advanceToNextPlayer()
+            if fork.isStunned(activeEntity):
+                fork.stunSkipTurn(activeEntity)
+            else:
+                fork.beginPlayerTurn(activeEntity)
+                if activeEntity not in handlerMap:
+                    handlerMap[activeEntity] = NPCInputHandler(activeEntity) if isinstance(activeEntity, NPCEntity) \
+                        else RandomEntityInputHandler(activeEntity, 0, playerRng)
+                handlerMap[activeEntity].performTurn(fork)
+            # Leans towards the slowest turns seen, since overrunning the budget is worse than stopping a little early
+            self.turnSeconds = max(time.perf_counter() - turnStart, self.turnSeconds * 0.95)
+
+        playerVictory = fork.checkPlayerVictory()
+        if playerVictory is not None:
+            return 1 if playerVictory == onPlayerTeam else 0
+        playerHealth = _getTeamHealthFraction(fork, fork.playerTeam)
+        opponentHealth = _getTeamHealthFraction(fork, fork.opponentTeam)
+        healthLead = playerHealth - opponentHealth if onPlayerTeam else opponentHealth - playerHealth
+        return 0.5 + healthLead / 2
+
+def _sameAction(action1 : EntityAIAction, action2 : EntityAIAction) -> bool:
+    return (action1.action == action2.action and action1.skillIndex == action2.skillIndex and action1.targetIndices == action2.targetIndices
+            and action1.actionParameter == action2.actionParameter and action1.skillSelector == action2.skillSelector)
+
+def _getTeamHealthFraction(combatController : CombatController, team : list[CombatEntity]) -> float:
+    maxHealth = sum(combatController.getMaxHealth(entity) for entity in team)
+    if maxHealth == 0:
+        return 0
+    return sum(combatController.getCurrentHealth(entity) for entity in team) / maxHealth
+
+"""
+    Lists the actions worth searching for the entity right now, in the form NPCInputHandler.performDecision
+    expects, without duplicates. Defending is always included, so this is never empty.
+"""
+def getCandidateActions(combatController : CombatController, entity : CombatEntity) -> list[EntityAIAction]:
+    targetList = combatController.getTargets(entity)
+    teammateList = combatController.getTeammates(entity)
+    candidates = [EntityAIAction(CombatActions.DEFEND, None, [], None, None)]
+
+    inRangeIndices = [i for i, target in enumerate(targetList) if combatController.checkInRange(entity, target)]
+    candidates += [EntityAIAction(CombatActions.ATTACK, None, [i], None, None) for i in inRangeIndices]
+
+    currentMana = combatController.getCurrentMana(entity)
+    for skillIndex, skill in enumerate(entity.availableActiveSkills):
+        manaCost = combatController.getSkillManaCost(entity, skill)
+        if manaCost is not None and currentMana < manaCost:
+            continue
+
+        skillOptions : list[str | None] = [None]
+        if isinstance(skill, ActiveSkillDataSelector):
+            skillOptions = [option for option in skill.options if skill.checkOptionAvailable(option, combatController, entity)]
+        for skillOption in skillOptions:
+            chosenSkill = skill if skillOption is None else skill.selectSkill(skillOption)
+            if not chosenSkill.targetOpponents:
+                validIndices = list(range(len(teammateList)))
+            elif chosenSkill.causesAttack:
+                validIndices = inRangeIndices
+            else:
+                validIndices = list(range(len(targetList)))
+            targetCount = 1 if chosenSkill.expectedTargets is None else chosenSkill.expectedTargets
+            for targetIndices in itertools.islice(itertools.combinations(validIndices, targetCount), MAX_SEARCH_TARGET_COMBINATIONS):
+                candidates.append(EntityAIAction(CombatActions.SKILL, skillIndex, list(targetIndices), None, skillOption))
+
+    # One step towards and one away from each target: towards it until it's in range (or by as much as possible),
+    # and away as far as possible. Smaller steps in the same direction rarely play out differently.
+    attackRange = combatController.combatStateMap[entity].getTotalStatValue(CombatStats.RANGE)
+    for i, target in enumerate(targetList):
+        distance = combatController.checkDistanceStrict(entity, target)
+        if distance > attackRange:
+            candidates.append(EntityAIAction(CombatActions.APPROACH, None, [i], min(distance - attackRange, MAX_SINGLE_REPOSITION), None))
+        if distance < MAX_DISTANCE:
+            candidates.append(EntityAIAction(CombatActions.RETREAT, None, [i], min(MAX_DISTANCE - distance, MAX_SINGLE_REPOSITION), None))
+
+    uniqueCandidates : list[EntityAIAction] = []
+    for candidate in candidates:
+        if not any(_sameAction(candidate, uniqueCandidate) for uniqueCandidate in uniqueCandidates):
+            uniqueCandidates.append(candidate)
+    return uniqueCandidates
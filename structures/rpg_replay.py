@@ -0,0 +1,544 @@
+from __future__ import annotations
+from typing import Callable
+import bisect
+import hashlib
+import importlib
+import inspect
+import json
+import random
+
+import numpy as np
+
+from rpg_consts import *
+from structures.rpg_classes_skills import ActiveSkillDataSelector, SkillData
+from structures.rpg_combat_entity import CombatEntity, Enemy, NPCEntity, Player
+from structures.rpg_combat_interface import CombatInputHandler, CombatInterface, NPCInputHandler, RandomEntityInputHandler
+from structures.rpg_combat_state import CombatController
+from structures.rpg_messages import MessageCollector
+
+COMBAT_REPLAY_FORMAT_VERSION = 1
+DEFAULT_REPLAY_CHECKPOINT_INTERVAL = 10
+
+"""
+    Derives every rng stream a fight uses from one root seed. Each stream's seed comes from hashing the root
+    seed with the stream's path (e.g. ("enemy", 2)), so streams don't depend on how much any other one was
+    drawn from, or on the order they're created in.
+"""
+class ReplaySeedTree(object):
+    def __init__(self, rootSeed : int):
+        self.rootSeed = rootSeed
+
+    def getSeed(self, *path) -> int:
+        pathString = "/".join(str(part) for part in (self.rootSeed,) + path)
+        return int.from_bytes(hashlib.sha256(pathString.encode()).digest()[:8], "little")
+
+    def makeRandom(self, *path) -> random.Random:
+        return random.Random(self.getSeed(*path))
+
+    """ Seeds the global random and numpy generators (summon names and equipment rolls use them). """
+    def pinGlobalGenerators(self):
+        random.seed(self.getSeed("global"))
+        np.random.seed(self.getSeed("numpy") % (2 ** 32))
+
+    """ Seeds a dungeon's room rolls; each of its fights should still be started with startRecordedCombat. """
+    def pinDungeon(self, dungeonController):
+        dungeonController.rng.seed(self.getSeed("dungeon"))
+
+"""
+    Logs the actions each entity takes in a fight (see CombatController.replayRecorder). Entities are referred
+    to by their position in the combat state map, which is in join order and stays stable for the whole fight.
+    Each action is [turn, entity, action name, then the action's own arguments]:
+        attack: target
+        skill: skill index in availableActiveSkills, selector option (or None), targets
+        reposition: distance change, targets
+        defend: (nothing)
+    Failed attempts are logged too, so replaying the actions in order repeats exactly what was done.
+    With a checkpointInterval, a CombatReplayCheckpoint is also taken every that many turns.
+"""
+class CombatReplayRecorder(object):
+    def __init__(self, combatController : CombatController, checkpointInterval : int | None = None):
+        self.combatController = combatController
+        self.checkpointInterval = checkpointInterval
+        self.turnCount = 0
+        self.actions : list[list] = []
+        self.checkpoints : list[CombatReplayCheckpoint] = []
+        self.entityIndices : dict[CombatEntity, int] = {}
+
+    """ Copies the recorder for a fork of its fight (see CombatController.fork); forks don't take checkpoints. """
+    def copyForFork(self, forked : CombatController) -> CombatReplayRecorder:
+        recorder = CombatReplayRecorder(forked)
+        recorder.turnCount = self.turnCount
+        recorder.actions = self.actions[:]
+        recorder.entityIndices = self.entityIndices.copy()
+        return recorder
+
+    def getEntityIndex(self, entity : CombatEntity) -> int:
+        if entity not in self.entityIndices:
+            self.entityIndices = {mapEntity: i for i, mapEntity in enumerate(self.combatController.combatStateMap)}
+        return self.entityIndices[entity]
+
+    """ Called as each turn starts, so checkpoints see the fight as it was after turnCount turns. """
+    def onBeginTurn(self):
+        if self.checkpointInterval is not None and self.turnCount % self.checkpointInterval == 0:
+            self.checkpoints.append(CombatReplayCheckpoint.capture(self.combatController, self.turnCount))
+        self.turnCount += 1
+
+    def recordAttack(self, entity : CombatEntity, target : CombatEntity):
+        self.actions.append([self.turnCount, self.getEntityIndex(entity), CombatActions.ATTACK.name, self.getEntityIndex(target)])
+
+    def recordSkill(self, entity : CombatEntity, targets : list[CombatEntity], skillData : SkillData):
+        skillIndex, skillSelector = _findSkillIndex(entity, skillData)
+        self.actions.append([self.turnCount, self.getEntityIndex(entity), CombatActions.SKILL.name, skillIndex, skillSelector,
+                             [self.getEntityIndex(target) for target in targets]])
+
+    def recordReposition(self, entity : CombatEntity, targets : list[CombatEntity], distanceChange : int):
+        self.actions.append([self.turnCount, self.getEntityIndex(entity), "REPOSITION", distanceChange,
+                             [self.getEntityIndex(target) for target in targets]])
+
+    def recordDefend(self, entity : CombatEntity):
+        self.actions.append([self.turnCount, self.getEntityIndex(entity), CombatActions.DEFEND.name])
+
+"""
+    A summary of a fight after some number of turns: each entity's HP, MP and action timer (by entity index, as
+    in CombatReplayRecorder) and the distance between each player and opponent. It's enough to check a replay
+    against and to chart a fight from, but not to rebuild one; see CombatReplayViewer for that.
+"""
+class CombatReplayCheckpoint(object):
+    def __init__(self, turn : int, entityStates : list[tuple[int, int, float]], distances : list[tuple[int, int, int]]):
+        self.turn = turn
+        self.entityStates = entityStates
+        self.distances = distances
+
+    @staticmethod
+    def capture(combatController : CombatController, turn : int) -> CombatReplayCheckpoint:
+        entityIndices = {entity: i for i, entity in enumerate(combatController.combatStateMap)}
+        entityStates = [(state.currentHP, state.currentMP, state.actionTimer) for state in combatController.combatStateMap.values()]
+        distances = [(entityIndices[player], entityIndices[opponent], distance)
+                     for player, opponentDistances in combatController.distanceMap.items()
+                     for opponent, distance in opponentDistances.items()]
+        return CombatReplayCheckpoint(turn, entityStates, distances)
+
+    def getSaveData(self) -> dict:
+        return {
+            "turn": self.turn,
+            "entities": [list(entityState) for entityState in self.entityStates],
+            "distances": [list(distance) for distance in self.distances]
+        }
+
+    @staticmethod
+    def fromSaveData(data : dict) -> CombatReplayCheckpoint:
+        return CombatReplayCheckpoint(data["turn"], [(hp, mp, actionTimer) for hp, mp, actionTimer in data["entities"]],
+                                      [(player, opponent, distance) for player, opponent, distance in data["distances"]])
+
+    def __eq__(self, other):
+        return (isinstance(other, CombatReplayCheckpoint) and self.turn == other.turn and self.entityStates == other.entityStates
+                and self.distances == other.distances)
+
+def _findSkillIndex(entity : CombatEntity, skillData : SkillData) -> tuple[int, str | None]:
+    for i, skill in enumerate(entity.availableActiveSkills):
+        if skill is skillData:
+            return i, None
+    # Selected skills are generated fresh each time they're picked, so they're matched by name
+    for i, skill in enumerate(entity.availableActiveSkills):
+        if isinstance(skill, ActiveSkillDataSelector):
+            for option in skill.options:
+                if skill.selectSkill(option).skillName == skillData.skillName:
+                    return i, option
+    raise ValueError(f"{skillData.skillName} isn't one of {entity.name}'s skills")
+
+"""
+    Everything needed to rebuild a fight and play it back: the root seed, the players as save data, the enemy
+    spawners (by module path) and their params, the starting state, and the recorded actions, checkpoints and
+    outcome. Starting state lists are in player order. Enemies are spawned from the seed tree, unless the fight
+    was recorded live (see recordLiveCombat), in which case enemySeeds has the seed each one was spawned from.
+"""
+class CombatReplayRecord(object):
+    def __init__(self, seed : int, playerData : list[dict], enemySpawns : list[tuple[str, dict]],
+                 startingDistances : list[int], startingHealth : list[int | None], startingMana : list[int | None],
+                 checkpointInterval : int | None = None, enemySeeds : list[int | None] | None = None):
+        self.seed = seed
+        self.playerData = playerData
+        self.enemySpawns = enemySpawns
+        self.startingDistances = startingDistances
+        self.startingHealth = startingHealth
+        self.startingMana = startingMana
+        self.checkpointInterval = checkpointInterval
+        self.enemySeeds = enemySeeds
+        self.actions : list[list] = []
+        self.checkpoints : list[CombatReplayCheckpoint] = []
+        # Filled in by finishRecordedCombat
+        self.playerVictory : bool | None = None
+        self.turnCount = 0
+        self.finalHealth : list[int] = []
+
+    def getSaveData(self) -> dict:
+        return {
+            "formatVersion": COMBAT_REPLAY_FORMAT_VERSION,
+            "seed": self.seed,
+            "players": self.playerData,
+            "enemies": [[spawnerPath, params] for spawnerPath, params in self.enemySpawns],
+            "startingDistances": self.startingDistances,
+            "startingHealth": self.startingHealth,
+            "startingMana": self.startingMana,
+            "checkpointInterval": self.checkpointInterval,
+            "enemySeeds": self.enemySeeds,
+            "actions": self.actions,
+            "checkpoints": [checkpoint.getSaveData() for checkpoint in self.checkpoints],
+            "playerVictory": self.playerVictory,
+            "turnCount": self.turnCount,
+            "finalHealth": self.finalHealth
+        }
+
+    @staticmethod
+    def fromSaveData(data : dict) -> CombatReplayRecord:
+        if data["formatVersion"] != COMBAT_REPLAY_FORMAT_VERSION:
+            raise ValueError(f"unsupported combat replay format {data['formatVersion']}")
+        record = CombatReplayRecord(data["seed"], data["players"], [(spawnerPath, params) for spawnerPath, params in data["enemies"]],
+                                    data["startingDistances"], data["startingHealth"], data["startingMana"],
+                                    data.get("checkpointInterval", None), data.get("enemySeeds", None))
+        record.actions = data["actions"]
+        record.checkpoints = [CombatReplayCheckpoint.fromSaveData(checkpoint) for checkpoint in data.get("checkpoints", [])]
+        record.playerVictory = data["playerVictory"]
+        record.turnCount = data["turnCount"]
+        record.finalHealth = data["finalHealth"]
+        return record
+
+def saveCombatReplay(record : CombatReplayRecord, filename : str):
+    with open(filename, "w") as replayFile:
+        json.dump(record.getSaveData(), replayFile)
+
+def loadCombatReplay(filename : str) -> CombatReplayRecord:
+    with open(filename) as replayFile:
+        return CombatReplayRecord.fromSaveData(json.load(replayFile))
+
+def getSpawnerPath(spawner : Callable) -> str:
+    return f"{spawner.__module__}:{spawner.__qualname__}"
+
+def findSpawner(spawnerPath : str) -> Callable:
+    moduleName, spawnerName = spawnerPath.split(":")
+    return getattr(importlib.import_module(moduleName), spawnerName)
+
+def _spawnPinnedEnemies(seedTree : ReplaySeedTree, enemySpawns : list[tuple[Callable, dict]],
+                        enemySeeds : list[int | None] | None = None) -> list[Enemy]:
+    enemies = []
+    for i, (spawner, params) in enumerate(enemySpawns):
+        if "rng" in inspect.signature(spawner).parameters:
+            enemySeed = seedTree.getSeed("enemy", i) if enemySeeds is None else enemySeeds[i]
+            enemies.append(spawner(dict(params), random.Random(enemySeed)))
+        else:
+            enemies.append(spawner(dict(params)))
+    return enemies
+
+def _buildPinnedCombat(seedTree : ReplaySeedTree, players : list[Player], enemies : list[Enemy],
+                       playerHandlers : dict[CombatEntity, CombatInputHandler], loggers : dict[CombatEntity, MessageCollector],
+                       startingDistances : list[int], startingHealth : list[int | None], startingMana : list[int | None],
+                       checkpointInterval : int | None) -> CombatInterface:
+    healthMap : dict[CombatEntity, int] = {player: health for player, health in zip(players, startingHealth) if health is not None}
+    manaMap : dict[CombatEntity, int] = {player: mana for player, mana in zip(players, startingMana) if mana is not None}
+    interface = CombatInterface(playerHandlers, {enemy: NPCInputHandler(enemy) for enemy in enemies}, loggers,
+                                healthMap, manaMap, dict(zip(players, startingDistances)))
+    interface.cc.rng.seed(seedTree.getSeed("combat"))
+    interface.cc.replayRecorder = CombatReplayRecorder(interface.cc, checkpointInterval)
+    return interface
+
+"""
+    Sets up a fight whose rng streams all come from seed, with every action recorded. Players act through
+    playerHandlers (RandomEntityInputHandlers on their own pinned streams by default). Run the fight however
+    it's normally run, then call finishRecordedCombat. This pins the global generators too, so it's meant for
+    fights run on their own, like simulations; fights the bot runs are recorded with recordLiveCombat instead.
+    checkpointInterval sets how often checkpoints are taken (None for no checkpoints).
+"""
+def startRecordedCombat(seed : int, players : list[Player], enemySpawns : list[tuple[Callable, dict]],
+                        playerHandlers : dict[CombatEntity, CombatInputHandler] | None = None,
+                        loggers : dict[CombatEntity, MessageCollector] | None = None,
+                        startingDistances : dict[CombatEntity, int] | None = None,
+                        startingHealth : dict[CombatEntity, int] | None = None,
+                        startingMana : dict[CombatEntity, int] | None = None,
+                        checkpointInterval : int | None = DEFAULT_REPLAY_CHECKPOINT_INTERVAL) -> tuple[CombatInterface, CombatReplayRecord]:
+    seedTree = ReplaySeedTree(seed)
+    distanceList = [DEFAULT_STARTING_DISTANCE if startingDistances is None else startingDistances.get(player, DEFAULT_STARTING_DISTANCE)
+                    for player in players]
+    healthList = [None if startingHealth is None else startingHealth.get(player, None) for player in players]
+    manaList = [None if startingMana is None else startingMana.get(player, None) for player in players]
+    record = CombatReplayRecord(seed, [player.getSaveData() for player in players],
+                                [(getSpawnerPath(spawner), dict(params)) for spawner, params in enemySpawns],
+                                distanceList, healthList, manaList, checkpointInterval)
+
+    seedTree.pinGlobalGenerators()
+    enemies = _spawnPinnedEnemies(seedTree, enemySpawns)
+    if playerHandlers is None:
+        playerHandlers = {player: RandomEntityInputHandler(player, 0, seedTree.makeRandom("player", i)) for i, player in enumerate(players)}
+    interface = _buildPinnedCombat(seedTree, players, enemies, playerHandlers, {} if loggers is None else loggers,
+                                   distanceList, healthList, manaList, checkpointInterval)
+    return interface, record
+
+"""
+    Starts recording a fight that was built some other way, such as a dungeon room; call it before the fight's
+    first turn, and finishRecordedCombat once it's over. The starting state should be what the fight was built
+    with. Every enemy has to have been spawned through ENEMY_PROTOTYPES, so the record can spawn it again from
+    the same seed (see Enemy.spawnSource), and the fight's rng is reseeded from seed (by default, one drawn from
+    the fight's own rng).
+
+    The global random and numpy generators aren't pinned, since other fights running alongside draw from them
+    too; nothing a fight draws from them affects how it plays out, only the names given to summons, so those
+    can come out differently in the replay. A player leaving partway through isn't recorded, so the replay of
+    such a fight won't match.
+"""
+def recordLiveCombat(interface : CombatInterface, startingDistances : dict[CombatEntity, int], startingHealth : dict[CombatEntity, int],
+                     startingMana : dict[CombatEntity, int], seed : int | None = None,
+                     checkpointInterval : int | None = DEFAULT_REPLAY_CHECKPOINT_INTERVAL) -> CombatReplayRecord:
+    if seed is None:
+        seed = interface.cc.rng.getrandbits(63)
+    seedTree = ReplaySeedTree(seed)
+    players = interface.players
+    enemySpawns : list[tuple[str, dict]] = []
+    enemySeeds : list[int | None] = []
+    for enemy in interface.opponents:
+        if not isinstance(enemy, Enemy) or enemy.spawnSource is None:
+            raise ValueError(f"{enemy.name} wasn't spawned through ENEMY_PROTOTYPES, so the fight can't be recorded")
+        spawner, params, spawnSeed = enemy.spawnSource
+        enemySpawns.append((getSpawnerPath(spawner), dict(params)))
+        enemySeeds.append(spawnSeed)
+
+    record = CombatReplayRecord(seed, [player.getSaveData() for player in players if isinstance(player, Player)], enemySpawns,
+                                [startingDistances.get(player, DEFAULT_STARTING_DISTANCE) for player in players],
+                                [startingHealth.get(player, None) for player in players],
+                                [startingMana.get(player, None) for player in players], checkpointInterval, enemySeeds)
+    if len(record.playerData) != len(players):
+        raise ValueError("only fights between players and enemies can be recorded")
+    interface.cc.rng.seed(seedTree.getSeed("combat"))
+    interface.cc.replayRecorder = CombatReplayRecorder(interface.cc, checkpointInterval)
+    return record
+
+def finishRecordedCombat(interface : CombatInterface, record : CombatReplayRecord):
+    recorder = interface.cc.replayRecorder
+    assert(recorder is not None)
+    record.actions = recorder.actions
+    record.checkpoints = recorder.checkpoints
+    record.playerVictory = interface.cc.checkPlayerVictory()
+    record.turnCount = recorder.turnCount
+    record.finalHealth = [interface.cc.getCurrentHealth(entity) for entity in interface.cc.combatStateMap]
+
+"""
+    Plays back the recorded actions of one player. Every action logged for the current turn is repeated in
+    order, and a ValueError is raised as soon as the replay stops lining up with the record.
+"""
+class ReplayInputHandler(CombatInputHandler):
+    def __init__(self, entity : CombatEntity, recordedActions : list[list]):
+        super().__init__(entity)
+        self.recordedActions = recordedActions
+        self.nextActionIndex = 0
+
+    async def takeTurn(self, combatController : CombatController) -> None:
+        self.performTurn(combatController)
+
+    def performTurn(self, combatController : CombatController) -> None:
+        recorder = combatController.replayRecorder
+        assert(recorder is not None)
+        entityIndex = recorder.getEntityIndex(self.entity)
+        entityMap = list(combatController.combatStateMap)
+
+        performedAction = False
+        while self.nextActionIndex < len(self.recordedActions) and self.recordedActions[self.nextActionIndex][0] <= recorder.turnCount:
+            turn, actionEntity, actionName, *actionArgs = self.recordedActions[self.nextActionIndex]
+            self.nextActionIndex += 1
+            if turn != recorder.turnCount or actionEntity != entityIndex:
+                raise ValueError(f"replay diverged on turn {recorder.turnCount}: recorded action is entity {actionEntity} on turn {turn}")
+            performedAction = True
+
+            if actionName == CombatActions.ATTACK.name:
+                self.doAttack(combatController, entityMap[actionArgs[0]], None, None, True, [])
+            elif actionName == CombatActions.SKILL.name:
+                skillIndex, skillSelector, targetIndices = actionArgs
+                skillData = self.entity.availableActiveSkills[skillIndex]
+                if skillSelector is not None:
+                    assert(isinstance(skillData, ActiveSkillDataSelector))
+                    skillData = skillData.selectSkill(skillSelector)
+                self.doSkill(combatController, [entityMap[i] for i in targetIndices], skillData)
+            elif actionName == "REPOSITION":
+                distanceChange, targetIndices = actionArgs
+                self.doReposition(combatController, [entityMap[i] for i in targetIndices], distanceChange)
+            else:
+                self.doDefend(combatController)
+
+        if not performedAction:
+            raise ValueError(f"replay diverged on turn {recorder.turnCount}: no recorded action for entity {entityIndex}")
+
+class CombatReplayResult(object):
+    def __init__(self, record : CombatReplayRecord, interface : CombatInterface, error : str | None):
+        self.record = record
+        self.interface = interface
+        self.error = error
+
+        recorder = interface.cc.replayRecorder
+        assert(recorder is not None)
+        self.actions = recorder.actions
+        self.checkpoints = recorder.checkpoints
+        self.playerVictory = interface.cc.checkPlayerVictory()
+        self.turnCount = recorder.turnCount
+        self.finalHealth = [interface.cc.getCurrentHealth(entity) for entity in interface.cc.combatStateMap]
+
+    """ Returns the first recorded action the replay didn't repeat exactly, or None if it matched throughout. """
+    def findDivergence(self) -> int | None:
+        for i, (recordedAction, replayedAction) in enumerate(zip(self.record.actions, self.actions)):
+            if recordedAction != replayedAction:
+                return i
+        if len(self.record.actions) != len(self.actions):
+            return min(len(self.record.actions), len(self.actions))
+        return None
+
+    def matchesRecord(self) -> bool:
+        return (self.error is None and self.findDivergence() is None and self.playerVictory == self.record.playerVictory
+                and self.turnCount == self.record.turnCount and self.finalHealth == self.record.finalHealth
+                and self.checkpoints == self.record.checkpoints)
+
+"""
+    Rebuilds a recorded fight and plays it through headlessly: players repeat their recorded actions, and
+    enemies decide for themselves on the same pinned rng streams, so a faithful replay makes the same choices.
+    (Enemies using a SearchEntityAI won't, since how far their search gets depends on timing.)
+    Pass loggers, keyed by player index, to see the fight's messages.
+"""
+def replayCombat(record : CombatReplayRecord, loggers : dict[int, MessageCollector] | None = None,
+                 maxTurns : int | None = None) -> CombatReplayResult:
+    interface = _buildReplay(record, loggers)
+    error = None
+    try:
+        interface.runCombatHeadless(record.turnCount if maxTurns is None else maxTurns)
+    except ValueError as e:
+        error = str(e)
+    return CombatReplayResult(record, interface, error)
+
+def _buildReplay(record : CombatReplayRecord, loggers : dict[int, MessageCollector] | None) -> CombatInterface:
+    players = [Player.fromSaveData(playerData) for playerData in record.playerData]
+    seedTree = ReplaySeedTree(record.seed)
+    seedTree.pinGlobalGenerators()
+    enemies = _spawnPinnedEnemies(seedTree, [(findSpawner(spawnerPath), params) for spawnerPath, params in record.enemySpawns],
+                                  record.enemySeeds)
+
+    playerActions : dict[int, list[list]] = {i: [] for i in range(len(players))}
+    for action in record.actions:
+        if action[1] in playerActions:
+            playerActions[action[1]].append(action)
+    playerHandlers : dict[CombatEntity, CombatInputHandler] = {player: ReplayInputHandler(player, playerActions[i])
+                                                                for i, player in enumerate(players)}
+    loggerMap : dict[CombatEntity, MessageCollector] = {} if loggers is None else \
+        {players[i]: logger for i, logger in loggers.items()}
+    return _buildPinnedCombat(seedTree, players, enemies, playerHandlers, loggerMap, record.startingDistances,
+                              record.startingHealth, record.startingMana, record.checkpointInterval)
+
+"""
+    Steps through a recorded fight for a viewer that jumps between turns. A fork of the fight (see
+    CombatController.fork) is kept at every checkpoint turn the replay has reached so far, so seeking to turn K
+    restores the nearest one at or before K and replays forward from there. Turns past the furthest point
+    reached are played forward from that point instead, keeping forks along the way.
+
+    The record's own checkpoints only summarize the fight (see CombatReplayCheckpoint), so a new viewer starts
+    from turn 0 and builds its forks as it goes; they're only checked against. Forks share nothing that changes
+    during a fight, so playing one forward leaves the others as they were; matchesFreshReplay checks a seek
+    against a replay from the start.
+"""
+class CombatReplayViewer(object):
+    def __init__(self, record : CombatReplayRecord, snapshotInterval : int | None = None):
+        self.record = record
+        if snapshotInterval is None:
+            snapshotInterval = record.checkpointInterval or DEFAULT_REPLAY_CHECKPOINT_INTERVAL
+        self.snapshotInterval = snapshotInterval
+        self.frontier = _ReplayCursor.fromInterface(_buildReplay(record, None))
+        self.snapshotTurns : list[int] = []
+        self.snapshots : list[_ReplayCursor] = []
+        self._takeSnapshot()
+
+    """
+        Returns a fork of the fight as it was after the given number of turns (capped at the end of the
+        record), which can be inspected or played on without affecting the viewer.
+    """
+    def seekTurn(self, turn : int) -> CombatController:
+        turn = max(0, min(turn, self.record.turnCount))
+        if turn >= self.frontier.getTurn():
+            while self.frontier.getTurn() < turn and self.frontier.combatController.checkPlayerVictory() is None:
+                nextSnapshot = min(turn, self.snapshotTurns[-1] + self.snapshotInterval)
+                self.frontier.advanceTo(nextSnapshot)
+                if self.frontier.getTurn() % self.snapshotInterval == 0:
+                    self._takeSnapshot()
+            self._checkRecordedCheckpoints()
+            return self.frontier.copy().combatController
+
+        snapshotIndex = bisect.bisect_right(self.snapshotTurns, turn) - 1
+        cursor = self.snapshots[snapshotIndex].copy()
+        cursor.advanceTo(turn)
+        return cursor.combatController
+
+    """
+        Checks that seeking to the given turn gives the same fight as replaying the record up to it from the start:
+        the same actions, and the same HP, MP, action timers and distances.
+    """
+    def matchesFreshReplay(self, turn : int) -> bool:
+        turn = max(0, min(turn, self.record.turnCount))
+        seekedController = self.seekTurn(turn)
+        freshController = replayCombat(self.record, maxTurns=turn).interface.cc
+        seekedRecorder = seekedController.replayRecorder
+        freshRecorder = freshController.replayRecorder
+        assert(seekedRecorder is not None and freshRecorder is not None)
+        return (seekedRecorder.actions == freshRecorder.actions and
+                CombatReplayCheckpoint.capture(seekedController, turn) == CombatReplayCheckpoint.capture(freshController, turn))
+
+    def _takeSnapshot(self):
+        self.snapshotTurns.append(self.frontier.getTurn())
+        self.snapshots.append(self.frontier.copy())
+
+    def _checkRecordedCheckpoints(self):
+        recorder = self.frontier.combatController.replayRecorder
+        assert(recorder is not None)
+        for recordedCheckpoint, checkpoint in zip(self.record.checkpoints, recorder.checkpoints):
+            if recordedCheckpoint != checkpoint:
+                raise ValueError(f"replay diverged from the recorded checkpoint for turn {recordedCheckpoint.turn}")
+
+"""
+    A position in a replayed fight: the fight, the handlers acting in it, and the global rng states, which
+    are swapped in while the cursor is played forward.
+"""
+class _ReplayCursor(object):
+    def __init__(self, combatController : CombatController, handlerMap : dict[CombatEntity, CombatInputHandler],
+                 globalRngStates : tuple[tuple, dict]):
+        self.combatController = combatController
+        self.handlerMap = handlerMap
+        self.globalRngStates = globalRngStates
+
+    @staticmethod
+    def fromInterface(interface : CombatInterface) -> _ReplayCursor:
+        return _ReplayCursor(interface.cc, interface.handlerMap.copy(), (random.getstate(), np.random.get_state(legacy=False)))
+
+    def getTurn(self) -> int:
+        recorder = self.combatController.replayRecorder
+        assert(recorder is not None)
+        return recorder.turnCount
+
+    def copy(self) -> _ReplayCursor:
+        forked = self.combatController.fork()
+        recorder = self.combatController.replayRecorder
+        assert(recorder is not None)
+        forked.replayRecorder = recorder.copyForFork(forked)
+
+        handlerMap : dict[CombatEntity, CombatInputHandler] = {}
+        for entity, handler in self.handlerMap.items():
+            if isinstance(handler, ReplayInputHandler):
+                handlerCopy = ReplayInputHandler(entity, handler.recordedActions)
+                handlerCopy.nextActionIndex = handler.nextActionIndex
+                handlerMap[entity] = handlerCopy
+        return _ReplayCursor(forked, handlerMap, self.globalRngStates)
+
+    def advanceTo(self, turn : int):
+        combatController = self.combatController
+        random.setstate(self.globalRngStates[0])
+        np.random.set_state(self.globalRngStates[1])
+        while self.getTurn() < turn and combatController.checkPlayerVictory() is None:
+            activeEntity = combatController.advanceToNextPlayer()
+            if combatController.isStunned(activeEntity):
+                combatController.stunSkipTurn(activeEntity)
+            else:
+                combatController.beginPlayerTurn(activeEntity)
+                if activeEntity not in self.handlerMap:
+                    assert(isinstance(activeEntity, NPCEntity))
+                    self.handlerMap[activeEntity] = NPCInputHandler(activeEntity)
+                self.handlerMap[activeEntity].performTurn(combatController)
+        self.globalRngStates = (random.getstate(), np.random.get_state(legacy=False))
@@ -0,0 +1,217 @@
+from __future__ import annotations
+import bisect
+import json
+import lzma
+import mmap
+import os
+import struct
+
+from rpg_consts import *
+from structures.rpg_replay import CombatReplayCheckpoint, CombatReplayRecord, CombatReplayViewer
+
+"""
+    Compact binary form of a CombatReplayRecord, for archiving fights in bulk. Laid out as:
+        header
+        builds: the record's players, enemies and starting state (lzma-compressed JSON), keyed by entity id
+        action stream: each action packed into a few bytes, in turn order
+        checkpoints: the record's CombatReplayCheckpoints, packed
+        turn index: where each turn's actions start in the action stream, plus where the stream ends
+        checkpoint index: (turn, file offset) for each checkpoint
+    Entity ids are their indices in the combat state map (players, then enemies, then anything spawned, in
+    order), as in CombatReplayRecorder. Files are read through a memory map, so scanning headers, or jumping to
+    one turn's actions, only touches the pages needed.
+"""
+class BinaryCombatReplay(object):
+    FILE_HEADER = struct.Struct("<4sBbQIIIIII")
+    ACTION_HEADER = struct.Struct("<BBbBB")
+    CHECKPOINT_HEADER = struct.Struct("<IBH")
+    ENTITY_STATE = struct.Struct("<iid")
+    DISTANCE = struct.Struct("<BBB")
+    INDEX_ENTRY = struct.Struct("<I")
+    CHECKPOINT_INDEX_ENTRY = struct.Struct("<II")
+    MAGIC = b"RPGC"
+    FORMAT_VERSION = 1
+
+    ACTION_CODES = {CombatActions.ATTACK.name: 0, CombatActions.SKILL.name: 1, "REPOSITION": 2, CombatActions.DEFEND.name: 3}
+    ACTION_NAMES = {code: actionName for actionName, code in ACTION_CODES.items()}
+    NO_SELECTOR = 0xFF
+
+    def __init__(self, buffer : bytes | mmap.mmap):
+        self.buffer = buffer
+        (magic, formatVersion, playerVictory, self.seed, self.turnCount, checkpointInterval, self.buildLength,
+            self.actionLength, self.checkpointLength, self.checkpointCount) = BinaryCombatReplay.FILE_HEADER.unpack_from(buffer, 0)
+        if magic != BinaryCombatReplay.MAGIC or formatVersion != BinaryCombatReplay.FORMAT_VERSION:
+            raise ValueError("not a supported combat replay file")
+        self.playerVictory : bool | None = None if playerVictory < 0 else playerVictory == 1
+        self.checkpointInterval : int | None = None if checkpointInterval == 0 else checkpointInterval
+
+        self.actionOffset = BinaryCombatReplay.FILE_HEADER.size + self.buildLength
+        self.turnIndexOffset = self.actionOffset + self.actionLength + self.checkpointLength
+        checkpointIndexOffset = self.turnIndexOffset + (self.turnCount + 1) * BinaryCombatReplay.INDEX_ENTRY.size
+        self.checkpointTurns : list[int] = []
+        self.checkpointOffsets : list[int] = []
+        for turn, offset in BinaryCombatReplay.CHECKPOINT_INDEX_ENTRY.iter_unpack(
+                buffer[checkpointIndexOffset:checkpointIndexOffset + self.checkpointCount * BinaryCombatReplay.CHECKPOINT_INDEX_ENTRY.size]):
+            self.checkpointTurns.append(turn)
+            self.checkpointOffsets.append(offset)
+        self._builds : dict | None = None
+
+    @staticmethod
+    def openFile(filename : str) -> BinaryCombatReplay:
+        with open(filename, 'rb') as replayFile:
+            return BinaryCombatReplay(mmap.mmap(replayFile.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    """ Returns the record's players, enemies, starting state, selector names and final health. """
+    def getBuilds(self) -> dict:
+        if self._builds is None:
+            buildOffset = BinaryCombatReplay.FILE_HEADER.size
+            self._builds = json.loads(lzma.decompress(self.buffer[buildOffset:buildOffset + self.buildLength]))
+        return self._builds
+
+    """ Returns the actions taken on the given turn (counting from 1), in CombatReplayRecorder's format. """
+    def getTurnActions(self, turn : int) -> list[list]:
+        if turn < 1 or turn > self.turnCount:
+            raise IndexError(f"turn {turn} is outside this replay's {self.turnCount} turns")
+        startOffset, endOffset = struct.unpack_from("<II", self.buffer, self.turnIndexOffset + (turn - 1) * BinaryCombatReplay.INDEX_ENTRY.size)
+        return self._readActions(turn, self.actionOffset + startOffset, self.actionOffset + endOffset)
+
+    def iterActions(self):
+        for turn in range(1, self.turnCount + 1):
+            yield from self.getTurnActions(turn)
+
+    def _readActions(self, turn : int, offset : int, endOffset : int) -> list[list]:
+        selectors : list[str] | None = None
+        actions = []
+        while offset < endOffset:
+            entity, actionCode, argument, selector, targetCount = BinaryCombatReplay.ACTION_HEADER.unpack_from(self.buffer, offset)
+            offset += BinaryCombatReplay.ACTION_HEADER.size
+            targets = list(self.buffer[offset:offset + targetCount])
+            offset += targetCount
+
+            actionName = BinaryCombatReplay.ACTION_NAMES[actionCode]
+            if actionName == CombatActions.ATTACK.name:
+                actions.append([turn, entity, actionName, targets[0]])
+            elif actionName == CombatActions.SKILL.name:
+                skillSelector = None
+                if selector != BinaryCombatReplay.NO_SELECTOR:
+                    if selectors is None:
+                        selectors = self.getBuilds()["selectors"]
+                    skillSelector = selectors[selector]
+                actions.append([turn, entity, actionName, argument, skillSelector, targets])
+            elif actionName == "REPOSITION":
+                actions.append([turn, entity, actionName, argument, targets])
+            else:
+                actions.append([turn, entity, actionName])
+        return actions
+
+    """ Returns the latest checkpoint at or before the given turn, or None if there isn't one. """
+    def findCheckpoint(self, turn : int) -> CombatReplayCheckpoint | None:
+        checkpointIndex = bisect.bisect_right(self.checkpointTurns, turn) - 1
+        if checkpointIndex < 0:
+            return None
+        return self._readCheckpoint(self.checkpointOffsets[checkpointIndex])
+
+    def _readCheckpoint(self, offset : int) -> CombatReplayCheckpoint:
+        turn, entityCount, distanceCount = BinaryCombatReplay.CHECKPOINT_HEADER.unpack_from(self.buffer, offset)
+        offset += BinaryCombatReplay.CHECKPOINT_HEADER.size
+        entityStates = []
+        for _ in range(entityCount):
+            entityStates.append(BinaryCombatReplay.ENTITY_STATE.unpack_from(self.buffer, offset))
+            offset += BinaryCombatReplay.ENTITY_STATE.size
+        distances = []
+        for _ in range(distanceCount):
+            distances.append(BinaryCombatReplay.DISTANCE.unpack_from(self.buffer, offset))
+            offset += BinaryCombatReplay.DISTANCE.size
+        return CombatReplayCheckpoint(turn, entityStates, distances)
+
+    def toRecord(self) -> CombatReplayRecord:
+        builds = self.getBuilds()
+        record = CombatReplayRecord(self.seed, builds["players"], [(spawnerPath, params) for spawnerPath, params in builds["enemies"]],
+                                    builds["startingDistances"], builds["startingHealth"], builds["startingMana"], self.checkpointInterval,
+                                    builds.get("enemySeeds", None))
+        record.actions = list(self.iterActions())
+        record.checkpoints = [self._readCheckpoint(offset) for offset in self.checkpointOffsets]
+        record.playerVictory = self.playerVictory
+        record.turnCount = self.turnCount
+        record.finalHealth = builds["finalHealth"]
+        return record
+
+    """ Sets up a CombatReplayViewer whose snapshots line up with this replay's checkpoints. """
+    def openViewer(self) -> CombatReplayViewer:
+        return CombatReplayViewer(self.toRecord(), self.checkpointInterval)
+
+    @staticmethod
+    def encode(record : CombatReplayRecord) -> bytes:
+        selectors : list[str] = []
+        selectorIndices : dict[str, int] = {}
+        actionChunks : list[bytes] = []
+        turnStarts : list[int] = []
+        actionLength = 0
+        for action in record.actions:
+            turn, entity, actionName, *actionArgs = action
+            while len(turnStarts) < turn:
+                turnStarts.append(actionLength)
+
+            argument, selector, targets = 0, BinaryCombatReplay.NO_SELECTOR, []
+            if actionName == CombatActions.ATTACK.name:
+                targets = [actionArgs[0]]
+            elif actionName == CombatActions.SKILL.name:
+                argument, skillSelector, targets = actionArgs
+                if skillSelector is not None:
+                    if skillSelector not in selectorIndices:
+                        selectorIndices[skillSelector] = len(selectors)
+                        selectors.append(skillSelector)
+                    selector = selectorIndices[skillSelector]
+            elif actionName == "REPOSITION":
+                argument, targets = actionArgs
+            actionChunks.append(BinaryCombatReplay.ACTION_HEADER.pack(entity, BinaryCombatReplay.ACTION_CODES[actionName],
+                                                                       argument, selector, len(targets)))
+            actionChunks.append(bytes(targets))
+            actionLength += BinaryCombatReplay.ACTION_HEADER.size + len(targets)
+        while len(turnStarts) < record.turnCount:
+            turnStarts.append(actionLength)
+        turnStarts.append(actionLength)
+        if len(selectors) >= BinaryCombatReplay.NO_SELECTOR:
+            raise ValueError("too many skill selectors for the replay format")
+
+        builds = lzma.compress(json.dumps({
+            "players": record.playerData,
+            "enemies": [[spawnerPath, params] for spawnerPath, params in record.enemySpawns],
+            "enemySeeds": record.enemySeeds,
+            "startingDistances": record.startingDistances,
+            "startingHealth": record.startingHealth,
+            "startingMana": record.startingMana,
+            "selectors": selectors,
+            "finalHealth": record.finalHealth
+        }, separators=(",", ":")).encode())
+
+        checkpointOffset = BinaryCombatReplay.FILE_HEADER.size + len(builds) + actionLength
+        checkpointChunks : list[bytes] = []
+        checkpointIndex : list[bytes] = []
+        checkpointLength = 0
+        for checkpoint in record.checkpoints:
+            checkpointIndex.append(BinaryCombatReplay.CHECKPOINT_INDEX_ENTRY.pack(checkpoint.turn, checkpointOffset + checkpointLength))
+            chunks = [BinaryCombatReplay.CHECKPOINT_HEADER.pack(checkpoint.turn, len(checkpoint.entityStates), len(checkpoint.distances))]
+            chunks += [BinaryCombatReplay.ENTITY_STATE.pack(*entityState) for entityState in checkpoint.entityStates]
+            chunks += [BinaryCombatReplay.DISTANCE.pack(*distance) for distance in checkpoint.distances]
+            checkpointChunk = b"".join(chunks)
+            checkpointChunks.append(checkpointChunk)
+            checkpointLength += len(checkpointChunk)
+
+        playerVictory = -1 if record.playerVictory is None else int(record.playerVictory)
+        header = BinaryCombatReplay.FILE_HEADER.pack(BinaryCombatReplay.MAGIC, BinaryCombatReplay.FORMAT_VERSION, playerVictory,
+                                                     record.seed, record.turnCount, record.checkpointInterval or 0, len(builds),
+                                                     actionLength, checkpointLength, len(record.checkpoints))
+        return b"".join([header, builds] + actionChunks + checkpointChunks +
+                        [BinaryCombatReplay.INDEX_ENTRY.pack(turnStart) for turnStart in turnStarts] + checkpointIndex)
+
+    @staticmethod
+    def writeFile(record : CombatReplayRecord, filename : str):
+        tmpFilename = filename + ".tmp"
+        with open(tmpFilename, 'wb') as replayFile:
+            replayFile.write(BinaryCombatReplay.encode(record))
+        os.replace(tmpFilename, filename)
@@ -0,0 +1,412 @@
+from __future__ import annotations
+from typing import Callable
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from rpg_consts import *
+from structures.rpg_combat_entity import CombatEntity, Enemy, Player
+from structures.rpg_combat_interface import CombatInputHandler, CombatInterface, NPCInputHandler, RandomEntityInputHandler
+from structures.rpg_combat_state import CombatController
+from structures.rpg_dungeons import DungeonController, DungeonData, DungeonInputHandler, DungeonReward, SettingsDungeonRoomData
+from structures.rpg_messages import MessageCollector, NullMessageCollector
+
+DEFAULT_SIMULATION_MAX_TURNS = 2000
+
+class CombatSimulationResult(object):
+    def __init__(self, playerVictory : bool | None, turnCount : int, remainingHealth : dict[CombatEntity, int],
+                 error : str | None = None):
+        self.playerVictory : bool | None = playerVictory
+        self.turnCount : int = turnCount
+        self.remainingHealth : dict[CombatEntity, int] = remainingHealth
+        self.error : str | None = error
+
+class CombatSimulationReport(object):
+    def __init__(self, results : list[CombatSimulationResult], elapsedSeconds : float):
+        self.results : list[CombatSimulationResult] = results
+        self.elapsedSeconds : float = elapsedSeconds
+
+        self.fights : int = len(results)
+        self.wins : int = len([result for result in results if result.playerVictory is True])
+        self.losses : int = len([result for result in results if result.playerVictory is False])
+        self.timeouts : int = len([result for result in results if result.playerVictory is None and result.error is None])
+        self.errors : list[str] = [result.error for result in results if result.error is not None]
+        self.turnCounts : list[int] = [result.turnCount for result in results if result.error is None]
+
+    def getWinRate(self) -> float:
+        return self.wins / self.fights if self.fights > 0 else 0
+
+    def getFightsPerSecond(self) -> float:
+        return self.fights / self.elapsedSeconds if self.elapsedSeconds > 0 else 0
+
+    def getAverageTurns(self) -> float:
+        return sum(self.turnCounts) / len(self.turnCounts) if len(self.turnCounts) > 0 else 0
+
+    def getReportString(self) -> str:
+        if len(self.turnCounts) == 0:
+            return f"No fights completed ({len(self.errors)} errors)."
+        sortedTurns = sorted(self.turnCounts)
+        reportLines = [
+            f"Fights: {self.fights} ({self.getFightsPerSecond():.1f} fights/s over {self.elapsedSeconds:.2f}s)",
+            f"Win rate: {self.getWinRate()*100:.2f}% ({self.wins} W / {self.losses} L / {self.timeouts} timed out)",
+            f"Errors: {len(self.errors)}" + (f" (first: {self.errors[0]})" if len(self.errors) > 0 else ""),
+            f"Turns: avg {self.getAverageTurns():.1f}, min {sortedTurns[0]}, median {sortedTurns[len(sortedTurns)//2]}, max {sortedTurns[-1]}"
+        ]
+        return '\n'.join(reportLines)
+
+"""
+    Runs fights synchronously, without asyncio or message sending, for balance testing.
+    Enemies are rebuilt for every fight (their AI data and names change during combat), so the enemy team is
+    given as a factory taking an rng. Players have no AI, so by default they act through RandomEntityInputHandler.
+"""
+class CombatSimulator(object):
+    def __init__(self, players : list[Player], enemyTeamFactory : Callable[[random.Random], list[Enemy]],
+                 startingDistances : dict[CombatEntity, int] | None = None,
+                 playerHandlerFactory : Callable[[Player, random.Random], CombatInputHandler] | None = None,
+                 maxTurns : int = DEFAULT_SIMULATION_MAX_TURNS, seed : int | None = None):
+        self.players : list[Player] = players
+        self.enemyTeamFactory : Callable[[random.Random], list[Enemy]] = enemyTeamFactory
+        self.startingDistances : dict[CombatEntity, int] = startingDistances if startingDistances is not None \
+            else {player : DEFAULT_STARTING_DISTANCE for player in players}
+        self.playerHandlerFactory : Callable[[Player, random.Random], CombatInputHandler] = playerHandlerFactory if playerHandlerFactory is not None \
+            else lambda player, rng: RandomEntityInputHandler(player, 0, rng)
+        self.maxTurns : int = maxTurns
+        self.rng : random.Random = random.Random(seed)
+
+    def _buildFight(self, fightSeed : int) -> CombatInterface:
+        fightRng = random.Random(fightSeed)
+        enemies = self.enemyTeamFactory(fightRng)
+        loggers : dict[CombatEntity, MessageCollector] = {player : NullMessageCollector() for player in self.players}
+
+        ci = CombatInterface({player : self.playerHandlerFactory(player, fightRng) for player in self.players},
+                             {enemy : NPCInputHandler(enemy) for enemy in enemies}, loggers, {}, {}, self.startingDistances)
+        ci.cc.rng.seed(fightRng.getrandbits(64))
+        return ci
+
+    def runFight(self, fightSeed : int | None = None) -> CombatSimulationResult:
+        ci = self._buildFight(fightSeed if fightSeed is not None else self.rng.getrandbits(64))
+        try:
+            playerVictory, turnCount = ci.runCombatHeadless(self.maxTurns)
+        except Exception as e:
+            # keep going so one broken interaction doesn't throw away a whole batch; errors are reported separately
+            remainingHealth = {player : ci.cc.getCurrentHealth(player) for player in self.players}
+            return CombatSimulationResult(None, 0, remainingHealth, f"{type(e).__name__}: {e}")
+        remainingHealth = {player : ci.cc.getCurrentHealth(player) for player in self.players}
+        return CombatSimulationResult(playerVictory, turnCount, remainingHealth)
+
+    def runFights(self, numFights : int) -> CombatSimulationReport:
+        results = []
+        startTime = time.perf_counter()
+        for _ in range(numFights):
+            results.append(self.runFight())
+        return CombatSimulationReport(results, time.perf_counter() - startTime)
+
+    """
+        Plays the fight for fightSeed, forking it every forkInterval turns and playing each fork to the end (with
+        random players) before carrying on. Checks that no fork changed any of the fight's entities, and that the
+        fight still came out the same as it does without the forks.
+    """
+    def checkForkIsolation(self, fightSeed : int, forkInterval : int = 10) -> bool:
+        expectedResult = self.runFight(fightSeed)
+        ci = self._buildFight(fightSeed)
+        forkRng = random.Random(fightSeed)
+        turnCount = 0
+        playerVictory = None
+        while playerVictory is None and turnCount < self.maxTurns:
+            entities = list(ci.cc.combatStateMap)
+            fingerprints = [_getEntityFingerprint(entity) for entity in entities]
+            forked = ci.cc.fork()
+            forkHandlers : dict[CombatEntity, CombatInputHandler] = {player : RandomEntityInputHandler(player, 0, forkRng)
+                                                                     for player in self.players}
+            _playToEnd(forked, forkHandlers, self.maxTurns)
+            if [_getEntityFingerprint(entity) for entity in entities] != fingerprints:
+                return False
+
+            playerVictory, turnsTaken = ci.runCombatHeadless(min(forkInterval, self.maxTurns - turnCount))
+            turnCount += turnsTaken
+        remainingHealth = {player : ci.cc.getCurrentHealth(player) for player in self.players}
+        return (playerVictory, turnCount, remainingHealth) == \
+            (expectedResult.playerVictory, expectedResult.turnCount, expectedResult.remainingHealth)
+
+""" Everything about an entity that a fight could plausibly change, for checking that forks leave it alone. """
+def _getEntityFingerprint(entity : CombatEntity) -> tuple:
+    entityAI = getattr(entity, "ai", None)
+    return (entity.name, entity.shortName, entity.statVersion, entity.baseStats.copy(), entity.flatStatMod.copy(),
+            entity.multStatMod.copy(), entity.basicAttackAttribute, entity.basicAttackType, entity.aggroDecayFactor,
+            [skill.skillName for skill in entity.availableActiveSkills + entity.availablePassiveSkills],
+            repr(entityAI.data) if entityAI is not None else None)
+
+def _playToEnd(combatController : CombatController, handlerMap : dict[CombatEntity, CombatInputHandler], maxTurns : int) -> None:
+    for _ in range(maxTurns):
+        if combatController.checkPlayerVictory() is not None:
+            return
+        activeEntity = combatController.advanceToNextPlayer()
+        if combatController.isStunned(activeEntity):
+            combatController.stunSkipTurn(activeEntity)
+        else:
+            combatController.beginPlayerTurn(activeEntity)
+            if activeEntity not in handlerMap:
+                handlerMap[activeEntity] = NPCInputHandler(activeEntity)
+            handlerMap[activeEntity].performTurn(combatController)
+
+
+class SimulationDungeonInputHandler(DungeonInputHandler):
+    def __init__(self, player : Player, playerHandlerFactory : Callable[[Player, random.Random], CombatInputHandler], rng : random.Random):
+        super().__init__(player, RandomEntityInputHandler)
+        self.playerHandlerFactory = playerHandlerFactory
+        self.rng = rng
+
+    def makeCombatInputController(self):
+        return self.playerHandlerFactory(self.player, self.rng)
+
+    def onPlayerLeaveDungeon(self):
+        pass
+
+"""
+    Plain-data results, so they can be sent back from worker processes (players and equipment hold lambdas).
+"""
+class DungeonRoomAttemptResult(object):
+    def __init__(self, roomIndex : int, playerVictory : bool | None, turnCount : int,
+                 healthFractions : dict[str, float], manaFractions : dict[str, float]):
+        self.roomIndex : int = roomIndex
+        self.playerVictory : bool | None = playerVictory
+        self.turnCount : int = turnCount
+        self.healthFractions : dict[str, float] = healthFractions
+        self.manaFractions : dict[str, float] = manaFractions
+
+class DungeonRunResult(object):
+    def __init__(self, runIndex : int, seed : int):
+        self.runIndex : int = runIndex
+        self.seed : int = seed
+        self.cleared : bool = False
+        self.roomAttempts : list[DungeonRoomAttemptResult] = []
+        self.exp : dict[str, int] = {}
+        self.wup : dict[str, int] = {}
+        self.swup : dict[str, int] = {}
+        self.equipRarities : dict[str, list[int]] = {}
+        self.error : str | None = None
+
+    """ Everything the run produced, as plain data, for comparing runs. """
+    def getSummary(self) -> tuple:
+        return (self.cleared, self.error,
+                tuple((attempt.roomIndex, attempt.playerVictory, attempt.turnCount,
+                       tuple(sorted(attempt.healthFractions.items())), tuple(sorted(attempt.manaFractions.items())))
+                      for attempt in self.roomAttempts),
+                tuple(sorted(self.exp.items())), tuple(sorted(self.wup.items())), tuple(sorted(self.swup.items())),
+                tuple(sorted((playerName, tuple(rarities)) for playerName, rarities in self.equipRarities.items())))
+
+    def addReward(self, playerName : str, reward : DungeonReward):
+        self.exp[playerName] = self.exp.get(playerName, 0) + reward.exp
+        self.wup[playerName] = self.wup.get(playerName, 0) + reward.wup
+        self.swup[playerName] = self.swup.get(playerName, 0) + reward.swup
+        self.equipRarities.setdefault(playerName, []).extend([equip.rarity for equip in reward.equips])
+
+def _summarizeValues(values : list[float] | list[int]) -> str:
+    if len(values) == 0:
+        return "n/a"
+    sortedValues = sorted(values)
+    return f"avg {sum(sortedValues)/len(sortedValues):.2f}, min {sortedValues[0]}, median {sortedValues[len(sortedValues)//2]}, max {sortedValues[-1]}"
+
+class DungeonSimulationReport(object):
+    def __init__(self, dungeonData : DungeonData, playerNames : list[str], results : list[DungeonRunResult], elapsedSeconds : float, workers : int):
+        self.dungeonData : DungeonData = dungeonData
+        self.playerNames : list[str] = playerNames
+        self.results : list[DungeonRunResult] = results
+        self.elapsedSeconds : float = elapsedSeconds
+        self.workers : int = workers
+
+        self.runs : int = len(results)
+        self.clears : int = len([result for result in results if result.cleared])
+        self.errors : list[str] = [result.error for result in results if result.error is not None]
+
+        self.roomAttempts : dict[int, list[DungeonRoomAttemptResult]] = {}
+        for result in results:
+            for attempt in result.roomAttempts:
+                self.roomAttempts.setdefault(attempt.roomIndex, []).append(attempt)
+
+    def getClearRate(self) -> float:
+        return self.clears / self.runs if self.runs > 0 else 0
+
+    """ Fraction of attempts at the room that were won, and the fraction of runs that reached the room and eventually cleared it. """
+    def getRoomClearRates(self, roomIndex : int) -> tuple[float, float]:
+        attempts = self.roomAttempts.get(roomIndex, [])
+        wins = len([attempt for attempt in attempts if attempt.playerVictory])
+        reached = len(set(result.runIndex for result in self.results
+                          if any(attempt.roomIndex == roomIndex for attempt in result.roomAttempts)))
+        attemptRate = wins / len(attempts) if len(attempts) > 0 else 0
+        runRate = wins / reached if reached > 0 else 0
+        return attemptRate, runRate
+
+    def getReportString(self) -> str:
+        reportLines = [
+            f"{self.dungeonData.dungeonName}: {self.runs} runs on {self.workers} worker(s) in {self.elapsedSeconds:.2f}s " +
+                f"({self.runs / self.elapsedSeconds if self.elapsedSeconds > 0 else 0:.1f} runs/s)",
+            f"Clear rate: {self.getClearRate()*100:.2f}% ({self.clears}/{self.runs})",
+            f"Errors: {len(self.errors)}" + (f" (first: {self.errors[0]})" if len(self.errors) > 0 else "")
+        ]
+        for roomIndex in sorted(self.roomAttempts):
+            attempts = self.roomAttempts[roomIndex]
+            attemptRate, runRate = self.getRoomClearRates(roomIndex)
+            wonAttempts = [attempt for attempt in attempts if attempt.playerVictory]
+            reportLines.append(f"Room {roomIndex+1}: {len(attempts)} attempts, {attemptRate*100:.2f}% won per attempt, " +
+                               f"{runRate*100:.2f}% of runs reaching it cleared it")
+            reportLines.append(f"--Turns: {_summarizeValues([attempt.turnCount for attempt in attempts])}")
+            for playerName in self.playerNames:
+                hpValues = [round(attempt.healthFractions[playerName], 3) for attempt in wonAttempts if playerName in attempt.healthFractions]
+                mpValues = [round(attempt.manaFractions[playerName], 3) for attempt in wonAttempts if playerName in attempt.manaFractions]
+                reportLines.append(f"--{playerName} HP left after a win: {_summarizeValues(hpValues)}; MP left: {_summarizeValues(mpValues)}")
+
+        clearedResults = [result for result in self.results if result.cleared]
+        reportLines.append(f"Rewards per cleared run ({len(clearedResults)} runs):")
+        for playerName in self.playerNames:
+            reportLines.append(f"--{playerName} EXP: {_summarizeValues([result.exp.get(playerName, 0) for result in clearedResults])}")
+            reportLines.append(f"--{playerName} WUP: {_summarizeValues([result.wup.get(playerName, 0) for result in clearedResults])}")
+            reportLines.append(f"--{playerName} SWUP: {_summarizeValues([result.swup.get(playerName, 0) for result in clearedResults])}")
+            rarityCounts : dict[int, int] = {}
+            for result in clearedResults:
+                for rarity in result.equipRarities.get(playerName, []):
+                    rarityCounts[rarity] = rarityCounts.get(rarity, 0) + 1
+            rarityString = ', '.join(f"{itemRarityStrings[rarity]}: {rarityCounts[rarity]}" for rarity in sorted(rarityCounts))
+            reportLines.append(f"--{playerName} equips: {rarityString if len(rarityString) > 0 else 'none'}")
+        return '\n'.join(reportLines)
+
+"""
+    Runs full dungeons headlessly. Rewards are tallied but never applied to the players, so every run
+    uses the same builds. Runs are spread across a process pool when fork is available; each run gets
+    its own seed, drawn up front, so results don't depend on how runs are split between workers.
+"""
+class DungeonSimulator(object):
+    def __init__(self, dungeonData : DungeonData, players : list[Player], roomSettings : dict | None = None,
+                 startingDistances : dict[CombatEntity, int] | None = None,
+                 playerHandlerFactory : Callable[[Player, random.Random], CombatInputHandler] | None = None,
+                 maxRetries : int = 0, maxTurns : int = DEFAULT_SIMULATION_MAX_TURNS, seed : int | None = None):
+        assert not dungeonData.pvpMode
+        self.dungeonData : DungeonData = dungeonData
+        self.players : list[Player] = players
+        self.roomSettings : dict = {} if roomSettings is None else roomSettings.copy()
+        for room in dungeonData.dungeonRooms:
+            if isinstance(room, SettingsDungeonRoomData):
+                for setting in room.roomSettings:
+                    self.roomSettings.setdefault(setting.settingKey, setting.settingDefault)
+        self.startingDistances : dict[CombatEntity, int] = startingDistances if startingDistances is not None \
+            else {player : DEFAULT_STARTING_DISTANCE for player in players}
+        self.playerHandlerFactory : Callable[[Player, random.Random], CombatInputHandler] = playerHandlerFactory if playerHandlerFactory is not None \
+            else lambda player, rng: RandomEntityInputHandler(player, 0, rng)
+        self.maxRetries : int = maxRetries
+        self.maxTurns : int = maxTurns
+        self.rng : random.Random = random.Random(seed)
+
+    """
+        Runs the dungeon once from the given seed. The global random and numpy generators are seeded for the run,
+        since equipment drops roll from them, and put back as they were afterwards.
+    """
+    def runDungeon(self, runIndex : int, seed : int) -> DungeonRunResult:
+        globalRngState = random.getstate()
+        numpyRngState = np.random.get_state()
+        try:
+            return self._runDungeon(runIndex, seed)
+        finally:
+            random.setstate(globalRngState)
+            np.random.set_state(numpyRngState)
+
+    def _runDungeon(self, runIndex : int, seed : int) -> DungeonRunResult:
+        result = DungeonRunResult(runIndex, seed)
+        runRng = random.Random(seed)
+        random.seed(runRng.getrandbits(64))
+        np.random.seed(runRng.getrandbits(32))
+
+        handlers = {player : SimulationDungeonInputHandler(player, self.playerHandlerFactory, runRng) for player in self.players}
+        loggers : dict[Player, MessageCollector] = {player : NullMessageCollector() for player in self.players}
+        controller = DungeonController(self.dungeonData, handlers, self.startingDistances, loggers, self.roomSettings, self.players[:])
+        controller.rng.seed(runRng.getrandbits(64))
+
+        try:
+            retries = 0
+            while controller.currentRoom < controller.totalRooms:
+                combatInterface = controller.beginRoom()
+                assert combatInterface is not None
+                combatInterface.cc.rng.seed(runRng.getrandbits(64))
+                playerVictory, turnCount = combatInterface.runCombatHeadless(self.maxTurns)
+
+                cc = combatInterface.cc
+                result.roomAttempts.append(DungeonRoomAttemptResult(
+                    controller.currentRoom, playerVictory, turnCount,
+                    {player.name : cc.getCurrentHealth(player) / cc.getMaxHealth(player) for player in self.players},
+                    {player.name : cc.getCurrentMana(player) / cc.getMaxMana(player) if cc.getMaxMana(player) > 0 else 0
+                        for player in self.players}))
+
+                if not playerVictory:
+                    if not self.dungeonData.allowRetryFights or retries >= self.maxRetries:
+                        return result
+                    retries += 1
+                    controller.doDungeonRestoration()
+                    controller.currentCombatInterface = None
+                    continue
+
+                rewardMap = controller.completeRoom()
+                assert rewardMap is not None
+                [result.addReward(player.name, rewardMap[player]) for player in rewardMap]
+
+            rewardMap = controller.completeDungeon()
+            assert rewardMap is not None
+            [result.addReward(player.name, rewardMap[player]) for player in rewardMap]
+            result.cleared = True
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        return result
+
+    """
+        Runs the same seed a few times over in this process and checks every run came out the same. Anything
+        that rolls from an unseeded generator (an enemy spawned without the run's rng, say) shows up here.
+    """
+    def checkReproducible(self, seed : int, repeats : int = 3) -> bool:
+        firstSummary = self.runDungeon(0, seed).getSummary()
+        return all(self.runDungeon(0, seed).getSummary() == firstSummary for _ in range(repeats - 1))
+
+    def runDungeons(self, numRuns : int, workers : int | None = None) -> DungeonSimulationReport:
+        seeds = [self.rng.getrandbits(64) for _ in range(numRuns)]
+        tasks = list(enumerate(seeds))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, numRuns))
+
+        startTime = time.perf_counter()
+        if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            global _activeDungeonSimulator
+            _activeDungeonSimulator = self
+            try:
+                # forked workers inherit the simulator, so builds never need to be pickled
+                with multiprocessing.get_context("fork").Pool(workers) as pool:
+                    results = pool.map(_runDungeonSimulationTask, tasks, chunksize=max(1, numRuns // (workers * 4)))
+            finally:
+                _activeDungeonSimulator = None
+        else:
+            workers = 1
+            results = [self.runDungeon(runIndex, seed) for runIndex, seed in tasks]
+        elapsed = time.perf_counter() - startTime
+
+        return DungeonSimulationReport(self.dungeonData, [player.name for player in self.players], results, elapsed, workers)
+
+    """
+        Rolls each room's enemy group samplesPerRoom times without running any fights. Returns, per room,
+        how often each group (as a tuple of spawner names) came up.
+    """
+    def sampleRoomCompositions(self, samplesPerRoom : int, seed : int | None = None) -> list[dict[tuple[str, ...], int]]:
+        sampleRng = random.Random(seed)
+        compositions = []
+        for room in self.dungeonData.dungeonRooms:
+            counts : dict[tuple[str, ...], int] = {}
+            for enemyGroup in room.sampleEnemyGroups(sampleRng, samplesPerRoom):
+                groupNames = tuple(spawner.__name__ for spawner in enemyGroup)
+                counts[groupNames] = counts.get(groupNames, 0) + 1
+            compositions.append(counts)
+        return compositions
+
+_activeDungeonSimulator : DungeonSimulator | None = None
+
+def _runDungeonSimulationTask(task : tuple[int, int]) -> DungeonRunResult:
+    assert _activeDungeonSimulator is not None
+    return _activeDungeonSimulator.runDungeon(task[0], task[1])